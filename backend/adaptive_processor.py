@@ -0,0 +1,246 @@
+"""
+Adaptive Processing
+Load-aware, tiered degradation for the analytics pipeline.
+
+Instead of skipping whole snapshots as soon as processing slows down, the
+pipeline sheds work in stages and keeps every snapshot for as long as it can:
+
+    tier 0  normal             everything enabled
+    tier 1  reduced_detection  KMeans regime clustering and pattern detectors off
+    tier 2  reduced_inference  tier 1 + model inference runs less often
+    tier 3  conflate           tier 2 + only the latest queued snapshot is analysed
+
+Tiers are chosen from measured per-stage costs and queue fill, escalate one
+step at a time (skipping a tier whose stages are measured to be negligible)
+and recover more slowly than they escalate so they do not flap.
+
+Each replay session keeps its own tier state, capped at REPLAY_MAX_TIER:
+replay is slowed by its producer credits and never thinned. Live ticks share
+one instance, the only one allowed to conflate.
+"""
+import logging
+import queue
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIERS = [
+    {"name": "normal", "clustering": True, "pattern_detectors": True,
+     "inference_interval_scale": 1.0, "conflate": False},
+    {"name": "reduced_detection", "clustering": False, "pattern_detectors": False,
+     "inference_interval_scale": 1.0, "conflate": False},
+    {"name": "reduced_inference", "clustering": False, "pattern_detectors": False,
+     "inference_interval_scale": 4.0, "conflate": False},
+    {"name": "conflate", "clustering": False, "pattern_detectors": False,
+     "inference_interval_scale": 4.0, "conflate": True},
+]
+
+# Stages whose cost each tier removes (tier 3 sheds snapshots, not a stage)
+SHED_STAGES = {1: ("clustering", "detectors"), 2: ("inference",), 3: ()}
+REPLAY_MAX_TIER = 2  # Replay rows must all be analysed, so no conflation
+
+
+class AdaptiveProcessor:
+    """Tracks pipeline load and selects a degradation tier with hysteresis."""
+
+    def __init__(
+        self,
+        budget_ms: float = 100.0,
+        queue_high: float = 0.75,
+        recover_ratio: float = 0.7,
+        escalate_after: int = 5,
+        recover_after: int = 20,
+        min_shed_fraction: float = 0.05,
+        alpha: float = 0.2,
+        max_tier: Optional[int] = None
+    ):
+        self.budget_ms = budget_ms              # Per-snapshot processing budget
+        self.queue_high = queue_high            # Queue fill treated as overloaded
+        self.recover_ratio = recover_ratio      # Load below this fraction counts toward recovery
+        self.escalate_after = escalate_after    # Consecutive overloaded samples before stepping up
+        self.recover_after = recover_after      # Consecutive calm samples before stepping down
+        self.min_shed_fraction = min_shed_fraction
+        self.alpha = alpha
+        self.max_tier = len(TIERS) - 1 if max_tier is None else max_tier
+
+        self.processing_times = deque(maxlen=20)
+        self.stage_ms: Dict[str, float] = {}    # EWMA cost per stage
+        self.queue_fill = 0.0                   # EWMA of queue depth / capacity
+
+        self.tier = 0
+        self._overloaded = 0
+        self._calm = 0
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+        # Statistics
+        self.transitions = 0
+        self.conflated = 0
+        self.tier_entered_at = time.time()
+        self.time_in_tier = defaultdict(float)
+
+    @property
+    def profile(self) -> Dict[str, Any]:
+        """Settings for the current tier."""
+        return TIERS[self.tier]
+
+    @property
+    def adaptive_mode(self) -> bool:
+        return self.tier > 0
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked with the new profile on every tier change."""
+        self._listeners.append(callback)
+
+    def record(
+        self,
+        processing_time_ms: float,
+        queue_depth: int = 0,
+        queue_capacity: int = 0,
+        stage_costs: Optional[Dict[str, float]] = None
+    ):
+        """Record one processed snapshot and re-evaluate the tier."""
+        self.processing_times.append(processing_time_ms)
+        for stage, cost in (stage_costs or {}).items():
+            previous = self.stage_ms.get(stage, cost)
+            self.stage_ms[stage] = (1 - self.alpha) * previous + self.alpha * cost
+        if queue_capacity:
+            fill = min(1.0, queue_depth / queue_capacity)
+            self.queue_fill = (1 - self.alpha) * self.queue_fill + self.alpha * fill
+
+        if len(self.processing_times) < 5:
+            return
+
+        load = self.load()
+        if load > 1.0:
+            self._overloaded += 1
+            self._calm = 0
+        elif load < self.recover_ratio:
+            self._calm += 1
+            self._overloaded = 0
+        else:
+            self._overloaded = 0
+            self._calm = 0
+
+        if self._overloaded >= self.escalate_after and self.tier < self.max_tier:
+            self._set_tier(self._next_tier())
+        elif self._calm >= self.recover_after and self.tier > 0:
+            self._set_tier(self.tier - 1)
+
+    def record_processing_time(self, processing_time_ms: float):
+        """Backward-compatible entry point for callers without queue or stage data."""
+        self.record(processing_time_ms)
+
+    def record_conflated(self, count: int):
+        """Count snapshots superseded by a newer one under tier 3."""
+        self.conflated += count
+
+    def load(self) -> float:
+        """Load as a multiple of capacity: >1 is overloaded."""
+        recent = list(self.processing_times)[-5:]
+        avg_time = sum(recent) / len(recent) if recent else 0.0
+        return max(avg_time / self.budget_ms, self.queue_fill / self.queue_high)
+
+    def _next_tier(self) -> int:
+        """Next tier up, skipping tiers whose shed stages are measured to be negligible."""
+        total = self.stage_ms.get("analytics", 0.0) + self.stage_ms.get("inference", 0.0)
+        for tier in range(self.tier + 1, self.max_tier):
+            stages = [s for s in SHED_STAGES[tier] if s in self.stage_ms]
+            if not stages or total <= 0:
+                return tier  # No measurement: assume shedding helps
+            if sum(self.stage_ms[s] for s in stages) / total >= self.min_shed_fraction:
+                return tier
+        return self.max_tier
+
+    def _set_tier(self, tier: int):
+        load = self.load()
+        now = time.time()
+        self.time_in_tier[TIERS[self.tier]["name"]] += now - self.tier_entered_at
+        self.tier_entered_at = now
+
+        previous = self.tier
+        self.tier = tier
+        self.transitions += 1
+        self._overloaded = 0
+        self._calm = 0
+        self.processing_times.clear()  # Judge the new tier on its own measurements
+
+        if tier > previous:
+            logger.warning(
+                f"Degrading analytics to tier {tier} ({TIERS[tier]['name']}), load {load:.2f}"
+            )
+        else:
+            logger.info(f"Recovering analytics to tier {tier} ({TIERS[tier]['name']})")
+
+        for callback in self._listeners:
+            try:
+                callback(self.profile)
+            except Exception as e:
+                logger.error(f"Adaptive profile listener failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get adaptive processor statistics"""
+        avg_time = sum(self.processing_times) / len(self.processing_times) if self.processing_times else 0
+        time_in_tier = dict(self.time_in_tier)
+        time_in_tier[self.profile["name"]] = (
+            time_in_tier.get(self.profile["name"], 0.0) + time.time() - self.tier_entered_at
+        )
+        return {
+            "adaptive_mode": self.adaptive_mode,
+            "tier": self.tier,
+            "tier_name": self.profile["name"],
+            "max_tier": self.max_tier,
+            "profile": self.profile,
+            "load": round(self.load(), 3),
+            "queue_fill": round(self.queue_fill, 3),
+            "stage_ms": {stage: round(cost, 3) for stage, cost in self.stage_ms.items()},
+            "avg_processing_time_ms": round(avg_time, 2),
+            "recent_samples": len(self.processing_times),
+            "transitions": self.transitions,
+            "conflated_snapshots": self.conflated,
+            "time_in_tier_s": {name: round(t, 1) for name, t in time_in_tier.items()}
+        }
+
+
+def session_tier_stats(processors: Dict[str, "AdaptiveProcessor"]) -> Dict[str, Any]:
+    """Sessions per tier name, plus the tier of every degraded session (by session id)."""
+    counts = {tier["name"]: 0 for tier in TIERS}
+    degraded = {}
+    for session_id, processor in processors.items():
+        counts[processor.profile["name"]] += 1
+        if processor.adaptive_mode:
+            degraded[session_id] = processor.profile["name"]
+    return {"counts": counts, "degraded": degraded}
+
+
+def apply_profile_to_engine(engine, profile: Dict[str, Any]):
+    """Switch an AnalyticsEngine's optional stages on or off."""
+    if engine is None:
+        return
+    engine.clustering_enabled = profile["clustering"]
+    engine.pattern_detectors_enabled = profile["pattern_detectors"]
+
+
+def drain_latest(q, first: Any, key_func: Callable[[Any], Any] = lambda s: s.get("symbol")) -> Tuple[List[Any], int]:
+    """
+    Conflate a queue backlog: keep only the newest snapshot per key.
+
+    Returns:
+        Tuple of (snapshots to process in arrival order, number superseded)
+    """
+    latest = {key_func(first): first}
+    superseded = 0
+    while True:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            continue
+        key = key_func(item)
+        if key in latest:
+            superseded += 1
+            del latest[key]  # Re-insert to keep arrival order of the newest items
+        latest[key] = item
+    return list(latest.values()), superseded
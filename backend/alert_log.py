@@ -0,0 +1,98 @@
+"""
+Durable Alert Audit Log
+Paged queries over analytics_anomalies, where FeatureStore (and the
+backfill) already persist every alert raised on a processed snapshot, so
+alert history survives restarts and covers days of trading instead of the
+last 1000 in-memory entries, without writing each alert a second time.
+
+The table is indexed for the audit queries: by time, by type and time, and
+by severity and time (see feature_store.SCHEMA_SQL). fetch_alert_log pages
+newest first with a keyset cursor on (ts, id), so deep pages cost the same
+as the first one.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from feature_store import ANOMALIES_TABLE, ANOMALY_COLUMNS, to_utc
+
+logger = logging.getLogger(__name__)
+
+ALERT_LOG_TABLE = ANOMALIES_TABLE
+RESULT_COLUMNS = ("id",) + ANOMALY_COLUMNS
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    return f"{ts.isoformat()}|{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(ts, id) from a next_cursor value; ValueError if malformed."""
+    ts, _, row_id = cursor.rpartition("|")
+    if not ts:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return to_utc(ts), int(row_id)
+
+
+def build_log_query(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    types: Sequence[str] = (),
+    severities: Sequence[str] = (),
+    source: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[str, List[Any]]:
+    """Parameterized page query: start <= ts < end, newest first, after `cursor`."""
+    conditions, args = [], []
+
+    def param(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if start is not None:
+        conditions.append(f"ts >= {param(to_utc(start))}")
+    if end is not None:
+        conditions.append(f"ts < {param(to_utc(end))}")
+    if types:
+        conditions.append(f"type = ANY({param(list(types))})")
+    if severities:
+        conditions.append(f"severity = ANY({param(list(severities))})")
+    if source is not None:
+        conditions.append(f"source = {param(source)}")
+    if cursor is not None:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        conditions.append(f"(ts, id) < ({param(cursor_ts)}, {param(cursor_id)})")
+
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    sql = (
+        f"SELECT {', '.join(RESULT_COLUMNS)} FROM {ALERT_LOG_TABLE} {where}"
+        f"ORDER BY ts DESC, id DESC LIMIT {param(max(1, min(limit, MAX_PAGE_SIZE)))}"
+    )
+    return sql, args
+
+
+def row_to_alert(row) -> Dict[str, Any]:
+    details = row["details"]
+    return {
+        "id": row["id"],
+        "timestamp": row["ts"].astimezone(timezone.utc).isoformat(),
+        "source": row["source"],
+        "symbol": row["symbol"],
+        "type": row["type"],
+        "severity": row["severity"],
+        "message": row["message"],
+        "details": json.loads(details) if isinstance(details, str) else details
+    }
+
+
+async def fetch_alert_log(conn, limit: int = 100, **filters) -> Dict[str, Any]:
+    """One page of alerts, newest first, with the cursor of the next page (None on the last)."""
+    sql, args = build_log_query(limit=limit, **filters)
+    rows = await conn.fetch(sql, *args)
+    alerts = [row_to_alert(row) for row in rows]
+    page_size = args[-1]
+    next_cursor = encode_cursor(rows[-1]["ts"], rows[-1]["id"]) if len(rows) == page_size else None
+    return {"count": len(alerts), "alerts": alerts, "next_cursor": next_cursor}
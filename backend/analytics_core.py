@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from sklearn.cluster import KMeans
 from collections import deque, defaultdict
 import hashlib
+import pickle
 from typing import Dict, List, Tuple, Optional
 import threading
 import time
@@ -529,7 +530,7 @@ class AnalyticsEngine:
         
         # Alert Management
         self.alert_manager = AlertManager(dedup_window_seconds=5)
-        self.last_cleanup_time = datetime.now()
+        self.last_cleanup_time = None  # Set on the first dedup cleanup, by whichever clock is in use
         
         # Feature F: Market State Clusters
         self.feature_history = deque(maxlen=600)
@@ -543,6 +544,16 @@ class AnalyticsEngine:
         self.training_in_progress = False
         self.cluster_map = {}
         self.pending_training = False
+        self.last_regime = 0
+
+        # Load shedding switches (driven by AdaptiveProcessor tiers)
+        self.clustering_enabled = True
+        self.pattern_detectors_enabled = True
+
+        # Time rates, alert dedup and K-Means retraining by snapshot timestamps
+        # instead of the wall clock (training then runs inline); used by backfill
+        self.data_clock = False
+        self.last_stage_ms = {"clustering": 0.0, "detectors": 0.0}
         
         # Feature G: Microprice Divergence
         self.tick_size = 0.01
@@ -607,6 +618,36 @@ class AnalyticsEngine:
         self.mid_price_history = deque(maxlen=100)  # Track mid-prices for realized spread
         self.trade_metrics_history = deque(maxlen=1000)  # Store trade metrics
     
+    # Configuration, fitted models and training bookkeeping: not part of a replay checkpoint
+    _NON_STATE_ATTRS = frozenset({
+        "window_size", "regime_labels", "kmeans", "is_fitted", "last_train_time", "cluster_map",
+        "training_lock", "training_in_progress", "pending_training", "clustering_enabled",
+        "pattern_detectors_enabled", "last_stage_ms", "tick_size", "bucket_size", "alpha", "data_clock"
+    })
+
+    def get_state(self) -> bytes:
+        """Serialize the forward state (baselines, OFI, VPIN buckets, histories) for a replay checkpoint."""
+        state = {k: v for k, v in self.__dict__.items() if k not in self._NON_STATE_ATTRS}
+        state["iceberg_candidates"] = dict(self.iceberg_candidates)  # defaultdict factory is a lambda
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def set_state(self, blob: Optional[bytes]):
+        """Restore a checkpoint from get_state(); None resets to a freshly constructed engine's state."""
+        if blob is None:
+            blob = AnalyticsEngine().get_state()
+        state = pickle.loads(blob)
+        iceberg_candidates = defaultdict(lambda: {'fills': 0, 'volume': 0, 'first_seen': None})
+        iceberg_candidates.update(state.pop("iceberg_candidates"))
+        self.__dict__.update(state)
+        self.iceberg_candidates = iceberg_candidates
+
+    def _now(self, snapshot: dict) -> datetime:
+        """Current time: the snapshot's timestamp under data_clock, else the wall clock."""
+        ts = snapshot.get('timestamp')
+        if self.data_clock and isinstance(ts, datetime):
+            return ts
+        return datetime.now()
+
     def detect_advanced_anomalies(self, snapshot: dict) -> list:
         """
         Standalone method to detect advanced manipulation patterns.
@@ -623,7 +664,7 @@ class AnalyticsEngine:
             return anomalies
         
         current_l1_vol = (bids[0][1] + asks[0][1]) / 2
-        current_time = datetime.now()
+        current_time = self._now(snapshot)
         
         # 1. Quote Stuffing Detection
         self.order_event_timestamps.append(current_time)
@@ -680,7 +721,7 @@ class AnalyticsEngine:
         self.price_momentum.append(mid_price)
         
         if abs(price_change) > 0.002 and current_l1_vol > (2.5 * self.avg_l1_vol):
-            if len(self.price_momentum) >= 3:
+            if len(self.price_momentum) >= 4:  # Three changes need four prices
                 recent_changes = [
                     (self.price_momentum[i] - self.price_momentum[i-1]) / self.price_momentum[i-1]
                     for i in range(-3, 0)
@@ -794,7 +835,7 @@ class AnalyticsEngine:
         
         return anomalies
     
-    def _train_kmeans_background(self, feature_data):
+    def _train_kmeans_background(self, feature_data, trained_at=None):
         """Train K-Means in background thread to avoid blocking."""
         try:
             self.training_in_progress = True
@@ -814,7 +855,7 @@ class AnalyticsEngine:
                 self.kmeans = new_kmeans
                 self.cluster_map = new_cluster_map
                 self.is_fitted = True
-                self.last_train_time = datetime.now()
+                self.last_train_time = trained_at or datetime.now()
         
         except Exception as e:
             print(f"Background K-Means training failed: {e}")
@@ -1026,15 +1067,20 @@ class AnalyticsEngine:
         feature_vector = [spread_z, abs(obi), volatility, abs(ofi_normalized)]
         self.feature_history.append(feature_vector)
         
-        # Clustering
-        regime = 0
-        if len(self.feature_history) > 50:
+        # Clustering (skipped under load; the last known regime is carried forward)
+        stage_start = time.time()
+        regime = 0 if self.clustering_enabled else self.last_regime
+        if self.clustering_enabled and len(self.feature_history) > 50:
             # Check if we need to retrain (every 10 seconds)
+            now = self._now(snapshot)
             should_retrain = (not self.is_fitted or 
-                            (datetime.now() - self.last_train_time).seconds > 10)
+                            (now - self.last_train_time).seconds > 10)
             
+            if should_retrain and self.data_clock:
+                # Deterministic: train on exactly this history before predicting
+                self._train_kmeans_background(np.array(list(self.feature_history)), trained_at=now)
             # Trigger background training if needed and not already running
-            if should_retrain and not self.training_in_progress and not self.pending_training:
+            elif should_retrain and not self.training_in_progress and not self.pending_training:
                 self.pending_training = True
                 X = np.array(list(self.feature_history))  # Copy data
                 training_thread = threading.Thread(
@@ -1054,6 +1100,9 @@ class AnalyticsEngine:
                         # If prediction fails, default to regime 0
                         regime = 0
             
+        self.last_regime = regime
+        self.last_stage_ms["clustering"] = (time.time() - stage_start) * 1000
+            
         snapshot['regime'] = regime
         snapshot['regime_label'] = self.regime_labels.get(regime, "Unknown")
 
@@ -1209,7 +1258,7 @@ class AnalyticsEngine:
         
         # 1. Quote Stuffing Detection
         # Rapid fire of orders (>20 updates/sec) to slow down competitors
-        current_time = datetime.now()
+        current_time = self._now(snapshot)
         self.order_event_timestamps.append(current_time)
         
         # Calculate update rate over last 1 second
@@ -1274,7 +1323,7 @@ class AnalyticsEngine:
         # Check for rapid price move (>0.2% in one tick) with heavy volume
         if abs(price_change) > 0.002 and current_l1_vol > (2.5 * self.avg_l1_vol):
             # Check if price continued moving in same direction (momentum)
-            if len(self.price_momentum) >= 3:
+            if len(self.price_momentum) >= 4:  # Three changes need four prices
                 recent_changes = [
                     (self.price_momentum[i] - self.price_momentum[i-1]) / self.price_momentum[i-1]
                     for i in range(-3, 0)
@@ -1298,129 +1347,134 @@ class AnalyticsEngine:
                             "direction": "UP" if price_change > 0 else "DOWN"
                         })
         
-        # 4. Wash Trading Detection
-        # Self-trading patterns (buy and sell at similar prices with similar volumes)
-        # Track volume patterns at each price level
-        for i in range(min(3, len(bids), len(asks))):
-            bid_px, bid_vol = bids[i]
-            ask_px, ask_vol = asks[i]
+        # Pattern detectors (4-5) keep per-price state across snapshots and are
+        # shed first under load; the per-tick detectors above always run
+        stage_start = time.time()
+        if self.pattern_detectors_enabled:
+            # 4. Wash Trading Detection
+            # Self-trading patterns (buy and sell at similar prices with similar volumes)
+            # Track volume patterns at each price level
+            for i in range(min(3, len(bids), len(asks))):
+                bid_px, bid_vol = bids[i]
+                ask_px, ask_vol = asks[i]
             
-            # Check if bid/ask volumes are suspiciously similar (within 5%)
-            if abs(bid_vol - ask_vol) / max(bid_vol, ask_vol) < 0.05 and bid_vol > self.avg_l1_vol:
-                self.volume_clustering.append({
-                    "bid_price": bid_px,
-                    "ask_price": ask_px,
-                    "volume": (bid_vol + ask_vol) / 2,
-                    "level": i
-                })
+                # Check if bid/ask volumes are suspiciously similar (within 5%)
+                if abs(bid_vol - ask_vol) / max(bid_vol, ask_vol) < 0.05 and bid_vol > self.avg_l1_vol:
+                    self.volume_clustering.append({
+                        "bid_price": bid_px,
+                        "ask_price": ask_px,
+                        "volume": (bid_vol + ask_vol) / 2,
+                        "level": i
+                    })
         
-        # Detect repeated similar volumes (potential wash trading)
-        if len(self.volume_clustering) >= 5:
-            recent_vols = [v['volume'] for v in list(self.volume_clustering)[-5:]]
-            vol_std = np.std(recent_vols)
-            vol_mean = np.mean(recent_vols)
+            # Detect repeated similar volumes (potential wash trading)
+            if len(self.volume_clustering) >= 5:
+                recent_vols = [v['volume'] for v in list(self.volume_clustering)[-5:]]
+                vol_std = np.std(recent_vols)
+                vol_mean = np.mean(recent_vols)
             
-            # Low variance in volumes suggests coordinated trading
-            if vol_std / vol_mean < 0.1 and vol_mean > self.avg_l1_vol * 1.5:
-                anomalies.append({
-                    "type": "WASH_TRADING",
-                    "severity": "high",
-                    "message": f"Wash Trading: Repeated similar volumes ({vol_mean:.0f} ± {vol_std:.0f})",
-                    "avg_volume": vol_mean,
-                    "volume_variance": vol_std,
-                    "pattern_count": len(recent_vols)
-                })
+                # Low variance in volumes suggests coordinated trading
+                if vol_std / vol_mean < 0.1 and vol_mean > self.avg_l1_vol * 1.5:
+                    anomalies.append({
+                        "type": "WASH_TRADING",
+                        "severity": "high",
+                        "message": f"Wash Trading: Repeated similar volumes ({vol_mean:.0f} ± {vol_std:.0f})",
+                        "avg_volume": vol_mean,
+                        "volume_variance": vol_std,
+                        "pattern_count": len(recent_vols)
+                    })
         
-        # 5. Iceberg Order Detection
-        # Hidden large orders: repeated fills at same price with consistent volume
-        for i in range(min(3, len(bids))):
-            price_key = f"BID_{bids[i][0]:.2f}"
-            volume = bids[i][1]
+            # 5. Iceberg Order Detection
+            # Hidden large orders: repeated fills at same price with consistent volume
+            for i in range(min(3, len(bids))):
+                price_key = f"BID_{bids[i][0]:.2f}"
+                volume = bids[i][1]
             
-            # Track repeated occurrences at same price level
-            if price_key in self.iceberg_candidates:
-                candidate = self.iceberg_candidates[price_key]
-                candidate['fills'] += 1
-                candidate['volume'] += volume
+                # Track repeated occurrences at same price level
+                if price_key in self.iceberg_candidates:
+                    candidate = self.iceberg_candidates[price_key]
+                    candidate['fills'] += 1
+                    candidate['volume'] += volume
                 
-                # If we see 5+ fills at same price with consistent volume, flag as iceberg
-                if candidate['fills'] >= 5:
-                    avg_fill_size = candidate['volume'] / candidate['fills']
+                    # If we see 5+ fills at same price with consistent volume, flag as iceberg
+                    if candidate['fills'] >= 5:
+                        avg_fill_size = candidate['volume'] / candidate['fills']
                     
-                    # Check if fill sizes are consistent (low variance)
-                    if 0.8 * avg_fill_size <= volume <= 1.2 * avg_fill_size:
-                        self.repeated_fills_history.append({
-                            "price": bids[i][0],
-                            "side": "BID",
-                            "fills": candidate['fills'],
-                            "total_volume": candidate['volume']
-                        })
-                        
-                        if candidate['fills'] >= 8:  # Strong signal
-                            anomalies.append({
-                                "type": "ICEBERG_ORDER",
-                                "severity": "medium",
-                                "message": f"Iceberg Order: {candidate['fills']} fills at {bids[i][0]:.2f} (BID side)",
+                        # Check if fill sizes are consistent (low variance)
+                        if 0.8 * avg_fill_size <= volume <= 1.2 * avg_fill_size:
+                            self.repeated_fills_history.append({
                                 "price": bids[i][0],
                                 "side": "BID",
-                                "fill_count": candidate['fills'],
-                                "total_volume": candidate['volume'],
-                                "avg_fill_size": avg_fill_size
+                                "fills": candidate['fills'],
+                                "total_volume": candidate['volume']
                             })
-                            # Reset after detection
-                            del self.iceberg_candidates[price_key]
-            else:
-                self.iceberg_candidates[price_key] = {
-                    'fills': 1,
-                    'volume': volume,
-                    'first_seen': current_time
-                }
-        
-        # Same for asks
-        for i in range(min(3, len(asks))):
-            price_key = f"ASK_{asks[i][0]:.2f}"
-            volume = asks[i][1]
+                        
+                            if candidate['fills'] >= 8:  # Strong signal
+                                anomalies.append({
+                                    "type": "ICEBERG_ORDER",
+                                    "severity": "medium",
+                                    "message": f"Iceberg Order: {candidate['fills']} fills at {bids[i][0]:.2f} (BID side)",
+                                    "price": bids[i][0],
+                                    "side": "BID",
+                                    "fill_count": candidate['fills'],
+                                    "total_volume": candidate['volume'],
+                                    "avg_fill_size": avg_fill_size
+                                })
+                                # Reset after detection
+                                del self.iceberg_candidates[price_key]
+                else:
+                    self.iceberg_candidates[price_key] = {
+                        'fills': 1,
+                        'volume': volume,
+                        'first_seen': current_time
+                    }
+        
+            # Same for asks
+            for i in range(min(3, len(asks))):
+                price_key = f"ASK_{asks[i][0]:.2f}"
+                volume = asks[i][1]
             
-            if price_key in self.iceberg_candidates:
-                candidate = self.iceberg_candidates[price_key]
-                candidate['fills'] += 1
-                candidate['volume'] += volume
+                if price_key in self.iceberg_candidates:
+                    candidate = self.iceberg_candidates[price_key]
+                    candidate['fills'] += 1
+                    candidate['volume'] += volume
                 
-                if candidate['fills'] >= 5:
-                    avg_fill_size = candidate['volume'] / candidate['fills']
+                    if candidate['fills'] >= 5:
+                        avg_fill_size = candidate['volume'] / candidate['fills']
                     
-                    if 0.8 * avg_fill_size <= volume <= 1.2 * avg_fill_size:
-                        self.repeated_fills_history.append({
-                            "price": asks[i][0],
-                            "side": "ASK",
-                            "fills": candidate['fills'],
-                            "total_volume": candidate['volume']
-                        })
-                        
-                        if candidate['fills'] >= 8:
-                            anomalies.append({
-                                "type": "ICEBERG_ORDER",
-                                "severity": "medium",
-                                "message": f"Iceberg Order: {candidate['fills']} fills at {asks[i][0]:.2f} (ASK side)",
+                        if 0.8 * avg_fill_size <= volume <= 1.2 * avg_fill_size:
+                            self.repeated_fills_history.append({
                                 "price": asks[i][0],
                                 "side": "ASK",
-                                "fill_count": candidate['fills'],
-                                "total_volume": candidate['volume'],
-                                "avg_fill_size": avg_fill_size
+                                "fills": candidate['fills'],
+                                "total_volume": candidate['volume']
                             })
-                            del self.iceberg_candidates[price_key]
-            else:
-                self.iceberg_candidates[price_key] = {
-                    'fills': 1,
-                    'volume': volume,
-                    'first_seen': current_time
-                }
-        
-        # Cleanup old iceberg candidates (older than 5 minutes)
-        five_min_ago = current_time - timedelta(minutes=5)
-        old_keys = [k for k, v in self.iceberg_candidates.items() if v['first_seen'] and v['first_seen'] < five_min_ago]
-        for key in old_keys:
-            del self.iceberg_candidates[key]
+                        
+                            if candidate['fills'] >= 8:
+                                anomalies.append({
+                                    "type": "ICEBERG_ORDER",
+                                    "severity": "medium",
+                                    "message": f"Iceberg Order: {candidate['fills']} fills at {asks[i][0]:.2f} (ASK side)",
+                                    "price": asks[i][0],
+                                    "side": "ASK",
+                                    "fill_count": candidate['fills'],
+                                    "total_volume": candidate['volume'],
+                                    "avg_fill_size": avg_fill_size
+                                })
+                                del self.iceberg_candidates[price_key]
+                else:
+                    self.iceberg_candidates[price_key] = {
+                        'fills': 1,
+                        'volume': volume,
+                        'first_seen': current_time
+                    }
+        
+            # Cleanup old iceberg candidates (older than 5 minutes)
+            five_min_ago = current_time - timedelta(minutes=5)
+            old_keys = [k for k, v in self.iceberg_candidates.items() if v['first_seen'] and v['first_seen'] < five_min_ago]
+            for key in old_keys:
+                del self.iceberg_candidates[key]
+        self.last_stage_ms["detectors"] = (time.time() - stage_start) * 1000
 
         # Update State
         self.prev_bids = bids
@@ -1453,7 +1507,7 @@ class AnalyticsEngine:
         anomalies.extend(trade_anomalies)
         
         # Process alerts through AlertManager
-        current_time = datetime.now()
+        current_time = self._now(snapshot)
         filtered_anomalies = []
         
         for alert in anomalies:
@@ -1466,7 +1520,7 @@ class AnalyticsEngine:
                 filtered_anomalies.append(alert)
         
         # Periodic cleanup of old deduplication entries
-        if (current_time - self.last_cleanup_time).total_seconds() > 60:
+        if self.last_cleanup_time is None or (current_time - self.last_cleanup_time).total_seconds() > 60:
             self.alert_manager.cleanup_old_deduplications(current_time)
             self.last_cleanup_time = current_time
         
@@ -0,0 +1,242 @@
+"""
+Anomaly Index
+Anomalies of the snapshots in the dashboard buffer, indexed as they are
+buffered so the anomaly endpoints no longer rebuild and scan every snapshot
+on each poll.
+
+- One log per anomaly type holds the events in insertion order as parallel
+  arrays (event id, snapshot sequence, timestamp in unix microseconds,
+  severity code) next to the event payloads.
+- The index covers the same window as the snapshot buffer: an event expires
+  once `window` newer snapshots have been added. Expiry pops from the front
+  of each log, so insert cost is amortized O(1).
+- Running counters by type and severity are updated on insert and expiry;
+  summary() is cached until the next change.
+- query() filters by type, severity, time range and an event-id cursor with
+  vectorized masks over the matching type logs only.
+"""
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ring_store import NO_TS, ArrayRing, timestamp_us
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 1000
+_SNAPSHOT_FIELDS = ("timestamp", "mid_price")
+
+
+class _TypeLog:
+    """Events of one anomaly type, oldest first."""
+
+    def __init__(self, capacity: int):
+        self._index = ArrayRing(capacity)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.seqs = np.zeros(capacity, dtype=np.int64)
+        self.ts_us = np.zeros(capacity, dtype=np.int64)
+        self.severities = np.zeros(capacity, dtype=np.int16)
+        self.events = np.empty(capacity, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def append(self, event_id: int, seq: int, ts: int, severity: int, event) -> Optional[int]:
+        """Add an event; returns the severity code of an event evicted to make room."""
+        evicted = None
+        if len(self._index) == self._index.capacity:
+            evicted = int(self.severities[self._index.start])
+        i = self._index.slot()
+        self.ids[i] = event_id
+        self.seqs[i] = seq
+        self.ts_us[i] = ts
+        self.severities[i] = severity
+        self.events[i] = event
+        return evicted
+
+    def expire(self, oldest_seq: int) -> List[int]:
+        """Drop events of snapshots older than `oldest_seq`; returns their severity codes."""
+        dropped = []
+        while len(self._index) and self.seqs[self._index.start] < oldest_seq:
+            i = self._index.start
+            dropped.append(int(self.severities[i]))
+            self.events[i] = None
+            self._index.drop(1)
+        return dropped
+
+    def physical(self) -> np.ndarray:
+        return self._index.physical(np.arange(len(self._index)))
+
+
+class AnomalyIndex:
+    """Per-type anomaly logs with running counters over a snapshot window."""
+
+    def __init__(self, window: int = 1000, per_type_capacity: Optional[int] = None):
+        self.window = window
+        self.per_type_capacity = per_type_capacity or window * 2
+        self.logs: Dict[str, _TypeLog] = {}
+        self.severity_codes: Dict[str, int] = {}
+        self.severity_names: List[str] = []
+        self.type_counts: Dict[str, int] = {}
+        self.severity_counts: Dict[str, int] = {}
+        self.snapshots = 0  # Sequence number of the next snapshot
+        self.next_id = 0
+        self.version = 0
+        self._summary: Optional[Dict[str, Any]] = None
+        self._summary_version = -1
+
+    def __len__(self) -> int:
+        return sum(self.type_counts.values())
+
+    def _severity_code(self, severity: Any) -> int:
+        name = str(severity or "").lower()
+        code = self.severity_codes.get(name)
+        if code is None:
+            code = self.severity_codes[name] = len(self.severity_names)
+            self.severity_names.append(name)
+        return code
+
+    def _count(self, anomaly_type: str, severity: int, delta: int):
+        name = self.severity_names[severity]
+        self.type_counts[anomaly_type] = self.type_counts.get(anomaly_type, 0) + delta
+        self.severity_counts[name] = self.severity_counts.get(name, 0) + delta
+
+    def add(self, snapshot: Dict[str, Any]):
+        """Index the anomalies of one buffered snapshot and expire those that left the window."""
+        seq = self.snapshots
+        self.snapshots += 1
+        changed = self._expire(self.snapshots - self.window)
+
+        anomalies = snapshot.get("anomalies")
+        if anomalies:
+            ts = timestamp_us(snapshot.get("timestamp"))
+            context = {key: snapshot.get(key) for key in _SNAPSHOT_FIELDS}
+            for anomaly in anomalies:
+                if not isinstance(anomaly, dict):
+                    continue
+                anomaly_type = str(anomaly.get("type") or "UNKNOWN")
+                log = self.logs.get(anomaly_type)
+                if log is None:
+                    log = self.logs[anomaly_type] = _TypeLog(self.per_type_capacity)
+                severity = self._severity_code(anomaly.get("severity"))
+                evicted = log.append(self.next_id, seq, ts, severity, (context, anomaly))
+                self.next_id += 1
+                self._count(anomaly_type, severity, 1)
+                if evicted is not None:
+                    self._count(anomaly_type, evicted, -1)
+                changed = True
+        if changed:
+            self.version += 1
+
+    def _expire(self, oldest_seq: int) -> bool:
+        if oldest_seq <= 0:
+            return False
+        changed = False
+        for anomaly_type, log in self.logs.items():
+            for severity in log.expire(oldest_seq):
+                self._count(anomaly_type, severity, -1)
+                changed = True
+        return changed
+
+    def clear(self):
+        self.logs.clear()
+        self.type_counts.clear()
+        self.severity_counts.clear()
+        self.version += 1
+
+    # ---- Reads ----
+
+    def _select(
+        self,
+        types: Optional[Iterable[str]] = None,
+        severities: Optional[Iterable[str]] = None,
+        start_us: Optional[int] = None,
+        end_us: Optional[int] = None,
+        before_id: Optional[int] = None,
+        last_snapshots: Optional[int] = None
+    ) -> Tuple[np.ndarray, List[Tuple[Any, ...]]]:
+        """Event ids and (context, anomaly) payloads matching the filters, unordered across types."""
+        logs = self.logs if types is None else {t: self.logs[t] for t in types if t in self.logs}
+        codes = None
+        if severities is not None:
+            codes = [self.severity_codes[s.lower()] for s in severities if s.lower() in self.severity_codes]
+
+        ids, events = [], []
+        for log in logs.values():
+            if not len(log):
+                continue
+            rows = log.physical()
+            keep = np.ones(len(rows), dtype=bool)
+            if codes is not None:
+                keep &= np.isin(log.severities[rows], codes)
+            if start_us is not None or end_us is not None:
+                ts = log.ts_us[rows]
+                keep &= ts != NO_TS
+                if start_us is not None:
+                    keep &= ts >= start_us
+                if end_us is not None:
+                    keep &= ts < end_us
+            if before_id is not None:
+                keep &= log.ids[rows] < before_id
+            if last_snapshots is not None:
+                keep &= log.seqs[rows] >= self.snapshots - last_snapshots
+            rows = rows[keep]
+            ids.append(log.ids[rows])
+            events.extend(log.events[rows])
+        if not ids:
+            return np.zeros(0, dtype=np.int64), []
+        return np.concatenate(ids), events
+
+    def iter_events(self, types: Optional[Iterable[str]] = None,
+                    last_snapshots: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(snapshot context, anomaly) pairs oldest first; the context has timestamp and mid_price."""
+        ids, events = self._select(types, last_snapshots=last_snapshots)
+        for i in np.argsort(ids, kind="stable"):
+            yield events[i]
+
+    def query(
+        self,
+        types: Optional[Iterable[str]] = None,
+        severities: Optional[Iterable[str]] = None,
+        start: Any = None,
+        end: Any = None,
+        cursor: Optional[int] = None,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """One page of events newest first, with the cursor of the next page (None on the last)."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        ids, events = self._select(
+            types, severities,
+            start_us=timestamp_us(start) if start is not None else None,
+            end_us=timestamp_us(end) if end is not None else None,
+            before_id=cursor
+        )
+        order = np.argsort(-ids, kind="stable")[:limit]
+        page = []
+        for i in order:
+            context, anomaly = events[i]
+            page.append({"id": int(ids[i]), **context, **anomaly})
+        next_cursor = page[-1]["id"] if len(order) == limit and len(ids) > limit else None
+        return {"count": len(page), "anomalies": page, "next_cursor": next_cursor}
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts of the indexed events by type and severity, cached until the index changes."""
+        if self._summary_version != self.version:
+            self._summary = {
+                "total": len(self),
+                "by_type": {t: n for t, n in self.type_counts.items() if n},
+                "by_severity": {s: n for s, n in self.severity_counts.items() if n},
+                "snapshots_indexed": min(self.snapshots, self.window)
+            }
+            self._summary_version = self.version
+        return self._summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "types": len(self.logs),
+            "events": len(self),
+            "events_indexed": self.next_id,
+            "version": self.version
+        }
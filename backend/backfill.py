@@ -0,0 +1,320 @@
+"""
+Historical Analytics Backfill
+Recomputes analytics and anomalies for an l2_orderbook time range in
+parallel worker processes, instead of replaying it in real time.
+
+The range is split into chunks. Each worker processes its chunk with a
+fresh AnalyticsEngine on the data clock (rates, alert dedup and K-Means
+retraining follow snapshot timestamps), starting `warmup_seconds` early and
+discarding the warm-up output so rolling windows, EWMA baselines and VPIN
+buckets have settled by the chunk's first row. With a warm-up longer than
+the longest window (1000 rows) the features match one sequential run;
+regime labels agree once K-Means has retrained inside the chunk.
+
+Sinks:
+- npz: `chunk_NNNNN.npz` per chunk (ts_us plus one array per feature
+       column) and `chunk_NNNNN.anomalies.jsonl`.
+- db:  analytics_features / analytics_anomalies rows with source
+       "backfill"; each chunk replaces its own time range, so re-running a
+       chunk is idempotent.
+
+Progress is recorded in `progress.json` in the output directory after every
+chunk; rerunning the same plan skips finished chunks.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from analytics_core import AnalyticsEngine
+from feature_store import (
+    ANOMALIES_TABLE, ANOMALY_COLUMNS, FEATURE_COLUMNS, FEATURES_TABLE,
+    anomaly_records, ensure_schema, feature_record
+)
+from replay_blocks import (
+    OrderBookBlock, datetime_to_unix_us, fetch_orderbook_range, ts_is_timezone_aware, unix_us_to_datetime
+)
+from replay_source import open_replay_source
+from snapshot_processor import SnapshotProcessor
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_NAME = "progress.json"
+BACKFILL_SOURCE = "backfill"  # `source` column value for the db sink
+SINKS = ("npz", "db")
+_TEXT_COLUMNS = {"source", "symbol", "regime_label", "engine"}
+
+
+class BackfillChunk(NamedTuple):
+    """One unit of work: output rows in [start_us, end_us), processing from warmup_us."""
+    index: int
+    start_us: int
+    end_us: int
+    warmup_us: int
+
+
+def plan_chunks(start_us: int, end_us: int, chunk_seconds: float, warmup_seconds: float) -> List[BackfillChunk]:
+    """Split [start_us, end_us) into chunks, each with its warm-up window."""
+    if chunk_seconds <= 0 or warmup_seconds < 0:
+        raise ValueError(f"Need chunk_seconds > 0 and warmup_seconds >= 0, got {chunk_seconds}, {warmup_seconds}")
+    chunk_us = int(chunk_seconds * 1e6)
+    warmup_us = int(warmup_seconds * 1e6)
+    return [
+        BackfillChunk(i, s, min(s + chunk_us, end_us), s - warmup_us)
+        for i, s in enumerate(range(start_us, end_us, chunk_us))
+    ]
+
+
+# --------------------------------------------------
+# Reading
+# --------------------------------------------------
+def _is_postgres(spec: str) -> bool:
+    return spec in ("", "postgres", "db")
+
+
+async def _postgres_connect():
+    import asyncpg
+    from db import _get_db_config
+    return await asyncpg.connect(**_get_db_config())
+
+
+async def _read_postgres(start_us: int, end_us: int) -> OrderBookBlock:
+    conn = await _postgres_connect()
+    try:
+        tz_aware = await ts_is_timezone_aware(conn)
+        return await fetch_orderbook_range(
+            conn, unix_us_to_datetime(start_us, tz_aware), unix_us_to_datetime(end_us, tz_aware)
+        )
+    finally:
+        await conn.close()
+
+
+def read_range(spec: str, start_us: int, end_us: int) -> OrderBookBlock:
+    """Order book rows with start_us <= ts < end_us from the postgres table or a file source."""
+    if _is_postgres(spec):
+        return asyncio.run(_read_postgres(start_us, end_us))
+    return open_replay_source(spec).read_range(start_us, end_us)
+
+
+async def _postgres_bounds() -> Optional[Tuple[int, int]]:
+    conn = await _postgres_connect()
+    try:
+        row = await conn.fetchrow("SELECT min(ts) AS first, max(ts) AS last FROM l2_orderbook")
+    finally:
+        await conn.close()
+    if row["first"] is None:
+        return None
+    return datetime_to_unix_us(row["first"]), datetime_to_unix_us(row["last"])
+
+
+def data_bounds(spec: str) -> Optional[Tuple[int, int]]:
+    """(first, last) timestamps in the source, or None when it is empty."""
+    if _is_postgres(spec):
+        return asyncio.run(_postgres_bounds())
+    return open_replay_source(spec).bounds_us()
+
+
+# --------------------------------------------------
+# Worker
+# --------------------------------------------------
+def process_block(block: OrderBookBlock, output_from_us: int) -> Tuple[List[tuple], List[tuple]]:
+    """Run analytics over `block` in order; feature and anomaly records for rows at or after output_from_us."""
+    engine = AnalyticsEngine()
+    engine.data_clock = True
+    processor = SnapshotProcessor(analytics_engine=engine)
+    features, anomalies = [], []
+    for i in range(len(block)):
+        processed, _, _, _ = processor.process(block.snapshot(i), 0)
+        if block.ts_us[i] < output_from_us:
+            continue  # Warm-up row
+        features.append(feature_record(BACKFILL_SOURCE, processed))
+        anomalies.extend(anomaly_records(BACKFILL_SOURCE, processed))
+    return features, anomalies
+
+
+def run_chunk(spec: str, chunk: BackfillChunk, out_dir: str, sink: str) -> Dict[str, Any]:
+    """Process one chunk and write its output (runs in a worker process)."""
+    start = time.time()
+    block = read_range(spec, chunk.warmup_us, chunk.end_us)
+    features, anomalies = process_block(block, chunk.start_us)
+
+    if sink == "db":
+        asyncio.run(_write_db(chunk, features, anomalies))
+    else:
+        write_npz(out_dir, chunk.index, features, anomalies)
+
+    return {
+        "index": chunk.index,
+        "rows": len(features),
+        "warmup_rows": len(block) - len(features),
+        "anomalies": len(anomalies),
+        "seconds": round(time.time() - start, 3)
+    }
+
+
+def chunk_path(out_dir: str, index: int, suffix: str) -> str:
+    return os.path.join(out_dir, f"chunk_{index:05d}{suffix}")
+
+
+def write_npz(out_dir: str, index: int, features: List[tuple], anomalies: List[tuple]):
+    """Write a chunk's features as columns and its anomalies as JSON lines (atomically)."""
+    columns = list(zip(*features)) if features else [()] * len(FEATURE_COLUMNS)
+    arrays = {}
+    for name, values in zip(FEATURE_COLUMNS, columns):
+        if name == "ts":
+            arrays["ts_us"] = np.array([datetime_to_unix_us(ts) for ts in values], dtype=np.int64)
+        elif name in _TEXT_COLUMNS:
+            arrays[name] = np.array(["" if v is None else v for v in values], dtype=str)
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    path = chunk_path(out_dir, index, ".npz")
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+    path = chunk_path(out_dir, index, ".anomalies.jsonl")
+    with open(path + ".tmp", "w") as f:
+        for record in anomalies:
+            row = dict(zip(ANOMALY_COLUMNS, record))
+            row["ts"] = row["ts"].isoformat()
+            row["details"] = json.loads(row["details"]) if row["details"] else None
+            f.write(json.dumps(row) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+async def _write_db(chunk: BackfillChunk, features: List[tuple], anomalies: List[tuple]):
+    start_ts = unix_us_to_datetime(chunk.start_us, tz_aware=True)
+    end_ts = unix_us_to_datetime(chunk.end_us, tz_aware=True)
+    conn = await _postgres_connect()
+    try:
+        async with conn.transaction():
+            for table in (FEATURES_TABLE, ANOMALIES_TABLE):
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE source = $1 AND ts >= $2 AND ts < $3",
+                    BACKFILL_SOURCE, start_ts, end_ts
+                )
+            await conn.copy_records_to_table(FEATURES_TABLE, records=features, columns=list(FEATURE_COLUMNS))
+            if anomalies:
+                await conn.copy_records_to_table(ANOMALIES_TABLE, records=anomalies, columns=list(ANOMALY_COLUMNS))
+    finally:
+        await conn.close()
+
+
+# --------------------------------------------------
+# Progress
+# --------------------------------------------------
+def load_progress(out_dir: str, plan: Dict[str, Any], restart: bool = False) -> Dict[str, Any]:
+    """Finished chunks for this plan; a different plan in the same directory is an error unless restarting."""
+    path = os.path.join(out_dir, PROGRESS_NAME)
+    if not restart and os.path.exists(path):
+        with open(path) as f:
+            progress = json.load(f)
+        if progress["plan"] != plan:
+            raise ValueError(f"{out_dir} holds a different backfill ({progress['plan']}); use restart or another directory")
+        return progress
+    return {"plan": plan, "done": {}}
+
+
+def save_progress(out_dir: str, progress: Dict[str, Any]):
+    path = os.path.join(out_dir, PROGRESS_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# --------------------------------------------------
+# Driver
+# --------------------------------------------------
+def run_backfill(
+    spec: str,
+    out_dir: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    workers: Optional[int] = None,
+    chunk_seconds: float = 3600,
+    warmup_seconds: float = 300,
+    sink: str = "npz",
+    restart: bool = False,
+    on_chunk: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Backfill [start, end) from `spec` ("postgres", a CSV or a .npy segment
+    directory) using `workers` processes (1 runs inline). Missing bounds
+    default to the data's first/last row. Returns a run summary.
+    """
+    if sink not in SINKS:
+        raise ValueError(f"sink must be one of {SINKS}, got {sink}")
+    bounds = data_bounds(spec) if start is None or end is None else None
+    if (start is None or end is None) and bounds is None:
+        raise ValueError(f"No data in {spec}")
+    start_us = datetime_to_unix_us(start) if start is not None else bounds[0]
+    end_us = datetime_to_unix_us(end) if end is not None else bounds[1] + 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    plan = {
+        "source": spec, "start_us": start_us, "end_us": end_us,
+        "chunk_seconds": chunk_seconds, "warmup_seconds": warmup_seconds, "sink": sink
+    }
+    progress = load_progress(out_dir, plan, restart)
+    chunks = plan_chunks(start_us, end_us, chunk_seconds, warmup_seconds)
+    pending = [c for c in chunks if str(c.index) not in progress["done"]]
+    save_progress(out_dir, progress)
+
+    if sink == "db":
+        async def create_tables():
+            conn = await _postgres_connect()
+            try:
+                await ensure_schema(conn)
+            finally:
+                await conn.close()
+        asyncio.run(create_tables())
+
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    logger.info(f"Backfill: {len(pending)}/{len(chunks)} chunks to process with {workers} workers")
+    started = time.time()
+    rows = 0
+
+    def finished(stats):
+        nonlocal rows
+        rows += stats["rows"]
+        progress["done"][str(stats["index"])] = stats
+        save_progress(out_dir, progress)
+        if on_chunk:
+            on_chunk(stats, progress)
+
+    if workers <= 1:
+        for chunk in pending:
+            finished(run_chunk(spec, chunk, out_dir, sink))
+    else:
+        # Spawn: fork is unsafe with the torch/gRPC threads of the importing process
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) as pool:
+            futures = [pool.submit(run_chunk, spec, chunk, out_dir, sink) for chunk in pending]
+            for future in as_completed(futures):
+                finished(future.result())
+
+    elapsed = time.time() - started
+    return {
+        "chunks": len(chunks),
+        "processed": len(pending),
+        "skipped": len(chunks) - len(pending),
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+def read_npz_features(out_dir: str) -> Dict[str, np.ndarray]:
+    """Concatenate the npz sink's chunk files into one set of columns, in time order."""
+    names = sorted(n for n in os.listdir(out_dir) if n.startswith("chunk_") and n.endswith(".npz"))
+    parts = [np.load(os.path.join(out_dir, n)) for n in names]
+    if not parts:
+        return {}
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0].files}
@@ -0,0 +1,157 @@
+"""
+Batched COPY Writer
+Buffers records in memory and writes them to PostgreSQL in batches with
+COPY from a background task, so producers on the hot path never wait on
+the database.
+
+- submit() is synchronous and never blocks; when the buffer is full the
+  oldest records are dropped and counted.
+- A batch is written when `batch_size` records are waiting or after
+  `flush_interval` seconds, whichever comes first.
+- Failed batches go back to the front of the buffer and are retried with
+  backoff, still bounded by `max_buffered`.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from db import get_connection, return_connection
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedCopyWriter:
+    """Background COPY writer for one table."""
+
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_buffered: int = 50000,
+        max_retry_delay: float = 30.0,
+        acquire: Callable[[], Awaitable[Any]] = get_connection,
+        release: Callable[[Any], Awaitable[None]] = return_connection
+    ):
+        if batch_size < 1 or max_buffered < batch_size:
+            raise ValueError(f"Need 1 <= batch_size <= max_buffered, got {batch_size}, {max_buffered}")
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.max_retry_delay = max_retry_delay
+        self._acquire = acquire
+        self._release = release
+        self._buffer: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Statistics
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.write_times = deque(maxlen=100)
+
+    def submit(self, record: Sequence[Any]):
+        """Queue one record (a tuple in `columns` order) without waiting."""
+        if len(self._buffer) >= self.max_buffered:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(tuple(record))
+        self.submitted += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush what is buffered (within `timeout`) and stop the background task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.table}: stopped with {len(self._buffer)} records unwritten")
+        finally:
+            self._task = None
+
+    async def _run(self):
+        retry_delay = self.flush_interval
+        while True:
+            if not self._stopping and len(self._buffer) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            if not self._buffer:
+                if self._stopping:
+                    return
+                continue
+
+            if await self.flush():
+                retry_delay = self.flush_interval
+            else:
+                if self._stopping:
+                    return
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+
+    async def flush(self) -> bool:
+        """Write buffered records batch by batch; False if a write failed."""
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            start = time.time()
+            try:
+                conn = await self._acquire()
+                try:
+                    await conn.copy_records_to_table(self.table, records=batch, columns=self.columns)
+                finally:
+                    await self._release(conn)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                logger.error(f"{self.table}: batch write failed ({len(batch)} records): {e}")
+                # Put the batch back in front, keeping the buffer bound
+                room = self.max_buffered - len(self._buffer)
+                if room < len(batch):
+                    self.dropped += len(batch) - room
+                    batch = batch[len(batch) - room:] if room > 0 else []
+                self._buffer.extendleft(reversed(batch))
+                return False
+
+            self.write_times.append((time.time() - start) * 1000)
+            self.written += len(batch)
+            self.batches += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer throughput and buffering statistics."""
+        avg_write = sum(self.write_times) / len(self.write_times) if self.write_times else 0
+        return {
+            "table": self.table,
+            "running": self._task is not None,
+            "buffered": len(self._buffer),
+            "max_buffered": self.max_buffered,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "avg_batch_write_ms": round(avg_write, 2)
+        }
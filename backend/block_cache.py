@@ -0,0 +1,91 @@
+"""
+Replay Block Cache
+In-process LRU cache of decoded order book blocks keyed by (table, time
+bucket) with a byte budget, so popular replay windows are read from
+Postgres once and then served from memory to every session.
+"""
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BlockCache:
+    """LRU cache bounded by total value size in bytes."""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        if max_bytes < 1:
+            raise ValueError(f"max_bytes must be >= 1, got {max_bytes}")
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, nbytes)
+        self.bytes_used = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value (marking it most recently used), or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        """Insert a value, evicting least recently used entries to fit the budget."""
+        if nbytes > self.max_bytes:
+            self.rejected += 1  # Larger than the whole budget; never cache
+            return
+        if key in self._entries:
+            self.bytes_used -= self._entries.pop(key)[1]
+
+        while self._entries and self.bytes_used + nbytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.bytes_used -= evicted_bytes
+            self.evictions += 1
+
+        self._entries[key] = (value, nbytes)
+        self.bytes_used += nbytes
+
+    def invalidate(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry[1]
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is true; returns how many."""
+        stale = [key for key, (value, _) in self._entries.items() if predicate(key, value)]
+        for key in stale:
+            self.invalidate(key)
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes_used = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache occupancy and hit-rate statistics."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "utilization_percent": round(100 * self.bytes_used / self.max_bytes, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "rejected": self.rejected
+        }
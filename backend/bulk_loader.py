@@ -0,0 +1,224 @@
+"""
+L2 Order Book Bulk Loader
+Streams an order book CSV into l2_orderbook with binary COPY over several
+parallel connections.
+
+- The CSV is parsed in chunks and converted vectorially (csv_chunk_to_block);
+  each chunk is encoded once as a binary COPY stream.
+- With `dedupe`, a chunk is copied into a temporary staging table and
+  inserted with INSERT ... SELECT, skipping timestamps already in the table
+  and duplicates within the chunk. Without it, chunks are copied straight
+  into the table (fastest, for empty tables).
+- With `notify_channel`, each chunk also sends pg_notify with its time range
+  in the same transaction, waking tailing replay sessions (replay_tail) on
+  commit.
+- Each chunk commits on its own. Finished chunk numbers are checkpointed to a
+  JSON file. A rerun skips the finished prefix of the CSV without parsing it,
+  and skips any other finished chunks before they are written.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from replay_blocks import LEVEL_COLUMNS, OrderBookBlock, encode_binary_copy
+from replay_source import read_csv_blocks
+from replay_tail import notify_inserted
+
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = ["ts"] + LEVEL_COLUMNS
+
+
+def dedupe_block(block: OrderBookBlock, previous_ts_us: Optional[np.ndarray] = None) -> OrderBookBlock:
+    """Drop rows repeating an earlier timestamp in the block or in the previous chunk (first row wins)."""
+    _, first = np.unique(block.ts_us, return_index=True)
+    keep = np.zeros(len(block), dtype=bool)
+    keep[first] = True
+    if previous_ts_us is not None and len(previous_ts_us):
+        keep &= ~np.isin(block.ts_us, previous_ts_us)
+    if keep.all():
+        return block
+    return OrderBookBlock(block.ts_us[keep], block.bids[keep], block.asks[keep], block.tz_aware)
+
+
+def insert_from_stage_sql(table: str, stage: str) -> str:
+    columns = ", ".join(COPY_COLUMNS)
+    return (
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} s "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.ts = s.ts)"
+    )
+
+
+def _inserted_count(status: str) -> int:
+    """Row count from an 'INSERT 0 n' command status."""
+    try:
+        return int(status.split()[-1])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+class LoadCheckpoint:
+    """Finished chunk numbers for one (CSV, chunk size, table) load, persisted as JSON."""
+
+    def __init__(self, path: str, source: Dict[str, Any]):
+        self.path = path
+        self.source = source
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("source") == source:
+                self.done = set(saved["done"])
+            else:
+                logger.warning(f"Ignoring checkpoint {path}: written for a different file or chunk size")
+
+    def prefix(self) -> int:
+        """Number of leading chunks that are all finished."""
+        n = 0
+        while n in self.done:
+            n += 1
+        return n
+
+    def mark(self, index: int):
+        self.done.add(index)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"source": self.source, "done": sorted(self.done)}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class BulkLoader:
+    """Parallel COPY loader for order book CSV files."""
+
+    def __init__(
+        self,
+        connect: Callable,
+        table: str = "l2_orderbook",
+        workers: int = 4,
+        chunksize: int = 100_000,
+        dedupe: bool = True,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        notify_channel: Optional[str] = None
+    ):
+        if workers < 1 or chunksize < 1:
+            raise ValueError(f"Need workers >= 1 and chunksize >= 1, got {workers}, {chunksize}")
+        self.connect = connect
+        self.table = table
+        self.workers = workers
+        self.chunksize = chunksize
+        self.dedupe = dedupe
+        self.on_progress = on_progress
+        self.notify_channel = notify_channel
+
+        # Statistics
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_skipped = 0  # Duplicates and rows already in the table
+        self.chunks_written = 0
+        self.chunks_skipped = 0
+        self.started_at = None
+
+    async def load_csv(self, path: str, checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """Load `path`; resumes from `checkpoint_path` (default: next to the CSV) if it matches."""
+        stat = os.stat(path)
+        checkpoint = LoadCheckpoint(
+            checkpoint_path or f"{path}.load_progress.json",
+            {"path": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime),
+             "chunksize": self.chunksize, "table": self.table}
+        )
+        first_chunk = checkpoint.prefix()
+        self.chunks_skipped = first_chunk
+        self.started_at = time.time()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.workers)
+
+        async def produce():
+            await self._read(path, first_chunk, checkpoint, queue)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(self._writer(queue, checkpoint)) for _ in range(self.workers)]
+        try:
+            # A failed writer fails the load at once; finished chunks stay checkpointed
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self.get_stats()
+
+    async def _read(self, path: str, first_chunk: int, checkpoint: LoadCheckpoint, queue: asyncio.Queue):
+        """Parse chunks in a thread and queue them; bounded so parsing cannot run far ahead of COPY."""
+        blocks = read_csv_blocks(path, self.chunksize, skip_rows=first_chunk * self.chunksize)
+        index = first_chunk
+        previous_ts = None
+        while True:
+            block = await asyncio.to_thread(next, blocks, None)
+            if block is None:
+                return
+            self.rows_read += len(block)
+            if self.dedupe:
+                deduped = dedupe_block(block, previous_ts)
+                previous_ts = block.ts_us
+                self.rows_skipped += len(block) - len(deduped)
+                block = deduped
+            if index in checkpoint.done:
+                self.chunks_skipped += 1
+            else:
+                await queue.put((index, block))
+            index += 1
+
+    async def _writer(self, queue: asyncio.Queue, checkpoint: LoadCheckpoint):
+        conn = await self.connect()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, block = item
+                written = await self.write_block(conn, block)
+                self.rows_written += written
+                self.rows_skipped += len(block) - written
+                self.chunks_written += 1
+                checkpoint.mark(index)
+                if self.on_progress:
+                    self.on_progress(self.get_stats())
+        finally:
+            await conn.close()
+
+    async def write_block(self, conn, block: OrderBookBlock) -> int:
+        """COPY one chunk in its own transaction; returns rows inserted."""
+        if not len(block):
+            return 0
+        payload = encode_binary_copy(block)
+        async with conn.transaction():
+            if not self.dedupe:
+                await conn.copy_to_table(self.table, source=payload, columns=COPY_COLUMNS, format="binary")
+                inserted = len(block)
+            else:
+                stage = f"{self.table.split('.')[-1]}_stage"  # Temp tables cannot be schema-qualified
+                await conn.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {self.table}) ON COMMIT DELETE ROWS"
+                )
+                await conn.copy_to_table(stage, source=payload, columns=COPY_COLUMNS, format="binary")
+                inserted = _inserted_count(await conn.execute(insert_from_stage_sql(self.table, stage)))
+            if inserted and self.notify_channel:
+                await notify_inserted(conn, block, self.notify_channel)
+            return inserted
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        return {
+            "rows_read": self.rows_read,
+            "rows_written": self.rows_written,
+            "rows_skipped": self.rows_skipped,
+            "chunks_written": self.chunks_written,
+            "chunks_skipped": self.chunks_skipped,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(self.rows_read / elapsed, 1) if elapsed > 0 else None
+        }
@@ -0,0 +1,128 @@
+"""
+Continuous Aggregates for Downsampled Replay and Charting
+Per-second and per-minute TimescaleDB continuous aggregates over
+l2_orderbook.
+
+Each bucket row holds:
+- L1 mid OHLC, average spread, average bid/ask depth (10 levels) and depth
+  imbalance, and the raw row count, for charts;
+- the closing 10-level book (`last(col, ts)` under the l2_orderbook column
+  names) with the bucket start as `ts`, so the replay readers and
+  ReplayReaderService read an aggregate exactly like the raw table.
+
+The aggregates are real-time (materialized_only = false), so the newest,
+not yet materialized buckets are still answered from raw rows.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from replay_blocks import DEPTH, LEVEL_COLUMNS, ts_is_timezone_aware
+
+logger = logging.getLogger(__name__)
+
+
+class Resolution(NamedTuple):
+    view: str
+    bucket: str                  # time_bucket width
+    cache_bucket_seconds: int    # Replay block cache bucket for this view
+    refresh_start: str           # Refresh policy window (start_offset, end_offset, schedule)
+    refresh_end: str
+    refresh_every: str
+
+
+RAW = "raw"
+RESOLUTIONS: Dict[str, Resolution] = {
+    "1s": Resolution("l2_orderbook_1s", "1 second", 3600, "2 hours", "10 seconds", "1 minute"),
+    "1m": Resolution("l2_orderbook_1m", "1 minute", 86400, "2 days", "1 minute", "10 minutes"),
+}
+
+BAR_COLUMNS = ("ts", "open", "high", "low", "close", "avg_spread", "avg_bid_depth", "avg_ask_depth",
+               "avg_imbalance", "row_count")
+
+_MID = "(bid_price_1 + ask_price_1) / 2"
+_BID_DEPTH = " + ".join(f"bid_volume_{i}" for i in range(1, DEPTH + 1))
+_ASK_DEPTH = " + ".join(f"ask_volume_{i}" for i in range(1, DEPTH + 1))
+
+
+def aggregate_view_sql(resolution: Resolution, table: str = "l2_orderbook") -> str:
+    bucket = f"time_bucket(INTERVAL '{resolution.bucket}', ts)"
+    closing_book = ",\n    ".join(f"last({c}, ts) AS {c}" for c in LEVEL_COLUMNS)
+    return f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {resolution.view}
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    {bucket} AS ts,
+    first({_MID}, ts) AS open,
+    max({_MID}) AS high,
+    min({_MID}) AS low,
+    last({_MID}, ts) AS close,
+    avg(ask_price_1 - bid_price_1) AS avg_spread,
+    avg({_BID_DEPTH}) AS avg_bid_depth,
+    avg({_ASK_DEPTH}) AS avg_ask_depth,
+    avg((({_BID_DEPTH}) - ({_ASK_DEPTH})) / NULLIF(({_BID_DEPTH}) + ({_ASK_DEPTH}), 0)) AS avg_imbalance,
+    count(*) AS row_count,
+    {closing_book}
+FROM {table}
+GROUP BY {bucket}
+WITH NO DATA
+"""
+
+
+async def ensure_aggregates(conn, names=None, refresh: bool = False, table: str = "l2_orderbook") -> List[str]:
+    """Create the aggregates and their refresh policies; `refresh` materializes all existing data."""
+    created = []
+    for name in names or RESOLUTIONS:
+        resolution = RESOLUTIONS[name]
+        await conn.execute(aggregate_view_sql(resolution, table))
+        await conn.execute(
+            f"SELECT add_continuous_aggregate_policy('{resolution.view}', "
+            f"start_offset => INTERVAL '{resolution.refresh_start}', end_offset => INTERVAL '{resolution.refresh_end}', "
+            f"schedule_interval => INTERVAL '{resolution.refresh_every}', if_not_exists => TRUE)"
+        )
+        if refresh:
+            # Policies only cover their recent window; backfilled history needs one full refresh
+            await conn.execute(f"CALL refresh_continuous_aggregate('{resolution.view}', NULL, NULL)")
+        created.append(resolution.view)
+        logger.info(f"Continuous aggregate {resolution.view} ready")
+    return created
+
+
+def resolve(name: str) -> Resolution:
+    """The aggregate for a resolution name; ValueError lists the valid ones."""
+    if name not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{name}'; use one of {[RAW] + list(RESOLUTIONS)}")
+    return RESOLUTIONS[name]
+
+
+def _match_timezone(ts: datetime, tz_aware: bool) -> datetime:
+    if tz_aware and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    if not tz_aware and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+async def fetch_bars(conn, name: str, start: datetime, end: datetime, limit: int) -> List[Dict[str, Any]]:
+    """Up to `limit` bars with start <= ts < end from the `name` aggregate."""
+    view = resolve(name).view
+    tz_aware = await ts_is_timezone_aware(conn, view)
+    rows = await conn.fetch(
+        f"SELECT {', '.join(BAR_COLUMNS)} FROM {view} WHERE ts >= $1 AND ts < $2 ORDER BY ts LIMIT $3",
+        _match_timezone(start, tz_aware), _match_timezone(end, tz_aware), limit
+    )
+    return [bar_to_dict(row) for row in rows]
+
+
+def bar_to_dict(row) -> Dict[str, Any]:
+    bar: Dict[str, Optional[Any]] = {}
+    for column in BAR_COLUMNS:
+        value = row[column]
+        if column == "ts":
+            value = value.isoformat()
+        elif column == "row_count":
+            value = int(value)
+        elif value is not None:
+            value = float(value)
+        bar[column] = value
+    return bar
@@ -0,0 +1,330 @@
+"""
+Typed Data Export (Arrow IPC / Parquet)
+Exports raw order books, processed features, anomalies and strategy trades
+for a time range (features and anomalies optionally for one session) as
+Arrow or Parquet, instead of scraping /features or trade CSVs.
+
+- Rows are read in chunks of `chunk_rows` with keyset pagination on ts, so
+  memory stays bounded by one chunk. Chunks never split a timestamp, so
+  the last ts of any complete chunk is a valid resume cursor: an export
+  restarted with cursor=<last ts in unix us> continues right after it.
+- Every dataset has a fixed schema (DATASET_SCHEMAS): timestamps are
+  timestamp[us, UTC] and books are flattened to the l2_orderbook level
+  columns, so notebooks get typed columns and can memory-map Arrow files.
+- ExportEncoder turns chunks into bytes for streaming (Arrow IPC stream or
+  Parquet row groups). export_to_directory writes one file per chunk under
+  <out>/<dataset>/ and records the cursor in _progress.json, so a rerun with
+  the same arguments resumes after the last finished part.
+"""
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from feature_store import ANOMALIES_TABLE, ANOMALY_COLUMNS, FEATURE_COLUMNS, FEATURES_TABLE, to_utc
+from replay_blocks import (LEVEL_COLUMNS, OrderBookBlock, datetime_to_unix_us, fetch_orderbook_block,
+                           fetch_orderbook_range, ts_is_timezone_aware, unix_us_to_datetime)
+
+logger = logging.getLogger(__name__)
+
+BOOKS, FEATURES, ANOMALIES, TRADES = "books", "features", "anomalies", "trades"
+DATASETS = (BOOKS, FEATURES, ANOMALIES, TRADES)
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+MEDIA_TYPES = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet"}
+DEFAULT_CHUNK_ROWS = 50000
+PROGRESS_NAME = "_progress.json"  # Leading underscore: skipped by pyarrow.dataset
+
+_FEATURE_TYPES = {"source": "string", "symbol": "string", "regime": "int16", "regime_label": "string",
+                  "gap_count": "int32", "engine": "string"}
+TRADE_COLUMNS = ("ts", "id", "side", "price", "size", "type", "confidence", "pnl")
+
+# Column -> Arrow type name; "ts" is always timestamp[us, UTC]
+DATASET_SCHEMAS: Dict[str, Dict[str, str]] = {
+    BOOKS: {"ts": "timestamp", **{c: "float64" for c in LEVEL_COLUMNS}},
+    FEATURES: {c: "timestamp" if c == "ts" else _FEATURE_TYPES.get(c, "float64") for c in FEATURE_COLUMNS},
+    ANOMALIES: {c: "timestamp" if c == "ts" else "string" for c in ANOMALY_COLUMNS},
+    TRADES: {"ts": "timestamp", "id": "int64", "side": "string", "price": "float64", "size": "float64",
+             "type": "string", "confidence": "float64", "pnl": "float64"},
+}
+
+
+def validate(dataset: str, format: str):
+    """ValueError for an unknown dataset or format."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}'; use one of {list(DATASETS)}")
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}'; use one of {list(FORMATS)}")
+
+
+# ---- Reading chunks ----
+
+def book_columns(block: OrderBookBlock) -> Dict[str, Any]:
+    """Flatten a block to ts plus one float64 array per LEVEL_COLUMNS entry."""
+    n = len(block)
+    levels = np.hstack([block.bids.reshape(n, -1), block.asks.reshape(n, -1)])
+    columns = {"ts": block.ts_us}
+    for j, name in enumerate(LEVEL_COLUMNS):
+        columns[name] = levels[:, j]
+    return columns
+
+
+def rows_to_columns(rows: Sequence[Any], names: Sequence[str]) -> Dict[str, Any]:
+    columns = {"ts": np.array([datetime_to_unix_us(r["ts"]) for r in rows], dtype=np.int64)}
+    for name in names:
+        if name != "ts":
+            columns[name] = [r[name] for r in rows]
+    return columns
+
+
+async def iter_book_chunks(conn, start: datetime, end: datetime, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                           cursor: Optional[int] = None,
+                           table: str = "l2_orderbook") -> AsyncIterator[Tuple[Dict[str, Any], int]]:
+    """Order book chunks in ts order; trailing rows sharing the last ts move to the next chunk."""
+    tz_aware = await ts_is_timezone_aware(conn, table)
+    after = cursor if cursor is not None else datetime_to_unix_us(start) - 1
+    end_us = datetime_to_unix_us(end)
+    while True:
+        # One row past the chunk shows whether the chunk ends inside a run of equal timestamps
+        block = await fetch_orderbook_block(conn, unix_us_to_datetime(after, tz_aware), chunk_rows + 1, table)
+        block = block.slice(0, int(np.searchsorted(block.ts_us, end_us)))
+        full = len(block) > chunk_rows
+        if full:
+            last = int(block.ts_us[chunk_rows])
+            if block.ts_us[0] == last:
+                # One timestamp fills the chunk
+                block = await fetch_orderbook_range(conn, unix_us_to_datetime(last, tz_aware),
+                                                    unix_us_to_datetime(last + 1, tz_aware), table)
+            else:
+                block = block.slice(0, int(np.searchsorted(block.ts_us[:chunk_rows], last)))
+        if not len(block):
+            return
+        after = int(block.ts_us[-1])
+        yield book_columns(block), after
+        if not full:
+            return
+
+
+async def iter_table_chunks(conn, table: str, names: Sequence[str], start: datetime, end: datetime,
+                            source: Optional[str] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                            cursor: Optional[int] = None) -> AsyncIterator[Tuple[Dict[str, Any], int]]:
+    """Chunks of a (ts, ...) table in ts order; trailing rows sharing the last ts move to the next chunk."""
+    filters, extra = "", []
+    if source is not None:
+        filters, extra = " AND source = $3", [source]
+    select = f"SELECT {', '.join(names)} FROM {table}"
+    page_sql = f"{select} WHERE ts > $1 AND ts < $2{filters} ORDER BY ts LIMIT ${3 + len(extra)}"
+    tie_sql = f"{select} WHERE ts = $1 AND ts < $2{filters}"
+
+    after = cursor if cursor is not None else datetime_to_unix_us(start) - 1
+    end_ts = to_utc(end)
+    while True:
+        # One row past the chunk shows whether the chunk ends inside a run of equal timestamps
+        rows = await conn.fetch(page_sql, unix_us_to_datetime(after, True), end_ts, *extra, chunk_rows + 1)
+        full = len(rows) > chunk_rows
+        if full:
+            rows, last = rows[:chunk_rows], rows[chunk_rows]["ts"]
+            if rows[0]["ts"] == last:
+                rows = await conn.fetch(tie_sql, last, end_ts, *extra)  # One timestamp fills the chunk
+            else:
+                rows = [r for r in rows if r["ts"] != last]
+        if not rows:
+            return
+        columns = rows_to_columns(rows, names)
+        after = int(columns["ts"][-1])
+        yield columns, after
+        if not full:
+            return
+
+
+def trade_columns(trades: Iterable[Dict[str, Any]], start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, cursor: Optional[int] = None) -> Dict[str, Any]:
+    """Typed columns for StrategyEngine trades (or parsed CSV rows) within the range, in ts order."""
+    low = cursor + 1 if cursor is not None else datetime_to_unix_us(start) if start is not None else None
+    high = datetime_to_unix_us(end) if end is not None else None
+    rows = []
+    for trade in trades:
+        ts = datetime_to_unix_us(to_utc(trade.get("timestamp")))
+        if (low is None or ts >= low) and (high is None or ts < high):
+            rows.append((ts, trade))
+    rows.sort(key=lambda row: row[0])
+    columns = {"ts": np.array([ts for ts, _ in rows], dtype=np.int64)}
+    for name in TRADE_COLUMNS[1:]:
+        kind = DATASET_SCHEMAS[TRADES][name]
+        values = []
+        for _, trade in rows:
+            value = trade.get(name)
+            if value in (None, ""):
+                values.append(None)
+            elif kind == "string":
+                values.append(str(value))
+            else:
+                values.append(int(float(value)) if kind == "int64" else float(value))
+        columns[name] = values
+    return columns
+
+
+def read_trades_csv(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Trades from CSV reports written by CSVReportService."""
+    trades = []
+    for path in paths:
+        with open(path, newline="") as f:
+            trades.extend(csv.DictReader(f))
+    return trades
+
+
+async def iter_export(conn, dataset: str, start: datetime, end: datetime, source: Optional[str] = None,
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS, cursor: Optional[int] = None,
+                      trades: Optional[Iterable[Dict[str, Any]]] = None) -> AsyncIterator[Tuple[Dict[str, Any], int]]:
+    """(columns, cursor after the chunk) for one dataset; `trades` supplies the trades dataset."""
+    if dataset == BOOKS:
+        async for chunk in iter_book_chunks(conn, start, end, chunk_rows, cursor):
+            yield chunk
+    elif dataset == FEATURES:
+        async for chunk in iter_table_chunks(conn, FEATURES_TABLE, FEATURE_COLUMNS, start, end, source,
+                                             chunk_rows, cursor):
+            yield chunk
+    elif dataset == ANOMALIES:
+        async for chunk in iter_table_chunks(conn, ANOMALIES_TABLE, ANOMALY_COLUMNS, start, end, source,
+                                             chunk_rows, cursor):
+            yield chunk
+    elif dataset == TRADES:
+        columns = trade_columns(trades or (), start, end, cursor)
+        if len(columns["ts"]):
+            yield columns, int(columns["ts"][-1])
+    else:
+        raise ValueError(f"Unknown dataset '{dataset}'")
+
+
+# ---- Encoding ----
+
+def schema(dataset: str):
+    fields = []
+    for name, kind in DATASET_SCHEMAS[dataset].items():
+        fields.append(pa.field(name, pa.timestamp("us", tz="UTC") if kind == "timestamp" else getattr(pa, kind)()))
+    return pa.schema(fields)
+
+
+def to_record_batch(dataset: str, columns: Dict[str, Any]):
+    target = schema(dataset)
+    arrays = []
+    for field in target:
+        values = columns[field.name]
+        if field.name == "ts":
+            arrays.append(pa.array(np.asarray(values, dtype=np.int64)).cast(field.type))
+        else:
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=target)
+
+
+class _Sink:
+    """File-like buffer that hands out what the writers produced so far."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+class ExportEncoder:
+    """Encodes chunks as an Arrow IPC stream or a Parquet file (one row group per chunk), incrementally."""
+
+    def __init__(self, dataset: str, format: str = "arrow"):
+        validate(dataset, format)
+        self.dataset = dataset
+        self.format = format
+        self._sink = _Sink()
+        target = schema(dataset)
+        if format == "parquet":
+            self._writer = pq.ParquetWriter(pa.PythonFile(self._sink, mode="w"), target)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, target)
+
+    def write(self, columns: Dict[str, Any]) -> bytes:
+        batch = to_record_batch(self.dataset, columns)
+        if self.format == "parquet":
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def write_part(path: str, dataset: str, columns: Dict[str, Any], format: str = "arrow"):
+    """Write one chunk as a standalone Arrow IPC file (memory-mappable) or Parquet file, atomically."""
+    batch = to_record_batch(dataset, columns)
+    tmp = f"{path}.tmp"
+    if format == "parquet":
+        pq.write_table(pa.Table.from_batches([batch]), tmp)
+    else:
+        with pa.OSFile(tmp, "wb") as f, pa.ipc.new_file(f, batch.schema) as writer:
+            writer.write_batch(batch)
+    os.replace(tmp, path)
+
+
+# ---- Directory export ----
+
+def load_progress(out_dir: str, plan: Dict[str, Any], restart: bool = False) -> Dict[str, Any]:
+    """Cursor and part count for this plan; a different plan in the same directory is an error unless restarting."""
+    path = os.path.join(out_dir, PROGRESS_NAME)
+    if not restart and os.path.exists(path):
+        with open(path) as f:
+            progress = json.load(f)
+        if progress["plan"] != plan:
+            raise ValueError(f"{out_dir} holds a different export ({progress['plan']}); use restart or another directory")
+        return progress
+    return {"plan": plan, "cursor": None, "parts": 0, "rows": 0, "complete": False}
+
+
+def save_progress(out_dir: str, progress: Dict[str, Any]):
+    path = os.path.join(out_dir, PROGRESS_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+async def export_to_directory(conn, out_dir: str, dataset: str, start: datetime, end: datetime,
+                              source: Optional[str] = None, format: str = "arrow",
+                              chunk_rows: int = DEFAULT_CHUNK_ROWS, trades: Optional[Iterable[Dict[str, Any]]] = None,
+                              restart: bool = False) -> Dict[str, Any]:
+    """Write <out_dir>/<dataset>/part-NNNNN.<ext>, one file per chunk; returns the final progress."""
+    validate(dataset, format)
+    directory = os.path.join(out_dir, dataset)
+    os.makedirs(directory, exist_ok=True)
+    plan = {"dataset": dataset, "start": start.isoformat(), "end": end.isoformat(), "source": source,
+            "format": format}
+    progress = load_progress(directory, plan, restart)
+    if progress["complete"]:
+        return progress
+
+    async for columns, cursor in iter_export(conn, dataset, start, end, source, chunk_rows, progress["cursor"], trades):
+        write_part(os.path.join(directory, f"part-{progress['parts']:05d}{FORMATS[format]}"), dataset, columns, format)
+        progress["parts"] += 1
+        progress["rows"] += len(columns["ts"])
+        progress["cursor"] = cursor
+        save_progress(directory, progress)
+        logger.info(f"Exported {progress['rows']:,} {dataset} rows ({progress['parts']} parts)")
+    progress["complete"] = True
+    save_progress(directory, progress)
+    return progress
@@ -0,0 +1,135 @@
+"""
+Feature Query: Windowed, Projected and Columnar /features Responses
+Selects buffered snapshots by time window (or the newest `last`), thins
+them to at most `max_points` (or every `step`-th row), and returns only the
+requested fields.
+
+Formats:
+- rows: a JSON list of snapshot dicts (the original /features shape)
+- columns: JSON {"count", "fields", "columns": {field: [...]}} with one array
+  per field plus ts_us; numeric fields come straight from the ring columns
+- msgpack: the columns document as MessagePack
+- arrow: an Arrow IPC stream with one record batch
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+
+from ring_store import SnapshotRing
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("rows", "columns", "msgpack", "arrow")
+MEDIA_TYPES = {
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Field names from a comma-separated list; None means every field."""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return list(dict.fromkeys(names)) or None
+
+
+def decimate(positions: np.ndarray, max_points: Optional[int] = None, step: Optional[int] = None) -> np.ndarray:
+    """Every `step`-th position, or at most `max_points` evenly spaced ones; the newest is always kept."""
+    n = len(positions)
+    if step and step > 1:
+        return positions[(n - 1) % step::step]
+    if max_points is not None and 0 < max_points < n:
+        return positions[np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))]
+    return positions
+
+
+def select_positions(
+    ring: SnapshotRing,
+    start_us: Optional[int] = None,
+    end_us: Optional[int] = None,
+    last: Optional[int] = None,
+    max_points: Optional[int] = None,
+    step: Optional[int] = None
+) -> np.ndarray:
+    return decimate(ring.positions(start_us, end_us, last), max_points, step)
+
+
+def all_fields(ring: SnapshotRing, positions: np.ndarray) -> List[str]:
+    """Every field present in the selected rows, numeric columns first."""
+    names = dict.fromkeys(ring.columns)
+    for key in ("bids", "asks"):
+        if (ring.depths[key][ring._physical(positions)] >= 0).any():
+            names[key] = None
+    for extras in ring.extras[ring._physical(positions)]:
+        if extras:
+            names.update(dict.fromkeys(extras))
+    return list(names)
+
+
+def project_rows(ring: SnapshotRing, positions: np.ndarray, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Snapshot dicts restricted to `fields` (absent fields are left out, as in full rows)."""
+    if fields is None:
+        return ring.rows(positions)
+    columns = {name: ring.values(name, positions) for name in fields}
+    return [
+        {name: values[n] for name, values in columns.items() if values[n] is not None}
+        for n in range(len(positions))
+    ]
+
+
+def project_columns(ring: SnapshotRing, positions: np.ndarray, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    fields = list(fields) if fields is not None else all_fields(ring, positions)
+    columns = {"ts_us": ring.ts_us[ring._physical(positions)].tolist()}
+    for name in fields:
+        columns[name] = ring.values(name, positions)
+    return {"count": len(positions), "fields": fields, "columns": columns}
+
+
+def encode_arrow(document: Dict[str, Any]) -> bytes:
+    """The columns document as an Arrow IPC stream."""
+    arrays, names = [], []
+    for name, values in document["columns"].items():
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+        names.append(name)
+    batch = pa.RecordBatch.from_arrays(arrays, names=names)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def query_features(
+    ring: SnapshotRing,
+    start_us: Optional[int] = None,
+    end_us: Optional[int] = None,
+    last: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+    max_points: Optional[int] = None,
+    step: Optional[int] = None,
+    format: str = "rows"
+) -> Tuple[Any, Optional[str]]:
+    """
+    (payload, media type) for a /features request. The payload is JSON-ready
+    for rows/columns (media type None) and bytes for msgpack/arrow.
+    ValueError for an unknown format.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', expected one of {', '.join(FORMATS)}")
+
+    positions = select_positions(ring, start_us, end_us, last, max_points, step)
+    if format == "rows":
+        return project_rows(ring, positions, fields), None
+
+    document = project_columns(ring, positions, fields)
+    if format == "msgpack":
+        return msgpack.packb(document), MEDIA_TYPES["msgpack"]
+    if format == "arrow":
+        return encode_arrow(document), MEDIA_TYPES["arrow"]
+    return document, None
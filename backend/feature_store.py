@@ -0,0 +1,192 @@
+"""
+Analytics Feature Store
+Optional sink that persists processed snapshots and their anomalies to
+TimescaleDB hypertables, so dashboards and backtests can query precomputed
+features instead of re-running analytics over raw order book data.
+
+Rows are handed to BatchedCopyWriters and written with COPY in the
+background; record() only extracts a tuple and never waits on the database.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from batch_writer import BatchedCopyWriter
+from db import get_connection, return_connection
+
+logger = logging.getLogger(__name__)
+
+FEATURES_TABLE = "analytics_features"
+ANOMALIES_TABLE = "analytics_anomalies"
+
+# Processed snapshot key -> column, in COPY order after (ts, source, symbol)
+FEATURE_FIELDS = (
+    "mid_price", "best_bid", "best_ask", "spread", "obi", "ofi", "vpin", "microprice", "divergence",
+    "directional_prob", "regime", "regime_label", "spoofing_risk", "volume_volatility",
+    "gap_count", "gap_severity_score"
+)
+FEATURE_COLUMNS = ("ts", "source", "symbol") + FEATURE_FIELDS + ("engine",)
+ANOMALY_COLUMNS = ("ts", "source", "symbol", "type", "severity", "message", "details")
+
+SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS {FEATURES_TABLE} (
+    ts                  TIMESTAMPTZ NOT NULL,
+    source              TEXT NOT NULL,
+    symbol              TEXT,
+    mid_price           DOUBLE PRECISION,
+    best_bid            DOUBLE PRECISION,
+    best_ask            DOUBLE PRECISION,
+    spread              DOUBLE PRECISION,
+    obi                 DOUBLE PRECISION,
+    ofi                 DOUBLE PRECISION,
+    vpin                DOUBLE PRECISION,
+    microprice          DOUBLE PRECISION,
+    divergence          DOUBLE PRECISION,
+    directional_prob    DOUBLE PRECISION,
+    regime              SMALLINT,
+    regime_label        TEXT,
+    spoofing_risk       DOUBLE PRECISION,
+    volume_volatility   DOUBLE PRECISION,
+    gap_count           INTEGER,
+    gap_severity_score  DOUBLE PRECISION,
+    engine              TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_{FEATURES_TABLE}_source_ts ON {FEATURES_TABLE} (source, ts DESC);
+
+CREATE TABLE IF NOT EXISTS {ANOMALIES_TABLE} (
+    id          BIGSERIAL,
+    ts          TIMESTAMPTZ NOT NULL,
+    source      TEXT NOT NULL,
+    symbol      TEXT,
+    type        TEXT NOT NULL,
+    severity    TEXT,
+    message     TEXT,
+    details     JSONB
+);
+-- Tables created before the alert log paged by (ts, id)
+ALTER TABLE {ANOMALIES_TABLE} ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+CREATE INDEX IF NOT EXISTS idx_{ANOMALIES_TABLE}_ts ON {ANOMALIES_TABLE} (ts DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_{ANOMALIES_TABLE}_type_ts ON {ANOMALIES_TABLE} (type, ts DESC);
+CREATE INDEX IF NOT EXISTS idx_{ANOMALIES_TABLE}_severity_ts ON {ANOMALIES_TABLE} (severity, ts DESC);
+"""
+
+_ANOMALY_BASE_KEYS = {"type", "severity", "message"}
+
+
+def to_utc(ts: Any) -> datetime:
+    """Snapshot timestamp (datetime or ISO string) as an aware UTC datetime; naive values are UTC."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    elif not isinstance(ts, datetime):
+        return datetime.now(timezone.utc)
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value and value not in (float("inf"), float("-inf")) else None
+
+
+def feature_record(source: str, processed: Dict[str, Any]) -> Tuple:
+    """One analytics_features row from a processed snapshot."""
+    values = []
+    for field in FEATURE_FIELDS:
+        value = processed.get(field)
+        if field == "regime_label":
+            values.append(value if isinstance(value, str) else None)
+        elif field in ("regime", "gap_count"):
+            value = _number(value)
+            values.append(int(value) if value is not None else None)
+        else:
+            values.append(_number(value))
+    return (to_utc(processed.get("timestamp")), source, processed.get("symbol"), *values, processed.get("engine"))
+
+
+def anomaly_records(source: str, processed: Dict[str, Any]):
+    """analytics_anomalies rows for the anomalies raised on a processed snapshot."""
+    ts = None
+    for anomaly in processed.get("anomalies") or ():
+        if ts is None:
+            ts = to_utc(processed.get("timestamp"))
+        details = {k: v for k, v in anomaly.items() if k not in _ANOMALY_BASE_KEYS}
+        yield (
+            ts, source, processed.get("symbol"),
+            str(anomaly.get("type", "UNKNOWN")), anomaly.get("severity"), anomaly.get("message"),
+            json.dumps(details, default=str) if details else None
+        )
+
+
+class FeatureStore:
+    """Persists processed features and anomalies through background COPY writers."""
+
+    def __init__(self, batch_size: int = 1000, flush_interval: float = 1.0, max_buffered: int = 50000,
+                 acquire=get_connection, release=return_connection):
+        self._acquire = acquire
+        self._release = release
+        self.features = BatchedCopyWriter(
+            FEATURES_TABLE, FEATURE_COLUMNS, batch_size=batch_size, flush_interval=flush_interval,
+            max_buffered=max_buffered, acquire=acquire, release=release
+        )
+        self.anomalies = BatchedCopyWriter(
+            ANOMALIES_TABLE, ANOMALY_COLUMNS, batch_size=batch_size, flush_interval=flush_interval,
+            max_buffered=max_buffered, acquire=acquire, release=release
+        )
+        self.hypertables = False
+        self.record_errors = 0
+
+    async def start(self):
+        """Create the tables (as hypertables when TimescaleDB is installed) and start the writers."""
+        conn = await self._acquire()
+        try:
+            self.hypertables = await ensure_schema(conn)
+        finally:
+            await self._release(conn)
+        self.features.start()
+        self.anomalies.start()
+        logger.info(f"Feature store started (hypertables: {self.hypertables})")
+
+    async def stop(self, timeout: float = 5.0):
+        await self.features.stop(timeout)
+        await self.anomalies.stop(timeout)
+
+    def record(self, source: str, processed: Dict[str, Any]):
+        """Queue one processed snapshot; never raises into the analytics path."""
+        try:
+            self.features.submit(feature_record(source, processed))
+            for record in anomaly_records(source, processed):
+                self.anomalies.submit(record)
+        except Exception as e:
+            self.record_errors += 1
+            logger.debug(f"Feature store skipped a snapshot: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hypertables": self.hypertables,
+            "record_errors": self.record_errors,
+            "features": self.features.get_stats(),
+            "anomalies": self.anomalies.get_stats()
+        }
+
+
+async def ensure_schema(conn) -> bool:
+    """Create the feature tables; True if they are TimescaleDB hypertables."""
+    await conn.execute(SCHEMA_SQL)
+    return await ensure_hypertables(conn, (FEATURES_TABLE, ANOMALIES_TABLE))
+
+
+async def ensure_hypertables(conn, tables, time_column: str = "ts", chunk_interval: str = "1 day") -> bool:
+    """Convert `tables` to hypertables if the timescaledb extension is available."""
+    has_timescale = await conn.fetchval("SELECT count(*) > 0 FROM pg_extension WHERE extname = 'timescaledb'")
+    if not has_timescale:
+        logger.warning("TimescaleDB extension not installed; using plain tables")
+        return False
+    for table in tables:
+        await conn.execute(
+            f"SELECT create_hypertable('{table}', '{time_column}', "
+            f"chunk_time_interval => INTERVAL '{chunk_interval}', if_not_exists => TRUE, migrate_data => TRUE)"
+        )
+    return True
@@ -0,0 +1,202 @@
+"""
+Historical Analytics Buckets
+Server-side aggregation of stored analytics over a time range, so charts
+request one row per bucket instead of downloading raw snapshots.
+
+- features: buckets over the analytics_features rows of one source (a
+  replay session id or live:<symbol>, written by FeatureStore): mid and
+  microprice OHLC, mean and percentiles of spread, OBI, OFI and VPIN, the
+  snapshot count, and anomaly counts per type from analytics_anomalies.
+  A source is required: every replay of the same history and every live
+  symbol is stored separately, so buckets across sources would mix symbols
+  and count replayed rows more than once.
+- aggregates: buckets rolled up from the l2_orderbook continuous aggregates
+  (coarsest resolution that divides the bucket): mid OHLC, mean spread and
+  depth imbalance. The order book has no source or symbol, so those filters
+  are rejected here, and there are no anomaly counts.
+- auto: features when a source is given, otherwise aggregates.
+
+Buckets are aligned to the unix epoch with plain SQL, so no TimescaleDB
+functions are needed for the features table.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from continuous_aggregates import RESOLUTIONS, _match_timezone
+from feature_store import ANOMALIES_TABLE, FEATURES_TABLE, to_utc
+from replay_blocks import ts_is_timezone_aware
+
+logger = logging.getLogger(__name__)
+
+FEATURES, AGGREGATES, AUTO = "features", "aggregates", "auto"
+SOURCES = (AUTO, FEATURES, AGGREGATES)
+DISTRIBUTION_METRICS = ("spread", "obi", "ofi", "vpin")
+PERCENTILES = (0.5, 0.95)
+MAX_BUCKETS = 10000
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_bucket(bucket: str) -> int:
+    """Bucket width in seconds from "<n><s|m|h|d>" (e.g. 10s, 5m, 1h); ValueError otherwise."""
+    match = re.fullmatch(r"(\d+)([smhd])", bucket.strip())
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f"Invalid bucket '{bucket}'; use e.g. 1s, 10s, 1m, 5m, 1h or 1d")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+def bucket_expr(param: str, column: str = "ts") -> str:
+    return f"to_timestamp(floor(extract(epoch FROM {column}) / {param}) * {param})"
+
+
+def _percentile_name(q: float) -> str:
+    return f"p{round(q * 100):g}"
+
+
+def _ohlc(column: str, name: str) -> List[str]:
+    present = f"FILTER (WHERE {column} IS NOT NULL)"
+    return [
+        f"(array_agg({column} ORDER BY ts) {present})[1] AS {name}__open",
+        f"max({column}) AS {name}__high",
+        f"min({column}) AS {name}__low",
+        f"(array_agg({column} ORDER BY ts DESC) {present})[1] AS {name}__close",
+    ]
+
+
+def _distribution(column: str) -> List[str]:
+    parts = [f"avg({column}) AS {column}__mean"]
+    for q in PERCENTILES:
+        parts.append(f"percentile_cont({q}) WITHIN GROUP (ORDER BY {column}) AS {column}__{_percentile_name(q)}")
+    return parts
+
+
+def _where(start, end, source: Optional[str], symbol: Optional[str], args: List[Any]) -> str:
+    def param(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    conditions = [f"ts >= {param(start)}", f"ts < {param(end)}"]
+    if source is not None:
+        conditions.append(f"source = {param(source)}")
+    if symbol is not None:
+        conditions.append(f"symbol = {param(symbol)}")
+    return " AND ".join(conditions)
+
+
+def build_features_query(start: datetime, end: datetime, bucket_seconds: int, source: str,
+                         symbol: Optional[str] = None) -> Tuple[str, List[Any]]:
+    args: List[Any] = [float(bucket_seconds)]
+    where = _where(to_utc(start), to_utc(end), source, symbol, args)
+    columns = ["count(*) AS snapshots"]
+    columns += _ohlc("mid_price", "mid") + _ohlc("microprice", "microprice")
+    for metric in DISTRIBUTION_METRICS:
+        columns += _distribution(metric)
+    sql = (
+        f"SELECT {bucket_expr('$1')} AS bucket, {', '.join(columns)} "
+        f"FROM {FEATURES_TABLE} WHERE {where} GROUP BY 1 ORDER BY 1"
+    )
+    return sql, args
+
+
+def aggregate_for(bucket_seconds: int) -> Optional[str]:
+    """The coarsest continuous aggregate whose bucket divides `bucket_seconds`."""
+    best = None
+    for name, seconds in (("1s", 1), ("1m", 60)):
+        if bucket_seconds % seconds == 0:
+            best = name
+    return best
+
+
+def build_aggregates_query(view: str, start: datetime, end: datetime, bucket_seconds: int) -> Tuple[str, List[Any]]:
+    args: List[Any] = [float(bucket_seconds)]
+    where = _where(start, end, None, None, args)
+    weighted = "sum({0} * row_count) / NULLIF(sum(row_count) FILTER (WHERE {0} IS NOT NULL), 0)"
+    sql = (
+        f"SELECT {bucket_expr('$1')} AS bucket, sum(row_count) AS snapshots, "
+        f"(array_agg(open ORDER BY ts))[1] AS mid__open, max(high) AS mid__high, min(low) AS mid__low, "
+        f"(array_agg(close ORDER BY ts DESC))[1] AS mid__close, "
+        f"{weighted.format('avg_spread')} AS spread__mean, "
+        f"{weighted.format('avg_imbalance')} AS imbalance__mean "
+        f"FROM {view} WHERE {where} GROUP BY 1 ORDER BY 1"
+    )
+    return sql, args
+
+
+def build_anomaly_counts_query(start: datetime, end: datetime, bucket_seconds: int, source: Optional[str] = None,
+                               symbol: Optional[str] = None) -> Tuple[str, List[Any]]:
+    args: List[Any] = [float(bucket_seconds)]
+    where = _where(to_utc(start), to_utc(end), source, symbol, args)
+    sql = (
+        f"SELECT {bucket_expr('$1')} AS bucket, type, count(*) AS n "
+        f"FROM {ANOMALIES_TABLE} WHERE {where} GROUP BY 1, 2"
+    )
+    return sql, args
+
+
+def row_to_bucket(row) -> Dict[str, Any]:
+    """Nest "<metric>__<stat>" columns as {metric: {stat: value}}."""
+    bucket: Dict[str, Any] = {"ts": row["bucket"].isoformat(), "snapshots": int(row["snapshots"] or 0)}
+    for key, value in dict(row).items():
+        metric, _, stat = key.partition("__")
+        if stat:
+            bucket.setdefault(metric, {})[stat] = float(value) if value is not None else None
+    return bucket
+
+
+async def fetch_history_analytics(
+    conn,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+    source: Optional[str] = None,
+    symbol: Optional[str] = None,
+    prefer: str = AUTO
+) -> Dict[str, Any]:
+    """
+    Buckets with start <= ts < end, oldest first, from the feature store
+    (requires `source`) or the order book aggregates (no source/symbol).
+    """
+    if prefer not in SOURCES:
+        raise ValueError(f"Unknown source '{prefer}'; use one of {list(SOURCES)}")
+    if end <= start:
+        raise ValueError("end must be after start")
+    n_buckets = (to_utc(end) - to_utc(start)).total_seconds() / bucket_seconds
+    if n_buckets > MAX_BUCKETS:
+        raise ValueError(f"Range covers {n_buckets:.0f} buckets; the limit is {MAX_BUCKETS}, use a wider bucket")
+    if prefer == AUTO:
+        prefer = FEATURES if source is not None else AGGREGATES
+
+    if prefer == AGGREGATES:
+        if source is not None or symbol is not None:
+            raise ValueError("The order book aggregates cannot be filtered by source or symbol; use prefer=features")
+        view = RESOLUTIONS[aggregate_for(bucket_seconds)].view
+        tz_aware = await ts_is_timezone_aware(conn, view)
+        sql, args = build_aggregates_query(
+            view, _match_timezone(start, tz_aware), _match_timezone(end, tz_aware), bucket_seconds
+        )
+        buckets = [row_to_bucket(row) for row in await conn.fetch(sql, *args)]
+        return {"bucket_seconds": bucket_seconds, "source": AGGREGATES, "count": len(buckets), "buckets": buckets}
+
+    if source is None:
+        raise ValueError("source is required for feature buckets (a replay session id or live:<symbol>)")
+    sql, args = build_features_query(start, end, bucket_seconds, source, symbol)
+    buckets = [row_to_bucket(row) for row in await conn.fetch(sql, *args)]
+    for bucket in buckets:
+        bucket["anomalies"] = {}
+        bucket["anomaly_count"] = 0
+    by_ts = {bucket["ts"]: bucket for bucket in buckets}
+    sql, args = build_anomaly_counts_query(start, end, bucket_seconds, source, symbol)
+    for row in await conn.fetch(sql, *args):
+        key = row["bucket"].isoformat()
+        bucket = by_ts.get(key)
+        if bucket is None:
+            # Anomalies in a bucket without feature rows still get counted
+            bucket = by_ts[key] = {"ts": key, "snapshots": 0, "anomalies": {}, "anomaly_count": 0}
+            buckets.append(bucket)
+        bucket["anomalies"][row["type"]] = int(row["n"])
+        bucket["anomaly_count"] += int(row["n"])
+    buckets.sort(key=lambda bucket: to_utc(bucket["ts"]))
+
+    return {"bucket_seconds": bucket_seconds, "source": FEATURES, "count": len(buckets), "buckets": buckets}
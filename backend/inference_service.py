@@ -4,12 +4,13 @@ import os
 import torch
 import numpy as np
 import json
-from collections import deque
 import logging
 
 # Add model_building/src to path to import model.py
 sys.path.append(os.path.join(os.path.dirname(__file__), "../model_building/src"))
 
+from ring_store import ArrayRing
+
 try:
     from model import DeepLOB
 except ImportError:
@@ -26,12 +27,13 @@ class ModelInference:
         self.mean = None
         self.std = None
         
-        # Buffer storage: session_id -> deque (max 100)
+        # Buffer storage: session_id -> ArrayRing of the last 100 normalized feature rows
         self.session_buffers = {}
         
         # Rate limiting for inference
         self.last_inference_time = {}
         self.min_inference_interval = 0.1  # 100ms between predictions (10 predictions/sec max)
+        self.interval_scale = {}  # session_id -> multiplier set by that session's degradation tier
         
         self.load_resources(model_path, scaler_path)
 
@@ -54,6 +56,10 @@ class ModelInference:
             logger.error(f"❌ Failed to load model resources: {e}")
             self.model = None
 
+    @staticmethod
+    def _new_buffer() -> ArrayRing:
+        return ArrayRing(100, (40,), np.float32)
+
     def _extract_features(self, snapshot):
         """
         Extract 40 features (10 levels * 4 stats) from snapshot dict.
@@ -92,12 +98,12 @@ class ModelInference:
         current_time = time.time()
         last_time = self.last_inference_time.get(session_id, 0)
         
-        if current_time - last_time < self.min_inference_interval:
+        if current_time - last_time < self.interval(session_id):
             # Too soon, skip this prediction
             return None
             
         if session_id not in self.session_buffers:
-            self.session_buffers[session_id] = deque(maxlen=100)
+            self.session_buffers[session_id] = self._new_buffer()
         
         # Extract features
         features = self._extract_features(snapshot)
@@ -115,7 +121,7 @@ class ModelInference:
             return None
             
         # Prepare Tensor (1, 1, 100, 40)
-        input_np = np.array(list(self.session_buffers[session_id]))
+        input_np = self.session_buffers[session_id].ordered()
         input_tensor = torch.FloatTensor(input_np).unsqueeze(0).unsqueeze(0).to(self.device)
         
         with torch.no_grad():
@@ -154,12 +160,12 @@ class ModelInference:
         for session_id, snapshot in session_snapshots.items():
             # Rate limiting check
             last_time = self.last_inference_time.get(session_id, 0)
-            if current_time - last_time < self.min_inference_interval:
+            if current_time - last_time < self.interval(session_id):
                 continue
             
             # Initialize buffer if needed
             if session_id not in self.session_buffers:
-                self.session_buffers[session_id] = deque(maxlen=100)
+                self.session_buffers[session_id] = self._new_buffer()
             
             # Extract and normalize features
             features = self._extract_features(snapshot)
@@ -171,7 +177,7 @@ class ModelInference:
             
             # Check if buffer is full
             if len(self.session_buffers[session_id]) == 100:
-                input_np = np.array(list(self.session_buffers[session_id]))
+                input_np = self.session_buffers[session_id].ordered()
                 batch_inputs.append(input_np)
                 session_ids_order.append(session_id)
         
@@ -205,6 +211,28 @@ class ModelInference:
         
         return ready_sessions
     
+    def prime_session(self, session_id: str, snapshots: list):
+        """Rebuild a session's model buffer from the rows preceding a replay seek."""
+        if self.model is None:
+            return
+        std_safe = self.std.copy()
+        std_safe[std_safe == 0] = 1.0
+        buffer = self._new_buffer()
+        for snapshot in snapshots[-100:]:
+            buffer.append((self._extract_features(snapshot) - self.mean) / std_safe)
+        self.session_buffers[session_id] = buffer
+
+    def interval(self, session_id) -> float:
+        """Minimum seconds between predictions for a session."""
+        return self.min_inference_interval * self.interval_scale.get(session_id, 1.0)
+    
+    def set_interval_scale(self, session_id, scale: float):
+        """Stretch one session's inference interval (degradation tiers); 1.0 restores it."""
+        if scale == 1.0:
+            self.interval_scale.pop(session_id, None)
+        else:
+            self.interval_scale[session_id] = scale
+    
     def cleanup_session(self, session_id: str):
         """Clean up session buffer when session ends."""
         if session_id in self.session_buffers:
@@ -213,6 +241,7 @@ class ModelInference:
         
         if session_id in self.last_inference_time:
             del self.last_inference_time[session_id]
+        self.interval_scale.pop(session_id, None)
     
     def get_stats(self) -> dict:
         """Get inference service statistics."""
@@ -0,0 +1,221 @@
+"""
+Shared Live Pipeline
+Runs analytics and model inference once per live tick and fans the
+processed result out to every session subscribed to that symbol.
+"""
+import logging
+import queue
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from adaptive_processor import apply_profile_to_engine
+from analytics_core import AnalyticsEngine
+from snapshot_processor import SnapshotProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolPipeline:
+    """
+    Analytics state for one live symbol, shared by all of its viewers.
+
+    With a worker pool the engine lives on the symbol's worker, so only the
+    per-symbol stats are kept here (processor is None).
+    """
+
+    def __init__(self, symbol: str, cpp_client=None, max_failures: int = 5, in_process: bool = True):
+        self.symbol = symbol
+        self.processor = SnapshotProcessor(
+            cpp_client=cpp_client,
+            analytics_engine=AnalyticsEngine(),
+            max_failures=max_failures
+        ) if in_process else None
+        self.consecutive_cpp_failures = 0
+        self.ticks_processed = 0
+        self.last_subscriber_count = 0
+        self.last_inference_ms = 0.0
+
+
+class LivePipeline:
+    """
+    Process-once, fan-out-many pipeline for LIVE mode.
+
+    Each tick is processed by the symbol's own analytics engine and model
+    buffer exactly once. Sessions only pay for their strategy state and
+    for delivery of the shared result.
+    """
+
+    def __init__(self, inference_engine=None, cpp_client=None, max_failures: int = 5, pool=None):
+        self.inference_engine = inference_engine
+        self.cpp_client = cpp_client
+        self.max_failures = max_failures
+        self.pool = pool  # Optional ShardedAnalyticsPool; symbols are sharded across workers
+        self.pipelines: Dict[str, SymbolPipeline] = {}
+        self.profile: Optional[Dict[str, Any]] = None  # Current degradation profile
+        self.total_ticks = 0
+        self.total_deliveries = 0
+        self.dropped_deliveries = 0
+
+    @staticmethod
+    def inference_key(symbol: str) -> str:
+        """Inference buffer key shared by all viewers of a symbol."""
+        return f"live:{symbol}"
+
+    def get_or_create(self, symbol: str) -> SymbolPipeline:
+        """Get the pipeline for a symbol, creating it on first tick."""
+        if symbol not in self.pipelines:
+            self.pipelines[symbol] = SymbolPipeline(symbol, self.cpp_client, self.max_failures,
+                                                    in_process=self.pool is None)
+            if self.profile is not None:
+                self._apply_profile(symbol, self.profile)
+            logger.info(f"Created shared live pipeline for {symbol}")
+        return self.pipelines[symbol]
+
+    def set_cpp_client(self, client):
+        """Propagate a (re)connected C++ client to every symbol pipeline."""
+        self.cpp_client = client
+        for pipeline in self.pipelines.values():
+            if pipeline.processor is not None:
+                pipeline.processor.set_cpp_client(client)
+            pipeline.consecutive_cpp_failures = 0
+
+    def apply_profile(self, profile: Dict[str, Any]):
+        """Apply the live degradation profile to every symbol, now and on creation."""
+        self.profile = profile
+        for symbol in self.pipelines:
+            self._apply_profile(symbol, profile)
+
+    def _apply_profile(self, symbol: str, profile: Dict[str, Any]):
+        key = self.inference_key(symbol)
+        processor = self.pipelines[symbol].processor
+        if processor is not None:
+            apply_profile_to_engine(processor.analytics_engine, profile)
+        if self.inference_engine is not None:
+            self.inference_engine.set_interval_scale(key, profile["inference_interval_scale"])
+        if self.pool is not None:
+            self.pool.set_profile(key, profile)
+
+    def stage_costs(self, symbol: str) -> Dict[str, float]:
+        """Last per-stage costs (ms) of a symbol's in-process engine and model."""
+        pipeline = self.pipelines.get(symbol)
+        if pipeline is None or pipeline.processor is None:
+            return {}
+        return {**pipeline.processor.analytics_engine.last_stage_ms, "inference": pipeline.last_inference_ms}
+
+    def process(self, snapshot: Dict[str, Any]) -> Tuple[Dict[str, Any], float, str]:
+        """
+        Run analytics and inference once for a live tick.
+
+        Returns:
+            Tuple of (processed_data, processing_time, engine_used)
+        """
+        symbol = snapshot.get("symbol") or "UNKNOWN"
+        pipeline = self.get_or_create(symbol)
+
+        processed, processing_time, used_engine, pipeline.consecutive_cpp_failures = pipeline.processor.process(
+            snapshot, pipeline.consecutive_cpp_failures
+        )
+        processed["engine"] = used_engine
+
+        if self.inference_engine is not None:
+            inference_start = time.time()
+            prediction = self.inference_engine.predict(self.inference_key(symbol), snapshot)
+            pipeline.last_inference_ms = (time.time() - inference_start) * 1000
+            if prediction:
+                processed["prediction"] = prediction
+
+        pipeline.ticks_processed += 1
+        self.total_ticks += 1
+        return processed, processing_time, used_engine
+
+    async def process_async(self, snapshot: Dict[str, Any]) -> Tuple[Dict[str, Any], float, str]:
+        """Process a live tick, on the symbol's worker process when a pool is configured."""
+        if self.pool is None:
+            return self.process(snapshot)
+
+        symbol = snapshot.get("symbol") or "UNKNOWN"
+        pipeline = self.get_or_create(symbol)
+        processed, processing_time, used_engine = await self.pool.process(self.inference_key(symbol), snapshot)
+
+        if "prediction" not in processed and self.inference_engine is not None:
+            prediction = self.inference_engine.predict(self.inference_key(symbol), snapshot)
+            if prediction:
+                processed["prediction"] = prediction
+
+        pipeline.ticks_processed += 1
+        self.total_ticks += 1
+        return processed, processing_time, used_engine
+
+    @staticmethod
+    def is_subscribed(session, symbol: Optional[str]) -> bool:
+        """Sessions without an explicit symbol follow the active live symbol."""
+        session_symbol = getattr(session, "symbol", None)
+        return session_symbol is None or symbol is None or session_symbol == symbol
+
+    def fan_out(
+        self,
+        processed: Dict[str, Any],
+        snapshot: Dict[str, Any],
+        processing_time: float,
+        sessions: Iterable,
+        strategy_manager=None
+    ) -> int:
+        """
+        Deliver one processed tick to every subscribed session.
+
+        Only the strategies sessions already have run here; every other
+        session gets the shared analytics result itself. Returns the number
+        of sessions the tick was delivered to.
+        """
+        symbol = snapshot.get("symbol")
+        prediction = processed.get("prediction")
+        delivered = 0
+
+        for session in sessions:
+            if not session.is_active() or not self.is_subscribed(session, symbol):
+                continue
+
+            message = processed
+            strategy = strategy_manager.strategies.get(session.session_id) if strategy_manager is not None else None
+            if prediction and strategy is not None:
+                strategy_update = strategy.process_signal(prediction, snapshot)
+                if strategy_update:
+                    # Copy only when the payload differs per session
+                    message = {**processed, "strategy": strategy_update}
+
+            try:
+                session.processed_snapshot_queue.put_nowait((message, processing_time))
+                delivered += 1
+            except queue.Full:
+                self.dropped_deliveries += 1
+
+        if symbol in self.pipelines:
+            self.pipelines[symbol].last_subscriber_count = delivered
+        self.total_deliveries += delivered
+        return delivered
+
+    def cleanup_symbol(self, symbol: str):
+        """Drop analytics and model state for a symbol nobody watches anymore."""
+        if symbol in self.pipelines:
+            del self.pipelines[symbol]
+            if self.inference_engine is not None:
+                self.inference_engine.cleanup_session(self.inference_key(symbol))
+            if self.pool is not None:
+                self.pool.release(self.inference_key(symbol))
+            logger.info(f"Cleaned up shared live pipeline for {symbol}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get fan-out statistics."""
+        return {
+            "symbols": {
+                symbol: {
+                    "ticks_processed": p.ticks_processed,
+                    "subscribers": p.last_subscriber_count,
+                    "engine_mode": p.processor.engine_mode if p.processor is not None else "worker"
+                }
+                for symbol, p in self.pipelines.items()
+            },
+            "total_ticks": self.total_ticks,
+            "total_deliveries": self.total_deliveries,
+            "dropped_deliveries": self.dropped_deliveries
+        }
@@ -0,0 +1,287 @@
+"""
+Live Capture Recorder
+Appends every ingested live snapshot to per-symbol, memory-mapped segment
+files so a live session can be replayed later through NpyReplaySource.
+
+Layout (one l2-npy directory per symbol, see replay_source):
+    <root>/<symbol>/manifest.json
+    <root>/<symbol>/seg_00000.ts.npy          int64 sort key: exchange time (UTC us), never decreasing
+    <root>/<symbol>/seg_00000.exchange_ts.npy int64 exchange time as received
+    <root>/<symbol>/seg_00000.levels.npy      float64 (rows, 40), bids then asks
+    <root>/<symbol>/seg_00000.processed.jsonl optional processed output
+
+Segments are preallocated with `open_memmap`, so recording a snapshot is a
+single row assignment on the event loop. A background thread msyncs the
+dirty pages and rewrites the manifest (the ts index: row count and first /
+last timestamp per segment) every `flush_interval`; readers only see rows
+covered by the last manifest write.
+
+Replay searches and pages by `ts`, so it must not decrease. When exchange
+time steps back, the row keeps its real time in `exchange_ts` and gets the
+previous row's time as its `ts`. Such rows are counted per segment in the
+manifest (`clamped_rows`) and in get_stats().
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from replay_blocks import DEPTH, LEVEL_COLUMNS
+from replay_source import MANIFEST_NAME, NPY_FORMAT, NPY_VERSION
+
+logger = logging.getLogger(__name__)
+
+ROW_WIDTH = 4 * DEPTH
+
+
+def snapshot_ts_us(snapshot: Dict[str, Any]) -> int:
+    """Exchange time of a live snapshot in UTC microseconds (ingest time if unparseable)."""
+    for key in ("exchange_ts", "ingest_ts"):
+        value = snapshot.get(key)
+        if not value:
+            continue
+        try:
+            ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return int(ts.timestamp() * 1_000_000)
+    return int(time.time() * 1_000_000)
+
+
+def fill_levels(row: np.ndarray, bids, asks):
+    """Write up to DEPTH [price, volume] levels per side into a 40-wide row; missing levels are NaN."""
+    row.fill(np.nan)
+    for side, offset in ((bids, 0), (asks, 2 * DEPTH)):
+        if side:
+            flat = np.asarray(side[:DEPTH], dtype=np.float64).reshape(-1)
+            row[offset:offset + len(flat)] = flat
+
+
+class SymbolRecorder:
+    """Segment writer for one symbol. `append` runs on the event loop, `flush` on a worker thread."""
+
+    def __init__(self, directory: str, segment_rows: int, record_processed: bool = False):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.record_processed = record_processed
+        self.rows = 0
+        self.segments: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._sealed: List[tuple] = []
+        self._last_us: Optional[int] = None
+        self.clamped = 0  # Rows whose exchange time stepped back
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            # Restart: keep earlier segments and continue after them
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.segments = [s for s in manifest["segments"] if s["rows"]]
+            self.rows = sum(s["rows"] for s in self.segments)
+            self.clamped = sum(s.get("clamped_rows", 0) for s in self.segments)
+            if self.segments:
+                self._last_us = self.segments[-1]["last_ts_us"]
+        self._open_segment()
+
+    def _open_segment(self):
+        name = f"seg_{len(self.segments):05d}"
+        self._entry = {
+            "ts": f"{name}.ts.npy",
+            "levels": f"{name}.levels.npy",
+            "exchange_ts": f"{name}.exchange_ts.npy",
+            "rows": 0,
+            "clamped_rows": 0,
+            "first_ts_us": None,
+            "last_ts_us": None
+        }
+        self._ts = open_memmap(os.path.join(self.directory, self._entry["ts"]), mode="w+",
+                               dtype=np.int64, shape=(self.segment_rows,))
+        self._exchange_ts = open_memmap(os.path.join(self.directory, self._entry["exchange_ts"]), mode="w+",
+                                        dtype=np.int64, shape=(self.segment_rows,))
+        self._levels = open_memmap(os.path.join(self.directory, self._entry["levels"]), mode="w+",
+                                   dtype=np.float64, shape=(self.segment_rows, ROW_WIDTH))
+        self._processed = None
+        if self.record_processed:
+            self._entry["processed"] = f"{name}.processed.jsonl"
+            self._processed = open(os.path.join(self.directory, self._entry["processed"]), "a")
+        self.segments.append(self._entry)
+        self._n = 0
+
+    def _pending(self) -> tuple:
+        return (self._ts, self._exchange_ts, self._levels, self._processed, self._entry, self._n)
+
+    def append(self, ts_us: int, bids, asks) -> int:
+        """Record one row; returns its sort key (`ts_us`, or the previous key if time stepped back)."""
+        if self._n == self.segment_rows:
+            with self._lock:
+                self._sealed.append(self._pending())
+                self._open_segment()
+        self._exchange_ts[self._n] = ts_us
+        # Keep the ts index sorted for searchsorted even if exchange times step back
+        if self._last_us is not None and ts_us < self._last_us:
+            ts_us = self._last_us
+            self.clamped += 1
+            self._entry["clamped_rows"] += 1
+        self._last_us = ts_us
+
+        self._ts[self._n] = ts_us
+        fill_levels(self._levels[self._n], bids, asks)
+        self._n += 1
+        self.rows += 1
+        return ts_us
+
+    def append_processed(self, ts_us: int, processed: Dict[str, Any]):
+        if self._processed is not None:
+            self._processed.write(json.dumps({"ts_us": ts_us, **processed}, default=str) + "\n")
+
+    def flush(self):
+        """msync written rows and publish them in the manifest."""
+        with self._lock:
+            sealed, self._sealed = self._sealed, []
+            pending = sealed + [self._pending()]
+
+        for ts, exchange_ts, levels, processed, entry, n in pending:
+            ts.flush()
+            exchange_ts.flush()
+            levels.flush()
+            if processed is not None:
+                processed.flush()
+                os.fsync(processed.fileno())
+            entry["rows"] = n
+            if n:
+                entry["first_ts_us"] = int(ts[0])
+                entry["last_ts_us"] = int(ts[n - 1])
+        for _, _, _, processed, _, _ in sealed:
+            if processed is not None:
+                processed.close()
+        self._write_manifest()
+
+    def close(self):
+        self.flush()
+        if self._processed is not None:
+            self._processed.close()
+            self._processed = None
+
+    def _write_manifest(self):
+        with self._lock:
+            segments = [dict(s) for s in self.segments if s["rows"]]
+        manifest = {
+            "format": NPY_FORMAT,
+            "version": NPY_VERSION,
+            "rows": sum(s["rows"] for s in segments),
+            "tz_aware": False,
+            "columns": LEVEL_COLUMNS,
+            "segments": segments
+        }
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+class LiveRecorder:
+    """Records raw live snapshots (and optionally processed output) per symbol."""
+
+    def __init__(self, directory: str, segment_rows: int = 100_000, flush_interval: float = 1.0,
+                 record_processed: bool = False):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.flush_interval = flush_interval
+        self.capture_processed = record_processed
+        self.recorders: Dict[str, SymbolRecorder] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.errors = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def _recorder(self, symbol: str) -> SymbolRecorder:
+        recorder = self.recorders.get(symbol)
+        if recorder is None:
+            recorder = SymbolRecorder(os.path.join(self.directory, symbol), self.segment_rows,
+                                      self.capture_processed)
+            self.recorders[symbol] = recorder
+            logger.info(f"Recording live {symbol} to {recorder.directory}")
+        return recorder
+
+    def record(self, snapshot: Dict[str, Any]):
+        """Append one raw live snapshot. Never raises into the ingest loop."""
+        try:
+            symbol = snapshot.get("symbol") or "UNKNOWN"
+            self._recorder(symbol).append(snapshot_ts_us(snapshot), snapshot.get("bids"), snapshot.get("asks"))
+            self.recorded += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Live recorder error: {e}")
+
+    def record_processed(self, snapshot: Dict[str, Any], processed: Dict[str, Any]):
+        """Append the processed output of `snapshot`, keyed by its exchange time."""
+        if not self.capture_processed:
+            return
+        try:
+            recorder = self.recorders.get(snapshot.get("symbol") or "UNKNOWN")
+            if recorder is not None:
+                recorder.append_processed(snapshot_ts_us(snapshot), processed)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Live recorder error: {e}")
+
+    def flush(self):
+        start = time.perf_counter()
+        for recorder in list(self.recorders.values()):
+            recorder.flush()
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - start
+
+    def start(self):
+        if self._task is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Live recorder started: {self.directory}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for recorder in list(self.recorders.values()):
+            await asyncio.to_thread(recorder.close)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Live recorder flush failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "recorded": self.recorded,
+            "errors": self.errors,
+            "clamped": sum(r.clamped for r in self.recorders.values()),
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 2),
+            "symbols": {
+                symbol: {"rows": r.rows, "segments": len(r.segments), "clamped": r.clamped}
+                for symbol, r in self.recorders.items()
+            }
+        }
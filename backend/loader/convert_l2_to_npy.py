@@ -0,0 +1,51 @@
+"""
+Convert l2_clean.csv into memory-mapped .npy replay segments.
+
+Usage:
+    python loader/convert_l2_to_npy.py [--csv PATH] [--out DIR] [--segment-rows N]
+
+Then run the backend with REPLAY_SOURCE=<DIR> to replay without a database.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay_source import NpyReplaySource, convert_csv_to_npy  # noqa: E402
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an order book CSV to .npy replay segments")
+    parser.add_argument("--csv", default=os.path.join(DATASET_DIR, "l2_clean.csv"))
+    parser.add_argument("--out", default=os.path.join(DATASET_DIR, "l2_npy"))
+    parser.add_argument("--segment-rows", type=int, default=1_000_000)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"Converting {args.csv} -> {args.out} ...")
+    start = time.time()
+    manifest = convert_csv_to_npy(args.csv, args.out, args.segment_rows, args.chunksize)
+    print(f"Wrote {manifest['rows']} rows in {len(manifest['segments'])} segments "
+          f"({time.time() - start:.1f}s)")
+
+    # Verify the output maps back and report raw read throughput
+    source = NpyReplaySource(args.out)
+    start = time.time()
+    rows = 0
+    after_us = -2**62
+    while True:
+        block = source.read_after(after_us, 50_000)
+        if not len(block):
+            break
+        rows += len(block)
+        after_us = int(block.ts_us[-1])
+    elapsed = time.time() - start
+    print(f"Read back {rows} rows at {rows / max(elapsed, 1e-9):,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
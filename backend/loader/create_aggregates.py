@@ -0,0 +1,55 @@
+"""
+Create the per-second and per-minute continuous aggregates over l2_orderbook.
+
+Usage:
+    python loader/create_aggregates.py [--resolutions 1s,1m] [--refresh]
+
+--refresh materializes all existing rows once (needed after loading
+history; the refresh policies only maintain their recent window).
+Requires l2_orderbook to be a hypertable (loader/migrate_timescale.py).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from continuous_aggregates import RESOLUTIONS, ensure_aggregates  # noqa: E402
+from db import _get_db_config  # noqa: E402
+
+
+async def run(names, refresh):
+    conn = await asyncpg.connect(**_get_db_config(), command_timeout=None)
+    try:
+        start = time.time()
+        views = await ensure_aggregates(conn, names, refresh)
+        for view in views:
+            rows = await conn.fetchval(f"SELECT count(*) FROM {view}")
+            print(f"{view}: {rows:,} buckets")
+        print(f"Done in {time.time() - start:.1f}s")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create continuous aggregates for downsampled replay")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    parser.add_argument("--refresh", action="store_true", help="Materialize all existing data now")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.resolutions.split(",") if n.strip()]
+    unknown = [n for n in names if n not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"Unknown resolutions {unknown}; choose from {list(RESOLUTIONS)}")
+
+    load_dotenv()
+    asyncio.run(run(names, args.refresh))
+
+
+if __name__ == "__main__":
+    main()
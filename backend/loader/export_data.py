@@ -0,0 +1,82 @@
+"""
+Export order books, features, anomalies and strategy trades as Arrow or Parquet.
+
+Usage:
+    python loader/export_data.py --start 2024-03-01T00:00 --end 2024-03-02T00:00 \
+        [--datasets books,features,anomalies,trades] [--session SESSION_ID] \
+        [--format arrow|parquet] [--out DIR] [--chunk-rows N] [--trades-csv FILE ...]
+
+Writes DIR/<dataset>/part-NNNNN.arrow (or .parquet), one file per chunk.
+Interrupted runs resume from DIR/<dataset>/_progress.json when rerun with the
+same arguments. Load a dataset with
+    pyarrow.dataset.dataset("DIR/books", format="arrow").to_table()
+Trades come from the CSV reports in reports/ (by default those of --session).
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_export import DATASETS, DEFAULT_CHUNK_ROWS, FORMATS, TRADES, export_to_directory, read_trades_csv  # noqa: E402
+from db import _get_db_config  # noqa: E402
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset")
+
+
+async def run(args, datasets, trades):
+    conn = await asyncpg.connect(**_get_db_config(), command_timeout=None)
+    try:
+        for dataset in datasets:
+            start = time.time()
+            progress = await export_to_directory(
+                conn, args.out, dataset, args.start, args.end, args.session, args.format, args.chunk_rows,
+                trades=trades if dataset == TRADES else None, restart=args.restart
+            )
+            print(f"{dataset}: {progress['rows']:,} rows in {progress['parts']} parts ({time.time() - start:.1f}s)")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export typed data as Arrow IPC or Parquet")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True, help="Inclusive start")
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True, help="Exclusive end")
+    parser.add_argument("--datasets", default=",".join(DATASETS))
+    parser.add_argument("--session", help="Only features/anomalies/trades of this session (feature store source)")
+    parser.add_argument("--format", choices=tuple(FORMATS), default="arrow")
+    parser.add_argument("--out", default=os.path.join(DATASET_DIR, "export"))
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--trades-csv", nargs="*", help="Trade CSV reports (default: reports/trades_<session>_*.csv)")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing progress and start over")
+    args = parser.parse_args()
+
+    datasets = [d.strip() for d in args.datasets.split(",") if d.strip()]
+    unknown = [d for d in datasets if d not in DATASETS]
+    if unknown:
+        parser.error(f"Unknown datasets {unknown}; choose from {list(DATASETS)}")
+    if args.end <= args.start:
+        parser.error("--end must be after --start")
+
+    trades = None
+    if TRADES in datasets:
+        paths = args.trades_csv
+        if paths is None and args.session:
+            paths = sorted(glob.glob(os.path.join("reports", f"trades_{args.session}_*.csv")))
+        if not paths:
+            parser.error("trades needs --trades-csv files or a --session with CSV reports")
+        trades = read_trades_csv(paths)
+
+    load_dotenv()
+    asyncio.run(run(args, datasets, trades))
+
+
+if __name__ == "__main__":
+    main()
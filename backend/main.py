@@ -1,5 +1,6 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -9,15 +10,14 @@ import logging
 from typing import List
 import os
 from contextlib import asynccontextmanager
-import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
 from routers import auth
 from utils.database import Base, engine as db_engine
-from analytics_core import AnalyticsEngine, db_row_to_snapshot, MarketSimulator
-from db import get_connection, return_connection, close_all_connections, get_pool_stats, get_connection_pool
+from analytics_core import AnalyticsEngine, MarketSimulator
+from db import get_connection, return_connection, close_all_connections, get_pool_stats, get_connection_pool, _get_db_config
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 import threading
 import queue
@@ -31,11 +31,33 @@ import grpc
 from rpc_stubs import live_pb2, live_pb2_grpc
 
 from session_replay import SessionManager, UserSession
+from session_queue import BLOCK
 from utils.security import decode_access_token
 from utils.data import sanitize
-from typing import Dict
+from typing import Dict, Optional
 from snapshot_processor import SnapshotProcessor
+from live_pipeline import LivePipeline
+from replay_reader import PrefetchingReplayReader
+from replay_service import ReplayReaderService
+from replay_source import PostgresReplaySource, ReplaySource, open_replay_source
+from continuous_aggregates import RAW, fetch_bars, resolve
+from history_analytics import AUTO, fetch_history_analytics, parse_bucket
+from data_export import TRADES, ExportEncoder, iter_export, validate as validate_export
+from data_export import FORMATS as EXPORT_FORMATS, MEDIA_TYPES as EXPORT_MEDIA_TYPES
+from replay_checkpoints import Checkpoint
+from replay_blocks import datetime_to_unix_us
+from block_cache import BlockCache
+from adaptive_processor import AdaptiveProcessor, apply_profile_to_engine, drain_latest, session_tier_stats
+from worker_pool import ShardedAnalyticsPool
 from csv_service import csv_service
+from feature_store import FeatureStore
+from alert_log import fetch_alert_log
+from live_recorder import LiveRecorder
+from ring_store import SnapshotRing, timestamp_us
+from anomaly_index import AnomalyIndex
+from feature_query import parse_fields, query_features
+from replay_tail import TailListener, ensure_notify_trigger
+import asyncpg
 
 # Load environment variables from .env file
 load_dotenv()
@@ -49,8 +71,60 @@ CPP_ENGINE_PORT = int(os.getenv("CPP_ENGINE_PORT", "50051"))
 MAX_BUFFER_SIZE = int(os.getenv("MAX_BUFFER_SIZE", "100"))
 RAW_QUEUE_SIZE = int(os.getenv("RAW_QUEUE_SIZE", "2000"))
 PROCESSED_QUEUE_SIZE = int(os.getenv("PROCESSED_QUEUE_SIZE", "2000"))
-REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", "500"))
-BACKPRESSURE_THRESHOLD = int(os.getenv("BACKPRESSURE_THRESHOLD", "1500"))  # 75% of queue size
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", "500"))  # Initial size; adapts to consumption rate
+REPLAY_PREFETCH_DEPTH = int(os.getenv("REPLAY_PREFETCH_DEPTH", "2"))  # Batches fetched ahead of the cursor
+REPLAY_READER_CONCURRENCY = int(os.getenv("REPLAY_READER_CONCURRENCY", "4"))  # DB connections used by all replays
+
+# Shared block cache for replay/history reads (0 MB disables it)
+REPLAY_CACHE_MB = int(os.getenv("REPLAY_CACHE_MB", "256"))
+REPLAY_CACHE_BUCKET_SECONDS = int(os.getenv("REPLAY_CACHE_BUCKET_SECONDS", "60"))
+REPLAY_CACHE_RECENT_SECONDS = int(os.getenv("REPLAY_CACHE_RECENT_SECONDS", "300"))  # Never cache data this fresh
+HISTORY_MAX_ROWS = int(os.getenv("HISTORY_MAX_ROWS", "5000"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))  # Rows per chunk of /export streams
+
+# Where replay sessions read from: "postgres", an order book CSV, or a directory
+# of memory-mapped .npy segments (see loader/convert_l2_to_npy.py)
+REPLAY_SOURCE = os.getenv("REPLAY_SOURCE", "postgres")
+
+# Seek/rewind: engine checkpoints every N seconds of replayed data; without a
+# checkpoint inside the warm-up window, state is rebuilt from this many seconds
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "10"))
+
+# Exchange-time pacing waits at most this long for a gap in the recorded data
+REPLAY_MAX_GAP_SECONDS = float(os.getenv("REPLAY_MAX_GAP_SECONDS", "5"))
+SEEK_WARMUP_SECONDS = float(os.getenv("SEEK_WARMUP_SECONDS", "60"))
+
+# Tail replay: sessions at the newest row wait for l2_orderbook insert notifications
+REPLAY_TAIL_ENABLED = os.getenv("REPLAY_TAIL_ENABLED", "false").lower() == "true"
+REPLAY_TAIL_TRIGGER = os.getenv("REPLAY_TAIL_TRIGGER", "true").lower() == "true"  # Install the NOTIFY trigger at startup
+REPLAY_TAIL_DEBOUNCE_SECONDS = float(os.getenv("REPLAY_TAIL_DEBOUNCE_SECONDS", "0.05"))
+
+# Persist processed features and anomalies to TimescaleDB (COPY batches from a background task)
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "false").lower() == "true"
+FEATURE_STORE_BATCH_SIZE = int(os.getenv("FEATURE_STORE_BATCH_SIZE", "1000"))
+FEATURE_STORE_FLUSH_SECONDS = float(os.getenv("FEATURE_STORE_FLUSH_SECONDS", "1.0"))
+FEATURE_STORE_MAX_BUFFERED = int(os.getenv("FEATURE_STORE_MAX_BUFFERED", "50000"))  # Oldest rows dropped beyond this
+
+# Record every raw live snapshot to replayable per-symbol segments (empty = disabled)
+LIVE_RECORDER_DIR = os.getenv("LIVE_RECORDER_DIR", "")
+LIVE_RECORDER_SEGMENT_ROWS = int(os.getenv("LIVE_RECORDER_SEGMENT_ROWS", "100000"))
+LIVE_RECORDER_FLUSH_SECONDS = float(os.getenv("LIVE_RECORDER_FLUSH_SECONDS", "1.0"))
+LIVE_RECORDER_PROCESSED = os.getenv("LIVE_RECORDER_PROCESSED", "false").lower() == "true"
+
+# Replay rows allowed in flight between a replay producer and its analytics worker
+REPLAY_CREDITS = int(os.getenv("REPLAY_CREDITS", "64"))
+
+# Per-session queue bounds and live overflow policy (drop_oldest | conflate | block);
+# replay rows always block so none are lost
+SESSION_QUEUE_SIZE = int(os.getenv("SESSION_QUEUE_SIZE", "1000"))
+LIVE_QUEUE_POLICY = os.getenv("LIVE_QUEUE_POLICY", "conflate")
+
+# Multi-process analytics (0 = run analytics in the API process)
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "0"))
+ANALYTICS_WORKER_INFERENCE = os.getenv("ANALYTICS_WORKER_INFERENCE", "true").lower() == "true"
+
+# Per-snapshot processing budget that drives tiered degradation
+ADAPTIVE_BUDGET_MS = float(os.getenv("ADAPTIVE_BUDGET_MS", "100"))
 
 engine_mode = "unknown"  # Track which engine is active: "cpp", "python", or "unavailable"
 
@@ -136,7 +210,10 @@ class MetricsCollector:
             "cpp_samples": len(self.cpp_latency),
             "python_samples": len(self.py_latency),
             "performance_improvement": f"{(py_avg / cpp_avg):.1f}x" if cpp_avg > 0 and py_avg > 0 else "N/A",
-            "adaptive_processor": adaptive_processor.get_stats()  # Add adaptive processing stats
+            "adaptive_processor": adaptive_processor.get_stats(),  # Add adaptive processing stats
+            "session_tiers": session_tier_stats({sid: s.adaptive for sid, s in list(session_manager.sessions.items())}),
+            "live_pipeline": live_pipeline.get_stats(),
+            "analytics_pool": analytics_pool.get_stats() if analytics_pool else None
         }
 
 metrics = MetricsCollector()
@@ -164,6 +241,50 @@ async def lifespan(app: FastAPI):
     # Initialize C++ engine
     initialize_cpp_engine()
 
+    # Start the feature store writers (needs the async pool)
+    global feature_store
+    if FEATURE_STORE_ENABLED:
+        store = FeatureStore(
+            batch_size=FEATURE_STORE_BATCH_SIZE,
+            flush_interval=FEATURE_STORE_FLUSH_SECONDS,
+            max_buffered=FEATURE_STORE_MAX_BUFFERED
+        )
+        try:
+            await store.start()
+            feature_store = store
+        except Exception as e:
+            logger.error(f"Feature store disabled: {e}")
+
+    if live_recorder:
+        live_recorder.start()
+
+    # Tail replay needs the Postgres source and a dedicated LISTEN connection
+    global tail_listener
+    if REPLAY_TAIL_ENABLED and replay_source.kind == "postgres":
+        if REPLAY_TAIL_TRIGGER:
+            conn = None
+            try:
+                conn = await get_connection()
+                await ensure_notify_trigger(conn)
+            except Exception as e:
+                logger.warning(f"Insert trigger not installed (loader notifications still work): {e}")
+            finally:
+                if conn is not None:
+                    await return_connection(conn)
+        db_config = _get_db_config()
+        tail_listener = TailListener(
+            lambda: asyncpg.connect(**db_config),
+            debounce=REPLAY_TAIL_DEBOUNCE_SECONDS,
+            on_insert=invalidate_replay_cache
+        )
+        tail_listener.start()
+
+    # Start sharded analytics workers (multi-process mode)
+    if analytics_pool:
+        analytics_pool.start()
+        if USE_CPP_ENGINE:
+            logger.warning("Analytics workers run the Python engine; the C++ engine only serves in-process analytics")
+
     # Start Live Data Dispatcher
     asyncio.create_task(live_data_dispatcher())
     asyncio.create_task(live_grpc_loop())
@@ -173,6 +294,8 @@ async def lifespan(app: FastAPI):
         while True:
             await asyncio.sleep(300)  # Every 5 minutes
             await session_manager.cleanup_inactive_sessions()
+            for session_id in set(session_processors) - set(session_manager.sessions):
+                release_session_analytics(session_id)
     
     cleanup_task = asyncio.create_task(cleanup_sessions_periodically())
     
@@ -190,6 +313,19 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
     
+    if analytics_pool:
+        analytics_pool.stop()
+
+    if feature_store:
+        await feature_store.stop()
+
+
+    if live_recorder:
+        await live_recorder.stop()
+
+    if tail_listener:
+        await tail_listener.stop()
+    
     try:
         # Close database connections
         await asyncio.wait_for(close_all_connections(), timeout=3.0)
@@ -233,7 +369,13 @@ app.include_router(auth.router)
 # --------------------------------------------------
 engine = AnalyticsEngine()
 cpp_client = None  # Lazy initialization
-session_manager = SessionManager()
+session_manager = SessionManager(
+    queue_size=SESSION_QUEUE_SIZE,
+    replay_credits=REPLAY_CREDITS,
+    checkpoint_interval=CHECKPOINT_INTERVAL_SECONDS,
+    max_gap_seconds=REPLAY_MAX_GAP_SECONDS,
+    adaptive_budget_ms=ADAPTIVE_BUDGET_MS
+)
 
 # Model Inference
 from inference_service import ModelInference
@@ -273,6 +415,9 @@ def initialize_cpp_engine():
             cpp_client = temp_client
             engine_mode = "cpp"
             snapshot_processor.set_cpp_client(cpp_client)
+            for processor in session_processors.values():
+                processor.set_cpp_client(cpp_client)
+            live_pipeline.set_cpp_client(cpp_client)
             return True
             
         except grpc.RpcError as e:
@@ -293,17 +438,91 @@ snapshot_processor = SnapshotProcessor(
     max_failures=5
 )
 
+# Shared replay I/O: short-lived connections per batch, coalesced across sessions,
+# with cold time buckets served from memory after the first read
+replay_cache = BlockCache(REPLAY_CACHE_MB * 1024 * 1024) if REPLAY_CACHE_MB > 0 else None
+replay_service = ReplayReaderService(
+    max_concurrent_queries=REPLAY_READER_CONCURRENCY,
+    cache=replay_cache,
+    bucket_seconds=REPLAY_CACHE_BUCKET_SECONDS,
+    recent_seconds=REPLAY_CACHE_RECENT_SECONDS
+)
+replay_source = open_replay_source(REPLAY_SOURCE, replay_service)
+
+# Downsampled replay reads the continuous aggregates (loader/create_aggregates.py),
+# which expose their closing books like l2_orderbook rows; opened on first use
+replay_sources = {RAW: replay_source}
+
+
+def get_replay_source(resolution: str = RAW) -> ReplaySource:
+    """Replay source for a resolution; ValueError if unknown or not backed by Postgres."""
+    if resolution == RAW and replay_source.kind == "npy":
+        # Reopened when the manifest changes, e.g. after the live recorder adds a segment
+        replay_sources[RAW] = open_replay_source(REPLAY_SOURCE)
+    if resolution not in replay_sources:
+        aggregate = resolve(resolution)
+        if replay_source.kind != "postgres":
+            raise ValueError(f"Resolution '{resolution}' needs the postgres replay source")
+        replay_sources[resolution] = PostgresReplaySource(ReplayReaderService(
+            max_concurrent_queries=REPLAY_READER_CONCURRENCY,
+            table=aggregate.view,
+            cache=replay_cache,  # Keyed by table, so resolutions share the byte budget
+            bucket_seconds=aggregate.cache_bucket_seconds,
+            recent_seconds=REPLAY_CACHE_RECENT_SECONDS
+        ))
+    return replay_sources[resolution]
+
+
+def invalidate_replay_cache(first_us: int, last_us: int):
+    """Drop cached replay buckets (every resolution) that rows inserted in this range made stale."""
+    for source in replay_sources.values():
+        if isinstance(source, PostgresReplaySource):
+            source.service.invalidate_range(first_us, last_us)
+
+# LISTEN connection for tailing sessions; None unless REPLAY_TAIL_ENABLED (started in lifespan)
+tail_listener = None
+
+# Optional feature store; None until started in lifespan (or when disabled)
+feature_store = None
+
+live_recorder = (
+    LiveRecorder(
+        LIVE_RECORDER_DIR,
+        segment_rows=LIVE_RECORDER_SEGMENT_ROWS,
+        flush_interval=LIVE_RECORDER_FLUSH_SECONDS,
+        record_processed=LIVE_RECORDER_PROCESSED
+    )
+    if LIVE_RECORDER_DIR else None
+)
 
-data_buffer: List[dict] = []
+# Sharded worker processes own the analytics engines when ANALYTICS_WORKERS > 0
+analytics_pool = (
+    ShardedAnalyticsPool(ANALYTICS_WORKERS, enable_inference=ANALYTICS_WORKER_INFERENCE)
+    if ANALYTICS_WORKERS > 0 else None
+)
+
+# Shared LIVE pipeline: analytics + inference once per tick, fanned out to sessions
+live_pipeline = LivePipeline(
+    inference_engine=None if analytics_pool and ANALYTICS_WORKER_INFERENCE else inference_engine,
+    max_failures=5,
+    pool=analytics_pool
+)
+
+
+# Recent processed snapshots for the dashboard APIs (columnar ring, O(1) trimming)
+data_buffer = SnapshotRing(MAX_BUFFER_SIZE)
+# Anomalies of the buffered snapshots, indexed on insert for the anomaly endpoints
+anomaly_index = AnomalyIndex(MAX_BUFFER_SIZE)
 simulation_queue = queue.Queue()
 MODE = "REPLAY"  # REPLAY | LIVE | SIMULATION
 ACTIVE_SOURCE = None   # e.g. "BINANCE"
 ACTIVE_SYMBOL = None   # e.g. "BTCUSDT"
 
-# --------------------------------------------------
-# DB Replay Buffer (LATENCY FIX #1)
-# --------------------------------------------------
-replay_buffer = deque()
+
+def buffer_snapshot(snapshot: dict):
+    """Append to the dashboard buffer and index its anomalies."""
+    data_buffer.append(snapshot)
+    anomaly_index.add(snapshot)
 
 # --------------------------------------------------
 # Analytics Worker (LATENCY FIX #2)
@@ -311,62 +530,38 @@ replay_buffer = deque()
 raw_snapshot_queue = queue.Queue(maxsize=RAW_QUEUE_SIZE)
 processed_snapshot_queue = queue.Queue(maxsize=PROCESSED_QUEUE_SIZE)
 
-class AdaptiveProcessor:
-    """Adaptive analytics processor that handles slow engines gracefully"""
-    def __init__(self):
-        self.processing_times = []
-        self.slow_processing_threshold = 100  # ms
-        self.adaptive_mode = False
-        self.skip_counter = 0
-        self.skip_ratio = 1  # Process every Nth snapshot when adaptive
-        
-    def should_process(self, snapshot):
-        """Decide if snapshot should be processed based on system load"""
-        if not self.adaptive_mode:
-            return True
-            
-        # In adaptive mode, skip some snapshots to catch up
-        self.skip_counter += 1
-        if self.skip_counter >= self.skip_ratio:
-            self.skip_counter = 0
-            return True
-        return False
-    
-    def record_processing_time(self, processing_time_ms):
-        """Record processing time and adjust adaptive mode"""
-        self.processing_times.append(processing_time_ms)
-        
-        # Keep only recent samples
-        if len(self.processing_times) > 20:
-            self.processing_times.pop(0)
-        
-        # Calculate average processing time
-        if len(self.processing_times) >= 5:
-            avg_time = sum(self.processing_times[-5:]) / 5
-            
-            # Enter adaptive mode if processing is consistently slow
-            if avg_time > self.slow_processing_threshold and not self.adaptive_mode:
-                self.adaptive_mode = True
-                self.skip_ratio = min(3, int(avg_time / 50))  # Skip more for slower processing
-                logger.warning(f"Entering adaptive processing mode - skipping {self.skip_ratio-1}/{self.skip_ratio} snapshots")
-            
-            # Exit adaptive mode if processing speeds up
-            elif avg_time < self.slow_processing_threshold * 0.7 and self.adaptive_mode:
-                self.adaptive_mode = False
-                self.skip_counter = 0
-                logger.info("Exiting adaptive processing mode - processing speed recovered")
-    
-    def get_stats(self):
-        """Get adaptive processor statistics"""
-        avg_time = sum(self.processing_times) / len(self.processing_times) if self.processing_times else 0
-        return {
-            "adaptive_mode": self.adaptive_mode,
-            "skip_ratio": self.skip_ratio if self.adaptive_mode else 1,
-            "avg_processing_time_ms": round(avg_time, 2),
-            "recent_samples": len(self.processing_times)
-        }
+# Tiered load shedding: clustering/detectors -> inference rate -> conflation.
+# This instance tracks live ticks; each replay session has its own (session.adaptive)
+adaptive_processor = AdaptiveProcessor(budget_ms=ADAPTIVE_BUDGET_MS)
+adaptive_processor.add_listener(live_pipeline.apply_profile)
+
+
+# Without the worker pool each replay session still gets its own engine, keyed by
+# session id like the pool's workers, so checkpoints and seek restore only that session
+session_processors: Dict[str, SnapshotProcessor] = {}
+
+
+def get_session_processor(session_id: str) -> SnapshotProcessor:
+    processor = session_processors.get(session_id)
+    if processor is None:
+        processor = SnapshotProcessor(cpp_client=cpp_client, analytics_engine=AnalyticsEngine(), max_failures=5)
+        session_processors[session_id] = processor
+    return processor
+
+
+def release_session_analytics(session_id: str):
+    """Drop the engine state held for a session (in process or in its worker)."""
+    session_processors.pop(session_id, None)
+    if analytics_pool:
+        analytics_pool.release(session_id)
 
-adaptive_processor = AdaptiveProcessor()
+
+def apply_session_profile(session_id: str, profile: dict):
+    """Push a session's tier to its own engine and inference rate."""
+    if inference_engine:
+        inference_engine.set_interval_scale(session_id, profile["inference_interval_scale"])
+    if analytics_pool:
+        analytics_pool.set_profile(session_id, profile)
 
 
 # --------------------------------------------------
@@ -393,6 +588,7 @@ class ConnectionManager:
             # Cleanup inference buffers for this session
             if inference_engine:
                 inference_engine.cleanup_session(session_id)
+            release_session_analytics(session_id)
             
             logger.info(f"WebSocket disconnected for session {session_id}")
 
@@ -436,6 +632,7 @@ async def session_analytics_worker_async(session: UserSession):
     
     consecutive_cpp_failures = 0
     MAX_CPP_FAILURES = 5
+    session.adaptive.add_listener(lambda profile: apply_session_profile(session.session_id, profile))
 
     while session.is_active():
         try:
@@ -449,30 +646,70 @@ async def session_analytics_worker_async(session: UserSession):
             if snapshot is None:
                 continue
 
-            # Process using snapshot processor service
-            processed, processing_time, used_engine, consecutive_cpp_failures = snapshot_processor.process(
-                snapshot, consecutive_cpp_failures
-            )
+            try:
+                inference_ms = 0.0
+                if analytics_pool:
+                    # Analytics (and inference) run in the worker process owning this session
+                    processed, processing_time, used_engine = await analytics_pool.process(
+                        session.session_id, snapshot
+                    )
+                    prediction = processed.get('prediction')
+                    if prediction is None and not ANALYTICS_WORKER_INFERENCE:
+                        inference_start = time.time()
+                        prediction = inference_engine.predict(session.session_id, snapshot)
+                        inference_ms = (time.time() - inference_start) * 1000
+                    stage_costs = {"analytics": processing_time}
+                else:
+                    # This session's own engine, run at this session's tier
+                    processor = get_session_processor(session.session_id)
+                    apply_profile_to_engine(processor.analytics_engine, session.adaptive.profile)
+                    processed, processing_time, used_engine, consecutive_cpp_failures = processor.process(
+                        snapshot, consecutive_cpp_failures
+                    )
+                
+                    stage_costs = {"analytics": processing_time}
+                    if used_engine == "python":
+                        stage_costs.update(processor.analytics_engine.last_stage_ms)
+                
+                    # === MODEL PREDICTION ===
+                    inference_start = time.time()
+                    prediction = inference_engine.predict(session.session_id, snapshot)
+                    inference_ms = (time.time() - inference_start) * 1000
 
-            processed["engine"] = used_engine
+                processed["engine"] = used_engine
             
-            # === MODEL PREDICTION ===
-            prediction = inference_engine.predict(session.session_id, snapshot)
-            if prediction:
-                processed['prediction'] = prediction
+                if prediction:
+                    processed['prediction'] = prediction
                 
-                # === STRATEGY ENGINE ===
-                # Get strategy for this session
-                strategy = strategy_manager.get_or_create(session.session_id)
-                strategy_update = strategy.process_signal(prediction, snapshot)
-                if strategy_update:
-                    processed['strategy'] = strategy_update
+                    # === STRATEGY ENGINE ===
+                    # Get strategy for this session
+                    strategy = strategy_manager.get_or_create(session.session_id)
+                    strategy_update = strategy.process_signal(prediction, snapshot)
+                    if strategy_update:
+                        processed['strategy'] = strategy_update
+                
+                # Right after this row's analytics, so the checkpoint matches it exactly
+                await capture_checkpoint(session, snapshot)
+
+                if feature_store:
+                    feature_store.record(session.session_id, processed)
             
-            # Also update global buffer for backward compatibility
-            data_buffer.append(processed)
+                # Also update global buffer for backward compatibility
+                buffer_snapshot(processed)
             
-            session.processed_snapshot_queue.put((processed, processing_time))
-            metrics.record_engine_latency(used_engine.replace("_fallback", ""), processing_time)
+                await session.processed_snapshot_queue.put((processed, processing_time))
+                metrics.record_engine_latency(used_engine.replace("_fallback", ""), processing_time)
+                
+                stage_costs["inference"] = inference_ms
+                session.adaptive.record(
+                    processing_time + inference_ms,
+                    queue_depth=session.raw_snapshot_queue.qsize(),
+                    queue_capacity=session.raw_snapshot_queue.maxsize,
+                    stage_costs=stage_costs
+                )
+            finally:
+                # Return the replay producer's credit once this row has left analytics
+                session.replay_credits.release()
 
         except queue.Empty:
             await asyncio.sleep(0.01)
@@ -483,91 +720,159 @@ async def session_analytics_worker_async(session: UserSession):
 
     logger.info(f"Async analytics worker stopped for session {session.session_id}")
 
-# Backward compatibility: Legacy threaded worker (deprecated)
+# --------------------------------------------------
+# Replay Checkpoints and Seek
+# --------------------------------------------------
+async def capture_checkpoint(session: UserSession, snapshot: dict):
+    """Checkpoint engine and strategy state after a replayed row, once per interval."""
+    ts = snapshot.get("timestamp")
+    if not isinstance(ts, datetime) or not session.checkpoints.due(ts):
+        return  # Live and ModelTest rows carry no replay timestamp
+    
+    if analytics_pool:
+        engine_state = await analytics_pool.checkpoint(session.session_id)
+    else:
+        engine_state = get_session_processor(session.session_id).analytics_engine.get_state()
+    strategy = strategy_manager.strategies.get(session.session_id)
+    session.checkpoints.add(Checkpoint(ts, engine_state, strategy.get_state() if strategy else None))
+
+
+async def restore_for_seek(session: UserSession, target: datetime):
+    """
+    Restore analytics to their state at `target`: load the nearest checkpoint
+    (or fresh state for the warm-up window) and fast-forward through the rows
+    up to and including `target` without inference or broadcasting.
+    The session's engine lives in its worker process with the pool, otherwise
+    in this process (session_processors); either way no other session's state
+    is touched.
+    """
+    start = time.time()
+    checkpoint = session.checkpoints.nearest(target)
+    warm_from = target - timedelta(seconds=SEEK_WARMUP_SECONDS)
+    if checkpoint is not None and checkpoint.ts >= warm_from:
+        engine_state, after_ts = checkpoint.engine_state, checkpoint.ts
+    else:
+        engine_state, after_ts = None, warm_from
+    
+    # Batch path: whole blocks from the replay source, cut at the target
+    snapshots = []
+    target_us = datetime_to_unix_us(target)
+    while True:
+        block = await get_replay_source(session.resolution).fetch(after_ts, REPLAY_BATCH_SIZE)
+        end = int(np.searchsorted(block.ts_us, target_us, side="right"))
+        snapshots.extend(block.snapshot(i) for i in range(end))
+        if len(block) == 0 or end < len(block):
+            break  # Out of rows, or the target lies inside this block
+        after_ts = block.timestamp(end - 1)
+    
+    if analytics_pool:
+        await analytics_pool.restore(session.session_id, engine_state, snapshots)
+    else:
+        engine = get_session_processor(session.session_id).analytics_engine
+        engine.set_state(engine_state)
+        for snapshot in snapshots:
+            engine.process_snapshot(snapshot)
+    if not (analytics_pool and ANALYTICS_WORKER_INFERENCE):
+        inference_engine.prime_session(session.session_id, snapshots)
+    
+    if checkpoint is not None and checkpoint.strategy_state is not None:
+        strategy_manager.get_or_create(session.session_id).set_state(checkpoint.strategy_state)
+    
+    session.checkpoints.restores += 1
+    session.last_seek = {
+        "target": target.isoformat(),
+        "checkpoint": checkpoint.ts.isoformat() if engine_state is not None else None,
+        "fast_forward_rows": len(snapshots),
+        "duration_ms": round((time.time() - start) * 1000, 2)
+    }
+    logger.info(f"Session {session.session_id}: Seek restored {session.last_seek}")
+
+
 # --------------------------------------------------
 # Session Replay Loop
 # --------------------------------------------------
+async def pace_replay(session: UserSession, base_delay: Optional[float] = None, ts=None,
+                      fixed_delay: Optional[float] = None):
+    """
+    Sleep between replayed rows according to the session's pacing.
+    Exchange pacing follows the rows' recorded timestamps; at max speed the
+    producer only yields and replay_credits alone limit its rate.
+    """
+    await session.pacer.wait(ts, base_delay, fixed_delay)
+
+
 async def session_replay_loop(session: UserSession):
     """Replay loop for individual session."""
     logger.info(f"Starting replay loop for session {session.session_id}")
     
-    conn = None
     try:
-        conn = await get_connection()
-        
-        QUERY_BATCH = """
-            SELECT *
-            FROM l2_orderbook
-            WHERE ts > $1
-            ORDER BY ts
-            LIMIT $2
-        """
-        
         consecutive_errors = 0
         max_consecutive_errors = 5
         
         while session.is_active():
             try:
+                if session.pending_seek is not None:
+                    target, session.pending_seek = session.pending_seek, None
+                    await restore_for_seek(session, target)
+                    continue
+                
                 if session.state != "PLAYING":
                     await asyncio.sleep(0.1)
                     continue
                 
-                # Refill buffer if empty
-                if not session.replay_buffer:
-                    last_ts = session.cursor_ts or datetime.min
-                    
-                    try:
-                        rows = await conn.fetch(QUERY_BATCH, last_ts, REPLAY_BATCH_SIZE)
-                    except Exception as db_err:
-                        logger.error(f"Session {session.session_id} DB error: {db_err}")
-                        consecutive_errors += 1
-                        
-                        if consecutive_errors >= max_consecutive_errors:
-                            logger.error(f"Session {session.session_id}: Too many DB errors")
-                            break
-                        
-                        await asyncio.sleep(1.0)
+                # (Re)open the prefetching reader at the cursor after start, seek or stop
+                if session.replay_reader is None:
+                    if session.tail_waiting:
+                        # Caught up: query again only after an insert notification
+                        if await tail_listener.wait(session.tail_version, 1.0):
+                            session.tail_waiting = False
                         continue
-                    
-                    if not rows:
-                        logger.info(f"Session {session.session_id}: Replay finished")
-                        session.stop()
-                        continue
-                    
-                    consecutive_errors = 0
-                    
-                    for r in rows:
-                        session.replay_buffer.append(dict(r))
+                    source = get_replay_source(session.resolution)
+                    session.tail_version = tail_listener.version if tail_listener else 0
+                    session.replay_reader = PrefetchingReplayReader(
+                        source.fetch_tail if session.tail_following else source.fetch,
+                        session.cursor_ts or datetime.min,
+                        batch_size=REPLAY_BATCH_SIZE,
+                        prefetch_depth=REPLAY_PREFETCH_DEPTH,
+                        end_ts=lambda block: block.last_ts
+                    )
+                reader = session.replay_reader
                 
-                # Pop next row
-                row = session.replay_buffer.popleft()
-                session.cursor_ts = row["ts"]
+                snapshot = await reader.next_row()
+                if reader.closed:
+                    continue  # Seek or stop while waiting; discard the stale row
                 
-                snapshot = db_row_to_snapshot(row)
+                if snapshot is None:
+                    if session.tail and tail_listener:
+                        session.reset_reader()
+                        session.tail_waiting = session.tail_following = True
+                        continue
+                    logger.info(f"Session {session.session_id}: Replay finished")
+                    session.stop()
+                    continue
+                
+                session.cursor_ts = snapshot["timestamp"]
                 
                 # Process snapshot
                 try:
-                    # Backpressure handling: check queue size before pushing
-                    queue_size = session.raw_snapshot_queue.qsize()
-                    if queue_size > BACKPRESSURE_THRESHOLD:
-                        logger.warning(f"Session {session.session_id}: High backpressure ({queue_size}/{RAW_QUEUE_SIZE}), skipping snapshot")
-                        metrics.record_error("queue_backpressure")
-                        await asyncio.sleep(0.5)  # Slow down replay
-                        continue
-                    
-                    session.raw_snapshot_queue.put_nowait(snapshot)
+                    # Credit-based backpressure: wait until analytics has room
+                    # rather than skipping rows when it falls behind
+                    await session.replay_credits.acquire()
+                    await session.raw_snapshot_queue.put(snapshot)
                     consecutive_errors = 0  # Reset on success
                 except queue.Full:
+                    session.replay_credits.release()
                     logger.warning(f"Session {session.session_id}: Queue full, dropping snapshot")
                     metrics.record_error("queue_full")
                     consecutive_errors += 1
                 
                 # Replay speed
-                await asyncio.sleep(0.25 / session.speed)
+                await pace_replay(session, 0.25, snapshot["timestamp"])
             
             except Exception as e:
                 logger.error(f"Session {session.session_id} loop error: {e}")
                 consecutive_errors += 1
+                session.reset_reader()  # Reopen at the cursor on the next pass
                 
                 if consecutive_errors >= max_consecutive_errors:
                     break
@@ -575,8 +880,7 @@ async def session_replay_loop(session: UserSession):
                 await asyncio.sleep(0.5)
     
     finally:
-        if conn:
-            await return_connection(conn)
+        session.reset_reader()
 
 
 # --------------------------------------------------
@@ -615,110 +919,42 @@ async def session_broadcast_loop(session: UserSession):
 # --------------------------------------------------
 async def session_csv_replay_loop(session: UserSession, csv_path: str):
     """Streams data from CSV for a specific session."""
-    print(f"DEBUG: Starting CSV replay for session {session.session_id} from {csv_path}")
     logger.info(f"Starting CSV replay for session {session.session_id} from {csv_path}")
     
     try:
         # Check if file exists
         if not os.path.exists(csv_path):
-             print(f"DEBUG: ERROR - File not found: {csv_path}")
-             logger.error(f"File not found: {csv_path}")
-             return
-
-        # Use pandas for easy chunk reading
-        chunk_size = 1000
-        print(f"DEBUG: Reading CSV chunks...")
-        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
-            print(f"DEBUG: Processing chunk of size {len(chunk)}")
-            if not session.is_active():
-                print("DEBUG: Session not active, breaking")
-                break
-                
-            # Convert chunk to dict records
-            records = chunk.to_dict('records')
-            
-            for row in records:
-                if not session.is_active():
+            logger.error(f"File not found: {csv_path}")
+            return
+
+        # Parsed once into arrays and shared by every ModelTest session
+        source = await asyncio.to_thread(open_replay_source, csv_path)
+        reader = PrefetchingReplayReader(
+            source.fetch,
+            datetime.min,
+            batch_size=REPLAY_BATCH_SIZE,
+            prefetch_depth=REPLAY_PREFETCH_DEPTH,
+            end_ts=lambda block: block.last_ts
+        )
+        
+        try:
+            while session.is_active():
+                snapshot = await reader.next_row()
+                if snapshot is None:
                     break
-                    
-                # Map CSV columns to snapshot format
-                # Assuming l2_clean.csv format: 
-                # [exchange_ts, receive_ts, bid1, vol1, ..., mid_price]
-                # We need to construct the snapshot carefully.
-                # Actually, data_loader.py logic handles this mapping usually.
-                # Let's align with what DataHandler does or simple mapping.
-                
-                # Simple mapping for visualization:
-                # 40 columns are features. 
-                # 0-20: Bids (Price, Vol) x 10
-                # 20-40: Asks (Price, Vol) x 10
-                
-                # Check columns to decide mapping
-                # If unnamed columns, we might need to assume indices.
-                # Let's assume standard LOB format.
-                
-                # Construct snapshot with safer column handling
-                snapshot = {
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "symbol": "BTCUSDT",
-                    "bids": [],
-                    "asks": [],
-                    "mid_price": 0.0
-                }
-                
-                # Try to use column names if available, fallback to positional
-                try:
-                    # Check if we have named columns (safer approach)
-                    if any(col.startswith('bid_price') for col in row.keys()):
-                        # Use named columns
-                        for i in range(1, 11):
-                            bid_price_col = f'bid_price_{i}'
-                            bid_vol_col = f'bid_volume_{i}'
-                            if bid_price_col in row and bid_vol_col in row:
-                                snapshot['bids'].append([float(row[bid_price_col]), float(row[bid_vol_col])])
-                        for i in range(1, 11):
-                            ask_price_col = f'ask_price_{i}'
-                            ask_vol_col = f'ask_volume_{i}'
-                            if ask_price_col in row and ask_vol_col in row:
-                                snapshot['asks'].append([float(row[ask_price_col]), float(row[ask_vol_col])])
-                    else:
-                        # Fallback to positional indexing
-                        vals = list(row.values())
-                        start_idx = 1 if "Unnamed: 0" in row else 0
-                        features = vals[start_idx:start_idx+40] if len(vals) >= start_idx + 40 else vals[start_idx:]
-                        
-                        if len(features) < 40:
-                            logger.warning(f"Insufficient features in CSV row: {len(features)}/40")
-                            continue
-                        
-                        current_bids = []
-                        current_asks = []
-                        
-                        for i in range(0, 20, 2):
-                            if i+1 < len(features):
-                                current_bids.append([float(features[i]), float(features[i+1])])
-                        
-                        for i in range(20, 40, 2):
-                            if i+1 < len(features):
-                                current_asks.append([float(features[i]), float(features[i+1])])
-                        
-                        snapshot["bids"] = current_bids
-                        snapshot["asks"] = current_asks
                 
-                    # Calc mid price from top levels
-                    if snapshot["bids"] and snapshot["asks"]:
-                        snapshot["mid_price"] = (snapshot["bids"][0][0] + snapshot["asks"][0][0]) / 2
-                    
-                except (ValueError, KeyError, IndexError) as e:
-                    logger.error(f"CSV parsing error: {e}")
-                    continue
+                # ModelTest charts run on wall-clock time
+                data_ts = snapshot["timestamp"]
+                snapshot["timestamp"] = datetime.utcnow().isoformat()
+                snapshot["symbol"] = "BTCUSDT"
                 
-                try:
-                    session.raw_snapshot_queue.put_nowait(snapshot)
-                except queue.Full:
-                    await asyncio.sleep(0.01)
+                await session.replay_credits.acquire()
+                await session.raw_snapshot_queue.put(snapshot)
                     
-                await asyncio.sleep(0.1) # Throttled playback speed
+                # Fixed 10 rows/s in fixed mode, whatever the session speed
+                await pace_replay(session, ts=data_ts, fixed_delay=0.1)
+        finally:
+            reader.close()
                 
     except Exception as e:
         logger.error(f"CSV Replay Error: {e}")
@@ -735,9 +971,7 @@ async def broadcast_loop():
             while not simulation_queue.empty():
                 snapshot = simulation_queue.get_nowait()
                 
-                data_buffer.append(snapshot)
-                if len(data_buffer) > MAX_BUFFER:
-                    data_buffer.pop(0)
+                buffer_snapshot(snapshot)
                 
                 msg = {**snapshot, "type": "snapshot"}
                 await manager.broadcast(msg)
@@ -754,13 +988,7 @@ async def processed_broadcast_loop():
             while not processed_snapshot_queue.empty():
                 processed, processing_time = processed_snapshot_queue.get_nowait()
 
-                data_buffer.append(processed)
-                if len(data_buffer) > MAX_BUFFER:
-                    data_buffer.pop(0)
-
-                # Trim buffer if exceeds max size
-                if len(data_buffer) > MAX_BUFFER_SIZE:
-                    data_buffer.pop(0)
+                buffer_snapshot(processed)
 
                 msg = {**processed, "type": "snapshot"}
                 await manager.broadcast(msg)
@@ -788,10 +1016,6 @@ def analytics_worker():
             if snapshot is None:
                 continue
 
-            # Check if we should process this snapshot (adaptive mode)
-            if not adaptive_processor.should_process(snapshot):
-                continue  # Skip processing to catch up
-
             # Process using snapshot processor service
             processed, processing_time, used_engine, consecutive_cpp_failures = snapshot_processor.process(
                 snapshot, consecutive_cpp_failures
@@ -818,8 +1042,9 @@ def analytics_worker():
 # live ingestion
 async def live_data_dispatcher():
     """
-    Dispatcher to broadcast live data from global queue to all active session queues.
-    This bridges the gap between singleton ingestion and per-session workers.
+    Dispatcher that processes each live snapshot once and fans the result out.
+    Analytics and inference run per symbol; sessions only receive the shared
+    processed tick plus their own strategy update.
     """
     logger.info("Starting live data dispatcher...")
     while True:
@@ -827,32 +1052,45 @@ async def live_data_dispatcher():
             # Get snapshot from global queue
             try:
                 snapshot = raw_snapshot_queue.get_nowait()
-                if "timestamp" in snapshot:
-                    # logger.debug(f"DEBUG DISPATCHER: Got snapshot with timestamp: {snapshot['timestamp']}")
-                    pass
             except queue.Empty:
                 await asyncio.sleep(0.005) # 5ms poll
                 continue
-                
-            # Broadcast to all active sessions
-            active_count = 0
-            # Snapshot list of sessions to avoid runtime modification issues
-            current_sessions = list(session_manager.sessions.values())
-            
-            for session in current_sessions:
-                if session.is_active():
-                    try:
-                        session.raw_snapshot_queue.put_nowait(snapshot)
-                        active_count += 1
-                    except queue.Full:
-                        pass # Drop if full to prevent blocking
-            
-            # Also update global buffer for /features API
-            if len(data_buffer) >= MAX_BUFFER_SIZE:
-                data_buffer.pop(0)
-            data_buffer.append(snapshot)
-            
+
+            snapshots = [snapshot]
+            if adaptive_processor.profile["conflate"]:
+                # Last-resort tier: analyse only the newest tick per symbol
+                snapshots, superseded = drain_latest(raw_snapshot_queue, snapshot)
+                adaptive_processor.record_conflated(superseded)
+
+            for snapshot in snapshots:
+                # Process once for all viewers of this symbol
+                processed, processing_time, used_engine = await live_pipeline.process_async(snapshot)
+                metrics.record_engine_latency(used_engine.replace("_fallback", ""), processing_time)
+
+                # Snapshot list of sessions to avoid runtime modification issues
+                current_sessions = list(session_manager.sessions.values())
+                live_pipeline.fan_out(processed, snapshot, processing_time, current_sessions, strategy_manager)
+
+                if feature_store:
+                    feature_store.record(f"live:{snapshot.get('symbol') or 'UNKNOWN'}", processed)
+                if live_recorder:
+                    live_recorder.record_processed(snapshot, processed)
+
+                # Also update global buffer for /features API
+                buffer_snapshot(processed)
+
+                stage_costs = {"analytics": processing_time}
+                if used_engine == "python":
+                    stage_costs.update(live_pipeline.stage_costs(snapshot.get("symbol") or "UNKNOWN"))
+                adaptive_processor.record(
+                    processing_time + stage_costs.get("inference", 0.0),
+                    queue_depth=raw_snapshot_queue.qsize(),
+                    queue_capacity=RAW_QUEUE_SIZE,
+                    stage_costs=stage_costs
+                )
+
         except Exception as e:
+            metrics.record_error("live_dispatcher_error")
             logger.error(f"Live data dispatcher error: {e}")
             await asyncio.sleep(1)
 
@@ -893,7 +1131,9 @@ async def live_grpc_loop():
                     }
                     # logger.debug(f"DEBUG LIVE_GRPC: Generated timestamp: {snapshot['timestamp']}")
 
-
+                    # Record before queueing: the dispatcher may conflate snapshots away
+                    if live_recorder:
+                        live_recorder.record(snapshot)
 
                     try:
                         raw_snapshot_queue.put_nowait(snapshot)
@@ -1163,7 +1403,10 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     # Get or create session
     session = await session_manager.get_session(session_id)
     if not session:
-        session = await session_manager.create_session(session_id)
+        session = await session_manager.create_session(
+            session_id,
+            queue_policy=LIVE_QUEUE_POLICY if MODE == "LIVE" else BLOCK
+        )
         
         # Start session-specific tasks with async worker
         asyncio.create_task(session_analytics_worker_async(session))
@@ -1190,7 +1433,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         # Send initial history
         await websocket.send_json({
             "type": "history",
-            "data": list(session.data_buffer),
+            "data": session.data_buffer.to_list(),
             "session_id": session_id
         })
         
@@ -1204,6 +1447,144 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
 # --------------------------------------------------
 # Session-Based Replay Control Endpoints
 # --------------------------------------------------
+@app.get("/history/analytics")
+async def history_analytics(
+    start: datetime,
+    end: datetime,
+    bucket: str = "1m",
+    source: Optional[str] = None,
+    symbol: Optional[str] = None,
+    prefer: str = AUTO
+):
+    """
+    Bucketed analytics with start <= ts < end. With `source` (a replay
+    session id or live:<symbol>): mid and microprice OHLC, mean and
+    percentiles of spread/OBI/OFI/VPIN and anomaly counts per type from the
+    feature store. Without it: mid OHLC, spread and imbalance from the order
+    book continuous aggregates.
+    """
+    conn = None
+    try:
+        bucket_seconds = parse_bucket(bucket)
+        conn = await get_connection()
+        result = await fetch_history_analytics(conn, start, end, bucket_seconds, source, symbol, prefer)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        logger.error(f"History analytics query failed: {e}")
+        return {"status": "error", "message": str(e)}
+    finally:
+        if conn is not None:
+            await return_connection(conn)
+    return {"status": "success", **result}
+
+@app.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    start: datetime,
+    end: datetime,
+    session_id: Optional[str] = None,
+    format: str = "arrow",
+    cursor: Optional[int] = None,
+    chunk_rows: Optional[int] = None
+):
+    """
+    Stream books, features, anomalies or trades with start <= ts < end as an
+    Arrow IPC stream or Parquet, chunk by chunk. session_id limits features
+    and anomalies to one session and is required for trades (held by the
+    session's strategy). To resume an interrupted download, pass the last ts
+    received (unix microseconds) as `cursor`.
+    """
+    try:
+        validate_export(dataset, format)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if end <= start:
+        return {"status": "error", "message": "end must be after start"}
+    trades = None
+    if dataset == TRADES:
+        strategy = strategy_manager.strategies.get(session_id) if session_id else None
+        if strategy is None:
+            return {"status": "error", "message": "trades export needs the session_id of a session with a strategy"}
+        trades = [dict(t) for t in strategy.trades]
+    chunk_rows = max(1, chunk_rows or EXPORT_CHUNK_ROWS)
+
+    async def stream():
+        encoder = ExportEncoder(dataset, format)
+        conn = await get_connection() if trades is None else None
+        try:
+            async for columns, _ in iter_export(conn, dataset, start, end, session_id, chunk_rows, cursor, trades):
+                yield encoder.write(columns)
+            yield encoder.close()
+        except Exception as e:
+            logger.error(f"Export of {dataset} failed: {e}")
+            raise
+        finally:
+            if conn is not None:
+                await return_connection(conn)
+
+    filename = f"{dataset}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}{EXPORT_FORMATS[format]}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/replay/history")
+async def replay_history(start: datetime, end: datetime, limit: int = 1000, resolution: str = RAW):
+    """
+    Order book snapshots with start <= ts < end from the replay source
+    (block-cached for Postgres), or with resolution=1s|1m, OHLC/spread/depth
+    bars from the matching continuous aggregate.
+    """
+    if end <= start:
+        return {"status": "error", "message": "end must be after start"}
+    limit = max(1, min(limit, HISTORY_MAX_ROWS))
+
+    if resolution != RAW:
+        conn = None
+        try:
+            resolve(resolution)
+            conn = await get_connection()
+            bars = await fetch_bars(conn, resolution, start, end, limit)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        except Exception as e:
+            logger.error(f"History bars query failed: {e}")
+            return {"status": "error", "message": str(e)}
+        finally:
+            if conn is not None:
+                await return_connection(conn)
+        return {
+            "status": "success",
+            "resolution": resolution,
+            "count": len(bars),
+            "truncated": len(bars) == limit,
+            "bars": bars
+        }
+
+    try:
+        block = await get_replay_source().fetch_range(start, end, limit)
+    except Exception as e:
+        logger.error(f"History query failed: {e}")
+        return {"status": "error", "message": str(e)}
+
+    return {
+        "status": "success",
+        "count": len(block),
+        "truncated": len(block) == limit,
+        "snapshots": [block.snapshot(i) for i in range(len(block))]
+    }
+
+@app.get("/replay/source")
+def replay_source_info():
+    """Which replay data source sessions read from, and the resolutions opened so far."""
+    return {
+        **get_replay_source().get_stats(),
+        "resolutions": list(replay_sources),
+        "tail": tail_listener.get_stats() if tail_listener else None
+    }
+
 @app.post("/replay/{session_id}/start")
 async def start_replay(session_id: str):
     session = await session_manager.get_session(session_id)
@@ -1211,7 +1592,7 @@ async def start_replay(session_id: str):
         return {"status": "error", "message": "Session not found"}
     
     session.start()
-    session.replay_buffer.clear()
+    session.reset_reader()
     return {"status": "started", **session.get_state()}
 
 @app.post("/replay/{session_id}/pause")
@@ -1241,6 +1622,52 @@ async def stop_replay(session_id: str):
     session.stop()
     return {"status": "stopped", **session.get_state()}
 
+@app.post("/replay/{session_id}/speed/max")
+async def set_max_speed(session_id: str):
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    
+    session.set_max_speed()
+    return {"status": "success", "speed": "max", **session.get_state()}
+
+@app.post("/replay/{session_id}/speed/exchange/{factor}")
+async def set_exchange_speed(session_id: str, factor: float):
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    if factor <= 0:
+        return {"status": "error", "message": "Speed factor must be positive"}
+    
+    session.set_exchange_speed(factor)
+    return {"status": "success", "speed": factor, **session.get_state()}
+
+@app.post("/replay/{session_id}/resolution/{resolution}")
+async def set_replay_resolution(session_id: str, resolution: str):
+    """Replay raw rows or the closing books of 1s/1m buckets; analytics restart at the cursor."""
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    try:
+        get_replay_source(resolution)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    
+    session.set_resolution(resolution)
+    return {"status": "success", "resolution": resolution, **session.get_state()}
+
+@app.post("/replay/{session_id}/tail/{enabled}")
+async def set_replay_tail(session_id: str, enabled: bool):
+    """At the newest row, keep following inserts (LISTEN/NOTIFY) instead of finishing."""
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    if enabled and not tail_listener:
+        return {"status": "error", "message": "Tail replay needs REPLAY_TAIL_ENABLED and the postgres source"}
+    
+    session.set_tail(enabled)
+    return {"status": "success", "tail": enabled, **session.get_state()}
+
 @app.post("/replay/{session_id}/speed/{value}")
 async def set_speed(session_id: str, value: int):
     session = await session_manager.get_session(session_id)
@@ -1258,6 +1685,15 @@ async def get_replay_state(session_id: str):
     
     return session.get_state()
 
+@app.post("/replay/{session_id}/seek")
+async def seek_replay(session_id: str, ts: datetime):
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    
+    session.seek(ts)
+    return {"status": "success", "message": f"Seeking to {ts.isoformat()}", **session.get_state()}
+
 @app.post("/replay/{session_id}/goback/{seconds}")
 async def go_back(session_id: str, seconds: float):
     session = await session_manager.get_session(session_id)
@@ -1277,6 +1713,32 @@ async def get_all_sessions():
     """Get all active sessions."""
     return session_manager.get_stats()
 
+@app.post("/sessions/{session_id}/symbol")
+async def set_session_symbol(session_id: str, payload: dict):
+    """
+    Limit a session's live ticks to one symbol ({"symbol": "ETHUSDT"}); a null
+    symbol follows the active live symbol again. Only streamed symbols arrive.
+    """
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    
+    session.subscribe(payload.get("symbol"))
+    return {"status": "success", **session.get_state()}
+
+@app.post("/sessions/{session_id}/queue-policy/{policy}")
+async def set_queue_policy(session_id: str, policy: str):
+    """Select the overflow policy of a session's queues; during a replay it applies once the replay stops."""
+    session = await session_manager.get_session(session_id)
+    if not session:
+        return {"status": "error", "message": "Session not found"}
+    
+    try:
+        session.set_queue_policy(policy)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", **session.get_state()}
+
 @app.delete("/sessions/{session_id}")
 async def delete_session(session_id: str):
     """Delete a specific session and cleanup resources."""
@@ -1285,6 +1747,7 @@ async def delete_session(session_id: str):
     
     # Cleanup model buffers
     inference_engine.cleanup_session(session_id)
+    release_session_analytics(session_id)
     
     # Cleanup strategy
     strategy_manager.cleanup_session(session_id)
@@ -1292,6 +1755,14 @@ async def delete_session(session_id: str):
     return {"status": "success", "message": f"Session {session_id} deleted"}
 
 
+@app.get("/live/recorder")
+def live_recorder_stats():
+    """Live capture recorder status; each symbol directory is a replayable REPLAY_SOURCE."""
+    if not live_recorder:
+        return {"enabled": False}
+    return {"enabled": True, **live_recorder.get_stats()}
+
+
 @app.post("/mode")
 async def set_mode(payload: dict):
     global MODE, ACTIVE_SYMBOL, ACTIVE_SOURCE
@@ -1304,6 +1775,7 @@ async def set_mode(payload: dict):
         return {"status": "error", "message": "Invalid mode"}
 
     MODE = mode
+    previous_symbol = ACTIVE_SYMBOL
 
     if mode == "LIVE":
         ACTIVE_SYMBOL = symbol or "BTCUSDT"
@@ -1324,6 +1796,15 @@ async def set_mode(payload: dict):
         ACTIVE_SYMBOL = None
         ACTIVE_SOURCE = None
 
+    # Live viewers want the latest book; replay must not lose rows
+    queue_policy = LIVE_QUEUE_POLICY if MODE == "LIVE" else BLOCK
+    for session in list(session_manager.sessions.values()):
+        session.set_queue_policy(queue_policy)
+
+    # Free shared analytics state for a symbol that is no longer streamed
+    if previous_symbol and previous_symbol != ACTIVE_SYMBOL:
+        live_pipeline.cleanup_symbol(previous_symbol)
+
     logger.info(f"Switched MODE={MODE}, SYMBOL={ACTIVE_SYMBOL}")
     return {
         "status": "success",
@@ -1335,61 +1816,84 @@ async def set_mode(payload: dict):
 # --------------------------------------------------
 # Data APIs (Dashboard)
 # --------------------------------------------------
+# Endpoints reading data_buffer or anomaly_index are async so they run on the
+# event loop and never interleave with buffer_snapshot's appends.
 @app.get("/features")
-def get_features():
-    return data_buffer
+async def get_features(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    last: Optional[int] = None,
+    fields: Optional[str] = None,
+    max_points: Optional[int] = None,
+    step: Optional[int] = None,
+    format: str = "rows"
+):
+    """
+    Buffered snapshots, optionally limited to start <= timestamp < end (or the
+    newest `last`), thinned to `max_points` or every `step`-th row, and
+    projected to comma-separated `fields`. `format` is rows (default),
+    columns, msgpack or arrow; the last three return one array per field.
+    """
+    try:
+        payload, media_type = query_features(
+            data_buffer,
+            start_us=timestamp_us(start) if start is not None else None,
+            end_us=timestamp_us(end) if end is not None else None,
+            last=last,
+            fields=parse_fields(fields),
+            max_points=max_points,
+            step=step,
+            format=format
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if media_type is not None:
+        return Response(content=payload, media_type=media_type)
+    return payload
 
 @app.get("/anomalies")
-def get_anomalies():
+async def get_anomalies():
     anomalies = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                anomalies.append({
-                    "timestamp": snap.get("timestamp"),
-                    "type": a.get("type"),
-                    "severity": a.get("severity"),
-                    "message": a.get("message"),
-                    **{k: v for k, v in a.items() if k not in ["type", "severity", "message"]}
-                })
+    for snap, a in anomaly_index.iter_events():
+        anomalies.append({
+            "timestamp": snap.get("timestamp"),
+            "type": a.get("type"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            **{k: v for k, v in a.items() if k not in ["type", "severity", "message"]}
+        })
     return anomalies
 
 @app.get("/anomalies/liquidity-gaps")
-def get_liquidity_gaps():
+async def get_liquidity_gaps():
     """Get recent liquidity gap events with detailed information."""
     gaps = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "LIQUIDITY_GAP":
-                    gaps.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "gap_count": a.get("gap_count", 0),
-                        "affected_levels": a.get("affected_levels", []),
-                        "total_gap_volume": a.get("total_gap_volume", 0),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"LIQUIDITY_GAP"}):
+        gaps.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "gap_count": a.get("gap_count", 0),
+            "affected_levels": a.get("affected_levels", []),
+            "total_gap_volume": a.get("total_gap_volume", 0),
+            "mid_price": snap.get("mid_price")
+        })
     return gaps
 
 @app.get("/anomalies/spoofing")
-def get_spoofing_events():
+async def get_spoofing_events():
     """Get recent spoofing-like behavior events."""
     spoofing = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "SPOOFING":
-                    spoofing.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "side": a.get("side"),
-                        "volume_ratio": a.get("volume_ratio", 0),
-                        "price_level": a.get("price_level"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"SPOOFING"}):
+        spoofing.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "side": a.get("side"),
+            "volume_ratio": a.get("volume_ratio", 0),
+            "price_level": a.get("price_level"),
+            "mid_price": snap.get("mid_price")
+        })
     return spoofing
 
 @app.get("/alerts/history")
@@ -1400,143 +1904,180 @@ def get_alert_history(limit: int = 100):
 @app.get("/alerts/stats")
 def get_alert_stats():
     """Get alert statistics and counts."""
-    return engine.alert_manager.get_alert_stats()
+    return {
+        **engine.alert_manager.get_alert_stats(),
+        "alert_log": feature_store.get_stats()["anomalies"] if feature_store else None
+    }
+
+@app.get("/alerts/log")
+async def get_alert_log(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+    source: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Durable alert audit log, newest first, read from the anomalies the
+    feature store persists. `type` and `severity` take comma-separated
+    lists; pass the returned next_cursor to get older pages.
+    """
+    if not feature_store:
+        return {"status": "error", "message": "Alert log needs the feature store (FEATURE_STORE_ENABLED=true)"}
+    if start is not None and end is not None and end <= start:
+        return {"status": "error", "message": "end must be after start"}
+    conn = None
+    try:
+        conn = await get_connection()
+        page = await fetch_alert_log(
+            conn,
+            limit,
+            start=start,
+            end=end,
+            types=[t for t in (type or "").split(",") if t],
+            severities=[s for s in (severity or "").split(",") if s],
+            source=source,
+            cursor=cursor
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        logger.error(f"Alert log query failed: {e}")
+        return {"status": "error", "message": str(e)}
+    finally:
+        if conn is not None:
+            await return_connection(conn)
+    return {"status": "success", **page}
 
 @app.get("/anomalies/quote-stuffing")
-def get_quote_stuffing_events():
+async def get_quote_stuffing_events():
     """Get recent quote stuffing events (rapid order fire/cancel)."""
     events = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "QUOTE_STUFFING":
-                    events.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "update_rate": a.get("update_rate"),
-                        "avg_rate": a.get("avg_rate"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"QUOTE_STUFFING"}):
+        events.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "update_rate": a.get("update_rate"),
+            "avg_rate": a.get("avg_rate"),
+            "mid_price": snap.get("mid_price")
+        })
     return events
 
 @app.get("/anomalies/layering")
-def get_layering_events():
+async def get_layering_events():
     """Get recent layering/spoofing events (stacked fake orders)."""
     events = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "LAYERING":
-                    events.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "side": a.get("side"),
-                        "score": a.get("score"),
-                        "large_order_count": a.get("large_order_count"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"LAYERING"}):
+        events.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "side": a.get("side"),
+            "score": a.get("score"),
+            "large_order_count": a.get("large_order_count"),
+            "mid_price": snap.get("mid_price")
+        })
     return events
 
 @app.get("/anomalies/momentum-ignition")
-def get_momentum_ignition_events():
+async def get_momentum_ignition_events():
     """Get recent momentum ignition events (aggressive orders triggering algos)."""
     events = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "MOMENTUM_IGNITION":
-                    events.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "price_change_pct": a.get("price_change_pct"),
-                        "volume": a.get("volume"),
-                        "direction": a.get("direction"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"MOMENTUM_IGNITION"}):
+        events.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "price_change_pct": a.get("price_change_pct"),
+            "volume": a.get("volume"),
+            "direction": a.get("direction"),
+            "mid_price": snap.get("mid_price")
+        })
     return events
 
 @app.get("/anomalies/wash-trading")
-def get_wash_trading_events():
+async def get_wash_trading_events():
     """Get recent wash trading events (self-trading patterns)."""
     events = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "WASH_TRADING":
-                    events.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "avg_volume": a.get("avg_volume"),
-                        "volume_variance": a.get("volume_variance"),
-                        "pattern_count": a.get("pattern_count"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"WASH_TRADING"}):
+        events.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "avg_volume": a.get("avg_volume"),
+            "volume_variance": a.get("volume_variance"),
+            "pattern_count": a.get("pattern_count"),
+            "mid_price": snap.get("mid_price")
+        })
     return events
 
 @app.get("/anomalies/iceberg-orders")
-def get_iceberg_order_events():
+async def get_iceberg_order_events():
     """Get recent iceberg order detections (hidden large orders)."""
     events = []
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") == "ICEBERG_ORDER":
-                    events.append({
-                        "timestamp": snap.get("timestamp"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "price": a.get("price"),
-                        "side": a.get("side"),
-                        "fill_count": a.get("fill_count"),
-                        "total_volume": a.get("total_volume"),
-                        "avg_fill_size": a.get("avg_fill_size"),
-                        "mid_price": snap.get("mid_price")
-                    })
+    for snap, a in anomaly_index.iter_events({"ICEBERG_ORDER"}):
+        events.append({
+            "timestamp": snap.get("timestamp"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "price": a.get("price"),
+            "side": a.get("side"),
+            "fill_count": a.get("fill_count"),
+            "total_volume": a.get("total_volume"),
+            "avg_fill_size": a.get("avg_fill_size"),
+            "mid_price": snap.get("mid_price")
+        })
     return events
 
+# Legacy summary keys of the anomaly types
+SUMMARY_KEYS = {
+    "QUOTE_STUFFING": "quote_stuffing",
+    "LAYERING": "layering",
+    "MOMENTUM_IGNITION": "momentum_ignition",
+    "WASH_TRADING": "wash_trading",
+    "ICEBERG_ORDER": "iceberg_orders",
+    "SPOOFING": "spoofing",
+    "LIQUIDITY_GAP": "liquidity_gaps"
+}
+
 @app.get("/anomalies/summary")
-def get_anomalies_summary():
+async def get_anomalies_summary():
     """Get summary statistics of all advanced anomaly types."""
-    summary = {
-        "quote_stuffing": 0,
-        "layering": 0,
-        "momentum_ignition": 0,
-        "wash_trading": 0,
-        "iceberg_orders": 0,
-        "spoofing": 0,
-        "liquidity_gaps": 0
-    }
-    
-    for snap in data_buffer:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                anomaly_type = a.get("type", "").lower().replace("_", "")
-                if "quotestuffing" in anomaly_type:
-                    summary["quote_stuffing"] += 1
-                elif "layering" in anomaly_type:
-                    summary["layering"] += 1
-                elif "momentumignition" in anomaly_type:
-                    summary["momentum_ignition"] += 1
-                elif "washtrading" in anomaly_type:
-                    summary["wash_trading"] += 1
-                elif "icebergorder" in anomaly_type:
-                    summary["iceberg_orders"] += 1
-                elif "spoofing" in anomaly_type:
-                    summary["spoofing"] += 1
-                elif "liquiditygap" in anomaly_type:
-                    summary["liquidity_gaps"] += 1
-    
-    return summary
+    by_type = anomaly_index.summary()["by_type"]
+    return {key: by_type.get(anomaly_type, 0) for anomaly_type, key in SUMMARY_KEYS.items()}
+
+@app.get("/anomalies/query")
+async def query_anomalies(
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 100
+):
+    """
+    Anomalies of the buffered snapshots, newest first. `type` and `severity`
+    take comma-separated lists; pass the returned next_cursor to get older
+    pages. Served from the anomaly index, so polling does not scan the buffer.
+    """
+    if start is not None and end is not None and end <= start:
+        return {"status": "error", "message": "end must be after start"}
+    page = anomaly_index.query(
+        types=[t for t in type.split(",") if t] if type else None,
+        severities=[s for s in severity.split(",") if s] if severity else None,
+        start=start,
+        end=end,
+        cursor=cursor,
+        limit=limit
+    )
+    return {"status": "success", **page, "summary": anomaly_index.summary()}
 
 @app.get("/snapshot/latest")
-def get_latest_snapshot():
-    if not data_buffer:
-        return {}
-    return data_buffer[-1]
+async def get_latest_snapshot():
+    return data_buffer.latest() or {}
 
 # --------------------------------------------------
 # Monitoring Endpoints
@@ -1592,17 +2133,22 @@ def health_check():
 
 
 @app.get("/metrics/dashboard")
-def metrics_dashboard():
+async def metrics_dashboard():
     stats = metrics.get_stats()
     stats["active_websocket_connections"] = len(manager.active_connections)
     stats["buffer_size"] = len(data_buffer)
+    stats["anomaly_index"] = anomaly_index.get_stats()
     stats["db_pool"] = get_pool_stats()
     return stats
 
 @app.get("/db/pool")
 def database_pool_stats():
     """Get detailed database connection pool statistics."""
-    return get_pool_stats()
+    return {
+        **get_pool_stats(),
+        "replay_reader": replay_service.get_stats(),
+        "feature_store": feature_store.get_stats() if feature_store else None
+    }
 
 @app.get("/db/health")
 def database_health():
@@ -1740,34 +2286,34 @@ async def run_benchmark():
     }
 # Priority #14: Trade Data Integration API Endpoints
 @app.get("/trades/classification")
-def get_trade_classification():
+async def get_trade_classification():
     """Get recent trade classifications (buy/sell side)."""
     trades = []
-    for snap in data_buffer[-100:]:  # Last 100 snapshots
-        if snap.get("trade_classified"):
-            trades.append({
-                "timestamp": snap.get("timestamp"),
-                "price": snap.get("last_trade_price"),
-                "volume": snap.get("trade_volume"),
-                "side": snap.get("trade_side"),
-                "mid_price": snap.get("mid_price"),
-                "effective_spread": snap.get("effective_spread")
-            })
+    recent = data_buffer.positions(last=100)  # Last 100 snapshots
+    for snap in data_buffer.rows(recent[data_buffer.column("trade_classified", recent) == 1]):
+        trades.append({
+            "timestamp": snap.get("timestamp"),
+            "price": snap.get("last_trade_price"),
+            "volume": snap.get("trade_volume"),
+            "side": snap.get("trade_side"),
+            "mid_price": snap.get("mid_price"),
+            "effective_spread": snap.get("effective_spread")
+        })
     return {"trades": trades, "count": len(trades)}
 
 @app.get("/trades/spreads")
-def get_trade_spreads():
+async def get_trade_spreads():
     """Get effective and realized spreads over time."""
     spreads = []
-    for snap in data_buffer[-100:]:
-        if snap.get("trade_classified"):
-            spreads.append({
-                "timestamp": snap.get("timestamp"),
-                "effective_spread": snap.get("effective_spread", 0),
-                "realized_spread": snap.get("realized_spread", 0),
-                "trade_side": snap.get("trade_side"),
-                "mid_price": snap.get("mid_price")
-            })
+    recent = data_buffer.positions(last=100)
+    for snap in data_buffer.rows(recent[data_buffer.column("trade_classified", recent) == 1]):
+        spreads.append({
+            "timestamp": snap.get("timestamp"),
+            "effective_spread": snap.get("effective_spread", 0),
+            "realized_spread": snap.get("realized_spread", 0),
+            "trade_side": snap.get("trade_side"),
+            "mid_price": snap.get("mid_price")
+        })
     
     # Calculate statistics
     if spreads:
@@ -1801,17 +2347,17 @@ def get_trade_spreads():
     }
 
 @app.get("/trades/vpin")
-def get_vpin():
+async def get_vpin():
     """Get V-PIN (Volume-Synchronized Probability of Informed Trading) history."""
     vpin_data = []
-    for snap in data_buffer[-100:]:
-        if "vpin" in snap and snap["vpin"] > 0:
-            vpin_data.append({
-                "timestamp": snap.get("timestamp"),
-                "vpin": snap["vpin"],
-                "mid_price": snap.get("mid_price"),
-                "obi": snap.get("obi", 0)
-            })
+    recent = data_buffer.positions(last=100)
+    for snap in data_buffer.rows(recent[data_buffer.column("vpin", recent) > 0]):
+        vpin_data.append({
+            "timestamp": snap.get("timestamp"),
+            "vpin": snap["vpin"],
+            "mid_price": snap.get("mid_price"),
+            "obi": snap.get("obi", 0)
+        })
     
     # Calculate statistics
     if vpin_data:
@@ -1838,23 +2384,20 @@ def get_vpin():
     }
 
 @app.get("/trades/anomalies")
-def get_trade_anomalies():
+async def get_trade_anomalies():
     """Get trade-level anomalies (unusual sizes, rapid trading, etc.)."""
     trade_anomalies = []
-    for snap in data_buffer[-100:]:
-        if "anomalies" in snap:
-            for a in snap["anomalies"]:
-                if a.get("type") in ["UNUSUAL_TRADE_SIZE", "RAPID_TRADING"]:
-                    trade_anomalies.append({
-                        "timestamp": snap.get("timestamp"),
-                        "type": a.get("type"),
-                        "severity": a.get("severity"),
-                        "message": a.get("message"),
-                        "details": {
-                            k: v for k, v in a.items() 
-                            if k not in ["type", "severity", "message", "timestamp"]
-                        }
-                    })
+    for snap, a in anomaly_index.iter_events({"UNUSUAL_TRADE_SIZE", "RAPID_TRADING"}, last_snapshots=100):
+        trade_anomalies.append({
+            "timestamp": snap.get("timestamp"),
+            "type": a.get("type"),
+            "severity": a.get("severity"),
+            "message": a.get("message"),
+            "details": {
+                k: v for k, v in a.items() 
+                if k not in ["type", "severity", "message", "timestamp"]
+            }
+        })
     return {
         "anomalies": trade_anomalies,
         "count": len(trade_anomalies)
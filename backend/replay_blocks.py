@@ -0,0 +1,292 @@
+"""
+Columnar Replay Blocks
+Bulk-reads order book rows with binary COPY and decodes them straight into
+NumPy arrays, so replay no longer materializes an asyncpg Record and a dict
+per row and calls float() on 40 columns.
+
+PostgreSQL binary COPY layout (per row, no NULLs):
+    int16 field count, then per field: int32 length + payload
+    ts     -> int64 microseconds since 2000-01-01 (timestamp and timestamptz)
+    levels -> float8 (columns are cast ::float8 in the query)
+With 41 fields every row is exactly 2 + 41 * (4 + 8) = 494 bytes, so the
+whole payload is decoded with a single structured `np.frombuffer`.
+"""
+import logging
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEPTH = 10
+LEVEL_COLUMNS = (
+    [f"{name}_{i}" for i in range(1, DEPTH + 1) for name in ("bid_price", "bid_volume")] +
+    [f"{name}_{i}" for i in range(1, DEPTH + 1) for name in ("ask_price", "ask_volume")]
+)
+N_FIELDS = 1 + len(LEVEL_COLUMNS)
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+PG_EPOCH_OFFSET_US = 946684800 * 1_000_000  # 2000-01-01 minus 1970-01-01
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+# One fixed-width record per row when no column is NULL
+_ROW_DTYPE = np.dtype(
+    [("nfields", ">i2"), ("ts_len", ">i4"), ("ts", ">i8")] +
+    [item for i in range(len(LEVEL_COLUMNS)) for item in ((f"len{i}", ">i4"), (f"v{i}", ">f8"))]
+)
+
+
+class OrderBookBlock:
+    """
+    A contiguous run of order book rows held as arrays.
+
+    ts_us: int64 microseconds since the Unix epoch, shape (n,)
+    bids / asks: float64 [price, volume] per level, shape (n, 10, 2)
+    """
+
+    __slots__ = ("ts_us", "bids", "asks", "tz_aware", "_datetimes")
+
+    def __init__(self, ts_us: np.ndarray, bids: np.ndarray, asks: np.ndarray, tz_aware: bool = False):
+        self.ts_us = ts_us
+        self.bids = bids
+        self.asks = asks
+        self.tz_aware = tz_aware
+        self._datetimes = None  # Converted in bulk on first use
+
+    def __len__(self) -> int:
+        return len(self.ts_us)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.snapshot(i)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts_us.nbytes + self.bids.nbytes + self.asks.nbytes
+
+    def timestamp(self, i: int) -> datetime:
+        """Row timestamp as the datetime asyncpg would have returned."""
+        if self._datetimes is None:
+            self._datetimes = self.ts_us.astype("datetime64[us]").tolist()
+        ts = self._datetimes[i]
+        return ts.replace(tzinfo=timezone.utc) if self.tz_aware else ts
+
+    @property
+    def last_ts(self) -> Optional[datetime]:
+        return self.timestamp(len(self) - 1) if len(self) else None
+
+    def mid_prices(self) -> np.ndarray:
+        return (self.bids[:, 0, 0] + self.asks[:, 0, 0]) / 2
+
+    def snapshot(self, i: int) -> Dict[str, Any]:
+        """Snapshot dict in the same shape as `db_row_to_snapshot`."""
+        bids = self.bids[i].tolist()
+        asks = self.asks[i].tolist()
+        return {
+            "timestamp": self.timestamp(i),
+            "bids": bids,
+            "asks": asks,
+            "mid_price": round((bids[0][0] + asks[0][0]) / 2, 2)
+        }
+
+    def slice(self, start: int, stop: Optional[int] = None) -> "OrderBookBlock":
+        return OrderBookBlock(self.ts_us[start:stop], self.bids[start:stop], self.asks[start:stop], self.tz_aware)
+
+    @classmethod
+    def concat(cls, blocks: Iterable["OrderBookBlock"], tz_aware: bool = False) -> "OrderBookBlock":
+        """Join consecutive blocks into one."""
+        blocks = [b for b in blocks if len(b)]
+        if not blocks:
+            return cls.empty(tz_aware)
+        if len(blocks) == 1:
+            return blocks[0]
+        return cls(
+            np.concatenate([b.ts_us for b in blocks]),
+            np.concatenate([b.bids for b in blocks]),
+            np.concatenate([b.asks for b in blocks]),
+            blocks[0].tz_aware
+        )
+
+    @classmethod
+    def empty(cls, tz_aware: bool = False) -> "OrderBookBlock":
+        return cls(np.empty(0, dtype=np.int64), np.empty((0, DEPTH, 2)), np.empty((0, DEPTH, 2)), tz_aware)
+
+    @classmethod
+    def from_levels(cls, ts_us: np.ndarray, levels: np.ndarray, tz_aware: bool = False) -> "OrderBookBlock":
+        """Build from an (n, 40) array ordered like LEVEL_COLUMNS."""
+        n = len(ts_us)
+        levels = np.ascontiguousarray(levels, dtype=np.float64)
+        return cls(
+            np.ascontiguousarray(ts_us, dtype=np.int64),
+            levels[:, :2 * DEPTH].reshape(n, DEPTH, 2),
+            levels[:, 2 * DEPTH:].reshape(n, DEPTH, 2),
+            tz_aware
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]) -> "OrderBookBlock":
+        """Build from asyncpg Records or dicts (slow path, for small inputs and tests)."""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        tz_aware = rows[0]["ts"].tzinfo is not None
+        ts_us = np.array([datetime_to_unix_us(r["ts"]) for r in rows], dtype=np.int64)
+        levels = np.array([[float(r[c]) for c in LEVEL_COLUMNS] for r in rows], dtype=np.float64)
+        return cls.from_levels(ts_us, levels, tz_aware)
+
+
+def datetime_to_unix_us(ts: datetime) -> int:
+    """Microseconds since the Unix epoch; naive datetimes are taken as UTC."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = ts - UNIX_EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def unix_us_to_datetime(ts_us: int, tz_aware: bool = False) -> datetime:
+    """Inverse of datetime_to_unix_us; aware (UTC) for timestamptz columns."""
+    ts = UNIX_EPOCH + timedelta(microseconds=int(ts_us))
+    return ts.replace(tzinfo=timezone.utc) if tz_aware else ts
+
+
+def _body_offset(buf: bytes) -> int:
+    if buf[:11] != COPY_SIGNATURE:
+        raise ValueError("Not a PostgreSQL binary COPY stream")
+    ext_len = struct.unpack_from(">i", buf, 15)[0]
+    return 19 + ext_len
+
+
+def decode_binary_copy(buf: bytes, tz_aware: bool = False) -> OrderBookBlock:
+    """
+    Decode a binary COPY of (ts, LEVEL_COLUMNS::float8) into an OrderBookBlock.
+
+    Uses one vectorized structured read; falls back to a per-row parse if
+    any row contains NULLs (NULL levels decode as NaN).
+    """
+    offset = _body_offset(buf)
+    body_len = len(buf) - offset - 2  # Trailer is int16 -1
+    if body_len >= 0 and body_len % _ROW_DTYPE.itemsize == 0:
+        records = np.frombuffer(buf, dtype=_ROW_DTYPE, count=body_len // _ROW_DTYPE.itemsize, offset=offset)
+        lengths_ok = (records["nfields"] == N_FIELDS).all() and (records["ts_len"] == 8).all() and all(
+            (records[f"len{i}"] == 8).all() for i in range(len(LEVEL_COLUMNS))
+        )
+        if lengths_ok:
+            ts_us = records["ts"].astype(np.int64) + PG_EPOCH_OFFSET_US
+            levels = np.empty((len(records), len(LEVEL_COLUMNS)), dtype=np.float64)
+            for i in range(len(LEVEL_COLUMNS)):
+                levels[:, i] = records[f"v{i}"]
+            return OrderBookBlock.from_levels(ts_us, levels, tz_aware)
+
+    return _decode_binary_copy_slow(buf, offset, tz_aware)
+
+
+def _decode_binary_copy_slow(buf: bytes, offset: int, tz_aware: bool) -> OrderBookBlock:
+    ts_values = []
+    level_rows = []
+    while True:
+        (nfields,) = struct.unpack_from(">h", buf, offset)
+        offset += 2
+        if nfields == -1:
+            break
+        if nfields != N_FIELDS:
+            raise ValueError(f"Expected {N_FIELDS} columns in COPY row, got {nfields}")
+
+        row = []
+        for field in range(nfields):
+            (length,) = struct.unpack_from(">i", buf, offset)
+            offset += 4
+            if length == -1:
+                if field == 0:
+                    raise ValueError("NULL ts in order book row")
+                row.append(np.nan)
+                continue
+            if length != 8:
+                raise ValueError(f"Unexpected field width {length}; cast level columns to float8")
+            if field == 0:
+                ts_values.append(struct.unpack_from(">q", buf, offset)[0] + PG_EPOCH_OFFSET_US)
+            else:
+                row.append(struct.unpack_from(">d", buf, offset)[0])
+            offset += 8
+        level_rows.append(row)
+
+    if not ts_values:
+        return OrderBookBlock.empty(tz_aware)
+    return OrderBookBlock.from_levels(
+        np.array(ts_values, dtype=np.int64), np.array(level_rows, dtype=np.float64), tz_aware
+    )
+
+
+def encode_binary_copy(block: OrderBookBlock) -> bytes:
+    """
+    Encode a block as a binary COPY stream of (ts, LEVEL_COLUMNS) for
+    `copy_to_table(..., format="binary")`; the inverse of decode_binary_copy.
+    NaN levels are sent as float8 NaN, not NULL.
+    """
+    n = len(block)
+    records = np.empty(n, dtype=_ROW_DTYPE)
+    records["nfields"] = N_FIELDS
+    records["ts_len"] = 8
+    records["ts"] = block.ts_us - PG_EPOCH_OFFSET_US
+    levels = np.concatenate([block.bids.reshape(n, -1), block.asks.reshape(n, -1)], axis=1)
+    for i in range(len(LEVEL_COLUMNS)):
+        records[f"len{i}"] = 8
+        records[f"v{i}"] = levels[:, i]
+    header = COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+    return header + records.tobytes() + struct.pack(">h", -1)
+
+
+def block_copy_query(table: str = "l2_orderbook") -> str:
+    """Range query for binary COPY: $1 = exclusive start ts, $2 = row limit."""
+    levels = ", ".join(f"{c}::float8" for c in LEVEL_COLUMNS)
+    return f"SELECT ts, {levels} FROM {table} WHERE ts > $1 ORDER BY ts LIMIT $2"
+
+
+def range_copy_query(table: str = "l2_orderbook") -> str:
+    """Time range query for binary COPY: $1 <= ts < $2."""
+    levels = ", ".join(f"{c}::float8" for c in LEVEL_COLUMNS)
+    return f"SELECT ts, {levels} FROM {table} WHERE ts >= $1 AND ts < $2 ORDER BY ts"
+
+
+_ts_tz_cache: Dict[str, bool] = {}
+
+
+async def ts_is_timezone_aware(conn, table: str = "l2_orderbook") -> bool:
+    """Whether `table.ts` is timestamptz (binary COPY encodes both types alike)."""
+    if table not in _ts_tz_cache:
+        type_name = await conn.fetchval(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = $1::regclass AND attname = 'ts'",
+            table
+        )
+        _ts_tz_cache[table] = bool(type_name) and "with time zone" in type_name
+    return _ts_tz_cache[table]
+
+
+async def fetch_orderbook_block(conn, after_ts, limit: int, table: str = "l2_orderbook") -> OrderBookBlock:
+    """Fetch up to `limit` rows after `after_ts` as one OrderBookBlock via binary COPY."""
+    tz_aware = await ts_is_timezone_aware(conn, table)
+    chunks = []
+
+    async def sink(data):
+        chunks.append(data)
+
+    await conn.copy_from_query(block_copy_query(table), after_ts, limit, output=sink, format="binary")
+    return decode_binary_copy(b"".join(chunks), tz_aware)
+
+
+async def fetch_orderbook_range(conn, start_ts, end_ts, table: str = "l2_orderbook") -> OrderBookBlock:
+    """Fetch every row with start_ts <= ts < end_ts as one OrderBookBlock via binary COPY."""
+    tz_aware = await ts_is_timezone_aware(conn, table)
+    chunks = []
+
+    async def sink(data):
+        chunks.append(data)
+
+    await conn.copy_from_query(range_copy_query(table), start_ts, end_ts, output=sink, format="binary")
+    return decode_binary_copy(b"".join(chunks), tz_aware)
+
+
+async def fetch_next_ts(conn, from_ts, table: str = "l2_orderbook") -> Optional[datetime]:
+    """First ts at or after `from_ts` (skips gaps in the data), or None at the end."""
+    return await conn.fetchval(f"SELECT min(ts) FROM {table} WHERE ts >= $1", from_ts)
@@ -0,0 +1,102 @@
+"""
+Replay Checkpoints
+Periodic snapshots of a session's analytics engine and strategy state,
+indexed by replay timestamp.
+
+A seek restores the nearest checkpoint at or before the target and
+fast-forwards from there through the batch path, so rewound output is
+correct immediately and the cost of a seek is bounded by the checkpoint
+interval rather than by how far the cursor moves.
+"""
+import bisect
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """Engine and strategy state after the row at `ts` was processed."""
+
+    __slots__ = ("ts", "engine_state", "strategy_state")
+
+    def __init__(self, ts: datetime, engine_state: Optional[bytes], strategy_state: Optional[Dict[str, Any]]):
+        self.ts = ts
+        self.engine_state = engine_state
+        self.strategy_state = strategy_state
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.engine_state) if self.engine_state else 0
+
+
+class CheckpointIndex:
+    """
+    Timestamp-ordered checkpoints for one replay session.
+
+    When `max_checkpoints` is reached every other checkpoint is dropped and
+    the interval doubles, so coverage stays even over long replays.
+    """
+
+    def __init__(self, interval_seconds: float = 10.0, max_checkpoints: int = 1000):
+        if interval_seconds <= 0:
+            raise ValueError(f"interval_seconds must be > 0, got {interval_seconds}")
+        self.interval_seconds = interval_seconds
+        self.max_checkpoints = max_checkpoints
+        self._ts: List[datetime] = []
+        self._checkpoints: List[Checkpoint] = []
+
+        # Statistics
+        self.taken = 0
+        self.restores = 0
+        self.thinned = 0
+
+    def __len__(self) -> int:
+        return len(self._checkpoints)
+
+    def due(self, ts: datetime) -> bool:
+        """Whether a row at `ts` is at least one interval from its nearest earlier checkpoint."""
+        i = bisect.bisect_right(self._ts, ts)
+        if i == 0:
+            return True
+        if self._ts[i - 1] == ts:
+            return False
+        return (ts - self._ts[i - 1]).total_seconds() >= self.interval_seconds
+
+    def add(self, checkpoint: Checkpoint):
+        i = bisect.bisect_right(self._ts, checkpoint.ts)
+        if i and self._ts[i - 1] == checkpoint.ts:
+            self._checkpoints[i - 1] = checkpoint
+            return
+        self._ts.insert(i, checkpoint.ts)
+        self._checkpoints.insert(i, checkpoint)
+        self.taken += 1
+
+        if len(self._checkpoints) > self.max_checkpoints:
+            self._ts = self._ts[::2]
+            self._checkpoints = self._checkpoints[::2]
+            self.interval_seconds *= 2
+            self.thinned += 1
+
+    def nearest(self, ts: datetime) -> Optional[Checkpoint]:
+        """Latest checkpoint at or before `ts`."""
+        i = bisect.bisect_right(self._ts, ts)
+        return self._checkpoints[i - 1] if i else None
+
+    def clear(self):
+        self._ts.clear()
+        self._checkpoints.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get checkpoint coverage statistics."""
+        return {
+            "count": len(self._checkpoints),
+            "interval_seconds": self.interval_seconds,
+            "bytes": sum(c.nbytes for c in self._checkpoints),
+            "first_ts": self._ts[0].isoformat() if self._ts else None,
+            "last_ts": self._ts[-1].isoformat() if self._ts else None,
+            "taken": self.taken,
+            "restores": self.restores,
+            "thinned": self.thinned
+        }
@@ -0,0 +1,139 @@
+"""
+Replay Pacing
+Decides how long the replay producer waits before each row.
+
+- fixed:    a constant delay per row (base_delay / speed), the original mode.
+- exchange: the recorded inter-arrival times scaled by a factor, scheduled
+            against an anchor so sleep overshoot does not accumulate.
+- max:      no delay; throughput is limited only by the pipeline's
+            credit-based backpressure (backtesting).
+
+Achieved speed is measured over a sliding window of recent rows so the
+session can report it next to the target.
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from replay_blocks import datetime_to_unix_us
+
+FIXED = "fixed"
+EXCHANGE = "exchange"
+MAX = "max"
+
+
+class ReplayPacer:
+    """Per-session replay clock."""
+
+    def __init__(self, base_delay: float = 0.25, max_gap_seconds: float = 5.0,
+                 max_lag_seconds: float = 1.0, window: int = 200):
+        self.base_delay = base_delay              # Seconds per row at 1x in fixed mode
+        self.max_gap_seconds = max_gap_seconds    # Longest wall-clock wait for one data gap
+        self.max_lag_seconds = max_lag_seconds    # Fall further behind than this and the clock re-anchors
+        self.mode = FIXED
+        self.speed = 1.0                          # Fixed-mode multiplier
+        self.factor = 1.0                         # Exchange-time multiplier
+        self._anchor = None                       # (wall seconds, data seconds)
+        self._samples = deque(maxlen=window)      # (wall seconds, data seconds or None)
+
+        # Statistics
+        self.rows = 0
+        self.gaps_skipped = 0
+        self.reanchors = 0
+
+    def set_fixed(self, speed: float):
+        self.mode = FIXED
+        self.speed = speed
+        self.reset()
+
+    def set_exchange(self, factor: float):
+        if factor <= 0:
+            raise ValueError(f"factor must be > 0, got {factor}")
+        self.mode = EXCHANGE
+        self.factor = factor
+        self.reset()
+
+    def set_max(self):
+        self.mode = MAX
+        self.reset()
+
+    def reset(self):
+        """Forget the clock anchor and speed samples (pause, seek, mode change)."""
+        self._anchor = None
+        self._samples.clear()
+
+    async def wait(self, ts: Any = None, base_delay: Optional[float] = None, fixed_delay: Optional[float] = None):
+        """
+        Sleep until the row at `ts` is due; rows without a datetime are paced as fixed.
+        A fixed_delay replaces base_delay / speed for sources with their own speed-independent rate.
+        """
+        data_s = datetime_to_unix_us(ts) / 1e6 if isinstance(ts, datetime) else None
+
+        if self.mode == MAX:
+            await asyncio.sleep(0)
+        elif self.mode == EXCHANGE and data_s is not None:
+            await asyncio.sleep(self._exchange_delay(data_s))
+        elif fixed_delay is not None:
+            await asyncio.sleep(fixed_delay)
+        else:
+            await asyncio.sleep((self.base_delay if base_delay is None else base_delay) / self.speed)
+
+        self.rows += 1
+        self._samples.append((time.monotonic(), data_s))
+
+    def _exchange_delay(self, data_s: float) -> float:
+        now = time.monotonic()
+        if self._anchor is None:
+            self._anchor = (now, data_s)
+            return 0.0
+
+        wall0, data0 = self._anchor
+        if self._samples and self._samples[-1][1] is not None:
+            gap = (data_s - self._samples[-1][1]) / self.factor
+            if gap > self.max_gap_seconds:
+                # Session breaks and outages: wait at most max_gap, then continue from here
+                self.gaps_skipped += 1
+                self._anchor = (now + self.max_gap_seconds, data_s)
+                return self.max_gap_seconds
+
+        delay = (wall0 + (data_s - data0) / self.factor) - now
+        if delay < -self.max_lag_seconds:
+            # Held back by the pipeline: resume from here rather than bursting to catch up
+            self.reanchors += 1
+            self._anchor = (now, data_s)
+            return 0.0
+        return max(0.0, delay)
+
+    def target_speed(self) -> Optional[float]:
+        """Target in data-seconds per wall-second (exchange), rows per second (fixed), None (max)."""
+        if self.mode == EXCHANGE:
+            return self.factor
+        if self.mode == FIXED:
+            return self.speed / self.base_delay
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Target versus achieved replay speed over the recent window."""
+        rows_per_second = None
+        achieved_speed = None
+        if len(self._samples) >= 2:
+            wall_first, data_first = self._samples[0]
+            wall_last, data_last = self._samples[-1]
+            elapsed = wall_last - wall_first
+            if elapsed > 0:
+                rows_per_second = round((len(self._samples) - 1) / elapsed, 2)
+                if data_first is not None and data_last is not None:
+                    achieved_speed = round((data_last - data_first) / elapsed, 3)
+
+        return {
+            "mode": self.mode,
+            "target": self.target_speed(),
+            "target_unit": "x_exchange_time" if self.mode == EXCHANGE else ("rows_per_second" if self.mode == FIXED else None),
+            "rows_per_second": rows_per_second,
+            "achieved_speed": achieved_speed,  # Data seconds replayed per wall second
+            "rows": self.rows,
+            "gaps_skipped": self.gaps_skipped,
+            "reanchors": self.reanchors
+        }
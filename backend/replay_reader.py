@@ -0,0 +1,194 @@
+"""
+Prefetching Replay Reader
+Keeps database batches in flight ahead of the replay cursor so playback
+never waits on a query round trip.
+
+Batches are fetched by keyset pagination (`ts > last_ts`), so batch N+1 is
+requested as soon as batch N arrives and up to `prefetch_depth` batches are
+buffered ahead of the row being replayed. Batch size adapts to how fast the
+session consumes rows, and closing the reader (seek or stop) cancels any
+fetch still in flight.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+FetchBatch = Callable[[Any, int], Awaitable[Sequence[Any]]]
+
+
+def row_end_ts(batch: Sequence[Dict[str, Any]]) -> Any:
+    """Keyset cursor for a batch of row dicts."""
+    return batch[-1]["ts"]
+
+
+class PrefetchingReplayReader:
+    """
+    Double-buffered (or deeper) async reader over an ordered replay range.
+
+    Batches may be any indexable sequence (row dicts, or OrderBookBlocks whose
+    items are snapshots); `end_ts` extracts the keyset cursor from a batch.
+    """
+
+    def __init__(
+        self,
+        fetch_batch: FetchBatch,
+        start_ts: Any,
+        batch_size: int = 500,
+        min_batch_size: int = 100,
+        max_batch_size: int = 5000,
+        prefetch_depth: int = 2,
+        lead_seconds: float = 2.0,
+        max_errors: int = 5,
+        retry_delay: float = 1.0,
+        end_ts: Callable[[Any], Any] = row_end_ts
+    ):
+        self.fetch_batch = fetch_batch          # async (after_ts, limit) -> ordered batch
+        self.end_ts = end_ts
+        self.start_ts = start_ts
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.prefetch_depth = prefetch_depth
+        self.lead_seconds = lead_seconds        # Seconds of playback each batch should cover
+        self.max_errors = max_errors
+        self.retry_delay = retry_delay
+
+        self._batches: asyncio.Queue = asyncio.Queue(maxsize=prefetch_depth)
+        self._current: Sequence[Any] = ()
+        self._position = 0
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[Exception] = None
+        self.closed = False
+        self.exhausted = False
+
+        # Consumption rate tracking for adaptive batch sizing
+        self._batch_started_at: Optional[float] = None
+        self._batch_rows = 0
+        self.consumption_rate = 0.0             # rows/sec (EWMA)
+        self.avg_fetch_ms = 0.0                 # EWMA
+
+        # Statistics
+        self.batches_fetched = 0
+        self.rows_fetched = 0
+        self.fetch_errors = 0
+        self.stalls = 0                         # Times the consumer had to wait for a batch
+        self.stall_ms = 0.0
+
+    def _ensure_started(self):
+        if self._task is None and not self.closed:
+            self._task = asyncio.create_task(self._prefetch_loop())
+
+    def next_batch_size(self) -> int:
+        """Size the next batch to cover `lead_seconds` of playback (and outlast a fetch)."""
+        if self.consumption_rate <= 0:
+            return self.batch_size
+        lead = max(self.lead_seconds, 2 * self.avg_fetch_ms / 1000)
+        target = int(self.consumption_rate * lead)
+        return max(self.min_batch_size, min(self.max_batch_size, target))
+
+    async def _prefetch_loop(self):
+        after_ts = self.start_ts
+        consecutive_errors = 0
+        try:
+            while not self.closed:
+                limit = self.next_batch_size()
+                fetch_start = time.time()
+                try:
+                    rows = await self.fetch_batch(after_ts, limit)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.fetch_errors += 1
+                    consecutive_errors += 1
+                    logger.error(f"Replay prefetch error ({consecutive_errors}/{self.max_errors}): {e}")
+                    if consecutive_errors >= self.max_errors:
+                        await self._batches.put(e)
+                        return
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+                consecutive_errors = 0
+                fetch_ms = (time.time() - fetch_start) * 1000
+                self.avg_fetch_ms = fetch_ms if self.batches_fetched == 0 else 0.8 * self.avg_fetch_ms + 0.2 * fetch_ms
+                self.batches_fetched += 1
+                self.rows_fetched += len(rows)
+
+                # Blocks while `prefetch_depth` batches are already waiting
+                await self._batches.put(rows)
+                if not rows:
+                    return  # End of range
+                after_ts = self.end_ts(rows)
+        except asyncio.CancelledError:
+            pass
+
+    async def next_row(self) -> Optional[Dict[str, Any]]:
+        """Next row in order, or None at the end of the range or after close."""
+        if self._position >= len(self._current):
+            if self._error is not None:
+                raise self._error
+            if self.closed or self.exhausted:
+                return None
+            self._ensure_started()
+
+            if self._batches.empty():
+                self.stalls += 1
+            wait_start = time.time()
+            item = await self._batches.get()
+            self.stall_ms += (time.time() - wait_start) * 1000
+
+            if isinstance(item, Exception):
+                self._error = item
+                raise item
+            if len(item) == 0:
+                self.exhausted = True
+                return None
+
+            self._record_batch_consumed()
+            self._current = item
+            self._position = 0
+            self._batch_rows = len(item)
+
+        row = self._current[self._position]
+        self._position += 1
+        return row
+
+    def _record_batch_consumed(self):
+        """Update the consumption rate when the previous batch has been fully replayed."""
+        now = time.time()
+        if self._batch_started_at is not None and self._batch_rows:
+            elapsed = max(now - self._batch_started_at, 1e-6)
+            rate = self._batch_rows / elapsed
+            self.consumption_rate = rate if self.consumption_rate <= 0 else 0.7 * self.consumption_rate + 0.3 * rate
+        self._batch_started_at = now
+
+    def close(self):
+        """Cancel in-flight fetches and wake any waiting consumer (seek/stop)."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+        self._current = ()
+        self._position = 0
+        try:
+            self._batches.put_nowait([])
+        except asyncio.QueueFull:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch statistics."""
+        return {
+            "batches_fetched": self.batches_fetched,
+            "rows_fetched": self.rows_fetched,
+            "batches_ready": self._batches.qsize(),
+            "rows_buffered": len(self._current) - self._position,
+            "next_batch_size": self.next_batch_size(),
+            "consumption_rate": round(self.consumption_rate, 1),
+            "avg_fetch_ms": round(self.avg_fetch_ms, 2),
+            "stalls": self.stalls,
+            "stall_ms": round(self.stall_ms, 1),
+            "fetch_errors": self.fetch_errors
+        }
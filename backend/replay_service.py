@@ -0,0 +1,286 @@
+"""
+Shared Replay Reader Service
+Serves replay batches for every session from one place, so replaying
+sessions no longer each pin a pooled connection for their lifetime.
+
+- Each batch borrows a connection only for the duration of its query.
+- At most `max_concurrent_queries` replay queries run at once, so the DB
+  connection count stays flat no matter how many sessions are replaying.
+- A request whose range starts inside a query already in flight waits for
+  that query and takes its tail instead of issuing a second one, so
+  sessions near the same cursor share I/O.
+- With a BlockCache, reads walk fixed time buckets that are loaded from
+  Postgres once and then served from memory to every session. Buckets
+  close to wall-clock time (rows may still be arriving) bypass the cache.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from block_cache import BlockCache
+from db import get_connection, return_connection
+from replay_blocks import (
+    OrderBookBlock, datetime_to_unix_us, fetch_next_ts, fetch_orderbook_block,
+    fetch_orderbook_range, ts_is_timezone_aware, unix_us_to_datetime
+)
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping bytes charged per cached bucket on top of its arrays
+BUCKET_OVERHEAD_BYTES = 256
+
+
+class _InFlight:
+    """A replay query other sessions can join."""
+
+    __slots__ = ("after_us", "limit", "task")
+
+    def __init__(self, after_us: int, limit: int, task: asyncio.Task):
+        self.after_us = after_us
+        self.limit = limit
+        self.task = task
+
+
+class ReplayReaderService:
+    """Shared, connection-frugal source of OrderBookBlocks for replay sessions."""
+
+    def __init__(
+        self,
+        max_concurrent_queries: int = 4,
+        table: str = "l2_orderbook",
+        cache: Optional[BlockCache] = None,
+        bucket_seconds: int = 60,
+        recent_seconds: int = 300,
+        timezone_aware: Optional[bool] = None,
+        acquire: Callable[[], Awaitable[Any]] = get_connection,
+        release: Callable[[Any], Awaitable[None]] = return_connection,
+        fetch_block: Callable[..., Awaitable[OrderBookBlock]] = fetch_orderbook_block,
+        fetch_range: Callable[..., Awaitable[OrderBookBlock]] = fetch_orderbook_range,
+        fetch_next: Callable[..., Awaitable[Any]] = fetch_next_ts
+    ):
+        self.max_concurrent_queries = max_concurrent_queries
+        self.table = table
+        self.cache = cache
+        self.bucket_us = bucket_seconds * 1_000_000
+        self.recent_us = recent_seconds * 1_000_000
+        self._tz_aware = timezone_aware  # Looked up on the first cached read when None
+        self._acquire = acquire
+        self._release = release
+        self._fetch_block = fetch_block
+        self._fetch_range = fetch_range
+        self._fetch_next = fetch_next
+        self._semaphore = asyncio.Semaphore(max_concurrent_queries)
+        self._in_flight: Dict[int, _InFlight] = {}
+        self._bucket_loads: Dict[Tuple[str, int], asyncio.Task] = {}
+
+        # Statistics
+        self.queries = 0
+        self.coalesced = 0
+        self.rows_fetched = 0
+        self.waiting = 0
+        self.active_queries = 0
+        self.query_times = []
+
+    async def fetch(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        """Up to `limit` rows strictly after `after_ts`, as one block."""
+        if self.cache is None:
+            return await self._fetch_direct(after_ts, limit)
+        return await self._read_buckets(datetime_to_unix_us(after_ts), limit)
+
+    async def fetch_range(self, start_ts: Any, end_ts: Any, limit: int) -> OrderBookBlock:
+        """Up to `limit` rows with start_ts <= ts < end_ts (history and seek reads)."""
+        start_us = datetime_to_unix_us(start_ts)
+        end_us = datetime_to_unix_us(end_ts)
+        if self.cache is None:
+            after_ts = unix_us_to_datetime(start_us - 1, await self._timezone_aware())
+            block = await self._fetch_direct(after_ts, limit)
+        else:
+            block = await self._read_buckets(start_us - 1, limit, end_us)
+        return block.slice(0, int(np.searchsorted(block.ts_us, end_us, side="left")))
+
+    async def fetch_latest(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        """Like fetch, but never from the cache: for tailing rows that are still being inserted."""
+        return await self._fetch_direct(after_ts, limit)
+
+    def invalidate_range(self, first_us: int, last_us: int) -> int:
+        """
+        Drop cached buckets made stale by rows inserted in [first_us, last_us]:
+        buckets overlapping the range, and empty buckets whose "next row"
+        pointer (or end of data) the new rows precede.
+        """
+        if self.cache is None:
+            return 0
+        lo, hi = first_us // self.bucket_us, last_us // self.bucket_us
+
+        def stale(key, value):
+            if key[0] != self.table:
+                return False
+            block, next_us = value
+            if lo <= key[1] <= hi:
+                return True
+            return not len(block) and key[1] < lo and (next_us is None or next_us > first_us)
+
+        return self.cache.invalidate_where(stale)
+
+    async def _timezone_aware(self) -> bool:
+        """Whether the table's ts is timestamptz, so query parameters match the column."""
+        if self._tz_aware is None:
+            self._tz_aware = await self._query(ts_is_timezone_aware, self.table)
+        return self._tz_aware
+
+    # ---- Uncached reads ----
+
+    async def _fetch_direct(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        after_us = datetime_to_unix_us(after_ts)
+
+        entry = self._find_covering(after_us)
+        if entry is not None:
+            # Shielded: a requester cancelled by seek/stop must not cancel the shared query
+            block = await asyncio.shield(entry.task)
+            tail = block.slice(int(np.searchsorted(block.ts_us, after_us, side="right")))
+            # An empty tail is only the end of data if the shared query was short
+            if len(tail) or len(block) < entry.limit:
+                self.coalesced += 1
+                return tail if len(tail) <= limit else tail.slice(0, limit)
+
+        task = asyncio.create_task(self._query(self._fetch_block, after_ts, limit, self.table))
+        entry = _InFlight(after_us, limit, task)
+        self._in_flight[after_us] = entry
+        task.add_done_callback(lambda task: self._query_done(entry))
+        return await asyncio.shield(task)
+
+    def _find_covering(self, after_us: int) -> Optional[_InFlight]:
+        """The in-flight query starting closest at or before `after_us`."""
+        best = None
+        for entry in self._in_flight.values():
+            if entry.after_us <= after_us and (best is None or entry.after_us > best.after_us):
+                best = entry
+        return best
+
+    def _query_done(self, entry: _InFlight):
+        if self._in_flight.get(entry.after_us) is entry:
+            del self._in_flight[entry.after_us]
+        _log_failure(entry.task)
+
+    async def _query(self, query: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Run one query on a connection borrowed for its duration only."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active_queries += 1
+        try:
+            start = time.time()
+            conn = await self._acquire()
+            try:
+                result = await query(conn, *args)
+            finally:
+                await self._release(conn)
+            self.query_times.append((time.time() - start) * 1000)
+            if len(self.query_times) > 100:
+                self.query_times.pop(0)
+        finally:
+            self.active_queries -= 1
+            self._semaphore.release()
+
+        self.queries += 1
+        if isinstance(result, OrderBookBlock):
+            self.rows_fetched += len(result)
+        return result
+
+    # ---- Cached reads ----
+
+    async def _read_buckets(self, after_us: int, limit: int, end_us: Optional[int] = None) -> OrderBookBlock:
+        """Walk time buckets forward from `after_us`, loading each through the cache."""
+        tz_aware = await self._timezone_aware()
+        hot_from_us = int(time.time() * 1_000_000) - self.recent_us
+        parts: List[OrderBookBlock] = []
+        remaining = limit
+        cursor_us = after_us
+        bucket = after_us // self.bucket_us
+
+        while remaining > 0:
+            bucket_start = bucket * self.bucket_us
+            if end_us is not None and bucket_start >= end_us:
+                break
+
+            if bucket_start + self.bucket_us > hot_from_us:
+                # Rows may still be arriving here: read directly, never cache
+                parts.append(await self._fetch_direct(unix_us_to_datetime(cursor_us, tz_aware), remaining))
+                break
+
+            block, next_us = await self._load_bucket(bucket, tz_aware)
+            if len(block):
+                tail = block.slice(int(np.searchsorted(block.ts_us, cursor_us, side="right")))
+                tail = tail.slice(0, remaining)
+                if len(tail):
+                    parts.append(tail)
+                    remaining -= len(tail)
+                    cursor_us = int(tail.ts_us[-1])
+                bucket += 1
+            elif next_us is None:
+                break  # End of data
+            else:
+                bucket = max(bucket + 1, next_us // self.bucket_us)  # Jump over the gap
+
+        return OrderBookBlock.concat(parts, tz_aware)
+
+    async def _load_bucket(self, bucket: int, tz_aware: bool) -> Tuple[OrderBookBlock, Optional[int]]:
+        """(rows in the bucket, first ts after it if it is empty); one load per bucket."""
+        key = (self.table, bucket)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._bucket_loads.get(key)
+        if task is None:
+            task = asyncio.create_task(self._query_bucket(key, bucket, tz_aware))
+            self._bucket_loads[key] = task
+            task.add_done_callback(lambda task: self._bucket_done(key, task))
+        return await asyncio.shield(task)
+
+    def _bucket_done(self, key: Tuple[str, int], task: asyncio.Task):
+        self._bucket_loads.pop(key, None)
+        _log_failure(task)
+
+    async def _query_bucket(self, key: Tuple[str, int], bucket: int,
+                            tz_aware: bool) -> Tuple[OrderBookBlock, Optional[int]]:
+        start = unix_us_to_datetime(bucket * self.bucket_us, tz_aware)
+        end = unix_us_to_datetime((bucket + 1) * self.bucket_us, tz_aware)
+
+        block = await self._query(self._fetch_range, start, end, self.table)
+        next_us = None
+        if not len(block):
+            next_ts = await self._query(self._fetch_next, end, self.table)
+            if next_ts is not None:
+                next_us = datetime_to_unix_us(next_ts)
+
+        value = (block, next_us)
+        self.cache.put(key, value, block.nbytes + BUCKET_OVERHEAD_BYTES)
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get replay I/O statistics."""
+        avg_query = sum(self.query_times) / len(self.query_times) if self.query_times else 0
+        return {
+            "max_concurrent_queries": self.max_concurrent_queries,
+            "active_queries": self.active_queries,
+            "waiting_requests": self.waiting,
+            "in_flight_ranges": len(self._in_flight),
+            "queries": self.queries,
+            "coalesced_requests": self.coalesced,
+            "rows_fetched": self.rows_fetched,
+            "avg_query_ms": round(avg_query, 2),
+            "block_cache": self.cache.get_stats() if self.cache is not None else None
+        }
+
+
+def _log_failure(task: asyncio.Task):
+    """Retrieve a shared task's error so abandoned failures are not reported as unhandled."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Replay query failed: {task.exception()}")
@@ -0,0 +1,362 @@
+"""
+Replay Data Sources
+Everything replay reads comes through one interface: `fetch(after_ts, limit)`
+and `fetch_range(start_ts, end_ts, limit)`, both returning OrderBookBlocks.
+
+- PostgresReplaySource: the shared ReplayReaderService (pooled, cached).
+- CSVReplaySource: an l2_clean.csv-style file parsed once, vectorized.
+- NpyReplaySource: memory-mapped `.npy` segments plus a JSON manifest that
+  indexes each segment's timestamp range. Reads are array slices of the
+  mapped files, so replay runs from local disk without a database.
+
+Segment directory layout:
+    manifest.json               {"format": "l2-npy", "version": 1, "rows": n,
+                                 "tz_aware": false, "segments": [...]}
+    seg_00000.ts.npy            int64 microseconds since the Unix epoch, (n,)
+    seg_00000.levels.npy        float64 levels ordered like LEVEL_COLUMNS, (n, 40)
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from replay_blocks import DEPTH, LEVEL_COLUMNS, OrderBookBlock, datetime_to_unix_us
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+NPY_FORMAT = "l2-npy"
+NPY_VERSION = 1
+SYNTHETIC_INTERVAL_US = 100_000  # Row spacing when a CSV carries no timestamps
+
+
+class ReplaySource:
+    """Ordered order book data that replay sessions read in blocks."""
+
+    kind = "base"
+
+    async def fetch(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        """Up to `limit` rows strictly after `after_ts`."""
+        raise NotImplementedError
+
+    async def fetch_range(self, start_ts: Any, end_ts: Any, limit: int) -> OrderBookBlock:
+        """Up to `limit` rows with start_ts <= ts < end_ts."""
+        raise NotImplementedError
+
+    async def fetch_tail(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        """Rows after `after_ts` for a session following new inserts; bypasses any caching."""
+        return await self.fetch(after_ts, limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind}
+
+
+class PostgresReplaySource(ReplaySource):
+    """The l2_orderbook table, read through the shared replay reader service."""
+
+    kind = "postgres"
+
+    def __init__(self, service):
+        self.service = service
+
+    async def fetch(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        return await self.service.fetch(after_ts, limit)
+
+    async def fetch_range(self, start_ts: Any, end_ts: Any, limit: int) -> OrderBookBlock:
+        return await self.service.fetch_range(start_ts, end_ts, limit)
+
+    async def fetch_tail(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        return await self.service.fetch_latest(after_ts, limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "table": self.service.table}
+
+
+class ArrayReplaySource(ReplaySource):
+    """Rows held in (possibly memory-mapped) segment arrays, sorted by ts."""
+
+    kind = "array"
+
+    def __init__(self, segments: List[OrderBookBlock], tz_aware: bool = False):
+        self.segments = [s for s in segments if len(s)]
+        self.tz_aware = tz_aware
+        # Timestamp index: first/last ts of every segment
+        self._first_us = np.array([s.ts_us[0] for s in self.segments], dtype=np.int64)
+        self._last_us = np.array([s.ts_us[-1] for s in self.segments], dtype=np.int64)
+        self.rows = sum(len(s) for s in self.segments)
+        self.rows_served = 0
+
+    async def fetch(self, after_ts: Any, limit: int) -> OrderBookBlock:
+        return self.read_after(datetime_to_unix_us(after_ts), limit)
+
+    async def fetch_range(self, start_ts: Any, end_ts: Any, limit: int) -> OrderBookBlock:
+        return self.read_range(datetime_to_unix_us(start_ts), datetime_to_unix_us(end_ts), limit)
+
+    def read_after(self, after_us: int, limit: int) -> OrderBookBlock:
+        """Up to `limit` rows with ts > after_us, sliced straight from the segments."""
+        parts = []
+        remaining = limit
+        seg = int(np.searchsorted(self._last_us, after_us, side="right"))  # First segment ending after the cursor
+        while remaining > 0 and seg < len(self.segments):
+            segment = self.segments[seg]
+            start = int(np.searchsorted(segment.ts_us, after_us, side="right")) if self._first_us[seg] <= after_us else 0
+            part = segment.slice(start, start + remaining)
+            parts.append(part)
+            remaining -= len(part)
+            seg += 1
+
+        block = OrderBookBlock.concat(parts, self.tz_aware)
+        self.rows_served += len(block)
+        return block
+
+    def read_range(self, start_us: int, end_us: int, limit: Optional[int] = None) -> OrderBookBlock:
+        """Rows with start_us <= ts < end_us (at most `limit`), copying only what is in range."""
+        parts = []
+        remaining = self.rows if limit is None else limit
+        seg = int(np.searchsorted(self._last_us, start_us, side="left"))
+        while remaining > 0 and seg < len(self.segments) and self._first_us[seg] < end_us:
+            segment = self.segments[seg]
+            start = int(np.searchsorted(segment.ts_us, start_us, side="left"))
+            stop = int(np.searchsorted(segment.ts_us, end_us, side="left"))
+            part = segment.slice(start, min(stop, start + remaining))
+            parts.append(part)
+            remaining -= len(part)
+            seg += 1
+
+        block = OrderBookBlock.concat(parts, self.tz_aware)
+        self.rows_served += len(block)
+        return block
+
+    def bounds_us(self) -> Optional[tuple]:
+        """(first, last) row timestamps, or None when empty."""
+        if not self.segments:
+            return None
+        return int(self._first_us[0]), int(self._last_us[-1])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "segments": len(self.segments),
+            "rows_served": self.rows_served
+        }
+
+
+class CSVReplaySource(ArrayReplaySource):
+    """An order book CSV parsed once into arrays (no per-row dicts)."""
+
+    kind = "csv"
+
+    def __init__(self, path: str, chunksize: int = 200_000):
+        self.path = path
+        start = time.time()
+        block = OrderBookBlock.concat(read_csv_blocks(path, chunksize))
+        super().__init__([block], block.tz_aware)
+        logger.info(f"Loaded {self.rows} rows from {path} in {time.time() - start:.2f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "path": self.path}
+
+
+class NpyReplaySource(ArrayReplaySource):
+    """Memory-mapped `.npy` segments described by a manifest."""
+
+    kind = "npy"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        manifest = read_manifest(directory)
+        segments = []
+        for entry in manifest["segments"]:
+            # Live recordings preallocate segments; only the first `rows` are written
+            n = entry["rows"]
+            ts_us = np.load(os.path.join(directory, entry["ts"]), mmap_mode="r")[:n]
+            levels = np.load(os.path.join(directory, entry["levels"]), mmap_mode="r")[:n]
+            segments.append(OrderBookBlock(
+                ts_us,
+                levels[:, :2 * DEPTH].reshape(n, DEPTH, 2),
+                levels[:, 2 * DEPTH:].reshape(n, DEPTH, 2),
+                manifest["tz_aware"]
+            ))
+        super().__init__(segments, manifest["tz_aware"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "path": self.directory}
+
+
+# --------------------------------------------------
+# CSV parsing
+# --------------------------------------------------
+def csv_chunk_to_block(df: pd.DataFrame, synthetic_start_us: int = 0) -> OrderBookBlock:
+    """
+    Vectorized conversion of an l2 CSV chunk.
+
+    Named `bid_price_1..ask_volume_10` columns are used when present;
+    otherwise the first 40 columns (after a pandas index column) are taken
+    as interleaved price/volume levels, bids then asks, as in l2_clean.csv.
+    Timestamps come from a `ts` column, else a text column right after the
+    levels, else are synthesized at 100 ms spacing.
+    """
+    if "Unnamed: 0" in df.columns:
+        df = df.drop(columns=["Unnamed: 0"])
+
+    if all(c in df.columns for c in LEVEL_COLUMNS):
+        levels = df[LEVEL_COLUMNS].to_numpy(dtype=np.float64)
+        rest = df.drop(columns=LEVEL_COLUMNS)
+    else:
+        if df.shape[1] < len(LEVEL_COLUMNS):
+            raise ValueError(f"Expected at least {len(LEVEL_COLUMNS)} level columns, got {df.shape[1]}")
+        levels = df.iloc[:, :len(LEVEL_COLUMNS)].to_numpy(dtype=np.float64)
+        rest = df.iloc[:, len(LEVEL_COLUMNS):]
+
+    ts_column = None
+    if "ts" in rest.columns:
+        ts_column = "ts"
+    elif len(rest.columns) and rest.dtypes.iloc[0] == object:  # Numeric trailers (e.g. mid_price) are not times
+        ts_column = rest.columns[0]
+    tz_aware = False
+    if ts_column is not None:
+        ts = pd.to_datetime(rest[ts_column], format="mixed")
+        if ts.dt.tz is not None:
+            tz_aware = True
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        ts_us = ts.to_numpy(dtype="datetime64[us]").astype(np.int64)
+    else:
+        ts_us = synthetic_start_us + np.arange(len(df), dtype=np.int64) * SYNTHETIC_INTERVAL_US
+
+    return OrderBookBlock.from_levels(ts_us, levels, tz_aware)
+
+
+def read_csv_blocks(path: str, chunksize: int = 200_000, skip_rows: int = 0) -> Iterable[OrderBookBlock]:
+    """Stream an order book CSV as OrderBookBlocks, optionally starting `skip_rows` data rows in."""
+    next_synthetic_us = datetime_to_unix_us(datetime.fromtimestamp(os.path.getmtime(path), timezone.utc))
+    next_synthetic_us += skip_rows * SYNTHETIC_INTERVAL_US
+    skiprows = range(1, skip_rows + 1) if skip_rows else None  # Keep the header
+    for chunk in pd.read_csv(path, chunksize=chunksize, skiprows=skiprows):
+        block = csv_chunk_to_block(chunk, next_synthetic_us)
+        if len(block):
+            next_synthetic_us = int(block.ts_us[-1]) + SYNTHETIC_INTERVAL_US
+            yield block
+
+
+# --------------------------------------------------
+# .npy segment files
+# --------------------------------------------------
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != NPY_FORMAT or manifest.get("version") != NPY_VERSION:
+        raise ValueError(f"Unsupported replay segment format in {directory}")
+    return manifest
+
+
+class NpySegmentWriter:
+    """Writes ordered OrderBookBlocks as fixed-size `.npy` segments plus a manifest."""
+
+    def __init__(self, directory: str, segment_rows: int = 1_000_000):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.segments: List[Dict[str, Any]] = []
+        self.rows = 0
+        self.tz_aware: Optional[bool] = None
+        self._pending: List[OrderBookBlock] = []
+        self._pending_rows = 0
+        self._last_us: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, block: OrderBookBlock):
+        if not len(block):
+            return
+        if self._last_us is not None and block.ts_us[0] < self._last_us:
+            raise ValueError("Blocks must be appended in timestamp order")
+        if self.tz_aware is None:
+            self.tz_aware = block.tz_aware
+        self._last_us = int(block.ts_us[-1])
+
+        self._pending.append(block)
+        self._pending_rows += len(block)
+        while self._pending_rows >= self.segment_rows:
+            merged = OrderBookBlock.concat(self._pending)
+            self._write_segment(merged.slice(0, self.segment_rows))
+            rest = merged.slice(self.segment_rows)
+            self._pending = [rest] if len(rest) else []
+            self._pending_rows = len(rest)
+
+    def close(self) -> Dict[str, Any]:
+        """Flush the last partial segment and write the manifest."""
+        if self._pending_rows:
+            self._write_segment(OrderBookBlock.concat(self._pending))
+            self._pending = []
+            self._pending_rows = 0
+
+        manifest = {
+            "format": NPY_FORMAT,
+            "version": NPY_VERSION,
+            "rows": self.rows,
+            "tz_aware": bool(self.tz_aware),
+            "columns": LEVEL_COLUMNS,
+            "segments": self.segments
+        }
+        # Written last so a partial conversion is never mistaken for a complete one
+        with open(os.path.join(self.directory, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _write_segment(self, block: OrderBookBlock):
+        name = f"seg_{len(self.segments):05d}"
+        n = len(block)
+        levels = np.concatenate([block.bids.reshape(n, -1), block.asks.reshape(n, -1)], axis=1)
+        np.save(os.path.join(self.directory, f"{name}.ts.npy"), np.ascontiguousarray(block.ts_us))
+        np.save(os.path.join(self.directory, f"{name}.levels.npy"), np.ascontiguousarray(levels))
+        self.segments.append({
+            "ts": f"{name}.ts.npy",
+            "levels": f"{name}.levels.npy",
+            "rows": n,
+            "first_ts_us": int(block.ts_us[0]),
+            "last_ts_us": int(block.ts_us[-1])
+        })
+        self.rows += n
+
+
+def convert_csv_to_npy(csv_path: str, directory: str, segment_rows: int = 1_000_000,
+                       chunksize: int = 200_000) -> Dict[str, Any]:
+    """Convert an order book CSV into a memory-mappable segment directory."""
+    writer = NpySegmentWriter(directory, segment_rows)
+    for block in read_csv_blocks(csv_path, chunksize):
+        writer.append(block)
+    return writer.close()
+
+
+# --------------------------------------------------
+# Factory
+# --------------------------------------------------
+_file_sources: Dict[str, Tuple[Optional[int], ReplaySource]] = {}  # path -> (manifest mtime, source)
+
+
+def open_replay_source(spec: str, service=None) -> ReplaySource:
+    """
+    Resolve a REPLAY_SOURCE setting: "postgres", a CSV file, or a segment
+    directory. File sources are loaded once per path and shared; a segment
+    directory is reopened when its manifest changes, so segments the live
+    recorder adds later become visible.
+    """
+    if spec in ("", "postgres", "db"):
+        if service is None:
+            raise ValueError("Postgres replay source requires a ReplayReaderService")
+        return PostgresReplaySource(service)
+
+    path = os.path.abspath(spec)
+    if os.path.isdir(path):
+        mtime = os.stat(os.path.join(path, MANIFEST_NAME)).st_mtime_ns
+        if _file_sources.get(path, (None,))[0] != mtime:
+            _file_sources[path] = (mtime, NpyReplaySource(path))
+    elif path not in _file_sources:
+        if not path.lower().endswith(".csv"):
+            raise ValueError(f"Unknown replay source: {spec}")
+        _file_sources[path] = (None, CSVReplaySource(path))
+    return _file_sources[path][1]
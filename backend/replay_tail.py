@@ -0,0 +1,185 @@
+"""
+Replay Tail: Follow New l2_orderbook Rows via LISTEN/NOTIFY
+When a tailing replay session reaches the newest row it waits for an insert
+notification instead of ending (or re-querying in a loop).
+
+- Writers announce inserts on TAIL_CHANNEL: a statement-level trigger
+  (ensure_notify_trigger) covers any writer with an empty payload, and the
+  bulk loader sends "<first_us>,<last_us>" for each committed chunk so cached
+  replay buckets covering those rows can be invalidated.
+- One TailListener holds a dedicated LISTEN connection for the whole
+  process and bumps a version counter per notification. Sessions remember
+  the version they read at, so a notification that arrives mid-read is
+  never missed, and the database is only queried after a wakeup.
+- Wakeups are debounced so a burst of inserts becomes one batched fetch.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from replay_blocks import OrderBookBlock
+
+logger = logging.getLogger(__name__)
+
+TAIL_CHANNEL = "l2_orderbook_insert"
+
+
+def insert_payload(block: OrderBookBlock) -> str:
+    """Notification payload for rows just written: their first and last ts (unix us)."""
+    return f"{int(block.ts_us[0])},{int(block.ts_us[-1])}"
+
+
+def parse_payload(payload: str) -> Optional[Tuple[int, int]]:
+    """(first_us, last_us) from a loader payload, or None for trigger notifications."""
+    try:
+        first, last = payload.split(",")
+        return int(first), int(last)
+    except (AttributeError, ValueError):
+        return None
+
+
+async def notify_inserted(conn, block: OrderBookBlock, channel: str = TAIL_CHANNEL):
+    """Announce `block`; inside a transaction the notification is delivered on commit."""
+    if len(block):
+        await conn.execute("SELECT pg_notify($1, $2)", channel, insert_payload(block))
+
+
+def notify_trigger_sql(table: str = "l2_orderbook", channel: str = TAIL_CHANNEL) -> str:
+    # Statement-level and without transition tables, so it also works on hypertables
+    # and costs one notification per INSERT/COPY rather than per row
+    name = table.split(".")[-1]
+    return f"""
+CREATE OR REPLACE FUNCTION {name}_notify_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{channel}', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS {name}_notify_insert ON {table};
+CREATE TRIGGER {name}_notify_insert
+    AFTER INSERT ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION {name}_notify_insert();
+"""
+
+
+async def ensure_notify_trigger(conn, table: str = "l2_orderbook", channel: str = TAIL_CHANNEL):
+    await conn.execute(notify_trigger_sql(table, channel))
+    logger.info(f"Insert notifications enabled on {table} ({channel})")
+
+
+class TailListener:
+    """Process-wide LISTEN connection that wakes tailing replay sessions."""
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        channel: str = TAIL_CHANNEL,
+        debounce: float = 0.05,
+        reconnect_delay: float = 5.0,
+        on_insert: Optional[Callable[[int, int], None]] = None
+    ):
+        self.connect = connect
+        self.channel = channel
+        self.debounce = debounce
+        self.reconnect_delay = reconnect_delay
+        self.on_insert = on_insert  # Called with (first_us, last_us) for loader notifications
+        self.version = 0
+        self._changed = asyncio.Event()
+        self._conn = None
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Statistics
+        self.notifications = 0
+        self.reconnects = 0
+        self.waiters = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+    async def _run(self):
+        while True:
+            try:
+                self._lost.clear()
+                conn = await self.connect()
+                conn.add_termination_listener(lambda conn: self._lost.set())
+                await conn.add_listener(self.channel, self._on_notify)
+                self._conn = conn
+                if self.reconnects:
+                    self._wake()  # Notifications may have been missed while disconnected
+                logger.info(f"Listening for inserts on {self.channel}")
+                await self._lost.wait()
+                logger.warning("Tail listener connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Tail listener error: {e}")
+            await self._close()
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.notifications += 1
+        span = parse_payload(payload)
+        if span is not None and self.on_insert is not None:
+            try:
+                self.on_insert(*span)
+            except Exception as e:
+                logger.error(f"Tail insert callback failed: {e}")
+        self._wake()
+
+    def _wake(self):
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, version: int, timeout: float) -> bool:
+        """
+        True once a notification newer than `version` has arrived (after the
+        debounce), False on timeout so callers can re-check session state.
+        """
+        if self.version == version:
+            self.waiters += 1
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiters -= 1
+        if self.debounce > 0:
+            await asyncio.sleep(self.debounce)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "connected": self.connected,
+            "version": self.version,
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+            "waiting_sessions": self.waiters
+        }
@@ -0,0 +1,293 @@
+"""
+Columnar Ring Store
+Fixed-capacity, NumPy-backed history of processed snapshots, replacing
+Python lists of full snapshot dicts for the dashboard buffer, the per-session
+WebSocket history and the model input windows.
+
+- ArrayRing: preallocated array of fixed-shape rows; append overwrites the
+  oldest row in O(1) and `ordered()` returns the rows oldest first.
+- SnapshotRing: parallel column arrays sharing one ring index. The order
+  books are kept as (capacity, 10, 2) float arrays and numeric fields as
+  float columns (created when a field first appears). Strings, lists, dicts and missing
+  values go into a small per-row `extras` dict. Rows are rebuilt as
+  dicts only when an endpoint returns them.
+- Every row carries its timestamp in unix microseconds, so history can be
+  read by time range without parsing strings.
+"""
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from replay_blocks import DEPTH
+
+logger = logging.getLogger(__name__)
+
+_BOOK_KEYS = ("bids", "asks")
+_INT, _FLOAT, _BOOL = "i", "f", "b"
+NO_TS = np.iinfo(np.int64).min  # Rows whose timestamp could not be parsed
+
+
+class ArrayRing:
+    """Fixed-capacity ring of equally shaped rows."""
+
+    def __init__(self, capacity: int, shape: Tuple[int, ...] = (), dtype=np.float64):
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self.capacity = capacity
+        self.data = np.zeros((capacity,) + tuple(shape), dtype=dtype)
+        self.start = 0  # Physical index of the oldest row
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def slot(self) -> int:
+        """Physical index for the next row, evicting the oldest when full."""
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        return index
+
+    def append(self, row):
+        self.data[self.slot()] = row
+
+    def drop(self, n: int = 1):
+        """Forget the oldest `n` rows."""
+        n = min(n, self.size)
+        self.start = (self.start + n) % self.capacity
+        self.size -= n
+
+    def physical(self, logical) -> np.ndarray:
+        """Physical indices for logical positions (0 = oldest)."""
+        return (self.start + np.asarray(logical)) % self.capacity
+
+    def ordered(self, last: Optional[int] = None) -> np.ndarray:
+        """Rows oldest first (the newest `last` rows if given), as a copy."""
+        n = self.size if last is None else max(0, min(last, self.size))
+        return self.data[self.physical(np.arange(self.size - n, self.size))]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
+def timestamp_us(value: Any) -> int:
+    """A snapshot timestamp (ISO string or datetime; naive is UTC) in unix microseconds."""
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1_000_000)
+    except (AttributeError, TypeError, ValueError):
+        return NO_TS
+
+
+def _numeric_kind(value: Any) -> Optional[str]:
+    if isinstance(value, (bool, np.bool_)):
+        return _BOOL
+    if isinstance(value, (int, np.integer)):
+        return _INT
+    if isinstance(value, (float, np.floating)) and value == value:
+        return _FLOAT
+    return None
+
+
+class SnapshotRing:
+    """Columnar ring buffer of processed snapshots."""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._index = ArrayRing(capacity)  # Drives slot allocation for all columns
+        self.ts_us = np.full(capacity, NO_TS, dtype=np.int64)
+        self.books = {key: np.full((capacity, DEPTH, 2), np.nan) for key in _BOOK_KEYS}
+        self.depths = {key: np.full(capacity, -1, dtype=np.int8) for key in _BOOK_KEYS}  # -1: not a book
+        self.n_anomalies = np.zeros(capacity, dtype=np.int16)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.kinds: Dict[str, str] = {}
+        self.extras = np.empty(capacity, dtype=object)
+        self.appended = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def _column(self, key: str, kind: str) -> np.ndarray:
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = np.full(self.capacity, np.nan)
+            self.kinds[key] = kind
+        elif kind == _FLOAT and self.kinds[key] != _FLOAT:
+            self.kinds[key] = _FLOAT  # Mixed int/float fields come back as floats
+        return column
+
+    def append(self, snapshot: Dict[str, Any]):
+        i = self._index.slot()
+        self.appended += 1
+        for column in self.columns.values():
+            column[i] = np.nan
+        extras = {}
+
+        self.ts_us[i] = timestamp_us(snapshot.get("timestamp"))
+        for key, value in snapshot.items():
+            if key in _BOOK_KEYS and self._store_book(i, key, value):
+                continue
+            kind = _numeric_kind(value)
+            if kind is None:
+                extras[key] = value
+            else:
+                self._column(key, kind)[i] = value
+        for key in _BOOK_KEYS:
+            if key not in snapshot or key in extras:
+                self.depths[key][i] = -1
+
+        anomalies = extras.get("anomalies")
+        self.n_anomalies[i] = len(anomalies) if isinstance(anomalies, list) else 0
+        self.extras[i] = extras or None
+
+    def _store_book(self, i: int, key: str, levels) -> bool:
+        """Copy a <= DEPTH level [price, volume] book into the arrays; False if it does not fit."""
+        try:
+            if len(levels) > DEPTH:
+                return False
+            book = self.books[key][i]
+            book.fill(np.nan)
+            if len(levels):
+                book[:len(levels)] = np.asarray(levels, dtype=np.float64).reshape(len(levels), 2)
+            self.depths[key][i] = len(levels)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    # ---- Reads ----
+
+    def _physical(self, positions) -> np.ndarray:
+        return self._index.physical(positions)
+
+    def positions(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                  last: Optional[int] = None) -> np.ndarray:
+        """Logical positions (oldest first) with start_us <= ts < end_us, limited to the newest `last`."""
+        positions = np.arange(len(self))
+        if start_us is not None or end_us is not None:
+            ts = self.ts_us[self._physical(positions)]
+            keep = np.ones(len(positions), dtype=bool)
+            if start_us is not None:
+                keep &= ts >= start_us
+            if end_us is not None:
+                keep &= ts < end_us
+            positions = positions[keep]
+        if last is not None:
+            positions = positions[max(0, len(positions) - last):]
+        return positions
+
+    def row(self, position: int) -> Dict[str, Any]:
+        """Rebuild the snapshot dict at a logical position (0 = oldest, -1 = newest)."""
+        if position < 0:
+            position += len(self)
+        i = int(self._physical(position))
+        row: Dict[str, Any] = {}
+        for key, column in self.columns.items():
+            value = column[i]
+            if value == value:
+                kind = self.kinds[key]
+                row[key] = bool(value) if kind == _BOOL else int(value) if kind == _INT else float(value)
+        for key in _BOOK_KEYS:
+            depth = self.depths[key][i]
+            if depth >= 0:
+                row[key] = self.books[key][i, :depth].tolist()
+        if self.extras[i]:
+            row.update(self.extras[i])
+        return row
+
+    def rows(self, positions: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        if positions is None:
+            positions = range(len(self))
+        return [self.row(int(p)) for p in positions]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return self.rows()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.row(-1) if len(self) else None
+
+    def column(self, key: str, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """A numeric field for the given positions (all rows by default); NaN where absent."""
+        if positions is None:
+            positions = np.arange(len(self))
+        column = self.columns.get(key)
+        if column is None:
+            return np.full(len(positions), np.nan)
+        return column[self._physical(positions)]
+
+    def values(self, key: str, positions: Optional[np.ndarray] = None) -> List[Any]:
+        """Any field for the given positions as Python values (None where absent)."""
+        if positions is None:
+            positions = np.arange(len(self))
+        physical = self._physical(positions)
+        column = self.columns.get(key)
+        if column is not None:
+            kind = self.kinds[key]
+            cast = bool if kind == _BOOL else int if kind == _INT else float
+            out = [cast(v) if v == v else None for v in column[physical].tolist()]
+        else:
+            out = [None] * len(physical)
+        depths = self.depths.get(key)
+        for n, i in enumerate(physical.tolist()):
+            if out[n] is not None:
+                continue
+            if depths is not None and depths[i] >= 0:
+                out[n] = self.books[key][i, :depths[i]].tolist()
+            elif self.extras[i]:
+                out[n] = self.extras[i].get(key)
+        return out
+
+    def anomaly_positions(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """The positions whose snapshot raised at least one anomaly."""
+        if positions is None:
+            positions = np.arange(len(self))
+        return positions[self.n_anomalies[self._physical(positions)] > 0]
+
+    def iter_anomalies(self, types=None, positions: Optional[np.ndarray] = None):
+        """(snapshot row, anomaly) pairs oldest first, optionally only for the given types."""
+        for p in self.anomaly_positions(positions):
+            row = self.row(int(p))
+            for anomaly in row.get("anomalies") or ():
+                if types is None or anomaly.get("type") in types:
+                    yield row, anomaly
+
+    def clear(self):
+        self._index.clear()
+
+    def nbytes(self) -> int:
+        """Approximate retained bytes (arrays plus the per-row extras dicts)."""
+        arrays = (self.ts_us.nbytes + self.n_anomalies.nbytes
+                  + sum(b.nbytes for b in self.books.values()) + sum(d.nbytes for d in self.depths.values())
+                  + sum(c.nbytes for c in self.columns.values()) + self.extras.nbytes)
+        return arrays + sum(_deep_size(e) for e in self.extras if e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "size": len(self),
+            "appended": self.appended,
+            "numeric_columns": len(self.columns),
+            "bytes": self.nbytes()
+        }
+
+
+def _deep_size(value: Any) -> int:
+    """Rough recursive size of plain Python containers."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(v) for v in value)
+    return size
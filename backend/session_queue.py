@@ -0,0 +1,226 @@
+"""
+Bounded Session Queues
+Per-session snapshot queues with a fixed capacity and a selectable
+overflow policy, so slow clients or stalled engines cannot grow memory
+without bound.
+"""
+import asyncio
+import logging
+import queue
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"  # Evict the oldest item to make room
+CONFLATE = "conflate"        # Keep only the latest item per symbol
+BLOCK = "block"              # Make the producer wait (replay must not lose rows)
+POLICIES = (DROP_OLDEST, CONFLATE, BLOCK)
+
+
+def default_conflation_key(item: Any) -> Optional[str]:
+    """
+    Conflation key for raw snapshots and (processed, processing_time) tuples.
+    Items carrying a strategy trade event get no key so they are never overwritten.
+    """
+    if isinstance(item, tuple):
+        item = item[0]
+    if not isinstance(item, dict):
+        return None
+    strategy = item.get("strategy")
+    if strategy and strategy.get("trade_event"):
+        return None
+    return item.get("symbol") or "__default__"
+
+
+class SessionQueue:
+    """
+    Bounded FIFO queue with an overflow policy.
+
+    Mirrors the subset of the `queue.Queue` API used by the session workers
+    (`put_nowait`, `get_nowait`, `qsize`, `empty`) and raises the same
+    `queue.Full` / `queue.Empty` exceptions. The async `put` waits for space
+    under the BLOCK policy and never blocks otherwise.
+    """
+
+    def __init__(self, maxsize: int = 1000, policy: str = DROP_OLDEST,
+                 key_func: Callable[[Any], Optional[str]] = default_conflation_key):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be >= 1, got {maxsize}")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {POLICIES}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key_func = key_func
+
+        # Entries are [key, item] lists so conflation can replace in place
+        self._entries: deque = deque()
+        self._latest_by_key: Dict[str, list] = {}
+        self._space_available: Optional[asyncio.Event] = None
+
+        # Statistics
+        self.total_put = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked_puts = 0
+        self.high_watermark = 0
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def full(self) -> bool:
+        return len(self._entries) >= self.maxsize
+
+    def set_policy(self, policy: str):
+        """Switch overflow policy (e.g. when the server changes mode)."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {POLICIES}")
+        self.policy = policy
+        if policy != CONFLATE:
+            self._latest_by_key.clear()
+        self._notify_space()
+
+    def put_nowait(self, item: Any):
+        """Enqueue an item, applying the overflow policy when full."""
+        if self.policy == CONFLATE:
+            key = self.key_func(item)
+            entry = self._latest_by_key.get(key) if key is not None else None
+            if entry is not None:
+                entry[1] = item
+                self.conflated += 1
+                self.total_put += 1
+                return
+
+        if self.full():
+            if self.policy == BLOCK:
+                raise queue.Full
+            self._evict_oldest()
+
+        entry = [self.key_func(item) if self.policy == CONFLATE else None, item]
+        self._entries.append(entry)
+        if entry[0] is not None:
+            self._latest_by_key[entry[0]] = entry
+
+        self.total_put += 1
+        if len(self._entries) > self.high_watermark:
+            self.high_watermark = len(self._entries)
+
+    async def put(self, item: Any):
+        """Enqueue an item, waiting for space under the BLOCK policy."""
+        if self.policy == BLOCK and self.full():
+            self.blocked_puts += 1
+            while self.policy == BLOCK and self.full():
+                if self._space_available is None:
+                    self._space_available = asyncio.Event()
+                self._space_available.clear()
+                await self._space_available.wait()
+        self.put_nowait(item)
+
+    def get_nowait(self) -> Any:
+        """Dequeue the oldest item."""
+        if not self._entries:
+            raise queue.Empty
+        entry = self._entries.popleft()
+        if entry[0] is not None and self._latest_by_key.get(entry[0]) is entry:
+            del self._latest_by_key[entry[0]]
+        self._notify_space()
+        return entry[1]
+
+    def clear(self):
+        """Drop all queued items (e.g. on stop or rewind)."""
+        self._entries.clear()
+        self._latest_by_key.clear()
+        self._notify_space()
+
+    def _evict_oldest(self):
+        entry = self._entries.popleft()
+        if entry[0] is not None and self._latest_by_key.get(entry[0]) is entry:
+            del self._latest_by_key[entry[0]]
+        self.dropped += 1
+
+    def _notify_space(self):
+        if self._space_available is not None:
+            self._space_available.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and overflow counters."""
+        return {
+            "policy": self.policy,
+            "depth": len(self._entries),
+            "maxsize": self.maxsize,
+            "high_watermark": self.high_watermark,
+            "total_put": self.total_put,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "blocked_puts": self.blocked_puts
+        }
+
+
+class CreditGate:
+    """
+    Credit-based flow control between a replay producer and the analytics stage.
+
+    The producer acquires one credit per snapshot and the analytics worker
+    returns it once the snapshot has been processed, so the producer runs
+    exactly as fast as downstream work completes and never has to drop rows.
+    """
+
+    def __init__(self, credits: int = 64):
+        if credits < 1:
+            raise ValueError(f"credits must be >= 1, got {credits}")
+        self.capacity = credits
+        self.available = credits
+        self._credit_returned: Optional[asyncio.Event] = None
+
+        # Statistics
+        self.total_acquired = 0
+        self.total_released = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.capacity - self.available
+
+    async def acquire(self):
+        """Wait for a credit and take it."""
+        if self.available <= 0:
+            self.waits += 1
+            start = time.time()
+            while self.available <= 0:
+                if self._credit_returned is None:
+                    self._credit_returned = asyncio.Event()
+                self._credit_returned.clear()
+                await self._credit_returned.wait()
+            self.total_wait_ms += (time.time() - start) * 1000
+        self.available -= 1
+        self.total_acquired += 1
+
+    def release(self, n: int = 1):
+        """Return credits as downstream work completes."""
+        self.available = min(self.capacity, self.available + n)
+        self.total_released += n
+        if self._credit_returned is not None:
+            self._credit_returned.set()
+
+    def reset(self):
+        """Return all credits (e.g. when queued work is discarded)."""
+        self.available = self.capacity
+        if self._credit_returned is not None:
+            self._credit_returned.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get credit usage statistics."""
+        return {
+            "capacity": self.capacity,
+            "available": self.available,
+            "in_flight": self.in_flight,
+            "total_acquired": self.total_acquired,
+            "producer_waits": self.waits,
+            "avg_wait_ms": round(self.total_wait_ms / self.waits, 3) if self.waits else 0
+        }
@@ -1,9 +1,12 @@
 import asyncio
 import logging
 from typing import Dict, Optional
-from datetime import datetime
-from collections import deque
-import queue
+from datetime import datetime, timedelta, timezone
+from adaptive_processor import AdaptiveProcessor, REPLAY_MAX_TIER
+from session_queue import SessionQueue, CreditGate, BLOCK, POLICIES
+from replay_checkpoints import CheckpointIndex
+from replay_pacing import ReplayPacer
+from ring_store import SnapshotRing
 
 logger = logging.getLogger(__name__)
 
@@ -11,34 +14,70 @@ logger = logging.getLogger(__name__)
 class UserSession:
     """Individual user's replay session."""
     
-    def __init__(self, session_id: str, user_id: Optional[int] = None):
+    def __init__(self, session_id: str, user_id: Optional[int] = None,
+                 queue_size: int = 1000, queue_policy: str = BLOCK, replay_credits: int = 64,
+                 checkpoint_interval: float = 10.0, max_gap_seconds: float = 5.0,
+                 adaptive_budget_ms: float = 100.0):
         self.session_id = session_id
         self.user_id = user_id
         self.state = "STOPPED"  # STOPPED, PLAYING, PAUSED
         self.speed = 1
+        # fixed: 0.25s / speed per row, exchange: recorded timing x factor, max: limited only by analytics
+        self.pacer = ReplayPacer(max_gap_seconds=max_gap_seconds)
         self.cursor_ts = None
-        self.data_buffer = deque(maxlen=100)
-        self.replay_buffer = deque()
+        self.pending_seek = None  # Target ts; the replay loop restores state before reading on
+        self.last_seek = None
+        self.symbol = None  # LIVE subscription; None follows the active live symbol
+        self.resolution = "raw"  # Replay raw rows or the closing books of an aggregate (1s, 1m)
+        self.data_buffer = SnapshotRing(100)  # WebSocket history sent on (re)connect
+        self.replay_reader = None  # PrefetchingReplayReader owned by the replay loop
+        self.tail = False  # At the newest row, wait for inserts instead of finishing
+        self.tail_waiting = False  # Caught up; the loop waits for a notification newer than tail_version
+        self.tail_following = False  # Caught up at least once; reads bypass the block cache
+        self.tail_version = 0
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
         
         # Session lifecycle flag for async workers
         self._running = True
         
-        # Session-specific queues - LIVE MODE: Unlimited
-        self.raw_snapshot_queue = queue.Queue(maxsize=0)  # Unlimited for LIVE mode
-        self.processed_snapshot_queue = queue.Queue(maxsize=0)  # Unlimited for LIVE mode
+        # Session-specific bounded queues. Raw rows come only from replay producers and
+        # each holds a credit, so that queue always blocks; the processed queue uses
+        # `queue_policy` (CONFLATE/DROP_OLDEST for live data) unless a replay is running
+        self.queue_policy = queue_policy
+        self.raw_snapshot_queue = SessionQueue(maxsize=queue_size, policy=BLOCK)
+        self.processed_snapshot_queue = SessionQueue(maxsize=queue_size, policy=queue_policy)
+        
+        # Replay producers take a credit per row; the analytics worker returns it
+        self.replay_credits = CreditGate(replay_credits)
+        
+        # Engine/strategy snapshots by replay ts for seek and rewind
+        self.checkpoints = CheckpointIndex(interval_seconds=checkpoint_interval)
+        
+        # This session's load-shedding tier; a slow replay degrades only itself
+        self.adaptive = AdaptiveProcessor(budget_ms=adaptive_budget_ms, max_tier=REPLAY_MAX_TIER)
     
     def start(self):
         """Start replay."""
         self.state = "PLAYING"
+        self._apply_queue_policy()
         self.last_activity = datetime.now()
         logger.info(f"Session {self.session_id}: Started")
     
+    @property
+    def pacing(self) -> str:
+        return self.pacer.mode
+    
+    @property
+    def replaying(self) -> bool:
+        """A replay is playing or paused; its rows must not be dropped or conflated."""
+        return self.state in ("PLAYING", "PAUSED")
+    
     def pause(self):
         """Pause replay."""
         if self.state == "PLAYING":
             self.state = "PAUSED"
+            self.pacer.reset()
             self.last_activity = datetime.now()
             logger.info(f"Session {self.session_id}: Paused")
     
@@ -53,8 +92,11 @@ class UserSession:
         """Stop replay."""
         self.state = "STOPPED"
         self.cursor_ts = None
+        self.pending_seek = None
+        self.tail_following = False
         self.data_buffer.clear()
-        self.replay_buffer.clear()
+        self.reset_reader()
+        self._apply_queue_policy()
         self.last_activity = datetime.now()
         logger.info(f"Session {self.session_id}: Stopped")
     
@@ -62,6 +104,10 @@ class UserSession:
         """Shutdown session and stop all workers."""
         self._running = False
         self.stop()
+        # Release producers blocked on a full queue
+        self.raw_snapshot_queue.clear()
+        self.processed_snapshot_queue.clear()
+        self.replay_credits.reset()
         logger.info(f"Session {self.session_id}: Shutdown initiated")
     
     def set_speed(self, speed: int):
@@ -74,17 +120,95 @@ class UserSession:
             speed = 1
         
         self.speed = max(1, min(speed, 10))
+        self.pacer.set_fixed(self.speed)
         self.last_activity = datetime.now()
         logger.info(f"Session {self.session_id}: Speed set to {self.speed}x")
     
+    def set_max_speed(self):
+        """Replay as fast as the analytics pipeline can take rows."""
+        self.pacer.set_max()
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Speed set to max")
+    
+    def set_exchange_speed(self, factor: float):
+        """Replay at the recorded inter-arrival times scaled by `factor` (any positive value)."""
+        self.pacer.set_exchange(factor)
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Speed set to {factor}x exchange time")
+    
+    def subscribe(self, symbol: Optional[str]):
+        """Receive live ticks of `symbol` only; None follows the active live symbol."""
+        self.symbol = symbol.strip().upper() if symbol and symbol.strip() else None
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Live symbol {self.symbol or 'follows active'}")
+    
+    def set_queue_policy(self, policy: str):
+        """
+        Set the overflow policy for live data on the processed queue. While a
+        replay runs the queue keeps BLOCK and the policy applies once it stops.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {POLICIES}")
+        self.queue_policy = policy
+        self._apply_queue_policy()
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Queue policy set to {policy}")
+    
+    def _apply_queue_policy(self):
+        self.processed_snapshot_queue.set_policy(BLOCK if self.replaying else self.queue_policy)
+    
+    def set_resolution(self, resolution: str):
+        """Switch replay granularity; analytics are rebuilt at the cursor from the new rows."""
+        if resolution == self.resolution:
+            return
+        self.resolution = resolution
+        self.checkpoints.clear()  # Engine state from another granularity does not carry over
+        if self.cursor_ts is not None:
+            self.seek(self.cursor_ts)
+        else:
+            self.reset_reader()
+        logger.info(f"Session {self.session_id}: Resolution set to {resolution}")
+    
+    def set_tail(self, enabled: bool):
+        """Follow new rows after the end of data (LISTEN/NOTIFY) instead of finishing."""
+        self.tail = enabled
+        if not enabled:
+            self.tail_waiting = self.tail_following = False
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Tail {'on' if enabled else 'off'}")
+    
+    def reset_reader(self):
+        """Cancel in-flight prefetches; the replay loop reopens at the cursor."""
+        if self.replay_reader is not None:
+            self.replay_reader.close()
+            self.replay_reader = None
+        self.tail_waiting = False
+    
+    def seek(self, ts: datetime):
+        """Move the replay cursor to `ts`; analytics state is restored before replay continues."""
+        if self.cursor_ts is not None and (ts.tzinfo is None) != (self.cursor_ts.tzinfo is None):
+            # Match the replayed timestamps (naive values are UTC)
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+        self.cursor_ts = ts
+        self.pending_seek = ts
+        self.tail_following = False
+        self.pacer.reset()
+        self.reset_reader()
+        self.data_buffer.clear()
+        
+        # Rows queued for the old position would corrupt the restored state
+        stale = self.raw_snapshot_queue.qsize()
+        self.raw_snapshot_queue.clear()
+        self.processed_snapshot_queue.clear()
+        self.replay_credits.release(stale)
+        
+        self.last_activity = datetime.now()
+        logger.info(f"Session {self.session_id}: Seek to {ts.isoformat()}")
+    
     def go_back(self, seconds: float) -> bool:
         """Rewind replay by specified seconds."""
         if self.cursor_ts:
-            from datetime import timedelta
-            self.cursor_ts = self.cursor_ts - timedelta(seconds=seconds)
-            self.replay_buffer.clear()
-            self.data_buffer.clear()
-            self.last_activity = datetime.now()
+            self.seek(self.cursor_ts - timedelta(seconds=seconds))
             logger.info(f"Session {self.session_id}: Rewound by {seconds}s")
             return True
         return False
@@ -96,8 +220,24 @@ class UserSession:
             "user_id": self.user_id,
             "state": self.state,
             "speed": self.speed,
+            "pacing": self.pacing,
+            "resolution": self.resolution,
+            "tail": self.tail,
+            "tail_waiting": self.tail_waiting,
+            "replay_speed": self.pacer.get_stats(),
+            "symbol": self.symbol,
             "cursor_ts": self.cursor_ts.isoformat() if self.cursor_ts else None,
             "buffer_size": len(self.data_buffer),
+            "queue_policy": self.queue_policy,
+            "queues": {
+                "raw": self.raw_snapshot_queue.get_stats(),
+                "processed": self.processed_snapshot_queue.get_stats()
+            },
+            "replay_credits": self.replay_credits.get_stats(),
+            "adaptive": self.adaptive.get_stats(),
+            "prefetch": self.replay_reader.get_stats() if self.replay_reader else None,
+            "checkpoints": self.checkpoints.get_stats(),
+            "last_seek": self.last_seek,
             "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat()
         }
@@ -106,25 +246,39 @@ class UserSession:
         """Check if session is still active (has running flag and recent activity)."""
         if not self._running:
             return False
-        from datetime import timedelta
         return (datetime.now() - self.last_activity) < timedelta(minutes=30)
 
 
 class SessionManager:
     """Manages all user sessions."""
     
-    def __init__(self):
+    def __init__(self, queue_size: int = 1000, replay_credits: int = 64, checkpoint_interval: float = 10.0,
+                 max_gap_seconds: float = 5.0, adaptive_budget_ms: float = 100.0):
         self.sessions: Dict[str, UserSession] = {}
+        self.queue_size = queue_size
+        self.replay_credits = replay_credits
+        self.checkpoint_interval = checkpoint_interval
+        self.max_gap_seconds = max_gap_seconds
+        self.adaptive_budget_ms = adaptive_budget_ms
         self._lock = asyncio.Lock()
     
-    async def create_session(self, session_id: str, user_id: Optional[int] = None) -> UserSession:
+    async def create_session(self, session_id: str, user_id: Optional[int] = None,
+                             queue_policy: str = BLOCK) -> UserSession:
         """Create a new session."""
         async with self._lock:
             if session_id in self.sessions:
                 logger.warning(f"Session {session_id} already exists, returning existing")
                 return self.sessions[session_id]
             
-            session = UserSession(session_id, user_id)
+            session = UserSession(
+                session_id, user_id,
+                queue_size=self.queue_size,
+                queue_policy=queue_policy,
+                replay_credits=self.replay_credits,
+                checkpoint_interval=self.checkpoint_interval,
+                max_gap_seconds=self.max_gap_seconds,
+                adaptive_budget_ms=self.adaptive_budget_ms
+            )
             self.sessions[session_id] = session
             logger.info(f"Created session {session_id} for user {user_id}")
             return session
@@ -164,5 +318,9 @@ class SessionManager:
             "total_sessions": len(self.sessions),
             "active_sessions": sum(1 for s in self.sessions.values() if s.state == "PLAYING"),
             "paused_sessions": sum(1 for s in self.sessions.values() if s.state == "PAUSED"),
+            "dropped_snapshots": sum(
+                s.raw_snapshot_queue.dropped + s.processed_snapshot_queue.dropped
+                for s in self.sessions.values()
+            ),
             "sessions": [s.get_state() for s in self.sessions.values()]
         }
\ No newline at end of file
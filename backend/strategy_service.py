@@ -34,6 +34,22 @@ class StrategyEngine:
         self.is_active = False  # Also stop the strategy on reset
         logger.info("Strategy Engine RESET")
 
+    def get_state(self) -> dict:
+        """Position and PnL for a replay checkpoint (the start/stop switch is not included)."""
+        return {
+            "pnl": self.pnl,
+            "position": self.position,
+            "entry_price": self.entry_price,
+            "trades": [dict(t) for t in self.trades]
+        }
+
+    def set_state(self, state: dict):
+        """Restore a checkpoint from get_state()."""
+        self.pnl = state["pnl"]
+        self.position = state["position"]
+        self.entry_price = state["entry_price"]
+        self.trades = [dict(t) for t in state["trades"]]
+
     def process_signal(self, prediction, snapshot):
         """
         Process a model prediction and execute paper trades.
@@ -0,0 +1,127 @@
+"""Tests for load-aware tiered degradation."""
+import copy
+import queue
+from adaptive_processor import (REPLAY_MAX_TIER, AdaptiveProcessor, apply_profile_to_engine, drain_latest,
+                                session_tier_stats)
+from analytics_core import AnalyticsEngine
+from session_replay import UserSession
+
+
+def overload(processor, samples=5, ms=250.0, stage_costs=None):
+    for _ in range(samples):
+        processor.record(ms, stage_costs=stage_costs)
+
+
+class TestTierSelection:
+    """Test escalation order and hysteresis."""
+
+    def test_starts_normal(self):
+        processor = AdaptiveProcessor(budget_ms=100)
+        overload(processor, ms=10)
+        assert processor.tier == 0
+        assert processor.profile["clustering"] is True
+
+    def test_escalates_one_tier_at_a_time(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3)
+        overload(processor, samples=7)
+        assert processor.tier == 1
+        assert processor.profile["pattern_detectors"] is False
+        assert processor.profile["conflate"] is False
+
+        # Each tier is judged on fresh samples before escalating again
+        overload(processor, samples=6)
+        assert processor.tier == 1
+        overload(processor, samples=1)
+        assert processor.tier == 2
+        assert processor.profile["inference_interval_scale"] > 1
+
+        overload(processor, samples=7)
+        assert processor.tier == 3
+        assert processor.profile["conflate"] is True
+
+    def test_skips_tier_with_negligible_stage_cost(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3)
+        costs = {"analytics": 250.0, "clustering": 0.1, "detectors": 0.1, "inference": 50.0}
+        overload(processor, samples=7, stage_costs=costs)
+        assert processor.tier == 2
+
+    def test_queue_fill_alone_triggers_degradation(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3, alpha=1.0)
+        for _ in range(7):
+            processor.record(5.0, queue_depth=950, queue_capacity=1000)
+        assert processor.tier == 1
+
+    def test_recovers_slowly_with_hysteresis(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3, recover_after=10)
+        overload(processor, samples=7)
+        assert processor.tier == 1
+
+        # Just under budget is not calm enough to recover
+        for _ in range(20):
+            processor.record(90.0)
+        assert processor.tier == 1
+
+        for _ in range(15):
+            processor.record(10.0)
+        assert processor.tier == 0
+        assert processor.get_stats()["transitions"] == 2
+
+    def test_listeners_receive_profile(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3)
+        profiles = []
+        processor.add_listener(profiles.append)
+        overload(processor, samples=7)
+        assert [p["name"] for p in profiles] == ["reduced_detection"]
+
+    def test_stats_report_tier(self):
+        processor = AdaptiveProcessor()
+        stats = processor.get_stats()
+        assert stats["tier_name"] == "normal"
+        assert stats["adaptive_mode"] is False
+        assert "normal" in stats["time_in_tier_s"]
+
+    def test_replay_cap_never_conflates(self):
+        processor = AdaptiveProcessor(budget_ms=100, escalate_after=3, max_tier=REPLAY_MAX_TIER)
+        overload(processor, samples=40)
+        assert processor.tier == REPLAY_MAX_TIER
+        assert processor.profile["conflate"] is False
+
+    def test_sessions_degrade_independently(self):
+        slow, fast = UserSession("slow", adaptive_budget_ms=100), UserSession("fast", adaptive_budget_ms=100)
+        for _ in range(40):
+            slow.adaptive.record(250.0)
+            fast.adaptive.record(10.0)
+        assert slow.adaptive.tier == REPLAY_MAX_TIER
+        assert fast.adaptive.tier == 0
+
+        stats = session_tier_stats({"slow": slow.adaptive, "fast": fast.adaptive})
+        assert stats["counts"]["normal"] == 1 and stats["counts"]["reduced_inference"] == 1
+        assert stats["counts"]["conflate"] == 0
+        assert stats["degraded"] == {"slow": "reduced_inference"}
+
+
+class TestDegradedEngine:
+    """Test that degraded tiers keep analysing every snapshot."""
+
+    def test_reduced_detection_still_produces_core_metrics(self, sample_snapshot):
+        engine = AnalyticsEngine()
+        apply_profile_to_engine(engine, {"clustering": False, "pattern_detectors": False})
+
+        processed = engine.process_snapshot(copy.deepcopy(sample_snapshot))
+
+        assert "spread" in processed
+        assert "anomalies" in processed
+        assert processed["regime"] == 0
+        assert engine.last_stage_ms["clustering"] >= 0
+
+    def test_drain_latest_keeps_newest_per_symbol(self):
+        q = queue.Queue()
+        for i in range(1, 5):
+            q.put({"symbol": "BTCUSDT", "n": i})
+        q.put({"symbol": "ETHUSDT", "n": 9})
+
+        latest, superseded = drain_latest(q, {"symbol": "BTCUSDT", "n": 0})
+
+        assert [s["n"] for s in latest] == [4, 9]
+        assert superseded == 4
+        assert q.empty()
@@ -0,0 +1,73 @@
+"""Tests for the durable alert audit log over analytics_anomalies."""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from alert_log import ALERT_LOG_TABLE, build_log_query, decode_cursor, encode_cursor, fetch_alert_log
+from feature_store import ANOMALIES_TABLE, SCHEMA_SQL
+
+START = datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    """Serves alert rows newest first and records queries."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.rows[:args[-1]]
+
+
+def alert_row(i):
+    return {"id": i, "ts": START - timedelta(seconds=i), "source": "live:BTCUSDT", "symbol": "BTCUSDT",
+            "type": "SPOOFING", "severity": "high", "message": f"alert {i}", "details": json.dumps({"side": "bid"})}
+
+
+class TestLogQuery:
+    """Test filters and keyset pagination."""
+
+    def test_filters_become_parameters(self):
+        sql, args = build_log_query(START, START + timedelta(days=1), types=["SPOOFING", "LAYERING"],
+                                    severities=["critical"], source="live:BTCUSDT", limit=50)
+
+        assert f"FROM {ALERT_LOG_TABLE} WHERE ts >= $1 AND ts < $2 AND type = ANY($3)" in sql
+        assert "severity = ANY($4) AND source = $5" in sql
+        assert sql.endswith("ORDER BY ts DESC, id DESC LIMIT $6")
+        assert args == [START, START + timedelta(days=1), ["SPOOFING", "LAYERING"], ["critical"], "live:BTCUSDT", 50]
+
+    def test_naive_times_are_utc_and_limit_is_capped(self):
+        _, args = build_log_query(datetime(2024, 3, 1, 9, 30), limit=10**6)
+        assert args[0] == START
+        assert args[-1] == 1000
+
+    def test_cursor_roundtrip(self):
+        cursor = encode_cursor(START, 42)
+        assert decode_cursor(cursor) == (START, 42)
+        sql, args = build_log_query(cursor=cursor)
+        assert "(ts, id) < ($1, $2)" in sql and args[:2] == [START, 42]
+        with pytest.raises(ValueError):
+            decode_cursor("garbage")
+
+    async def test_full_page_returns_next_cursor(self):
+        conn = FakeConnection([alert_row(i) for i in range(5)])
+
+        page = await fetch_alert_log(conn, limit=3)
+        assert page["count"] == 3
+        assert page["next_cursor"] == encode_cursor(alert_row(2)["ts"], 2)
+        assert page["alerts"][0]["details"] == {"side": "bid"}
+
+        last = await fetch_alert_log(conn, limit=10)
+        assert last["next_cursor"] is None
+
+
+class TestAlertLogSchema:
+    """Test that the log reads the feature store's anomalies table."""
+
+    def test_anomalies_table_backs_the_log(self):
+        assert ALERT_LOG_TABLE == ANOMALIES_TABLE
+        assert f"ALTER TABLE {ANOMALIES_TABLE} ADD COLUMN IF NOT EXISTS id BIGSERIAL" in SCHEMA_SQL
+        for index in ("(ts DESC, id DESC)", "(type, ts DESC)", "(severity, ts DESC)"):
+            assert f"ON {ANOMALIES_TABLE} {index}" in SCHEMA_SQL
@@ -0,0 +1,65 @@
+"""Tests for the in-memory anomaly index."""
+from datetime import datetime, timedelta
+
+from anomaly_index import AnomalyIndex
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def snapshot(i, *anomalies):
+    return {
+        "timestamp": (START + timedelta(seconds=i)).isoformat(),
+        "mid_price": 100.0 + i,
+        "anomalies": [{"type": t, "severity": sev, "message": f"{t} {i}"} for t, sev in anomalies]
+    }
+
+
+class TestAnomalyIndex:
+    """Test indexing on insert, window expiry and paged queries."""
+
+    def test_iterates_events_oldest_first_by_type(self):
+        index = AnomalyIndex(window=100)
+        index.add(snapshot(0, ("SPOOFING", "high")))
+        index.add(snapshot(1, ("LAYERING", "critical"), ("SPOOFING", "medium")))
+        index.add(snapshot(2))
+
+        events = list(index.iter_events({"SPOOFING"}))
+        assert [a["message"] for _, a in events] == ["SPOOFING 0", "SPOOFING 1"]
+        assert events[1][0] == {"timestamp": snapshot(1)["timestamp"], "mid_price": 101.0}
+        assert [a["type"] for _, a in index.iter_events()] == ["SPOOFING", "LAYERING", "SPOOFING"]
+        assert [a["message"] for _, a in index.iter_events(last_snapshots=2)] == ["LAYERING 1", "SPOOFING 1"]
+
+    def test_expires_with_the_snapshot_window(self):
+        index = AnomalyIndex(window=3)
+        for i in range(6):
+            index.add(snapshot(i, ("SPOOFING", "high")) if i % 2 == 0 else snapshot(i, ("LAYERING", "HIGH")))
+
+        assert [a["message"] for _, a in index.iter_events()] == ["LAYERING 3", "SPOOFING 4", "LAYERING 5"]
+        summary = index.summary()
+        assert summary["by_type"] == {"SPOOFING": 1, "LAYERING": 2}
+        assert summary["by_severity"] == {"high": 3} and summary["total"] == 3
+
+    def test_summary_is_cached_until_changed(self):
+        index = AnomalyIndex(window=10)
+        index.add(snapshot(0, ("SPOOFING", "high")))
+        first = index.summary()
+        index.add(snapshot(1))
+
+        assert index.summary() is first
+        index.add(snapshot(2, ("SPOOFING", "low")))
+        assert index.summary()["total"] == 2
+
+    def test_query_filters_and_pages_newest_first(self):
+        index = AnomalyIndex(window=100)
+        for i in range(10):
+            index.add(snapshot(i, ("SPOOFING", "high" if i % 2 else "medium"), ("LAYERING", "low")))
+
+        page = index.query(types=["SPOOFING"], severities=["HIGH"], limit=3)
+        assert [a["message"] for a in page["anomalies"]] == ["SPOOFING 9", "SPOOFING 7", "SPOOFING 5"]
+        rest = index.query(types=["SPOOFING"], severities=["high"], cursor=page["next_cursor"], limit=3)
+        assert [a["message"] for a in rest["anomalies"]] == ["SPOOFING 3", "SPOOFING 1"]
+        assert rest["next_cursor"] is None
+
+        window = index.query(start=START + timedelta(seconds=2), end=START + timedelta(seconds=4))
+        assert window["count"] == 4 and {a["mid_price"] for a in window["anomalies"]} == {102.0, 103.0}
+        assert index.query(types=["UNKNOWN"])["count"] == 0
@@ -0,0 +1,88 @@
+"""Tests for the parallel historical analytics backfill."""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from backfill import load_progress, plan_chunks, process_block, read_npz_features, run_backfill
+from feature_store import FEATURE_COLUMNS
+from replay_blocks import OrderBookBlock, datetime_to_unix_us
+from replay_source import NpySegmentWriter
+
+START = datetime(2024, 3, 1, 9, 30)
+COMPARED = ("obi", "ofi", "vpin", "microprice", "divergence", "spoofing_risk", "volume_volatility")
+
+
+def make_block(n, seed=11):
+    rng = random.Random(seed)
+    ts_us, levels = [], []
+    for i in range(n):
+        mid = 100 + rng.random()
+        bids = [v for k in range(10) for v in (round(mid - 0.01 * (k + 1), 2), rng.randint(100, 900))]
+        asks = [v for k in range(10) for v in (round(mid + 0.01 * (k + 1), 2), rng.randint(100, 900))]
+        ts_us.append(datetime_to_unix_us(START + timedelta(milliseconds=100 * i)))
+        levels.append(bids + asks)
+    return OrderBookBlock.from_levels(np.array(ts_us), np.array(levels))
+
+
+@pytest.fixture(scope="module")
+def npy_source(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("l2_npy"))
+    writer = NpySegmentWriter(directory, segment_rows=700)
+    writer.append(make_block(1500))
+    writer.close()
+    return directory
+
+
+class TestPlan:
+    """Test chunk planning and progress bookkeeping."""
+
+    def test_chunks_cover_range_with_warmup(self):
+        chunks = plan_chunks(0, 25_000_000, chunk_seconds=10, warmup_seconds=3)
+
+        assert [(c.start_us, c.end_us) for c in chunks] == [(0, 10_000_000), (10_000_000, 20_000_000), (20_000_000, 25_000_000)]
+        assert chunks[1].warmup_us == 7_000_000
+
+    def test_progress_rejects_a_different_plan(self, tmp_path):
+        (tmp_path / "progress.json").write_text(json.dumps({"plan": {"start_us": 0}, "done": {"0": {}}}))
+
+        with pytest.raises(ValueError):
+            load_progress(str(tmp_path), {"start_us": 1})
+        assert load_progress(str(tmp_path), {"start_us": 1}, restart=True)["done"] == {}
+
+
+class TestBackfill:
+    """Test that chunked output matches one sequential pass."""
+
+    def test_chunked_features_match_sequential(self, npy_source, tmp_path):
+        sequential, _ = process_block(make_block(1500), 0)
+        expected = {name: np.array([r[FEATURE_COLUMNS.index(name)] for r in sequential], dtype=float)
+                    for name in COMPARED}
+
+        summary = run_backfill(npy_source, str(tmp_path), workers=1, chunk_seconds=50, warmup_seconds=60)
+        features = read_npz_features(str(tmp_path))
+
+        assert summary["chunks"] == 3 and summary["rows"] == 1500
+        assert np.all(np.diff(features["ts_us"]) > 0)
+        for name in COMPARED:
+            np.testing.assert_allclose(features[name], expected[name], rtol=1e-6, atol=1e-9, err_msg=name)
+
+    def test_resume_skips_finished_chunks(self, npy_source, tmp_path):
+        run_backfill(npy_source, str(tmp_path), workers=1, chunk_seconds=50, warmup_seconds=5)
+        progress_path = tmp_path / "progress.json"
+        progress = json.loads(progress_path.read_text())
+        del progress["done"]["1"]
+        progress_path.write_text(json.dumps(progress))
+        os.remove(tmp_path / "chunk_00001.npz")
+
+        summary = run_backfill(npy_source, str(tmp_path), workers=1, chunk_seconds=50, warmup_seconds=5)
+
+        assert (summary["processed"], summary["skipped"]) == (1, 2)
+        assert len(read_npz_features(str(tmp_path))["ts_us"]) == 1500
+
+    def test_worker_processes(self, npy_source, tmp_path):
+        summary = run_backfill(npy_source, str(tmp_path), workers=2, chunk_seconds=75, warmup_seconds=5)
+
+        assert summary["processed"] == 2
+        assert len(read_npz_features(str(tmp_path))["ts_us"]) == 1500
@@ -0,0 +1,178 @@
+"""Tests for the replay block cache and cached replay reads."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from block_cache import BlockCache
+from replay_blocks import OrderBookBlock, datetime_to_unix_us
+from replay_reader import PrefetchingReplayReader
+from replay_service import ReplayReaderService
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def ts(i):
+    return START + timedelta(milliseconds=100 * i)
+
+
+class FakeDatabase:
+    """Order book table counting every query that reaches it."""
+
+    def __init__(self, timestamps):
+        ts_us = np.array([datetime_to_unix_us(t) for t in timestamps], dtype=np.int64)
+        levels = np.tile(np.arange(40, dtype=np.float64), (len(ts_us), 1))
+        self.table = OrderBookBlock.from_levels(ts_us, levels)
+        self.queries = 0
+
+    async def acquire(self):
+        return object()
+
+    async def release(self, conn):
+        pass
+
+    async def fetch_block(self, conn, after_ts, limit, table):
+        self.queries += 1
+        start = int(np.searchsorted(self.table.ts_us, datetime_to_unix_us(after_ts), side="right"))
+        return self.table.slice(start, start + limit)
+
+    async def fetch_range(self, conn, start_ts, end_ts, table):
+        self.queries += 1
+        lo = int(np.searchsorted(self.table.ts_us, datetime_to_unix_us(start_ts), side="left"))
+        hi = int(np.searchsorted(self.table.ts_us, datetime_to_unix_us(end_ts), side="left"))
+        await asyncio.sleep(0)
+        return self.table.slice(lo, hi)
+
+    async def fetch_next(self, conn, from_ts, table):
+        self.queries += 1
+        i = int(np.searchsorted(self.table.ts_us, datetime_to_unix_us(from_ts), side="left"))
+        return self.table.timestamp(i) if i < len(self.table) else None
+
+    def service(self, cache, **kwargs):
+        return ReplayReaderService(cache=cache, timezone_aware=False, acquire=self.acquire,
+                                   release=self.release, fetch_block=self.fetch_block,
+                                   fetch_range=self.fetch_range, fetch_next=self.fetch_next, **kwargs)
+
+
+async def replay_all(service, batch_size=250):
+    reader = PrefetchingReplayReader(service.fetch, START, batch_size=batch_size,
+                                     end_ts=lambda block: block.last_ts)
+    stamps = []
+    while (snapshot := await reader.next_row()) is not None:
+        stamps.append(snapshot["timestamp"])
+    return stamps
+
+
+class TestBlockCache:
+    """Test LRU eviction under the byte budget."""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = BlockCache(max_bytes=100)
+        cache.put("a", 1, 40)
+        cache.put("b", 2, 40)
+        assert cache.get("a") == 1  # "b" is now least recently used
+        cache.put("c", 3, 40)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.bytes_used == 80
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_rejects_entries_larger_than_budget(self):
+        cache = BlockCache(max_bytes=100)
+        cache.put("a", 1, 50)
+        cache.put("huge", 2, 101)
+        assert "huge" not in cache
+        assert "a" in cache
+        assert cache.get_stats()["rejected"] == 1
+
+    def test_hit_rate(self):
+        cache = BlockCache(max_bytes=100)
+        cache.put("a", 1, 10)
+        cache.get("a")
+        cache.get("missing")
+        assert cache.get_stats()["hit_rate"] == 0.5
+
+    def test_invalid_budget(self):
+        with pytest.raises(ValueError):
+            BlockCache(max_bytes=0)
+
+
+class TestCachedReplay:
+    """Test that repeat replays are served from memory."""
+
+    async def test_second_replay_issues_no_queries(self):
+        db = FakeDatabase([ts(i) for i in range(1, 3001)])  # 5 minutes of data
+        service = db.service(BlockCache(), bucket_seconds=60)
+
+        first = await replay_all(service)
+        queries_after_first = db.queries
+        second = await replay_all(service, batch_size=97)
+
+        assert first == second == [ts(i) for i in range(1, 3001)]
+        assert db.queries == queries_after_first
+        assert service.cache.get_stats()["hits"] > 0
+
+    async def test_concurrent_sessions_load_each_bucket_once(self):
+        db = FakeDatabase([ts(i) for i in range(1, 1201)])
+        service = db.service(BlockCache(), bucket_seconds=60)
+
+        results = await asyncio.gather(*(replay_all(service) for _ in range(5)))
+
+        assert all(r == results[0] for r in results)
+        # Three data buckets, then one empty bucket plus its end-of-data probe
+        assert db.queries == 5
+
+    async def test_skips_gaps_between_buckets(self):
+        stamps = [ts(i) for i in range(1, 11)] + [ts(i) + timedelta(days=1) for i in range(1, 11)]
+        db = FakeDatabase(stamps)
+        service = db.service(BlockCache(), bucket_seconds=60)
+
+        block = await service.fetch(START, 100)
+
+        assert len(block) == 20
+        assert block.timestamp(10) == ts(1) + timedelta(days=1)
+        assert db.queries < 10  # Did not walk a day of empty buckets
+
+    async def test_recent_buckets_are_not_cached(self):
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        db = FakeDatabase([now - timedelta(seconds=30 - i) for i in range(20)])
+        service = db.service(BlockCache(), bucket_seconds=60, recent_seconds=300)
+
+        await service.fetch(now - timedelta(minutes=1), 100)
+        await service.fetch(now - timedelta(minutes=1), 100)
+
+        assert len(service.cache) == 0
+        assert db.queries == 2
+
+    async def test_fetch_range_is_half_open(self):
+        db = FakeDatabase([ts(i) for i in range(1, 1001)])
+        service = db.service(BlockCache(), bucket_seconds=60)
+
+        block = await service.fetch_range(ts(10), ts(20), 100)
+
+        assert [block.timestamp(i) for i in range(len(block))] == [ts(i) for i in range(10, 20)]
+        assert len(await service.fetch_range(ts(10), ts(20), 3)) == 3
+
+    async def test_eviction_under_small_budget_still_replays_correctly(self):
+        db = FakeDatabase([ts(i) for i in range(1, 3001)])
+        bucket_bytes = OrderBookBlock.from_levels(np.zeros(600, dtype=np.int64), np.zeros((600, 40))).nbytes
+        service = db.service(BlockCache(max_bytes=2 * bucket_bytes + 1024), bucket_seconds=60)
+
+        assert await replay_all(service) == [ts(i) for i in range(1, 3001)]
+        assert service.cache.bytes_used <= service.cache.max_bytes
+        assert service.cache.get_stats()["evictions"] > 0
+
+    async def test_inserted_range_invalidates_stale_buckets(self):
+        db = FakeDatabase([ts(i) for i in range(1, 601)])  # 1 minute, then end of data
+        service = db.service(BlockCache(), bucket_seconds=60)
+        assert len(await replay_all(service)) == 600
+
+        late = OrderBookBlock.from_levels(
+            np.array([datetime_to_unix_us(ts(i)) for i in range(601, 901)], dtype=np.int64),
+            np.zeros((300, 40))
+        )
+        db.table = OrderBookBlock.concat([db.table, late])
+        assert len(await service.fetch(ts(600), 1000)) == 0  # Served from the stale buckets
+
+        assert service.invalidate_range(int(late.ts_us[0]), int(late.ts_us[-1])) > 0
+        assert len(await service.fetch(ts(600), 1000)) == 300
@@ -0,0 +1,136 @@
+"""Tests for the COPY-based order book bulk loader."""
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from bulk_loader import BulkLoader, dedupe_block
+from replay_blocks import LEVEL_COLUMNS, OrderBookBlock, datetime_to_unix_us, decode_binary_copy, encode_binary_copy
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def write_csv(path, n, duplicate_every=0):
+    """An l2 CSV with named level columns; every `duplicate_every`-th row repeats the previous ts."""
+    ts = []
+    for i in range(n):
+        ts.append(ts[-1] if duplicate_every and i and i % duplicate_every == 0 else START + timedelta(milliseconds=100 * i))
+    df = pd.DataFrame(np.arange(n * 40, dtype=float).reshape(n, 40), columns=LEVEL_COLUMNS)
+    df["ts"] = [t.isoformat() for t in ts]
+    df.to_csv(path, index=False)
+    return len(set(ts))
+
+
+class FakeTable:
+    """Shared 'database' for FakeConnections: ts -> row count."""
+
+    def __init__(self, fail_after=None):
+        self.rows = {}
+        self.copies = 0
+        self.fail_after = fail_after
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+        self.staged = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+        self.staged = None
+
+    async def execute(self, sql):
+        if sql.startswith("INSERT"):
+            new = [t for t in self.staged.ts_us.tolist() if t not in self.table.rows]
+            for t in new:
+                self.table.rows[t] = 1
+            return f"INSERT 0 {len(new)}"
+        return "CREATE TABLE"
+
+    async def copy_to_table(self, name, source, columns, format):
+        if self.table.fail_after is not None and self.table.copies >= self.table.fail_after:
+            raise ConnectionError("connection lost")
+        self.table.copies += 1
+        block = decode_binary_copy(bytes(source))
+        if name.endswith("_stage"):
+            self.staged = block
+        else:
+            for t in block.ts_us.tolist():
+                self.table.rows[t] = self.table.rows.get(t, 0) + 1
+
+    async def close(self):
+        pass
+
+
+def make_loader(table, **kwargs):
+    async def connect():
+        return FakeConnection(table)
+    return BulkLoader(connect, **kwargs)
+
+
+class TestBinaryCopy:
+    """Test the encoder against the replay decoder."""
+
+    def test_roundtrip(self):
+        ts_us = np.array([datetime_to_unix_us(START), datetime_to_unix_us(START) + 100_000])
+        levels = np.random.default_rng(1).random((2, 40))
+        levels[1, 5] = np.nan
+        decoded = decode_binary_copy(encode_binary_copy(OrderBookBlock.from_levels(ts_us, levels)))
+
+        assert decoded.ts_us.tolist() == ts_us.tolist()
+        np.testing.assert_array_equal(np.concatenate([decoded.bids.reshape(2, -1), decoded.asks.reshape(2, -1)], axis=1), levels)
+
+    def test_dedupe_within_and_across_chunks(self):
+        block = OrderBookBlock.from_levels(np.array([1, 2, 2, 3, 4]), np.arange(200.0).reshape(5, 40))
+        deduped = dedupe_block(block, previous_ts_us=np.array([0, 1]))
+
+        assert deduped.ts_us.tolist() == [2, 3, 4]
+        assert deduped.bids[0, 0, 0] == 40.0  # First of the duplicates wins
+
+
+class TestBulkLoader:
+    """Test parallel loading, de-duplication and resume."""
+
+    async def test_parallel_load_skips_duplicates(self, tmp_path):
+        csv = tmp_path / "l2.csv"
+        unique = write_csv(csv, 500, duplicate_every=7)
+        table = FakeTable()
+        table.rows[datetime_to_unix_us(START)] = 1  # Already loaded
+
+        stats = await make_loader(table, workers=3, chunksize=60).load_csv(str(csv))
+
+        assert len(table.rows) == unique
+        assert all(count == 1 for count in table.rows.values())
+        assert stats["rows_read"] == 500
+        assert stats["rows_written"] == unique - 1
+        assert stats["rows_written"] + stats["rows_skipped"] == 500
+        assert stats["rows_per_second"] > 0
+
+    async def test_resumes_after_failure(self, tmp_path):
+        csv = tmp_path / "l2.csv"
+        write_csv(csv, 300)
+        table = FakeTable(fail_after=2)
+
+        with pytest.raises(ConnectionError):
+            await make_loader(table, workers=1, chunksize=50).load_csv(str(csv))
+        progress = json.loads((tmp_path / "l2.csv.load_progress.json").read_text())
+        assert progress["done"] == [0, 1]
+
+        table.fail_after = None
+        stats = await make_loader(table, workers=2, chunksize=50).load_csv(str(csv))
+
+        assert stats["chunks_skipped"] == 2
+        assert stats["rows_read"] == 200  # The finished prefix is not parsed again
+        assert len(table.rows) == 300
+
+    async def test_plain_copy_without_dedupe(self, tmp_path):
+        csv = tmp_path / "l2.csv"
+        write_csv(csv, 120, duplicate_every=10)
+        table = FakeTable()
+
+        stats = await make_loader(table, workers=2, chunksize=50, dedupe=False).load_csv(str(csv))
+
+        assert stats["rows_written"] == 120
+        assert sum(table.rows.values()) == 120
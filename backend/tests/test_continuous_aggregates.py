@@ -0,0 +1,76 @@
+"""Tests for continuous aggregate definitions and resolution switching."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from continuous_aggregates import RESOLUTIONS, aggregate_view_sql, bar_to_dict, fetch_bars, resolve
+from replay_blocks import LEVEL_COLUMNS
+from replay_checkpoints import Checkpoint
+from session_replay import UserSession
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+class FakeConnection:
+    def __init__(self, type_name="timestamp without time zone"):
+        self.type_name = type_name
+        self.queries = []
+
+    async def fetchval(self, sql, *args):
+        return self.type_name
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return [{"ts": args[0], "open": 1, "high": 2.0, "low": 0.5, "close": 1.5, "avg_spread": 0.01,
+                 "avg_bid_depth": 500.0, "avg_ask_depth": 400.0, "avg_imbalance": None, "row_count": 10}]
+
+
+class TestAggregateDefinitions:
+    """Test the view SQL and bar reads."""
+
+    def test_view_exposes_closing_book_as_table_columns(self):
+        sql = aggregate_view_sql(RESOLUTIONS["1m"])
+
+        assert "timescaledb.continuous" in sql and "materialized_only = false" in sql
+        assert "time_bucket(INTERVAL '1 minute', ts) AS ts" in sql
+        for column in LEVEL_COLUMNS:
+            assert f"last({column}, ts) AS {column}" in sql
+
+    def test_unknown_resolution(self):
+        with pytest.raises(ValueError):
+            resolve("5m")
+
+    async def test_fetch_bars_matches_column_timezone(self):
+        conn = FakeConnection("timestamp with time zone")
+        bars = await fetch_bars(conn, "1s", START, START + timedelta(minutes=1), 100)
+
+        sql, args = conn.queries[0]
+        assert "FROM l2_orderbook_1s" in sql
+        assert args[0] == START.replace(tzinfo=timezone.utc)
+        assert bars[0]["open"] == 1.0 and bars[0]["avg_imbalance"] is None
+        assert bars[0]["ts"] == args[0].isoformat()
+
+    def test_bar_to_dict_types(self):
+        bar = bar_to_dict({"ts": START, "open": 1, "high": 1, "low": 1, "close": 1, "avg_spread": 0,
+                           "avg_bid_depth": 1, "avg_ask_depth": 1, "avg_imbalance": 0, "row_count": 3.0})
+        assert bar["row_count"] == 3 and isinstance(bar["open"], float)
+
+
+class TestSessionResolution:
+    """Test that switching resolution restarts analytics at the cursor."""
+
+    def test_switch_seeks_to_cursor_and_drops_checkpoints(self):
+        session = UserSession("res")
+        session.cursor_ts = START
+        session.checkpoints.add(Checkpoint(START, b"state", None))
+
+        session.set_resolution("1s")
+
+        assert session.resolution == "1s"
+        assert session.pending_seek == START
+        assert len(session.checkpoints) == 0
+        assert session.get_state()["resolution"] == "1s"
+
+    def test_same_resolution_is_noop(self):
+        session = UserSession("res-noop")
+        session.cursor_ts = START
+        session.set_resolution("raw")
+        assert session.pending_seek is None
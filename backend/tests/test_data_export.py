@@ -0,0 +1,152 @@
+"""Tests for chunked, resumable Arrow/Parquet export."""
+import csv
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from data_export import (FEATURES, PROGRESS_NAME, TRADES, ExportEncoder, book_columns, export_to_directory,
+                         iter_book_chunks, iter_table_chunks, read_trades_csv, trade_columns)
+from feature_store import FEATURE_COLUMNS
+from replay_blocks import OrderBookBlock, datetime_to_unix_us, encode_binary_copy
+
+START = datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+
+
+def make_block(n):
+    ts_us = datetime_to_unix_us(START) + np.arange(n, dtype=np.int64) * 1_000_000
+    levels = np.tile(np.arange(40, dtype=np.float64), (n, 1)) + np.arange(n)[:, None]
+    return OrderBookBlock.from_levels(ts_us, levels, tz_aware=True)
+
+
+class FakeConnection:
+    """Serves l2_orderbook via binary COPY and a (ts, source, obi) table via fetch."""
+
+    def __init__(self, block=None, rows=()):
+        self.block = block
+        self.rows = sorted(rows, key=lambda r: r["ts"])
+        self.queries = []
+
+    async def fetchval(self, sql, *args):
+        return "timestamp with time zone"
+
+    async def copy_from_query(self, sql, *args, output, format):
+        self.queries.append((sql, args))
+        if "ts >= $1" in sql:
+            lo, hi = (int(np.searchsorted(self.block.ts_us, datetime_to_unix_us(t))) for t in args)
+            await output(encode_binary_copy(self.block.slice(lo, hi)))
+            return
+        after_ts, limit = args
+        start = int(np.searchsorted(self.block.ts_us, datetime_to_unix_us(after_ts), side="right"))
+        await output(encode_binary_copy(self.block.slice(start, start + limit)))
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        if "WHERE ts = $1" in sql:
+            return [r for r in self.rows if r["ts"] == args[0]]
+        after, end, limit = args[0], args[1], args[-1]
+        return [r for r in self.rows if after < r["ts"] < end][:limit]
+
+
+def feature_rows(seconds):
+    return [{"ts": START + timedelta(seconds=s), "source": "s1", "obi": 0.1 * n} for n, s in enumerate(seconds)]
+
+
+class TestChunks:
+    """Test keyset chunking, tie handling and resume cursors."""
+
+    async def test_book_chunks_cover_range_once(self):
+        conn = FakeConnection(make_block(25))
+        chunks = [c async for c in iter_book_chunks(conn, START, START + timedelta(seconds=20), chunk_rows=8)]
+
+        assert [len(c["ts"]) for c, _ in chunks] == [8, 8, 4]
+        assert chunks[0][0]["bid_price_1"][1] == 1.0 and chunks[0][0]["ask_volume_10"][0] == 39.0
+        resumed = [c async for c in iter_book_chunks(conn, START, START + timedelta(seconds=20), 8, chunks[0][1])]
+        assert resumed[0][0]["ts"][0] == chunks[1][0]["ts"][0]
+
+    async def test_book_chunks_never_split_a_timestamp(self):
+        block = make_block(11)
+        block.ts_us[:] = datetime_to_unix_us(START) + np.array([0, 1, 1, 1, 2, 3, 3, 3, 3, 3, 4]) * 1_000_000
+        conn = FakeConnection(block)
+        chunks = [c async for c in iter_book_chunks(conn, START, START + timedelta(seconds=10), chunk_rows=3)]
+
+        sizes = [len(c["ts"]) for c, _ in chunks]
+        assert sum(sizes) == 11 and sizes[:2] == [1, 3]
+        assert any(len(set(c["ts"].tolist())) == 1 and len(c["ts"]) == 5 for c, _ in chunks)
+        for (columns, cursor), (following, _) in zip(chunks, chunks[1:]):
+            assert cursor == columns["ts"][-1] < following["ts"][0]
+
+    async def test_table_chunks_never_split_a_timestamp(self):
+        conn = FakeConnection(rows=feature_rows([0, 1, 1, 1, 2, 3, 3, 3, 3, 3, 4]))
+        chunks = [c async for c in iter_table_chunks(conn, "t", ("ts", "source", "obi"), START,
+                                                     START + timedelta(seconds=10), chunk_rows=3)]
+
+        sizes = [len(c["ts"]) for c, _ in chunks]
+        assert sum(sizes) == 11 and sizes[:2] == [1, 3]
+        assert any(len(set(c["ts"].tolist())) == 1 and len(c["ts"]) == 5 for c, _ in chunks)
+        for (columns, cursor), (following, _) in zip(chunks, chunks[1:]):
+            assert cursor == columns["ts"][-1] < following["ts"][0]
+
+    def test_trade_columns_are_typed_and_sorted(self, tmp_path):
+        path = tmp_path / "trades.csv"
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["id", "timestamp", "side", "price", "size", "type", "pnl",
+                                                   "confidence"])
+            writer.writeheader()
+            writer.writerow({"id": "2", "timestamp": (START + timedelta(seconds=5)).isoformat(), "side": "SELL",
+                             "price": "101.5", "size": "1", "type": "EXIT", "pnl": "1.5", "confidence": ""})
+            writer.writerow({"id": "1", "timestamp": START.isoformat(), "side": "BUY", "price": "100",
+                             "size": "1", "type": "ENTRY", "pnl": "0", "confidence": "0.8"})
+
+        columns = trade_columns(read_trades_csv([path]), START, START + timedelta(minutes=1))
+        assert columns["id"] == [1, 2] and columns["price"] == [100.0, 101.5]
+        assert columns["confidence"] == [0.8, None]
+        assert len(trade_columns(read_trades_csv([path]), cursor=int(columns["ts"][0]))["ts"]) == 1
+
+
+class TestEncoding:
+    """Test typed Arrow/Parquet output and directory resume."""
+
+    def test_stream_round_trip(self):
+        for format in ("arrow", "parquet"):
+            encoder = ExportEncoder("books", format)
+            payload = encoder.write(book_columns(make_block(5))) + encoder.write(book_columns(make_block(3)))
+            payload += encoder.close()
+            if format == "arrow":
+                table = pa.ipc.open_stream(payload).read_all()
+            else:
+                table = pq.read_table(pa.BufferReader(payload))
+            assert table.num_rows == 8 and table.schema.field("ts").type == pa.timestamp("us", tz="UTC")
+            assert table.column("bid_volume_1").to_pylist()[:2] == [1.0, 2.0]
+
+    async def test_directory_export_resumes(self, tmp_path):
+        conn = FakeConnection(rows=[{**dict.fromkeys(FEATURE_COLUMNS), **r} for r in feature_rows(range(10))])
+        end = START + timedelta(minutes=1)
+
+        progress = await export_to_directory(conn, str(tmp_path), FEATURES, START, end, chunk_rows=4)
+        assert progress["complete"] and progress["rows"] == 10 and progress["parts"] == 3
+
+        with open(tmp_path / FEATURES / PROGRESS_NAME) as f:
+            saved = json.load(f)
+        saved.update(complete=False, parts=1, rows=4)
+        saved["cursor"] = datetime_to_unix_us(START + timedelta(seconds=3))
+        with open(tmp_path / FEATURES / PROGRESS_NAME, "w") as f:
+            json.dump(saved, f)
+        os.remove(tmp_path / FEATURES / "part-00001.arrow")
+        os.remove(tmp_path / FEATURES / "part-00002.arrow")
+
+        progress = await export_to_directory(conn, str(tmp_path), FEATURES, START, end, chunk_rows=4)
+        table = ds.dataset(str(tmp_path / FEATURES), format="arrow").to_table()
+        assert progress["rows"] == 10 and table.num_rows == 10
+        assert sorted(table.column("obi").to_pylist()) == pytest.approx([0.1 * n for n in range(10)])
+
+        with pytest.raises(ValueError):
+            await export_to_directory(conn, str(tmp_path), FEATURES, START, end, source="other")
+
+    def test_trades_need_rows_not_connection(self):
+        encoder = ExportEncoder(TRADES)
+        assert encoder.write(trade_columns([{"timestamp": START.isoformat(), "id": 1, "price": 1.0}]))
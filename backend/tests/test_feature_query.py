@@ -0,0 +1,81 @@
+"""Tests for windowed, projected and columnar /features queries."""
+import json
+from datetime import datetime, timedelta
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+import pytest
+from feature_query import decimate, parse_fields, query_features
+from ring_store import SnapshotRing, timestamp_us
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def filled_ring(n=50):
+    ring = SnapshotRing(100)
+    for i in range(n):
+        ring.append({
+            "timestamp": (START + timedelta(seconds=i)).isoformat(),
+            "mid_price": 100.0 + i,
+            "obi": 0.01 * i,
+            "spread": 0.02,
+            "regime": i % 3,
+            "regime_label": "Normal",
+            "bids": [[100.0 - j, 1.0] for j in range(10)],
+            "asks": [[101.0 + j, 1.0] for j in range(10)],
+            "anomalies": []
+        })
+    return ring
+
+
+class TestFeatureQuery:
+    """Test selection, projection and response formats."""
+
+    def test_defaults_return_full_rows(self):
+        ring = filled_ring(5)
+        rows, media_type = query_features(ring)
+        assert rows == ring.to_list() and media_type is None
+
+    def test_parse_fields_and_decimate(self):
+        assert parse_fields("obi, spread,,obi") == ["obi", "spread"]
+        assert parse_fields("") is None
+        positions = np.arange(10)
+        assert decimate(positions, step=3).tolist() == [0, 3, 6, 9]
+        thinned = decimate(positions, max_points=4)
+        assert len(thinned) == 4 and thinned[0] == 0 and thinned[-1] == 9
+
+    def test_window_and_projection(self):
+        ring = filled_ring()
+        start_us = timestamp_us(START + timedelta(seconds=10))
+        rows, _ = query_features(ring, start_us=start_us, end_us=start_us + 5_000_000, fields=["obi", "regime"])
+        assert len(rows) == 5
+        assert rows[0] == {"obi": 0.1, "regime": 1}
+
+    def test_columns_are_small(self):
+        ring = filled_ring()
+        document, media_type = query_features(ring, last=20, max_points=10, fields=["obi", "spread", "regime_label"],
+                                              format="columns")
+        assert media_type is None and document["count"] == 10
+        assert document["fields"] == ["obi", "spread", "regime_label"]
+        assert document["columns"]["ts_us"][-1] == timestamp_us(START + timedelta(seconds=49))
+        assert document["columns"]["regime_label"] == ["Normal"] * 10
+        assert len(json.dumps(document)) * 10 < len(json.dumps(ring.to_list()))
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            query_features(filled_ring(1), format="xml")
+
+    def test_binary_formats_round_trip(self):
+        ring = filled_ring()
+        expected, _ = query_features(ring, last=10, fields=["obi", "regime_label", "bids"], format="columns")
+
+        packed, media_type = query_features(ring, last=10, fields=["obi", "regime_label", "bids"], format="msgpack")
+        assert media_type == "application/msgpack"
+        assert msgpack.unpackb(packed) == expected
+
+        payload, media_type = query_features(ring, last=10, fields=["obi", "regime_label", "bids"], format="arrow")
+        table = pa.ipc.open_stream(payload).read_all()
+        assert media_type == "application/vnd.apache.arrow.stream"
+        assert table.column_names == ["ts_us", "obi", "regime_label", "bids"]
+        assert table.to_pydict() == expected["columns"]
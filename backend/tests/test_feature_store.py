@@ -0,0 +1,152 @@
+"""Tests for the batched COPY writer and the analytics feature store."""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from batch_writer import BatchedCopyWriter
+from feature_store import FEATURE_COLUMNS, FeatureStore, anomaly_records, feature_record, to_utc
+
+
+class FakeConnection:
+    """Records COPY calls; fails the next `failures` of them."""
+
+    def __init__(self, failures=0):
+        self.copies = []
+        self.failures = failures
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection lost")
+        self.copies.append((table, list(records), list(columns)))
+
+    def rows(self, table):
+        return [r for t, records, _ in self.copies if t == table for r in records]
+
+
+def make_writer(conn, **kwargs):
+    async def acquire():
+        return conn
+
+    async def release(_):
+        pass
+
+    return BatchedCopyWriter("t", ("a", "b"), acquire=acquire, release=release, **kwargs)
+
+
+class TestBatchedCopyWriter:
+    """Test batching, bounded buffering and retries."""
+
+    async def test_full_batch_wakes_writer_before_interval(self):
+        conn = FakeConnection()
+        writer = make_writer(conn, batch_size=10, flush_interval=60)
+        writer.start()
+        for i in range(25):
+            writer.submit((i, str(i)))
+        await asyncio.sleep(0.05)
+
+        # Woken by the first full batch, long before the 60 s interval
+        assert [len(records) for _, records, _ in conn.copies][:2] == [10, 10]
+
+        await writer.stop()
+        assert conn.rows("t") == [(i, str(i)) for i in range(25)]
+        assert writer.get_stats()["written"] == 25
+
+    async def test_flushes_partial_batch_after_interval(self):
+        conn = FakeConnection()
+        writer = make_writer(conn, batch_size=100, flush_interval=0.02)
+        writer.start()
+        writer.submit((1, "x"))
+        await asyncio.sleep(0.1)
+
+        assert conn.rows("t") == [(1, "x")]
+        await writer.stop()
+
+    def test_submit_drops_oldest_when_full(self):
+        writer = make_writer(FakeConnection(), batch_size=2, max_buffered=3)
+        for i in range(5):
+            writer.submit((i, None))
+
+        stats = writer.get_stats()
+        assert stats["buffered"] == 3
+        assert stats["dropped"] == 2
+        assert list(writer._buffer) == [(2, None), (3, None), (4, None)]
+
+    async def test_failed_batch_is_retried_in_order(self):
+        conn = FakeConnection(failures=1)
+        writer = make_writer(conn, batch_size=2, max_buffered=10)
+        for i in range(3):
+            writer.submit((i, None))
+
+        assert await writer.flush() is False
+        assert writer.get_stats()["errors"] == 1
+        assert await writer.flush() is True
+        assert conn.rows("t") == [(0, None), (1, None), (2, None)]
+
+    def test_invalid_sizes(self):
+        with pytest.raises(ValueError):
+            make_writer(FakeConnection(), batch_size=10, max_buffered=5)
+
+
+class TestFeatureRecords:
+    """Test snapshot to row conversion."""
+
+    def test_naive_and_iso_timestamps_become_utc(self):
+        naive = datetime(2024, 3, 1, 9, 30)
+        expected = naive.replace(tzinfo=timezone.utc)
+        assert to_utc(naive) == expected
+        assert to_utc("2024-03-01T09:30:00Z") == expected
+        assert to_utc(datetime(2024, 3, 1, 10, 30, tzinfo=timezone(timedelta(hours=1)))) == expected
+        assert to_utc(None).tzinfo is not None
+
+    def test_feature_record_columns(self):
+        processed = {
+            "timestamp": datetime(2024, 3, 1, 9, 30), "symbol": "BTCUSDT", "mid_price": 100.5,
+            "spread": 0.1, "obi": float("nan"), "regime": 2, "regime_label": "Stressed",
+            "gap_count": 3.0, "engine": "python", "bids": [[100.4, 5]]
+        }
+        row = dict(zip(FEATURE_COLUMNS, feature_record("session-1", processed)))
+
+        assert row["source"] == "session-1"
+        assert row["mid_price"] == 100.5
+        assert row["obi"] is None
+        assert row["vpin"] is None
+        assert (row["regime"], row["regime_label"], row["gap_count"]) == (2, "Stressed", 3)
+        assert row["engine"] == "python"
+
+    def test_anomaly_details_are_json(self):
+        processed = {
+            "timestamp": datetime(2024, 3, 1, 9, 30),
+            "anomalies": [{"type": "SPOOFING", "severity": "high", "message": "m", "side": "bid", "price": 100.0}]
+        }
+        [row] = list(anomaly_records("live:BTCUSDT", processed))
+
+        assert row[3:6] == ("SPOOFING", "high", "m")
+        assert json.loads(row[6]) == {"side": "bid", "price": 100.0}
+
+
+class TestFeatureStore:
+    """Test the store end to end against a fake connection."""
+
+    async def test_records_features_and_anomalies(self):
+        conn = FakeConnection()
+        conn.execute = lambda *_: asyncio.sleep(0)
+        conn.fetchval = lambda *_: asyncio.sleep(0, result=False)
+
+        async def acquire():
+            return conn
+
+        async def release(_):
+            pass
+
+        store = FeatureStore(batch_size=10, flush_interval=60, acquire=acquire, release=release)
+        await store.start()
+        store.record("s", {"timestamp": datetime(2024, 3, 1), "mid_price": 1.0, "anomalies": [{"type": "GAP"}]})
+        store.record("s", {"timestamp": object()})  # Unusable timestamp: stored at now()
+        await store.stop()
+
+        assert len(conn.rows("analytics_features")) == 2
+        assert len(conn.rows("analytics_anomalies")) == 1
+        stats = store.get_stats()
+        assert stats["hypertables"] is False
+        assert stats["features"]["written"] == 2
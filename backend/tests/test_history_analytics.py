@@ -0,0 +1,92 @@
+"""Tests for bucketed historical analytics."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from history_analytics import (aggregate_for, build_features_query, fetch_history_analytics, parse_bucket,
+                               row_to_bucket)
+
+START = datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    """Answers feature, aggregate and anomaly bucket queries by table name."""
+
+    def __init__(self, features=(), aggregates=(), anomalies=()):
+        self.results = {"analytics_features": list(features), "l2_orderbook_1m": list(aggregates),
+                        "analytics_anomalies": list(anomalies)}
+        self.queries = []
+
+    async def fetchval(self, sql, *args):
+        return "timestamp with time zone"
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        table = sql.split(" FROM ")[-1].split()[0]
+        return self.results.get(table, [])
+
+
+def feature_row(minute, mid_open=100.0):
+    return {"bucket": START + timedelta(minutes=minute), "snapshots": 600, "mid__open": mid_open,
+            "mid__high": 101.0, "mid__low": 99.5, "mid__close": 100.5, "spread__mean": 0.02, "spread__p50": 0.02,
+            "spread__p95": 0.05, "vpin__mean": None}
+
+
+class TestHistoryAnalytics:
+    """Test the bucket queries and how sources are combined."""
+
+    def test_parse_bucket(self):
+        assert parse_bucket("10s") == 10 and parse_bucket("5m") == 300 and parse_bucket("1h") == 3600
+        for bad in ("0m", "5 minutes", "1w"):
+            with pytest.raises(ValueError):
+                parse_bucket(bad)
+        assert aggregate_for(300) == "1m" and aggregate_for(10) == "1s"
+
+    def test_features_query(self):
+        sql, args = build_features_query(START, START + timedelta(hours=1), 60, source="live:BTCUSDT")
+
+        assert "to_timestamp(floor(extract(epoch FROM ts) / $1) * $1) AS bucket" in sql
+        assert "percentile_cont(0.95) WITHIN GROUP (ORDER BY vpin) AS vpin__p95" in sql
+        assert "AS microprice__close" in sql and "source = $4" in sql
+        assert args == [60.0, START, START + timedelta(hours=1), "live:BTCUSDT"]
+
+    def test_row_to_bucket_nests_metrics(self):
+        bucket = row_to_bucket(feature_row(0))
+        assert bucket["mid"] == {"open": 100.0, "high": 101.0, "low": 99.5, "close": 100.5}
+        assert bucket["spread"]["p95"] == 0.05 and bucket["vpin"]["mean"] is None
+        assert bucket["snapshots"] == 600
+
+    async def test_merges_anomaly_counts(self):
+        anomalies = [{"bucket": START, "type": "SPOOFING", "n": 3}, {"bucket": START, "type": "LAYERING", "n": 1},
+                     {"bucket": START + timedelta(minutes=5), "type": "SPOOFING", "n": 2}]
+        conn = FakeConnection(features=[feature_row(0), feature_row(1)], anomalies=anomalies)
+
+        result = await fetch_history_analytics(conn, START, START + timedelta(minutes=10), 60, source="session-1")
+        assert result["source"] == "features" and result["count"] == 3
+        assert conn.queries[0][1][3] == "session-1" and conn.queries[1][1][3] == "session-1"
+        first, _, last = result["buckets"]
+        assert first["anomalies"] == {"SPOOFING": 3, "LAYERING": 1} and first["anomaly_count"] == 4
+        assert last["snapshots"] == 0 and last["anomaly_count"] == 2
+
+    async def test_without_source_reads_aggregates(self):
+        aggregate = {"bucket": START, "snapshots": 3600, "mid__open": 100.0, "mid__high": 102.0, "mid__low": 99.0,
+                     "mid__close": 101.0, "spread__mean": 0.03, "imbalance__mean": 0.1}
+        conn = FakeConnection(aggregates=[aggregate])
+
+        result = await fetch_history_analytics(conn, START, START + timedelta(hours=1), 3600)
+        assert result["source"] == "aggregates"
+        assert result["buckets"][0]["imbalance"] == {"mean": 0.1}
+        assert len(conn.queries) == 1 and "FROM l2_orderbook_1m" in conn.queries[0][0]
+        assert "anomalies" not in result["buckets"][0]
+
+    async def test_rejects_unscoped_features_and_filtered_aggregates(self):
+        end = START + timedelta(hours=1)
+        with pytest.raises(ValueError):
+            await fetch_history_analytics(FakeConnection(), START, end, 60, prefer="features")
+        with pytest.raises(ValueError):
+            await fetch_history_analytics(FakeConnection(), START, end, 60, symbol="BTCUSDT", prefer="aggregates")
+        with pytest.raises(ValueError):
+            await fetch_history_analytics(FakeConnection(), START, end, 60, source="live:BTCUSDT", prefer="aggregates")
+
+    async def test_rejects_too_many_buckets(self):
+        with pytest.raises(ValueError):
+            await fetch_history_analytics(FakeConnection(), START, START + timedelta(days=30), 1)
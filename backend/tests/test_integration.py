@@ -47,6 +47,7 @@ class TestHealthAndMetrics:
         assert "total_snapshots_processed" in data
         assert "avg_latency_ms" in data
         assert "total_errors" in data
+        assert set(data["session_tiers"]["counts"]) >= {"normal", "reduced_detection"}
     
     def test_metrics_dashboard_endpoint(self, client):
         """Test /metrics/dashboard returns detailed stats."""
@@ -102,6 +103,19 @@ class TestReplayControls:
         assert response.status_code == 200
         assert response.json()["speed"] == 5
 
+    def test_queue_policy_applies_after_replay(self, client, session_id):
+        """Test /sessions/{session_id}/queue-policy/{policy} stores the policy during a replay."""
+        client.post(f"/replay/{session_id}/start")
+
+        response = client.post(f"/sessions/{session_id}/queue-policy/conflate")
+        assert response.json()["status"] == "success"
+        assert response.json()["queue_policy"] == "conflate"
+        assert response.json()["queues"]["processed"]["policy"] == "block"
+
+        client.post(f"/replay/{session_id}/stop")
+        response = client.post(f"/sessions/{session_id}/queue-policy/unbounded")
+        assert response.json()["status"] == "error"
+
 
 class TestDataEndpoints:
     """Test data retrieval endpoints."""
@@ -0,0 +1,146 @@
+"""Tests for the shared LIVE process-once, fan-out-many pipeline."""
+import copy
+import pytest
+from live_pipeline import LivePipeline
+from session_replay import UserSession
+from session_strategy import SessionStrategyManager
+
+
+class CountingInference:
+    """Inference stub that counts calls and always returns a prediction."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, key, snapshot):
+        self.calls.append(key)
+        return {"up": 0.9, "neutral": 0.05, "down": 0.05}
+
+    def cleanup_session(self, key):
+        self.calls = [k for k in self.calls if k != key]
+
+
+class FakePool:
+    """Analytics pool stub that records which keys it processed."""
+
+    def __init__(self):
+        self.keys = []
+
+    async def process(self, key, snapshot):
+        self.keys.append(key)
+        return {"mid_price": snapshot["mid_price"]}, 0.1, "worker"
+
+    def set_profile(self, key, profile):
+        pass
+
+    def release(self, key):
+        pass
+
+
+@pytest.fixture
+def live_snapshot(sample_snapshot):
+    snap = copy.deepcopy(sample_snapshot)
+    snap["symbol"] = "BTCUSDT"
+    return snap
+
+
+class TestLivePipeline:
+    """Test that analytics and inference run once per tick."""
+
+    def test_process_runs_inference_once_per_tick(self, live_snapshot):
+        inference = CountingInference()
+        pipeline = LivePipeline(inference_engine=inference)
+
+        processed, processing_time, engine = pipeline.process(live_snapshot)
+
+        assert engine == "python"
+        assert "prediction" in processed
+        assert inference.calls == ["live:BTCUSDT"]
+        assert pipeline.get_stats()["symbols"]["BTCUSDT"]["ticks_processed"] == 1
+
+    def test_fan_out_delivers_to_all_subscribers(self, live_snapshot):
+        inference = CountingInference()
+        pipeline = LivePipeline(inference_engine=inference)
+        sessions = [UserSession(f"viewer-{i}") for i in range(50)]
+
+        processed, processing_time, _ = pipeline.process(live_snapshot)
+        delivered = pipeline.fan_out(processed, live_snapshot, processing_time, sessions)
+
+        assert delivered == 50
+        assert len(inference.calls) == 1
+        for session in sessions:
+            message, _ = session.processed_snapshot_queue.get_nowait()
+            assert message["spread"] == processed["spread"]
+
+    def test_fan_out_skips_other_symbols_and_inactive_sessions(self, live_snapshot):
+        pipeline = LivePipeline()
+        follower = UserSession("follower")
+        other = UserSession("other")
+        other.subscribe("ETHUSDT")
+        closed = UserSession("closed")
+        closed.shutdown()
+
+        processed, processing_time, _ = pipeline.process(live_snapshot)
+        delivered = pipeline.fan_out(processed, live_snapshot, processing_time, [follower, other, closed])
+
+        assert delivered == 1
+        assert other.processed_snapshot_queue.empty()
+        assert closed.processed_snapshot_queue.empty()
+
+    def test_subscription_selects_symbol(self, live_snapshot):
+        pipeline = LivePipeline()
+        session = UserSession("switcher")
+        session.subscribe(" btcusdt ")
+        assert session.get_state()["symbol"] == "BTCUSDT"
+
+        processed, processing_time, _ = pipeline.process(live_snapshot)
+        assert pipeline.fan_out(processed, live_snapshot, processing_time, [session]) == 1
+
+        session.subscribe("ETHUSDT")
+        assert pipeline.fan_out(processed, live_snapshot, processing_time, [session]) == 0
+
+        session.subscribe(None)
+        assert session.symbol is None
+        assert pipeline.fan_out(processed, live_snapshot, processing_time, [session]) == 1
+
+    def test_strategy_state_stays_per_session(self, live_snapshot):
+        pipeline = LivePipeline(inference_engine=CountingInference())
+        strategies = SessionStrategyManager()
+        active, idle = UserSession("active"), UserSession("idle")
+        strategies.get_or_create("active").start()
+
+        processed, processing_time, _ = pipeline.process(live_snapshot)
+        pipeline.fan_out(processed, live_snapshot, processing_time, [active, idle], strategies)
+
+        active_msg, _ = active.processed_snapshot_queue.get_nowait()
+        idle_msg, _ = idle.processed_snapshot_queue.get_nowait()
+        assert active_msg["strategy"]["trade_event"]["side"] == "BUY"
+        assert idle_msg is processed and "strategy" not in processed
+        assert "idle" not in strategies.strategies
+
+    async def test_pool_keeps_only_symbol_stats(self, live_snapshot):
+        pool = FakePool()
+        pipeline = LivePipeline(pool=pool)
+
+        processed, _, engine = await pipeline.process_async(live_snapshot)
+
+        assert engine == "worker" and pool.keys == ["live:BTCUSDT"]
+        assert pipeline.pipelines["BTCUSDT"].processor is None
+        assert pipeline.get_stats()["symbols"]["BTCUSDT"] == {
+            "ticks_processed": 1, "subscribers": 0, "engine_mode": "worker"}
+        assert pipeline.stage_costs("BTCUSDT") == {}
+
+    def test_symbols_have_independent_engines(self, live_snapshot):
+        pipeline = LivePipeline()
+        eth = copy.deepcopy(live_snapshot)
+        eth["symbol"] = "ETHUSDT"
+
+        pipeline.process(live_snapshot)
+        pipeline.process(eth)
+
+        btc_engine = pipeline.pipelines["BTCUSDT"].processor.analytics_engine
+        eth_engine = pipeline.pipelines["ETHUSDT"].processor.analytics_engine
+        assert btc_engine is not eth_engine
+
+        pipeline.cleanup_symbol("ETHUSDT")
+        assert "ETHUSDT" not in pipeline.pipelines
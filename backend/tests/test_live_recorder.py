@@ -0,0 +1,97 @@
+"""Tests for the live capture recorder."""
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from live_recorder import LiveRecorder, snapshot_ts_us
+from replay_source import NpyReplaySource
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def live_snapshot(i, symbol="BTCUSDT", depth=10):
+    return {
+        "timestamp": START.isoformat(),
+        "exchange_ts": (START + timedelta(milliseconds=100 * i)).isoformat(),
+        "ingest_ts": (START + timedelta(milliseconds=100 * i + 5)).isoformat(),
+        "bids": [[100.0 - j * 0.1 + i, 1.0 + j] for j in range(depth)],
+        "asks": [[100.1 + j * 0.1 + i, 2.0 + j] for j in range(depth)],
+        "mid_price": 100.05 + i,
+        "symbol": symbol,
+        "source": "BINANCE"
+    }
+
+
+class TestLiveRecorder:
+    """Test segment rotation, replay of recordings and restarts."""
+
+    def test_recording_replays_through_npy_source(self, tmp_path):
+        recorder = LiveRecorder(str(tmp_path), segment_rows=4)
+        for i in range(10):
+            recorder.record(live_snapshot(i))
+        recorder.flush()
+
+        source = NpyReplaySource(str(tmp_path / "BTCUSDT"))
+        assert source.rows == 10
+        assert len(source.segments) == 3
+
+        rows = source.read_range(snapshot_ts_us(live_snapshot(0)), snapshot_ts_us(live_snapshot(9)) + 1)
+        snap = rows.snapshot(7)
+        assert snap["bids"][0] == [107.0, 1.0]
+        assert snap["asks"][9][1] == 11.0
+        assert recorder.get_stats()["symbols"]["BTCUSDT"] == {"rows": 10, "segments": 3, "clamped": 0}
+
+    def test_unflushed_rows_are_not_published(self, tmp_path):
+        recorder = LiveRecorder(str(tmp_path), segment_rows=100)
+        recorder.record(live_snapshot(0))
+        recorder.flush()
+        recorder.record(live_snapshot(1))
+
+        assert NpyReplaySource(str(tmp_path / "BTCUSDT")).rows == 1
+
+    def test_shallow_books_and_out_of_order_times(self, tmp_path):
+        recorder = LiveRecorder(str(tmp_path), segment_rows=100)
+        recorder.record(live_snapshot(5, depth=3))
+        recorder.record(live_snapshot(2))
+        recorder.flush()
+
+        source = NpyReplaySource(str(tmp_path / "BTCUSDT"))
+        block = source.segments[0]
+        assert np.isnan(block.bids[0, 3:]).all()
+        assert block.ts_us[0] == block.ts_us[1]  # clamped so the index stays sorted
+
+        # The real exchange time is kept next to the sort key and the clamp is reported
+        exchange_ts = np.load(tmp_path / "BTCUSDT" / "seg_00000.exchange_ts.npy")
+        assert exchange_ts[1] == snapshot_ts_us(live_snapshot(2)) < block.ts_us[1]
+        with open(tmp_path / "BTCUSDT" / "manifest.json") as f:
+            assert json.load(f)["segments"][0]["clamped_rows"] == 1
+        assert recorder.get_stats()["clamped"] == 1
+
+    def test_restart_appends_new_segments(self, tmp_path):
+        first = LiveRecorder(str(tmp_path), segment_rows=100)
+        for i in range(3):
+            first.record(live_snapshot(i))
+        first.flush()
+
+        second = LiveRecorder(str(tmp_path), segment_rows=100)
+        for i in range(3, 5):
+            second.record(live_snapshot(i))
+        second.flush()
+
+        source = NpyReplaySource(str(tmp_path / "BTCUSDT"))
+        assert source.rows == 5
+        assert source.bounds_us()[1] == snapshot_ts_us(live_snapshot(4))
+
+    def test_processed_output_and_symbols(self, tmp_path):
+        recorder = LiveRecorder(str(tmp_path), segment_rows=100, record_processed=True)
+        for symbol in ("BTCUSDT", "ETHUSDT"):
+            snapshot = live_snapshot(1, symbol)
+            recorder.record(snapshot)
+            recorder.record_processed(snapshot, {"mid_price": 101.05, "anomalies": []})
+        recorder.flush()
+
+        with open(tmp_path / "ETHUSDT" / "seg_00000.processed.jsonl") as f:
+            line = json.loads(f.readline())
+        assert line["ts_us"] == snapshot_ts_us(live_snapshot(1)) and line["mid_price"] == 101.05
+        assert sorted(os.listdir(tmp_path)) == ["BTCUSDT", "ETHUSDT"]
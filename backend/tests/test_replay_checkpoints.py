@@ -0,0 +1,180 @@
+"""Tests for replay checkpoints, engine state restore and seek."""
+import random
+from datetime import datetime, timedelta
+import pytest
+from analytics_core import AnalyticsEngine
+from replay_checkpoints import Checkpoint, CheckpointIndex
+from session_replay import UserSession
+from strategy_service import StrategyEngine
+
+START = datetime(2024, 3, 1, 9, 30)
+COMPARED = ("ofi", "obi", "vpin", "microprice", "divergence", "spoofing_risk", "volume_volatility", "directional_prob")
+
+
+def make_snapshots(n, seed=7):
+    rng = random.Random(seed)
+    snapshots = []
+    for i in range(n):
+        mid = 100 + rng.random()
+        snapshots.append({
+            "timestamp": START + timedelta(milliseconds=100 * i),
+            "bids": [[round(mid - 0.01 * (k + 1), 2), rng.randint(100, 900)] for k in range(10)],
+            "asks": [[round(mid + 0.01 * (k + 1), 2), rng.randint(100, 900)] for k in range(10)],
+            "mid_price": round(mid, 2)
+        })
+    return snapshots
+
+
+def metrics(result):
+    return {k: result.get(k) for k in COMPARED}
+
+
+class TestCheckpointIndex:
+    """Test checkpoint spacing, lookup and thinning."""
+
+    def test_due_and_nearest(self):
+        index = CheckpointIndex(interval_seconds=10)
+        assert index.due(START)
+        index.add(Checkpoint(START, b"a", None))
+        assert not index.due(START + timedelta(seconds=5))
+        assert index.due(START + timedelta(seconds=10))
+        index.add(Checkpoint(START + timedelta(seconds=10), b"b", None))
+
+        assert index.nearest(START - timedelta(seconds=1)) is None
+        assert index.nearest(START + timedelta(seconds=9)).engine_state == b"a"
+        assert index.nearest(START + timedelta(seconds=10)).engine_state == b"b"
+        # Earlier gaps are checkpointed after a rewind
+        assert not index.due(START + timedelta(seconds=3))
+
+    def test_thinning_keeps_coverage(self):
+        index = CheckpointIndex(interval_seconds=1, max_checkpoints=10)
+        for i in range(11):
+            index.add(Checkpoint(START + timedelta(seconds=i), b"x", None))
+
+        assert len(index) == 6
+        assert index.interval_seconds == 2
+        assert index.nearest(START + timedelta(seconds=10)).ts == START + timedelta(seconds=10)
+
+    def test_invalid_interval(self):
+        with pytest.raises(ValueError):
+            CheckpointIndex(interval_seconds=0)
+
+
+class TestEngineState:
+    """Test that restoring a checkpoint reproduces forward analytics."""
+
+    def test_restore_then_fast_forward_matches_uninterrupted_run(self):
+        snapshots = make_snapshots(300)
+        engine = AnalyticsEngine()
+        expected = []
+        for i, snapshot in enumerate(snapshots):
+            expected.append(metrics(engine.process_snapshot(snapshot)))
+            if i == 149:
+                checkpoint = engine.get_state()
+
+        restored = AnalyticsEngine()
+        restored.set_state(checkpoint)
+        replayed = [metrics(restored.process_snapshot(s)) for s in snapshots[150:]]
+
+        assert replayed == expected[150:]
+
+    def test_set_state_none_resets(self):
+        snapshots = make_snapshots(50)
+        engine = AnalyticsEngine()
+        first = metrics(engine.process_snapshot(snapshots[0]))
+        for snapshot in snapshots[1:]:
+            engine.process_snapshot(snapshot)
+
+        engine.set_state(None)
+        assert metrics(engine.process_snapshot(snapshots[0])) == first
+
+    def test_state_excludes_load_shedding_switches(self):
+        engine = AnalyticsEngine()
+        state = engine.get_state()
+        engine.clustering_enabled = False
+        engine.set_state(state)
+        assert engine.clustering_enabled is False
+
+    def test_strategy_state_roundtrip(self):
+        strategy = StrategyEngine()
+        strategy.pnl, strategy.position, strategy.entry_price = 12.5, 1.0, 100.0
+        strategy.trades = [{"id": 1, "side": "BUY"}]
+        state = strategy.get_state()
+
+        strategy.trades[0]["side"] = "SELL"
+        strategy.reset()
+        strategy.set_state(state)
+
+        assert (strategy.pnl, strategy.position, strategy.entry_price) == (12.5, 1.0, 100.0)
+        assert strategy.trades == [{"id": 1, "side": "BUY"}]
+
+
+class TestSessionSeek:
+    """Test that seeking drops rows queued for the old position."""
+
+    async def test_seek_drains_queue_and_returns_credits(self):
+        session = UserSession("seek", replay_credits=8)
+        session.cursor_ts = START + timedelta(minutes=5)
+        for snapshot in make_snapshots(3):
+            await session.replay_credits.acquire()
+            await session.raw_snapshot_queue.put(snapshot)
+
+        target = START + timedelta(minutes=1)
+        session.seek(target)
+
+        assert session.raw_snapshot_queue.qsize() == 0
+        assert session.replay_credits.in_flight == 0
+        assert session.cursor_ts == target
+        assert session.pending_seek == target
+
+    def test_seek_matches_cursor_timezone(self):
+        from datetime import timezone
+        session = UserSession("seek-tz")
+        session.cursor_ts = START
+        session.seek(datetime(2024, 3, 1, 9, 0, tzinfo=timezone.utc))
+        assert session.cursor_ts == datetime(2024, 3, 1, 9, 0)
+
+    def test_go_back_seeks(self):
+        session = UserSession("rewind")
+        session.cursor_ts = START
+        assert session.go_back(30)
+        assert session.pending_seek == START - timedelta(seconds=30)
+
+        session.stop()
+        assert session.pending_seek is None
+
+
+class TestInProcessRestore:
+    """Test checkpoint and seek restore without the worker pool."""
+
+    async def test_session_engine_restores_without_workers(self, monkeypatch):
+        import numpy as np
+        import main
+        from replay_blocks import OrderBookBlock
+
+        class EmptySource:
+            async def fetch(self, after_ts, limit):
+                return OrderBookBlock.from_levels(np.zeros(0, dtype=np.int64), np.zeros((0, 40)))
+
+        monkeypatch.setattr(main, "analytics_pool", None)
+        monkeypatch.setattr(main, "get_replay_source", lambda resolution: EmptySource())
+        session = UserSession("in-process-seek", checkpoint_interval=1)
+        snapshots = make_snapshots(60)
+        engine = main.get_session_processor(session.session_id).analytics_engine
+        shared_state = main.snapshot_processor.analytics_engine.get_state()
+        try:
+            expected = []
+            for snapshot in snapshots:
+                expected.append(metrics(engine.process_snapshot(snapshot)))
+                await main.capture_checkpoint(session, snapshot)
+
+            target = snapshots[20]["timestamp"]  # Checkpointed every 10 rows
+            assert session.checkpoints.nearest(target).ts == target
+            await main.restore_for_seek(session, target)
+
+            assert [metrics(engine.process_snapshot(s)) for s in snapshots[21:]] == expected[21:]
+            assert session.last_seek["checkpoint"] == target.isoformat()
+            assert main.snapshot_processor.analytics_engine.get_state() == shared_state
+        finally:
+            main.release_session_analytics(session.session_id)
+            main.inference_engine.cleanup_session(session.session_id)
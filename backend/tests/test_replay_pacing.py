@@ -0,0 +1,104 @@
+"""Tests for replay pacing modes and achieved-speed reporting."""
+import time
+from datetime import datetime, timedelta
+import pytest
+from replay_pacing import ReplayPacer
+from session_replay import UserSession
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+async def pace_rows(pacer, offsets_ms):
+    start = time.monotonic()
+    for ms in offsets_ms:
+        await pacer.wait(START + timedelta(milliseconds=ms))
+    return time.monotonic() - start
+
+
+class TestReplayPacer:
+    """Test fixed, exchange-time and max pacing."""
+
+    async def test_exchange_follows_recorded_inter_arrival_times(self):
+        pacer = ReplayPacer()
+        pacer.set_exchange(10.0)
+
+        # 400 ms of recorded data at 10x: about 40 ms of wall time
+        elapsed = await pace_rows(pacer, [0, 100, 150, 300, 400])
+
+        assert 0.035 <= elapsed < 0.2
+        stats = pacer.get_stats()
+        assert stats["mode"] == "exchange"
+        assert stats["target"] == 10.0
+        assert stats["achieved_speed"] == pytest.approx(10.0, rel=0.3)
+
+    async def test_exchange_caps_long_gaps(self):
+        pacer = ReplayPacer(max_gap_seconds=0.02)
+        pacer.set_exchange(1.0)
+
+        elapsed = await pace_rows(pacer, [0, 3_600_000, 3_600_010])  # An hour-long gap
+
+        assert elapsed < 0.5
+        assert pacer.gaps_skipped == 1
+
+    async def test_exchange_reanchors_when_held_back(self):
+        pacer = ReplayPacer(max_lag_seconds=0.01)
+        pacer.set_exchange(1.0)
+        await pacer.wait(START)
+        time.sleep(0.05)  # Pipeline backpressure
+
+        start = time.monotonic()
+        await pacer.wait(START + timedelta(milliseconds=10))
+        await pacer.wait(START + timedelta(milliseconds=20))
+
+        assert pacer.reanchors == 1
+        assert time.monotonic() - start >= 0.009  # Paced from the new anchor, not bursting
+
+    async def test_max_does_not_sleep(self):
+        pacer = ReplayPacer()
+        pacer.set_max()
+
+        elapsed = await pace_rows(pacer, range(0, 100_000, 100))
+
+        assert elapsed < 0.5
+        stats = pacer.get_stats()
+        assert stats["target"] is None
+        assert stats["achieved_speed"] > 100
+
+    async def test_fixed_and_rows_without_timestamps(self):
+        pacer = ReplayPacer(base_delay=0.01)
+        pacer.set_exchange(1.0)
+
+        start = time.monotonic()
+        await pacer.wait("2024-03-01T09:30:00")  # Not a datetime: paced as fixed
+        assert time.monotonic() - start >= 0.009
+
+        pacer.set_fixed(2)
+        assert pacer.target_speed() == pytest.approx(200)
+
+    async def test_fixed_delay_ignores_speed(self):
+        pacer = ReplayPacer(base_delay=1.0)
+        pacer.set_fixed(100)
+
+        start = time.monotonic()
+        await pacer.wait(START, fixed_delay=0.05)
+        assert time.monotonic() - start >= 0.045
+
+    def test_invalid_factor(self):
+        with pytest.raises(ValueError):
+            ReplayPacer().set_exchange(0)
+
+
+class TestSessionPacing:
+    """Test pacing controls on the session."""
+
+    def test_exchange_speed_is_not_clamped(self):
+        session = UserSession("exchange")
+        session.set_exchange_speed(250.0)
+
+        state = session.get_state()
+        assert state["pacing"] == "exchange"
+        assert state["replay_speed"]["target"] == 250.0
+
+        session.set_speed(50)
+        assert session.get_state()["pacing"] == "fixed"
+        assert session.speed == 10  # Fixed mode keeps its 1-10 range
@@ -0,0 +1,135 @@
+"""Tests for the prefetching replay reader."""
+import asyncio
+from datetime import datetime
+import pytest
+from replay_reader import PrefetchingReplayReader
+from session_replay import UserSession
+
+
+class FakeTable:
+    """In-memory ordered table with simulated query latency."""
+
+    def __init__(self, n_rows, latency=0.0, fail_times=0):
+        self.rows = [{"ts": i, "value": i * 10} for i in range(1, n_rows + 1)]
+        self.latency = latency
+        self.fail_times = fail_times
+        self.queries = []
+        self.cancelled = 0
+
+    async def fetch(self, after_ts, limit):
+        self.queries.append((after_ts, limit))
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("db down")
+        return [r for r in self.rows if r["ts"] > after_ts][:limit]
+
+
+async def read_all(reader):
+    rows = []
+    while True:
+        row = await reader.next_row()
+        if row is None:
+            return rows
+        rows.append(row)
+
+
+class TestPrefetchingReplayReader:
+    """Test ordering, prefetch depth and cancellation."""
+
+    async def test_reads_full_range_in_order(self):
+        table = FakeTable(1234)
+        reader = PrefetchingReplayReader(table.fetch, 0, batch_size=100)
+
+        rows = await read_all(reader)
+
+        assert [r["ts"] for r in rows] == list(range(1, 1235))
+        assert reader.exhausted
+
+    async def test_starts_after_cursor(self):
+        table = FakeTable(50)
+        reader = PrefetchingReplayReader(table.fetch, 40, batch_size=100)
+        rows = await read_all(reader)
+        assert [r["ts"] for r in rows] == list(range(41, 51))
+
+    async def test_next_batch_is_in_flight_while_consuming(self):
+        table = FakeTable(1000, latency=0.01)
+        reader = PrefetchingReplayReader(table.fetch, 0, batch_size=100, prefetch_depth=2)
+
+        await reader.next_row()
+        await asyncio.sleep(0.05)
+
+        # Current batch plus `prefetch_depth` ready batches, without further reads
+        assert reader.get_stats()["batches_ready"] == 2
+        assert reader.batches_fetched >= 3
+        reader.close()
+
+    async def test_consumer_does_not_stall_on_query_latency(self):
+        table = FakeTable(600, latency=0.02)
+        reader = PrefetchingReplayReader(table.fetch, 0, batch_size=100, min_batch_size=100)
+
+        rows = []
+        while (row := await reader.next_row()) is not None:
+            rows.append(row)
+            await asyncio.sleep(0.001)  # Playback slower than the DB
+
+        assert len(rows) == 600
+        assert reader.stalls == 1  # Only the initial fetch is waited for
+
+    async def test_batch_size_adapts_to_consumption(self):
+        reader = PrefetchingReplayReader(FakeTable(0).fetch, 0, batch_size=500,
+                                         min_batch_size=100, max_batch_size=5000, lead_seconds=2.0)
+        reader.consumption_rate = 10.0
+        assert reader.next_batch_size() == 100
+
+        reader.consumption_rate = 1000.0
+        assert reader.next_batch_size() == 2000
+
+        reader.consumption_rate = 100000.0
+        assert reader.next_batch_size() == 5000
+
+    async def test_close_cancels_in_flight_fetch(self):
+        table = FakeTable(1000, latency=1.0)
+        reader = PrefetchingReplayReader(table.fetch, 0)
+
+        waiter = asyncio.create_task(reader.next_row())
+        await asyncio.sleep(0.01)
+        reader.close()
+
+        assert await asyncio.wait_for(waiter, timeout=1) is None
+        await asyncio.sleep(0)
+        assert table.cancelled == 1
+
+    async def test_retries_then_surfaces_errors(self):
+        table = FakeTable(10, fail_times=1)
+        reader = PrefetchingReplayReader(table.fetch, 0, retry_delay=0.001)
+        rows = await read_all(reader)
+        assert len(rows) == 10
+        assert reader.fetch_errors == 1
+
+        failing = PrefetchingReplayReader(FakeTable(10, fail_times=10).fetch, 0, max_errors=2, retry_delay=0.001)
+        with pytest.raises(ConnectionError):
+            await failing.next_row()
+
+
+class TestSessionReader:
+    """Test that seek and stop drop the session's prefetches."""
+
+    async def test_go_back_and_stop_reset_reader(self):
+        session = UserSession("prefetch")
+        session.cursor_ts = datetime(2024, 1, 1, 12, 0, 0)
+        session.replay_reader = PrefetchingReplayReader(FakeTable(100, latency=1.0).fetch, 0)
+        reader = session.replay_reader
+
+        assert session.go_back(5)
+        assert reader.closed
+        assert session.replay_reader is None
+
+        session.replay_reader = PrefetchingReplayReader(FakeTable(100).fetch, 0)
+        reader = session.replay_reader
+        session.stop()
+        assert reader.closed
@@ -0,0 +1,126 @@
+"""Tests for the shared replay reader service."""
+import asyncio
+from datetime import datetime, timedelta
+import numpy as np
+from replay_blocks import OrderBookBlock, datetime_to_unix_us
+from replay_reader import PrefetchingReplayReader
+from replay_service import ReplayReaderService
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def ts(i):
+    return START + timedelta(milliseconds=100 * i)
+
+
+class FakeDatabase:
+    """Order book table behind a connection pool, tracking concurrent connections."""
+
+    def __init__(self, n_rows, latency=0.01):
+        ts_us = np.array([datetime_to_unix_us(ts(i)) for i in range(1, n_rows + 1)], dtype=np.int64)
+        levels = np.tile(np.arange(40, dtype=np.float64), (n_rows, 1))
+        self.table = OrderBookBlock.from_levels(ts_us, levels)
+        self.latency = latency
+        self.open_connections = 0
+        self.peak_connections = 0
+        self.queries = 0
+
+    async def acquire(self):
+        self.open_connections += 1
+        self.peak_connections = max(self.peak_connections, self.open_connections)
+        return object()
+
+    async def release(self, conn):
+        self.open_connections -= 1
+
+    async def fetch_block(self, conn, after_ts, limit, table):
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+        start = int(np.searchsorted(self.table.ts_us, datetime_to_unix_us(after_ts), side="right"))
+        return self.table.slice(start, start + limit)
+
+    def service(self, **kwargs):
+        return ReplayReaderService(acquire=self.acquire, release=self.release,
+                                   fetch_block=self.fetch_block, **kwargs)
+
+
+class TestReplayReaderService:
+    """Test connection usage and request coalescing."""
+
+    async def test_returns_rows_after_cursor(self):
+        db = FakeDatabase(100)
+        block = await db.service().fetch(ts(10), 5)
+        assert [block.timestamp(i) for i in range(5)] == [ts(i) for i in range(11, 16)]
+        assert db.open_connections == 0
+
+    async def test_connection_count_stays_flat(self):
+        db = FakeDatabase(1000)
+        service = db.service(max_concurrent_queries=4)
+
+        # 200 sessions at scattered cursors
+        await asyncio.gather(*(service.fetch(ts(i * 5), 50) for i in range(200)))
+
+        assert db.peak_connections <= 4
+        assert db.open_connections == 0
+
+    async def test_nearby_cursors_share_one_query(self):
+        db = FakeDatabase(1000)
+        service = db.service()
+
+        leader = asyncio.create_task(service.fetch(ts(100), 500))
+        await asyncio.sleep(0)
+        followers = await asyncio.gather(service.fetch(ts(100), 500), service.fetch(ts(103), 500))
+        first = await leader
+
+        assert db.queries == 1
+        assert followers[0].timestamp(0) == first.timestamp(0)
+        assert followers[1].timestamp(0) == ts(104)
+        assert service.get_stats()["coalesced_requests"] == 2
+
+    async def test_query_behind_cursor_is_not_joined(self):
+        db = FakeDatabase(1000)
+        service = db.service()
+
+        leader = asyncio.create_task(service.fetch(ts(500), 100))
+        await asyncio.sleep(0)
+        behind = await service.fetch(ts(10), 100)
+        await leader
+
+        assert db.queries == 2
+        assert behind.timestamp(0) == ts(11)
+
+    async def test_past_end_of_shared_batch_queries_again(self):
+        db = FakeDatabase(1000)
+        service = db.service()
+
+        leader = asyncio.create_task(service.fetch(ts(0), 10))
+        await asyncio.sleep(0)
+        beyond = await service.fetch(ts(50), 10)
+        await leader
+
+        assert beyond.timestamp(0) == ts(51)
+        assert db.queries == 2
+
+    async def test_cancelled_requester_does_not_cancel_joiners(self):
+        db = FakeDatabase(100, latency=0.05)
+        service = db.service()
+
+        leader = asyncio.create_task(service.fetch(ts(0), 10))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service.fetch(ts(2), 10))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        block = await asyncio.wait_for(follower, timeout=1)
+        assert block.timestamp(0) == ts(3)
+
+    async def test_prefetching_reader_over_service(self):
+        db = FakeDatabase(1234, latency=0.001)
+        reader = PrefetchingReplayReader(db.service().fetch, START, batch_size=100,
+                                         end_ts=lambda block: block.last_ts)
+        count = 0
+        while (snapshot := await reader.next_row()) is not None:
+            count += 1
+            last = snapshot["timestamp"]
+        assert count == 1234
+        assert last == ts(1234)
@@ -0,0 +1,140 @@
+"""Tests for pluggable replay data sources."""
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from replay_blocks import LEVEL_COLUMNS
+from replay_reader import PrefetchingReplayReader
+from replay_source import (
+    CSVReplaySource, NpyReplaySource, NpySegmentWriter, convert_csv_to_npy,
+    csv_chunk_to_block, open_replay_source, read_csv_blocks
+)
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def ts(i):
+    return START + timedelta(milliseconds=100 * i)
+
+
+def write_l2_clean(path, n_rows):
+    """CSV shaped like l2_clean.csv: 40 interleaved level columns, then ts."""
+    levels = np.array([[100.0 + i + c * 0.01 for c in range(40)] for i in range(n_rows)])
+    df = pd.DataFrame(levels, columns=[str(c) for c in range(40)])
+    df["ts"] = [ts(i).isoformat() for i in range(1, n_rows + 1)]
+    df.to_csv(path)  # Includes the pandas index as "Unnamed: 0"
+    return levels
+
+
+async def replay_all(source):
+    reader = PrefetchingReplayReader(source.fetch, datetime.min, batch_size=137,
+                                     end_ts=lambda block: block.last_ts)
+    snapshots = []
+    while (snapshot := await reader.next_row()) is not None:
+        snapshots.append(snapshot)
+    return snapshots
+
+
+class TestCSVParsing:
+    """Test vectorized CSV conversion."""
+
+    def test_positional_columns(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        levels = write_l2_clean(path, 5)
+        block = next(read_csv_blocks(str(path)))
+
+        assert len(block) == 5
+        assert block.timestamp(2) == ts(3)
+        assert block.snapshot(0)["bids"][1] == [levels[0][2], levels[0][3]]
+        assert block.snapshot(0)["asks"][0] == [levels[0][20], levels[0][21]]
+
+    def test_named_columns(self):
+        df = pd.DataFrame([[float(i) for i in range(40)]], columns=LEVEL_COLUMNS)
+        df["ts"] = [ts(1).isoformat()]
+        block = csv_chunk_to_block(df)
+        assert block.snapshot(0)["bids"][0] == [0.0, 1.0]
+        assert block.snapshot(0)["asks"][0] == [20.0, 21.0]
+
+    def test_synthesizes_timestamps_without_ts_column(self):
+        df = pd.DataFrame(np.ones((3, 41)))  # 40 levels + numeric mid_price
+        block = csv_chunk_to_block(df, synthetic_start_us=1_000_000)
+        assert block.ts_us.tolist() == [1_000_000, 1_100_000, 1_200_000]
+
+
+class TestFileSources:
+    """Test CSV and memory-mapped segment replay."""
+
+    async def test_csv_source_replays_everything_in_order(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 500)
+        snapshots = await replay_all(CSVReplaySource(str(path), chunksize=64))
+
+        assert [s["timestamp"] for s in snapshots] == [ts(i) for i in range(1, 501)]
+
+    async def test_npy_roundtrip_matches_csv(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 1000)
+        manifest = convert_csv_to_npy(str(path), str(tmp_path / "npy"), segment_rows=300, chunksize=128)
+
+        assert manifest["rows"] == 1000
+        assert [s["rows"] for s in manifest["segments"]] == [300, 300, 300, 100]
+
+        from_npy = await replay_all(NpyReplaySource(str(tmp_path / "npy")))
+        from_csv = await replay_all(CSVReplaySource(str(path)))
+        assert from_npy == from_csv
+
+    async def test_npy_segments_are_memory_mapped(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 100)
+        convert_csv_to_npy(str(path), str(tmp_path / "npy"))
+        source = NpyReplaySource(str(tmp_path / "npy"))
+        assert isinstance(source.segments[0].ts_us, np.memmap)
+
+    async def test_fetch_spans_segments_and_ranges(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 100)
+        convert_csv_to_npy(str(path), str(tmp_path / "npy"), segment_rows=30)
+        source = NpyReplaySource(str(tmp_path / "npy"))
+
+        block = await source.fetch(ts(25), 10)
+        assert [block.timestamp(i) for i in range(10)] == [ts(i) for i in range(26, 36)]
+
+        window = await source.fetch_range(ts(58), ts(62), 100)
+        assert [window.timestamp(i) for i in range(len(window))] == [ts(i) for i in range(58, 62)]
+        assert len(await source.fetch(ts(100), 10)) == 0
+
+    def test_writer_rejects_out_of_order_blocks(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 10)
+        block = next(read_csv_blocks(str(path)))
+        writer = NpySegmentWriter(str(tmp_path / "npy"))
+        writer.append(block.slice(5))
+        with pytest.raises(ValueError):
+            writer.append(block.slice(0, 5))
+
+    def test_open_replay_source(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        write_l2_clean(path, 10)
+        convert_csv_to_npy(str(path), str(tmp_path / "npy"))
+
+        assert open_replay_source(str(path)).kind == "csv"
+        assert open_replay_source(str(path)) is open_replay_source(str(path))
+        assert open_replay_source(str(tmp_path / "npy")).kind == "npy"
+        with pytest.raises(ValueError):
+            open_replay_source("postgres")  # Needs the reader service
+
+    def test_npy_source_reopens_when_manifest_changes(self, tmp_path):
+        path = tmp_path / "l2_clean.csv"
+        directory = str(tmp_path / "npy")
+        write_l2_clean(path, 10)
+        convert_csv_to_npy(str(path), directory)
+        source = open_replay_source(directory)
+        assert open_replay_source(directory) is source
+
+        write_l2_clean(path, 20)
+        convert_csv_to_npy(str(path), directory)  # As if the recorder added rows
+        manifest = os.path.join(directory, "manifest.json")
+        os.utime(manifest, ns=(0, os.stat(manifest).st_mtime_ns + 1_000_000))
+
+        assert open_replay_source(directory).rows == 20
@@ -0,0 +1,152 @@
+"""Tests for LISTEN/NOTIFY tail replay."""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+from bulk_loader import BulkLoader
+from replay_blocks import OrderBookBlock, datetime_to_unix_us
+from replay_tail import TAIL_CHANNEL, TailListener, insert_payload, notify_trigger_sql, parse_payload
+from session_replay import UserSession
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def make_block(n, offset=0):
+    ts_us = np.array([datetime_to_unix_us(START + timedelta(milliseconds=100 * (offset + i)))
+                      for i in range(n)], dtype=np.int64)
+    return OrderBookBlock.from_levels(ts_us, np.ones((n, 40)))
+
+
+class FakeListenConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.executed = []
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    def notify(self, payload=""):
+        self.listeners[TAIL_CHANNEL](self, 1, TAIL_CHANNEL, payload)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, sql, *args):
+        self.executed.append((sql, args))
+        return "INSERT 0 0"
+
+    async def copy_to_table(self, name, source, columns, format):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def started_listener(**kwargs):
+    conns = []
+
+    async def connect():
+        conns.append(FakeListenConnection())
+        return conns[-1]
+
+    listener = TailListener(connect, debounce=0, reconnect_delay=0, **kwargs)
+    listener.start()
+    while not listener.connected:
+        await asyncio.sleep(0)
+    return listener, conns
+
+
+class TestTailListener:
+    """Test wakeups, missed-notification safety and reconnects."""
+
+    async def test_wait_times_out_without_inserts(self):
+        listener, _ = await started_listener()
+        try:
+            assert await listener.wait(listener.version, timeout=0.01) is False
+        finally:
+            await listener.stop()
+
+    async def test_notification_wakes_waiters(self):
+        listener, conns = await started_listener()
+        try:
+            version = listener.version
+            waiters = [asyncio.create_task(listener.wait(version, timeout=5)) for _ in range(3)]
+            await asyncio.sleep(0)
+            conns[0].notify()
+            assert await asyncio.gather(*waiters) == [True, True, True]
+        finally:
+            await listener.stop()
+
+    async def test_notification_before_wait_is_not_missed(self):
+        listener, conns = await started_listener()
+        try:
+            version = listener.version  # Taken when the session started reading
+            conns[0].notify()
+            assert await listener.wait(version, timeout=0.01) is True
+        finally:
+            await listener.stop()
+
+    async def test_loader_payload_reports_range(self):
+        ranges = []
+        listener, conns = await started_listener(on_insert=lambda lo, hi: ranges.append((lo, hi)))
+        try:
+            block = make_block(5)
+            conns[0].notify(insert_payload(block))
+            conns[0].notify("")  # Trigger notifications carry no range
+            assert ranges == [(int(block.ts_us[0]), int(block.ts_us[-1]))]
+            assert listener.notifications == 2
+        finally:
+            await listener.stop()
+
+    async def test_reconnect_wakes_waiters(self):
+        listener, conns = await started_listener()
+        try:
+            version = listener.version
+            conns[0].on_terminate(conns[0])
+            assert await listener.wait(version, timeout=5) is True
+            assert len(conns) == 2 and listener.reconnects == 1
+        finally:
+            await listener.stop()
+
+
+class TestInsertNotifications:
+    """Test the trigger SQL, payloads and the loader-side hook."""
+
+    def test_payload_roundtrip(self):
+        block = make_block(3)
+        assert parse_payload(insert_payload(block)) == (int(block.ts_us[0]), int(block.ts_us[-1]))
+        assert parse_payload("") is None
+
+    def test_trigger_is_statement_level(self):
+        sql = notify_trigger_sql()
+        assert "FOR EACH STATEMENT" in sql and f"pg_notify('{TAIL_CHANNEL}'" in sql
+
+    async def test_loader_notifies_each_chunk(self):
+        conn = FakeListenConnection()
+        loader = BulkLoader(lambda: conn, dedupe=False, notify_channel=TAIL_CHANNEL)
+        block = make_block(4, offset=10)
+
+        assert await loader.write_block(conn, block) == 4
+        assert conn.executed == [("SELECT pg_notify($1, $2)", (TAIL_CHANNEL, insert_payload(block)))]
+
+
+class TestSessionTail:
+    """Test tail state on the session."""
+
+    def test_seek_and_disable_leave_tail_following(self):
+        session = UserSession("tail")
+        session.set_tail(True)
+        session.tail_waiting = session.tail_following = True
+
+        session.seek(START)
+        assert session.tail and not session.tail_waiting and not session.tail_following
+
+        session.tail_following = True
+        session.set_tail(False)
+        assert not session.tail_following and session.get_state()["tail"] is False
@@ -0,0 +1,108 @@
+"""Tests for the columnar ring store."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from ring_store import ArrayRing, SnapshotRing, _deep_size, timestamp_us
+
+START = datetime(2024, 3, 1, 9, 30)
+
+
+def processed(i, anomalies=None, depth=10):
+    return {
+        "timestamp": (START + timedelta(milliseconds=100 * i)).isoformat(),
+        "mid_price": 100.0 + i * 0.01,
+        "spread": 0.02,
+        "vpin": 0.1 * (i % 3),
+        "regime": i % 4,
+        "regime_label": "Normal",
+        "trade_classified": i % 2 == 0,
+        "engine": "python",
+        "bids": [[100.0 - j * 0.01, 5.0 + j] for j in range(depth)],
+        "asks": [[100.02 + j * 0.01, 4.0 + j] for j in range(depth)],
+        "anomalies": anomalies or [],
+        "prediction": None
+    }
+
+
+class TestArrayRing:
+    """Test O(1) appends and ordered reads across the wrap point."""
+
+    def test_wraps_and_keeps_newest(self):
+        ring = ArrayRing(4, (2,))
+        for i in range(6):
+            ring.append([i, -i])
+
+        assert len(ring) == 4
+        assert ring.ordered()[:, 0].tolist() == [2, 3, 4, 5]
+        assert ring.ordered(last=2)[:, 0].tolist() == [4, 5]
+
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            ArrayRing(0)
+
+
+class TestSnapshotRing:
+    """Test round trips, eviction and columnar reads."""
+
+    def test_round_trip_is_exact(self):
+        ring = SnapshotRing(10)
+        snaps = [processed(i, [{"type": "SPOOFING", "severity": "high", "message": "m", "side": "bid"}])
+                 for i in range(3)]
+        for snap in snaps:
+            ring.append(snap)
+
+        assert ring.to_list() == snaps
+        assert isinstance(ring.row(0)["regime"], int) and ring.row(0)["trade_classified"] is True
+        assert ring.latest() == snaps[-1]
+
+    def test_evicts_oldest_at_capacity(self):
+        ring = SnapshotRing(5)
+        for i in range(12):
+            ring.append(processed(i))
+
+        assert len(ring) == 5 and ring.appended == 12
+        assert [r["mid_price"] for r in ring.to_list()] == [processed(i)["mid_price"] for i in range(7, 12)]
+
+    def test_missing_fields_and_odd_books(self):
+        ring = SnapshotRing(5)
+        ring.append({"timestamp": "bad", "mid_price": float("nan"), "bids": [[1.0, 2.0]] * 15, "label": None})
+        ring.append(processed(1, depth=3))
+
+        first = ring.row(0)
+        assert len(first["bids"]) == 15 and "asks" not in first
+        assert first["label"] is None and np.isnan(first["mid_price"])
+        assert len(ring.row(1)["asks"]) == 3
+        assert "bids" not in ring.row(1) or len(ring.row(1)["bids"]) == 3
+
+    def test_time_range_and_columns(self):
+        ring = SnapshotRing(100)
+        for i in range(50):
+            ring.append(processed(i))
+
+        start_us = timestamp_us(START + timedelta(seconds=1))
+        positions = ring.positions(start_us, start_us + 1_000_000)
+        assert len(positions) == 10
+        assert ring.row(int(positions[0]))["timestamp"] == processed(10)["timestamp"]
+        assert ring.positions(last=7).tolist() == list(range(43, 50))
+        assert np.allclose(ring.column("mid_price", positions), [processed(i)["mid_price"] for i in range(10, 20)])
+        assert np.isnan(ring.column("unknown")).all()
+
+    def test_anomaly_iteration_skips_quiet_rows(self):
+        ring = SnapshotRing(20)
+        for i in range(10):
+            anomalies = [{"type": "LAYERING", "severity": "medium", "message": "x"}] if i in (2, 7) else []
+            ring.append(processed(i, anomalies))
+
+        assert ring.anomaly_positions().tolist() == [2, 7]
+        events = list(ring.iter_anomalies({"LAYERING"}))
+        assert [snap["timestamp"] for snap, _ in events] == [processed(2)["timestamp"], processed(7)["timestamp"]]
+        assert list(ring.iter_anomalies({"SPOOFING"})) == []
+
+    def test_uses_several_times_less_memory_than_dicts(self):
+        snaps = [processed(i) for i in range(1000)]
+        ring = SnapshotRing(1000)
+        for snap in snaps:
+            ring.append(snap)
+
+        assert ring.nbytes() * 3 < sum(_deep_size(s) for s in snaps)
@@ -0,0 +1,194 @@
+"""Tests for bounded per-session queues and overflow policies."""
+import asyncio
+import queue
+import pytest
+from session_queue import SessionQueue, CreditGate, DROP_OLDEST, CONFLATE, BLOCK
+from session_replay import UserSession
+
+
+def snap(symbol, n):
+    return {"symbol": symbol, "n": n}
+
+
+class TestOverflowPolicies:
+    """Test each overflow policy."""
+
+    def test_drop_oldest_keeps_newest(self):
+        q = SessionQueue(maxsize=3, policy=DROP_OLDEST)
+        for i in range(5):
+            q.put_nowait(snap("BTCUSDT", i))
+
+        assert q.qsize() == 3
+        assert [q.get_nowait()["n"] for _ in range(3)] == [2, 3, 4]
+        assert q.get_stats()["dropped"] == 2
+
+    def test_conflate_keeps_latest_per_symbol(self):
+        q = SessionQueue(maxsize=10, policy=CONFLATE)
+        for i in range(100):
+            q.put_nowait(snap("BTCUSDT", i))
+            q.put_nowait(snap("ETHUSDT", i))
+
+        assert q.qsize() == 2
+        first, second = q.get_nowait(), q.get_nowait()
+        assert (first["symbol"], first["n"]) == ("BTCUSDT", 99)
+        assert (second["symbol"], second["n"]) == ("ETHUSDT", 99)
+        assert q.get_stats()["conflated"] == 198
+
+    def test_conflate_handles_processed_tuples(self):
+        q = SessionQueue(maxsize=10, policy=CONFLATE)
+        q.put_nowait((snap("BTCUSDT", 1), 0.5))
+        q.put_nowait((snap("BTCUSDT", 2), 0.5))
+
+        processed, _ = q.get_nowait()
+        assert processed["n"] == 2
+        assert q.empty()
+
+    def test_conflate_never_overwrites_trade_events(self):
+        q = SessionQueue(maxsize=10, policy=CONFLATE)
+        trade = {**snap("BTCUSDT", 1), "strategy": {"trade_event": {"side": "BUY"}}}
+        q.put_nowait((trade, 0.1))
+        q.put_nowait((snap("BTCUSDT", 2), 0.1))
+
+        assert q.qsize() == 2
+        assert q.get_nowait()[0]["strategy"]["trade_event"]["side"] == "BUY"
+
+    def test_block_raises_full_without_waiting(self):
+        q = SessionQueue(maxsize=1, policy=BLOCK)
+        q.put_nowait(snap("BTCUSDT", 1))
+        with pytest.raises(queue.Full):
+            q.put_nowait(snap("BTCUSDT", 2))
+
+    async def test_block_waits_for_consumer(self):
+        q = SessionQueue(maxsize=2, policy=BLOCK)
+        received = []
+
+        async def consumer():
+            while len(received) < 10:
+                try:
+                    received.append(q.get_nowait()["n"])
+                except queue.Empty:
+                    await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(consumer())
+        for i in range(10):
+            await q.put(snap("BTCUSDT", i))
+        await asyncio.wait_for(task, timeout=2)
+
+        assert received == list(range(10))
+        assert q.get_stats()["dropped"] == 0
+        assert q.get_stats()["high_watermark"] <= 2
+
+    def test_empty_queue_raises(self):
+        q = SessionQueue(maxsize=1)
+        with pytest.raises(queue.Empty):
+            q.get_nowait()
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            SessionQueue(maxsize=1, policy="unbounded")
+
+
+class TestSessionQueues:
+    """Test queue integration with UserSession."""
+
+    def test_session_queues_are_bounded(self):
+        session = UserSession("bounded", queue_size=5, queue_policy=DROP_OLDEST)
+        for i in range(20):
+            session.processed_snapshot_queue.put_nowait((snap("BTCUSDT", i), 0.0))
+
+        state = session.get_state()
+        assert state["queues"]["processed"]["depth"] == 5
+        assert state["queues"]["processed"]["dropped"] == 15
+
+    def test_raw_queue_always_blocks(self):
+        session = UserSession("raw", queue_size=1, queue_policy=CONFLATE)
+        session.raw_snapshot_queue.put_nowait(snap("BTCUSDT", 0))
+        with pytest.raises(queue.Full):
+            session.raw_snapshot_queue.put_nowait(snap("BTCUSDT", 1))
+        assert session.get_state()["queues"]["raw"]["policy"] == BLOCK
+
+    def test_switch_policy(self):
+        session = UserSession("switch")
+        session.set_queue_policy(CONFLATE)
+        assert session.get_state()["queues"]["processed"]["policy"] == CONFLATE
+
+    def test_replay_keeps_block_policy(self):
+        session = UserSession("replay", queue_policy=CONFLATE)
+        session.start()
+        assert session.get_state()["queues"]["processed"]["policy"] == BLOCK
+
+        session.set_queue_policy(DROP_OLDEST)
+        assert session.get_state()["queues"]["processed"]["policy"] == BLOCK
+
+        session.stop()
+        assert session.get_state()["queues"]["processed"]["policy"] == DROP_OLDEST
+
+    def test_invalid_session_policy(self):
+        with pytest.raises(ValueError):
+            UserSession("invalid").set_queue_policy("unbounded")
+
+    async def test_shutdown_releases_blocked_producer(self):
+        session = UserSession("blocked", queue_size=1, queue_policy=BLOCK)
+        session.raw_snapshot_queue.put_nowait(snap("BTCUSDT", 0))
+
+        producer = asyncio.create_task(session.raw_snapshot_queue.put(snap("BTCUSDT", 1)))
+        await asyncio.sleep(0.01)
+        assert not producer.done()
+
+        session.shutdown()
+        await asyncio.wait_for(producer, timeout=1)
+
+
+class TestCreditGate:
+    """Test credit-based backpressure between replay and analytics."""
+
+    async def test_producer_waits_for_credit(self):
+        gate = CreditGate(2)
+        await gate.acquire()
+        await gate.acquire()
+
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        gate.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert gate.in_flight == 2
+        assert gate.get_stats()["producer_waits"] == 1
+
+    async def test_slow_consumer_loses_no_rows(self):
+        session = UserSession("credits", queue_size=100, replay_credits=4)
+        received = []
+
+        async def analytics():
+            while len(received) < 50:
+                try:
+                    item = session.raw_snapshot_queue.get_nowait()
+                except queue.Empty:
+                    await asyncio.sleep(0.001)
+                    continue
+                await asyncio.sleep(0.001)  # Slower than the producer
+                received.append(item["n"])
+                session.replay_credits.release()
+
+        task = asyncio.create_task(analytics())
+        for i in range(50):
+            await session.replay_credits.acquire()
+            await session.raw_snapshot_queue.put(snap("BTCUSDT", i))
+            assert session.raw_snapshot_queue.qsize() <= 4
+        await asyncio.wait_for(task, timeout=5)
+
+        assert received == list(range(50))
+        assert session.get_state()["queues"]["raw"]["dropped"] == 0
+
+    def test_release_never_exceeds_capacity(self):
+        gate = CreditGate(3)
+        gate.release(10)
+        assert gate.available == 3
+
+    def test_max_speed_pacing(self):
+        session = UserSession("pacing")
+        session.set_max_speed()
+        assert session.get_state()["pacing"] == "max"
+        session.set_speed(2)
+        assert session.get_state()["pacing"] == "fixed"
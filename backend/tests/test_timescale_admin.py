@@ -0,0 +1,205 @@
+"""Tests for hypertable migration and plan checks."""
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import pytest
+from timescale_admin import batch_ranges, chunks_in_plan, migrate_to_hypertable
+
+START = datetime(2024, 3, 1)
+
+
+class ScriptedConnection:
+    """Answers the migration's queries from a fixed table of rows (by hour offset)."""
+
+    def __init__(self, hours, copied_until=None, hypertable=False):
+        self.old = [START + timedelta(hours=h) for h in hours]
+        self.new = [t for t in self.old if copied_until is not None and t <= copied_until]
+        self.hypertable = hypertable
+        self.statements = []
+        self.queries = []
+        self.logging = False
+        self.written = []
+        self.before_lock = []  # Writes that land between the unlocked pass and the lock
+
+    def write(self, t, delete=False):
+        if delete:
+            self.old.remove(t)
+        else:
+            self.old.append(t)
+        if self.logging:
+            self.written.append(t)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    def rows(self, sql):
+        return self.new if "_ht" in sql else self.old
+
+    async def fetchval(self, sql, *args):
+        self.queries.append(sql)
+        if "pg_extension" in sql:
+            return True
+        if "hypertables" in sql:
+            return self.hypertable
+        if "max(ts)" in sql and "_ht" in sql:
+            return max(self.new) if self.new else None
+        if sql.startswith("SELECT count(*) FROM") and "WHERE" in sql:
+            lo, hi = args
+            return sum(1 for t in self.rows(sql) if lo <= t < hi)
+        if sql.startswith("SELECT count(*) FROM"):
+            return len(self.rows(sql))
+        raise AssertionError(sql)
+
+    async def fetchrow(self, sql, *args):
+        return (min(self.old), max(self.old)) if self.old else (None, None)
+
+    async def fetch(self, sql, *args):
+        self.queries.append(sql)
+        origin, step = args
+        if "DISTINCT" in sql:
+            return [{"k": k} for k in {int((t - origin).total_seconds() // step) for t in self.written}]
+        counts = {}
+        for t in self.rows(sql.split("GROUP BY")[0]):
+            k = int((t - origin).total_seconds() // step)
+            counts[k] = counts.get(k, 0) + 1
+        return [{"k": k, "n": n} for k, n in counts.items()]
+
+    async def execute(self, sql, *args):
+        self.statements.append((sql, args))
+        if sql.startswith("CREATE TRIGGER"):
+            self.logging = True
+        elif sql.startswith("DROP TRIGGER"):
+            self.logging = False
+        elif sql.startswith("LOCK TABLE"):
+            self.queries.append(sql)
+            for t, delete in self.before_lock:
+                self.write(t, delete)
+        elif sql.startswith("DELETE"):
+            lo, hi = args
+            self.new = [t for t in self.new if not lo <= t < hi]
+        elif sql.startswith("INSERT"):
+            if "ts >= $1" in sql:
+                selected = [t for t in self.old if args[0] <= t < args[1]]
+            else:
+                lo = args[0] if args else datetime.min
+                hi = args[1] if len(args) > 1 else datetime.max
+                selected = [t for t in self.old if lo < t <= hi]
+            rows = [t for t in selected if t not in self.new]
+            self.new.extend(rows)
+            return f"INSERT 0 {len(rows)}"
+        return "OK"
+
+
+class UndeletableConnection(ScriptedConnection):
+    """A connection whose repair deletes remove nothing, so the counts never match."""
+
+    async def execute(self, sql, *args):
+        if sql.startswith("DELETE"):
+            self.statements.append((sql, args))
+            return "DELETE 0"
+        return await super().execute(sql, *args)
+
+
+class TestMigration:
+    """Test batched, resumable hypertable conversion."""
+
+    def test_batch_ranges(self):
+        ranges = list(batch_ranges(START, START + timedelta(hours=10), timedelta(hours=4)))
+        assert [(lo.hour, hi.hour) for lo, hi in ranges] == [(0, 4), (4, 8), (8, 10)]
+
+    async def test_copies_in_batches_and_swaps(self):
+        conn = ScriptedConnection(range(0, 24))
+        batches = []
+
+        result = await migrate_to_hypertable(conn, batch=timedelta(hours=6), on_batch=batches.append)
+
+        assert result["rows_copied"] == 24
+        assert sorted(conn.new) == conn.old
+        assert len(batches) == 4
+        sql = [s for s, _ in conn.statements]
+        assert sql.index("LOCK TABLE l2_orderbook IN EXCLUSIVE MODE") < sql.index("ALTER TABLE l2_orderbook_ht RENAME TO l2_orderbook")
+
+    async def test_resumes_after_copied_rows(self):
+        conn = ScriptedConnection(range(0, 24), copied_until=START + timedelta(hours=11))
+
+        result = await migrate_to_hypertable(conn, batch=timedelta(hours=6))
+
+        assert result["rows_copied"] == 12
+        first_batch = next(args for sql, args in conn.statements if sql.startswith("INSERT"))
+        assert first_batch[0] == START + timedelta(hours=11)
+
+    async def test_recopies_ranges_with_late_inserts(self):
+        conn = ScriptedConnection(range(0, 24))
+        late = START + timedelta(hours=2, minutes=30)
+
+        def backdated_insert(progress):
+            if late not in conn.old:
+                conn.old.append(late)  # Lands behind the batch that was just copied
+
+        result = await migrate_to_hypertable(conn, batch=timedelta(hours=6), on_batch=backdated_insert)
+
+        assert result["ranges_repaired"] == 1
+        assert sorted(conn.new) == sorted(conn.old)
+
+    async def test_removes_rows_missing_from_old_table(self):
+        conn = ScriptedConnection(range(0, 24))
+        conn.new.append(START - timedelta(days=1))  # Stray row outside every copied range
+
+        result = await migrate_to_hypertable(conn, batch=timedelta(hours=6))
+
+        assert result["ranges_repaired"] == 1
+        assert sorted(conn.new) == conn.old
+
+    async def test_refuses_swap_when_counts_differ(self):
+        conn = UndeletableConnection(range(0, 24))
+        conn.new.append(START - timedelta(days=1))
+
+        with pytest.raises(RuntimeError):
+            await migrate_to_hypertable(conn, batch=timedelta(hours=6), drop_old=True)
+        sql = [s for s, _ in conn.statements]
+        assert not any(s.startswith("ALTER") for s in sql)
+        assert "DROP TABLE l2_orderbook_pre_ht" not in sql
+        assert "LOCK TABLE l2_orderbook IN EXCLUSIVE MODE" not in sql
+        assert not conn.logging
+
+    async def test_repairs_writes_before_lock_without_full_scan(self):
+        conn = ScriptedConnection(range(0, 24))
+        conn.before_lock = [(START + timedelta(hours=13, minutes=30), False), (START + timedelta(hours=20), True)]
+
+        result = await migrate_to_hypertable(conn, batch=timedelta(hours=6))
+
+        assert sorted(conn.new) == sorted(conn.old)
+        assert result["ranges_repaired"] == 2
+        locked = conn.queries[conn.queries.index("LOCK TABLE l2_orderbook IN EXCLUSIVE MODE"):]
+        assert not any("GROUP BY" in q or ("count(*)" in q and "WHERE" not in q) for q in locked)
+        assert not conn.logging
+
+    async def test_refuses_swap_when_locked_check_fails(self):
+        conn = UndeletableConnection(range(0, 24))
+        conn.before_lock = [(START + timedelta(hours=20), True)]
+
+        with pytest.raises(RuntimeError):
+            await migrate_to_hypertable(conn, batch=timedelta(hours=6))
+        assert not any(s.startswith("ALTER") for s, _ in conn.statements)
+        assert not conn.logging
+
+    async def test_noop_for_existing_hypertable(self):
+        conn = ScriptedConnection(range(3), hypertable=True)
+        assert (await migrate_to_hypertable(conn))["status"] == "already_hypertable"
+        assert conn.statements == []
+
+
+class TestChunkExclusion:
+    """Test chunk extraction from EXPLAIN output."""
+
+    def test_chunks_in_plan(self):
+        plan = [{"Plan": {"Node Type": "Custom Scan", "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "_hyper_1_7_chunk"},
+            {"Node Type": "Custom Scan", "Relation Name": "_hyper_1_8_chunk",
+             "Plans": [{"Node Type": "Seq Scan", "Relation Name": "compress_hyper_2_9_chunk"}]},
+            {"Node Type": "Seq Scan", "Relation Name": "l2_orderbook"}
+        ]}}]
+
+        assert chunks_in_plan(json.dumps(plan)) == ["_hyper_1_7_chunk", "_hyper_1_8_chunk"]
+        assert chunks_in_plan(plan) == chunks_in_plan(json.dumps(plan))
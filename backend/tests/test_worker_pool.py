@@ -0,0 +1,132 @@
+"""Tests for the sharded multi-process analytics worker pool."""
+import asyncio
+import copy
+import pytest
+from worker_pool import ShardedAnalyticsPool, shard_for
+
+
+@pytest.fixture(scope="module")
+def pool():
+    """Two analytics workers without model inference (fast startup)."""
+    pool = ShardedAnalyticsPool(2, enable_inference=False)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+class TestSharding:
+    """Test key to shard assignment."""
+
+    def test_shard_assignment_is_stable(self):
+        assert shard_for("session-a", 4) == shard_for("session-a", 4)
+        assert 0 <= shard_for("session-b", 4) < 4
+
+    def test_keys_spread_across_shards(self):
+        shards = {shard_for(f"session-{i}", 4) for i in range(100)}
+        assert shards == {0, 1, 2, 3}
+
+    def test_invalid_worker_count(self):
+        with pytest.raises(ValueError):
+            ShardedAnalyticsPool(0)
+
+
+class TestWorkerPool:
+    """Test processing snapshots on worker processes."""
+
+    async def test_process_returns_analytics(self, pool, sample_snapshot):
+        processed, processing_time, engine = await pool.process("session-a", copy.deepcopy(sample_snapshot))
+
+        assert engine == "python"
+        assert processed["engine"] == "python"
+        assert processed["spread"] == pytest.approx(0.1)
+        assert processing_time >= 0
+
+    async def test_concurrent_keys(self, pool, sample_snapshot):
+        results = await asyncio.gather(*[
+            pool.process(f"session-{i}", copy.deepcopy(sample_snapshot)) for i in range(8)
+        ])
+
+        assert len(results) == 8
+        assert all(r[0]["best_bid"] == 99.95 for r in results)
+        stats = pool.get_stats()
+        assert sum(s["requests"] for s in stats["shards"]) >= 8
+        assert all(s["alive"] for s in stats["shards"])
+
+    async def test_state_is_kept_per_key(self, pool, sample_snapshot):
+        first = copy.deepcopy(sample_snapshot)
+        second = copy.deepcopy(sample_snapshot)
+        second["bids"][0] = [99.96, 1000]
+
+        await pool.process("stateful", first)
+        processed, _, _ = await pool.process("stateful", second)
+
+        # OFI needs the previous tick of the same key: bid price improved
+        assert processed["ofi"] > 0
+
+    async def test_release_resets_state(self, pool, sample_snapshot):
+        await pool.process("released", copy.deepcopy(sample_snapshot))
+        pool.release("released")
+        processed, _, _ = await pool.process("released", copy.deepcopy(sample_snapshot))
+
+        assert processed["ofi"] == 0
+
+    async def test_checkpoint_and_restore(self, pool, sample_snapshot):
+        first = copy.deepcopy(sample_snapshot)
+        second = copy.deepcopy(sample_snapshot)
+        second["bids"][0] = [99.96, 1000]
+
+        await pool.process("seek", first)
+        state = await pool.checkpoint("seek")
+        await pool.process("seek", copy.deepcopy(second))
+
+        # Back to the state after `first`: the bid improvement is seen again
+        assert await pool.restore("seek", state, []) == 0
+        processed, _, _ = await pool.process("seek", copy.deepcopy(second))
+        assert processed["ofi"] > 0
+
+        # Fresh state fast-forwarded through `first` is equivalent
+        assert await pool.restore("seek", None, [copy.deepcopy(first)]) == 1
+        processed, _, _ = await pool.process("seek", copy.deepcopy(second))
+        assert processed["ofi"] > 0
+        assert await pool.checkpoint("unknown-key") is None
+
+    async def test_unavailable_worker_fails_request(self, sample_snapshot):
+        broken = ShardedAnalyticsPool(1, enable_inference=False)
+        broken.start()
+        try:
+            broken.shards[0].conn.close()
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(broken.process("gone", copy.deepcopy(sample_snapshot)), timeout=5)
+        finally:
+            broken.stop()
+
+    async def test_failed_op_replies_without_killing_worker(self, sample_snapshot):
+        pool = ShardedAnalyticsPool(1, enable_inference=False)
+        pool.start()
+        try:
+            await pool.process("bad-profile", copy.deepcopy(sample_snapshot))
+            pool.set_profile("bad-profile", {})  # Missing stage switches: raises in the worker
+            with pytest.raises(RuntimeError):
+                await pool.restore("bad-profile", b"not a checkpoint", [])
+
+            processed, _, _ = await pool.process("bad-profile", copy.deepcopy(sample_snapshot))
+            assert processed["engine"] == "python"
+            assert pool.get_stats()["shards"][0]["restarts"] == 0
+        finally:
+            pool.stop()
+
+    async def test_dead_worker_is_respawned(self, sample_snapshot):
+        pool = ShardedAnalyticsPool(1, enable_inference=False, respawn_delay=0)
+        pool.start()
+        try:
+            pool.shards[0].process.terminate()
+            for _ in range(200):
+                if pool.shards[0].restarts:
+                    break
+                await asyncio.sleep(0.05)
+
+            processed, _, _ = await asyncio.wait_for(pool.process("after", copy.deepcopy(sample_snapshot)), timeout=30)
+            assert "mid_price" in processed
+            assert pool.get_stats()["shards"][0]["restarts"] == 1
+        finally:
+            pool.stop()
@@ -0,0 +1,311 @@
+"""
+TimescaleDB Administration for l2_orderbook
+Converts the plain table to a hypertable without one long locking
+migration, and manages compression, retention and plan checks.
+
+Migration (resumable, the old table stays readable until the swap):
+1. Create `<table>_ht` like the table and make it a hypertable.
+2. Copy rows in time batches, each committed on its own. A rerun resumes
+   after the newest row already copied.
+3. Reconcile: a trigger starts logging the ts of every row written to the
+   old table, then row counts are compared per batch range and every range
+   that differs is re-copied, which picks up late or backdated inserts
+   behind the copy. Ranges that still differ and were not written since
+   stop the migration.
+4. In one short transaction, lock the old table against writes, copy the
+   rows that arrived meanwhile, and re-check only the ranges in the write
+   log. Swap the names only if those ranges match. The old table is kept as
+   `<table>_pre_ht` unless dropped.
+
+Compression is ordered by ts with no segmentby column, which matches replay's
+access pattern: time-range scans in ts order over a single instrument.
+"""
+import json
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_NAME = re.compile(r"^_hyper_\d+_\d+_chunk$")
+
+
+async def timescale_available(conn) -> bool:
+    return await conn.fetchval("SELECT count(*) > 0 FROM pg_extension WHERE extname = 'timescaledb'")
+
+
+async def is_hypertable(conn, table: str) -> bool:
+    return await conn.fetchval(
+        "SELECT count(*) > 0 FROM timescaledb_information.hypertables WHERE hypertable_name = $1", table
+    )
+
+
+def batch_ranges(after: datetime, last: datetime, step: timedelta) -> Iterator[Tuple[datetime, datetime]]:
+    """(lo, hi] ranges covering (after, last] in `step`-sized batches."""
+    lo = after
+    while lo < last:
+        hi = min(lo + step, last)
+        yield lo, hi
+        lo = hi
+
+
+async def range_counts(conn, table: str, origin: datetime, step: timedelta,
+                       keys: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """Row counts per [origin + k*step, origin + (k+1)*step) range, by k (only `keys` if given)."""
+    if keys is None:
+        rows = await conn.fetch(
+            f"SELECT floor(extract(epoch FROM ts - $1) / $2)::bigint AS k, count(*) AS n FROM {table} GROUP BY 1",
+            origin, step.total_seconds()
+        )
+        return {row["k"]: row["n"] for row in rows}
+    counts = {}
+    for k in keys:
+        lo = origin + k * step
+        counts[k] = await conn.fetchval(f"SELECT count(*) FROM {table} WHERE ts >= $1 AND ts < $2", lo, lo + step)
+    return counts
+
+
+async def mismatched_ranges(conn, table: str, new_table: str, origin: datetime, step: timedelta,
+                            keys: Optional[Iterable[int]] = None) -> Dict[int, Tuple[int, int]]:
+    """(old, new) row counts of every range that differs between the tables."""
+    keys = None if keys is None else sorted(keys)
+    old_counts = await range_counts(conn, table, origin, step, keys)
+    new_counts = await range_counts(conn, new_table, origin, step, keys)
+    return {
+        k: (old_counts.get(k, 0), new_counts.get(k, 0))
+        for k in sorted(set(old_counts) | set(new_counts))
+        if old_counts.get(k, 0) != new_counts.get(k, 0)
+    }
+
+
+async def reconcile(conn, table: str, new_table: str, origin: datetime, step: timedelta,
+                    keys: Optional[Iterable[int]] = None) -> int:
+    """Re-copy every range (of `keys`, or all) whose row count differs; returns the number of ranges."""
+    mismatched = await mismatched_ranges(conn, table, new_table, origin, step, keys)
+    for k, (old_n, new_n) in mismatched.items():
+        lo = origin + k * step
+        hi = lo + step
+        async with conn.transaction():
+            await conn.execute(f"DELETE FROM {new_table} WHERE ts >= $1 AND ts < $2", lo, hi)
+            await conn.execute(f"INSERT INTO {new_table} SELECT * FROM {table} WHERE ts >= $1 AND ts < $2", lo, hi)
+        logger.info(f"Re-copied {table} rows in [{lo}, {hi}): {old_n} vs {new_n}")
+    return len(mismatched)
+
+
+async def start_write_log(conn, table: str, log_table: str):
+    """Log the ts of every row inserted, updated or deleted in `table` from now on."""
+    await conn.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {log_table} AS SELECT ts FROM {table} WITH NO DATA")
+    await conn.execute(f"TRUNCATE {log_table}")
+    await conn.execute(
+        f"CREATE OR REPLACE FUNCTION {log_table}_fn() RETURNS trigger AS $$ BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN INSERT INTO {log_table} VALUES (OLD.ts); END IF; "
+        f"IF TG_OP <> 'DELETE' THEN INSERT INTO {log_table} VALUES (NEW.ts); END IF; "
+        f"RETURN NULL; END $$ LANGUAGE plpgsql"
+    )
+    await conn.execute(f"DROP TRIGGER IF EXISTS {log_table}_trigger ON {table}")
+    await conn.execute(
+        f"CREATE TRIGGER {log_table}_trigger AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {log_table}_fn()"
+    )
+
+
+async def written_ranges(conn, log_table: str, origin: datetime, step: timedelta) -> List[int]:
+    """Range keys of the rows in the write log."""
+    rows = await conn.fetch(
+        f"SELECT DISTINCT floor(extract(epoch FROM ts - $1) / $2)::bigint AS k FROM {log_table}",
+        origin, step.total_seconds()
+    )
+    return [row["k"] for row in rows]
+
+
+async def stop_write_log(conn, table: str, log_table: str):
+    await conn.execute(f"DROP TRIGGER IF EXISTS {log_table}_trigger ON {table}")
+    await conn.execute(f"DROP FUNCTION IF EXISTS {log_table}_fn()")
+    await conn.execute(f"DROP TABLE IF EXISTS {log_table}")
+
+
+async def migrate_to_hypertable(
+    conn,
+    table: str = "l2_orderbook",
+    chunk_interval: str = "1 day",
+    batch: timedelta = timedelta(hours=6),
+    drop_old: bool = False,
+    on_batch: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """Convert `table` to a hypertable in time batches, then swap it in. No-op if it already is one."""
+    if not await timescale_available(conn):
+        raise RuntimeError("TimescaleDB extension is not installed")
+    if await is_hypertable(conn, table):
+        return {"status": "already_hypertable", "rows_copied": 0}
+
+    new_table = f"{table}_ht"
+    await conn.execute(f"CREATE TABLE IF NOT EXISTS {new_table} (LIKE {table} INCLUDING DEFAULTS)")
+    await conn.execute(
+        f"SELECT create_hypertable('{new_table}', 'ts', chunk_time_interval => INTERVAL '{chunk_interval}', "
+        f"if_not_exists => TRUE)"
+    )
+
+    first, last = await conn.fetchrow(f"SELECT min(ts), max(ts) FROM {table}")
+    copied_until = await conn.fetchval(f"SELECT max(ts) FROM {new_table}")
+    rows_copied = 0
+    ranges_repaired = 0
+    started = time.time()
+
+    if first is not None:
+        # Resume after the newest copied row; a batch either committed whole or not at all
+        after = copied_until if copied_until is not None else first - timedelta(microseconds=1)
+        for lo, hi in batch_ranges(after, last, batch):
+            async with conn.transaction():
+                status = await conn.execute(
+                    f"INSERT INTO {new_table} SELECT * FROM {table} WHERE ts > $1 AND ts <= $2", lo, hi
+                )
+            rows = int(status.split()[-1])
+            rows_copied += rows
+            if on_batch:
+                on_batch({"until": hi.isoformat(), "rows": rows, "rows_copied": rows_copied,
+                          "rows_per_second": round(rows_copied / max(time.time() - started, 1e-9), 1)})
+
+    # Full verification while writers still run; from here on the write log
+    # names every range a writer touched, so the locked pass checks only those
+    log_table = f"{table}_migration_writes"
+    await start_write_log(conn, table, log_table)
+    try:
+        if first is not None:
+            ranges_repaired += await reconcile(conn, table, new_table, first, batch)
+            written = set(await written_ranges(conn, log_table, first, batch))
+            stuck = {k: n for k, n in (await mismatched_ranges(conn, table, new_table, first, batch)).items()
+                     if k not in written}
+            if stuck:
+                raise RuntimeError(f"{new_table} still differs from {table} in {len(stuck)} ranges; not swapping")
+
+        # Catch up with rows written during the copy, re-check what was written, then swap names atomically
+        old_table = f"{table}_pre_ht"
+        async with conn.transaction():
+            await conn.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+            copied_until = await conn.fetchval(f"SELECT max(ts) FROM {new_table}")
+            if copied_until is None:
+                status = await conn.execute(f"INSERT INTO {new_table} SELECT * FROM {table}")
+            else:
+                status = await conn.execute(
+                    f"INSERT INTO {new_table} SELECT * FROM {table} WHERE ts > $1", copied_until
+                )
+            rows_copied += int(status.split()[-1])
+            if first is None:
+                # Empty when the copy started: everything came in through the catch-up above
+                mismatched = {}
+                old_rows = await conn.fetchval(f"SELECT count(*) FROM {table}")
+                new_rows = await conn.fetchval(f"SELECT count(*) FROM {new_table}")
+                if old_rows != new_rows:
+                    mismatched = {0: (old_rows, new_rows)}
+            else:
+                written = await written_ranges(conn, log_table, first, batch)
+                ranges_repaired += await reconcile(conn, table, new_table, first, batch, written)
+                mismatched = await mismatched_ranges(conn, table, new_table, first, batch, written)
+            if mismatched:
+                # Raising rolls back: no swap, and nothing is dropped
+                raise RuntimeError(f"{new_table} differs from {table} in {len(mismatched)} ranges; not swapping")
+            await stop_write_log(conn, table, log_table)
+            await conn.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+            await conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    except BaseException:
+        await stop_write_log(conn, table, log_table)
+        raise
+
+    # create_hypertable already built the (ts DESC) index; the old table keeps its index names
+    if drop_old:
+        await conn.execute(f"DROP TABLE {old_table}")
+    await conn.execute(f"ANALYZE {table}")
+    logger.info(f"Migrated {table} to a hypertable ({rows_copied} rows)")
+    return {"status": "migrated", "rows_copied": rows_copied, "ranges_repaired": ranges_repaired, "old_table": None if drop_old else old_table,
+            "seconds": round(time.time() - started, 2)}
+
+
+async def configure_compression(conn, table: str = "l2_orderbook", compress_after: Optional[str] = "7 days",
+                                orderby: str = "ts ASC", segmentby: str = "") -> Dict[str, Any]:
+    """Enable native compression and (re)set the compression policy; None removes the policy."""
+    await conn.execute(
+        f"ALTER TABLE {table} SET (timescaledb.compress, "
+        f"timescaledb.compress_orderby = '{orderby}', timescaledb.compress_segmentby = '{segmentby}')"
+    )
+    await conn.execute(f"SELECT remove_compression_policy('{table}', if_exists => TRUE)")
+    if compress_after:
+        await conn.execute(f"SELECT add_compression_policy('{table}', INTERVAL '{compress_after}')")
+    return {"table": table, "orderby": orderby, "segmentby": segmentby, "compress_after": compress_after}
+
+
+async def set_retention(conn, table: str, drop_after: Optional[str]) -> Dict[str, Any]:
+    """Drop chunks older than `drop_after`; None removes the retention policy."""
+    await conn.execute(f"SELECT remove_retention_policy('{table}', if_exists => TRUE)")
+    if drop_after:
+        await conn.execute(f"SELECT add_retention_policy('{table}', INTERVAL '{drop_after}')")
+    return {"table": table, "drop_after": drop_after}
+
+
+def chunks_in_plan(plan: Any) -> List[str]:
+    """Names of the hypertable chunks an EXPLAIN (FORMAT JSON) plan reads."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    names = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            name = node.get("Relation Name")
+            if name and _CHUNK_NAME.match(name):
+                names.add(name)
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return sorted(names)
+
+
+async def verify_chunk_exclusion(conn, query: str, start: datetime, end: datetime,
+                                 table: str = "l2_orderbook") -> Dict[str, Any]:
+    """EXPLAIN a replay range query and report how many chunks it would scan."""
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", start, end)
+    scanned = chunks_in_plan(plan)
+    total = await conn.fetchval(
+        "SELECT count(*) FROM timescaledb_information.chunks WHERE hypertable_name = $1", table
+    )
+    span_chunks = await conn.fetchval(
+        "SELECT count(*) FROM timescaledb_information.chunks "
+        "WHERE hypertable_name = $1 AND range_end > $2 AND range_start < $3",
+        table, start, end
+    )
+    return {
+        "total_chunks": total,
+        "chunks_in_range": span_chunks,
+        "chunks_scanned": len(scanned),
+        "excluded": len(scanned) <= span_chunks,
+        "scanned": scanned
+    }
+
+
+async def table_report(conn, table: str = "l2_orderbook") -> Dict[str, Any]:
+    """Size, chunk and compression figures for a hypertable."""
+    hypertable = await is_hypertable(conn, table)
+    size_fn = "hypertable_size" if hypertable else "pg_total_relation_size"
+    report = {
+        "table": table,
+        "hypertable": hypertable,
+        "total_size": await conn.fetchval(f"SELECT pg_size_pretty({size_fn}('{table}'))")
+    }
+    if report["hypertable"]:
+        row = await conn.fetchrow(
+            "SELECT count(*) AS chunks, count(*) FILTER (WHERE is_compressed) AS compressed "
+            "FROM timescaledb_information.chunks WHERE hypertable_name = $1", table
+        )
+        report.update(chunks=row["chunks"], compressed_chunks=row["compressed"])
+        stats = await conn.fetchrow(
+            f"SELECT pg_size_pretty(sum(before_compression_total_bytes)) AS before, "
+            f"pg_size_pretty(sum(after_compression_total_bytes)) AS after "
+            f"FROM chunk_compression_stats('{table}')"
+        )
+        if stats and stats["before"]:
+            report.update(before_compression=stats["before"], after_compression=stats["after"])
+    return report
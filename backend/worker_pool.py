@@ -0,0 +1,363 @@
+"""
+Sharded Analytics Worker Pool
+Runs analytics and model inference in separate worker processes so that
+throughput scales with CPU cores instead of being capped by the GIL.
+
+Keys (session ids or live symbols) are hashed onto a fixed shard, and each
+worker process owns the engine instances for the keys routed to it.
+Snapshots and results travel over one duplex pipe per worker; a writer
+thread per shard sends requests, so a full pipe never blocks the event loop.
+A worker that dies is respawned with empty engines; requests in flight fail.
+
+Workers always run the Python engine: the C++ engine keeps one shared state
+server-side, which per-key workers cannot partition.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(key: str, num_shards: int) -> int:
+    """Stable shard assignment (independent of PYTHONHASHSEED)."""
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+
+def _worker_main(conn, shard_id: int, enable_inference: bool, max_failures: int):
+    """Worker process entrypoint: owns per-key engines and serves requests."""
+    from adaptive_processor import apply_profile_to_engine
+    from analytics_core import AnalyticsEngine
+    from snapshot_processor import SnapshotProcessor
+
+    processors: Dict[str, SnapshotProcessor] = {}
+    profiles: Dict[str, Dict[str, Any]] = {}  # Degradation profile per key, pushed by the parent
+    inference = None
+    if enable_inference:
+        try:
+            from inference_service import ModelInference
+            inference = ModelInference()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Worker {shard_id}: inference unavailable: {e}")
+
+    def get_processor(key: str) -> SnapshotProcessor:
+        processor = processors.get(key)
+        if processor is None:
+            processor = SnapshotProcessor(analytics_engine=AnalyticsEngine(), max_failures=max_failures)
+            if key in profiles:
+                apply_profile_to_engine(processor.analytics_engine, profiles[key])
+            processors[key] = processor
+        return processor
+
+    log = logging.getLogger(__name__)
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+
+        op = msg[0]
+        # Requests carry a request id and get a reply; release/profile are fire-and-forget
+        request_id = msg[1] if op in ("process", "checkpoint", "restore") else None
+        try:
+            if op == "process":
+                _, _, key, snapshot = msg
+                processor = get_processor(key)
+
+                processed, processing_time, used_engine, _ = processor.process(snapshot, 0)
+                processed["engine"] = used_engine
+
+                if inference is not None:
+                    prediction = inference.predict(key, snapshot)
+                    if prediction:
+                        processed["prediction"] = prediction
+
+                conn.send((request_id, processed, processing_time, used_engine, None))
+
+            elif op == "checkpoint":
+                _, _, key = msg
+                processor = processors.get(key)
+                state = processor.analytics_engine.get_state() if processor is not None else None
+                conn.send((request_id, state, 0.0, "checkpoint", None))
+
+            elif op == "restore":
+                # Seek: restore a checkpoint (None = fresh state) and fast-forward through `snapshots`
+                _, _, key, state, snapshots = msg
+                processor = get_processor(key)
+                processor.analytics_engine.set_state(state)
+                for snapshot in snapshots:
+                    processor.analytics_engine.process_snapshot(snapshot)
+                if inference is not None:
+                    inference.prime_session(key, snapshots)
+                conn.send((request_id, len(snapshots), 0.0, "restore", None))
+
+            elif op == "release":
+                _, key = msg
+                processors.pop(key, None)
+                profiles.pop(key, None)
+                if inference is not None:
+                    inference.cleanup_session(key)
+
+            elif op == "profile":
+                _, key, profile = msg
+                profiles[key] = profile
+                if key in processors:
+                    apply_profile_to_engine(processors[key].analytics_engine, profile)
+                if inference is not None:
+                    inference.set_interval_scale(key, profile["inference_interval_scale"])
+
+        except (EOFError, OSError):
+            break  # Parent gone
+        except Exception as e:
+            if request_id is None:
+                log.error(f"Worker {shard_id}: {op} failed: {e!r}")
+                continue
+            try:
+                conn.send((request_id, None, 0.0, "error", repr(e)))
+            except (EOFError, OSError):
+                break
+
+    conn.close()
+
+
+class _Shard:
+    """Parent-side handle for one worker process."""
+
+    def __init__(self, shard_id: int, process, conn):
+        self.shard_id = shard_id
+        self.process = process
+        self.conn = conn
+        self.pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self.lock = threading.Lock()
+        self.outbox: queue.SimpleQueue = queue.SimpleQueue()  # (request_id or None, message)
+        self.requests = 0
+        self.errors = 0
+        self.restarts = 0
+        self.reader: Optional[threading.Thread] = None
+        self.writer: Optional[threading.Thread] = None
+
+    def send(self, message, request_id: Optional[int] = None):
+        """Queue a message for the writer thread; never blocks."""
+        self.outbox.put((request_id, message))
+
+
+class ShardedAnalyticsPool:
+    """
+    Pool of analytics worker processes addressed by key.
+
+    All snapshots for the same key go to the same worker, so per-key engine
+    state (EWMA baselines, OFI, VPIN buckets, model buffers) stays consistent.
+    """
+
+    def __init__(self, num_workers: int, enable_inference: bool = True, max_failures: int = 5,
+                 respawn_delay: float = 1.0):
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be >= 1, got {num_workers}")
+        self.num_workers = num_workers
+        self.enable_inference = enable_inference
+        self.max_failures = max_failures
+        self.respawn_delay = respawn_delay  # Between a worker dying and its replacement starting
+        self.shards: list = []
+        self._request_ids = itertools.count()
+        self._started = False
+        self._stopping = False
+        self._lifecycle = threading.Lock()  # Orders respawns against stop()
+
+    def start(self):
+        """Spawn worker processes and their result reader threads."""
+        if self._started:
+            return
+        self._stopping = False
+        self.shards = [self._spawn(shard_id) for shard_id in range(self.num_workers)]
+        self._started = True
+        logger.info(f"Started {self.num_workers} analytics worker processes (inference: {self.enable_inference})")
+
+    def _spawn(self, shard_id: int) -> _Shard:
+        """Start one worker process with its reader and writer threads."""
+        ctx = mp.get_context("spawn")  # Fork is unsafe with torch and gRPC threads
+        parent_conn, child_conn = ctx.Pipe(duplex=True)
+        process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, shard_id, self.enable_inference, self.max_failures),
+            name=f"analytics-worker-{shard_id}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        shard = _Shard(shard_id, process, parent_conn)
+        shard.reader = threading.Thread(
+            target=self._read_results, args=(shard,), name=f"analytics-reader-{shard_id}", daemon=True
+        )
+        shard.writer = threading.Thread(
+            target=self._write_requests, args=(shard,), name=f"analytics-writer-{shard_id}", daemon=True
+        )
+        shard.reader.start()
+        shard.writer.start()
+        return shard
+
+    def _respawn(self, shard: _Shard):
+        """Replace a dead worker; keys routed to it start again from empty engines."""
+        time.sleep(self.respawn_delay)
+        with self._lifecycle:
+            if self._stopping or not self._started or self.shards[shard.shard_id] is not shard:
+                return
+            shard.send(None)  # Let the old writer thread exit
+            shard.conn.close()
+            replacement = self._spawn(shard.shard_id)
+            replacement.restarts = shard.restarts + 1
+            replacement.requests, replacement.errors = shard.requests, shard.errors
+            self.shards[shard.shard_id] = replacement
+        logger.warning(f"Analytics worker {shard.shard_id} exited; respawned (restart {replacement.restarts})")
+
+    def _write_requests(self, shard: _Shard):
+        """Send queued messages to a worker; a None message (stop) is sent last."""
+        while True:
+            request_id, message = shard.outbox.get()
+            try:
+                shard.conn.send(message)
+            except (OSError, ValueError) as e:
+                if request_id is not None:
+                    with shard.lock:
+                        entry = shard.pending.pop(request_id, None)
+                    if entry is not None:
+                        loop, future = entry
+                        loop.call_soon_threadsafe(
+                            _set_exception, future, RuntimeError(f"Analytics worker {shard.shard_id} unavailable: {e}")
+                        )
+            if message is None:
+                break
+
+    def _read_results(self, shard: _Shard):
+        """Resolve pending futures as results arrive from a worker."""
+        while True:
+            try:
+                request_id, processed, processing_time, used_engine, error = shard.conn.recv()
+            except (EOFError, OSError):
+                break
+
+            with shard.lock:
+                entry = shard.pending.pop(request_id, None)
+            if entry is None:
+                continue
+
+            loop, future = entry
+            if error is not None:
+                shard.errors += 1
+                loop.call_soon_threadsafe(_set_exception, future, RuntimeError(error))
+            else:
+                loop.call_soon_threadsafe(_set_result, future, (processed, processing_time, used_engine))
+
+        # Worker is gone: fail anything still waiting
+        with shard.lock:
+            pending, shard.pending = shard.pending, {}
+        for loop, future in pending.values():
+            loop.call_soon_threadsafe(
+                _set_exception, future, RuntimeError(f"Analytics worker {shard.shard_id} exited")
+            )
+        if not self._stopping:
+            self._respawn(shard)
+
+    def shard_of(self, key: str) -> _Shard:
+        return self.shards[shard_for(key, self.num_workers)]
+
+    async def process(self, key: str, snapshot: Dict[str, Any]) -> Tuple[Dict[str, Any], float, str]:
+        """
+        Process a snapshot on the worker that owns `key`.
+
+        Returns:
+            Tuple of (processed_data, processing_time, engine_used)
+        """
+        return await self._request(key, lambda request_id: ("process", request_id, key, snapshot))
+
+    async def checkpoint(self, key: str) -> Optional[bytes]:
+        """Serialized engine state for `key` (None if the worker holds none yet)."""
+        state, _, _ = await self._request(key, lambda request_id: ("checkpoint", request_id, key))
+        return state
+
+    async def restore(self, key: str, state: Optional[bytes], snapshots: list) -> int:
+        """Restore engine state for `key` and fast-forward it through `snapshots`."""
+        count, _, _ = await self._request(key, lambda request_id: ("restore", request_id, key, state, snapshots))
+        return count
+
+    async def _request(self, key: str, build_message) -> Tuple[Any, float, str]:
+        """Send a request to the worker owning `key` and await its reply."""
+        if not self._started:
+            raise RuntimeError("Analytics pool not started")
+
+        shard = self.shard_of(key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._request_ids)
+
+        with shard.lock:
+            shard.pending[request_id] = (loop, future)
+        shard.requests += 1
+        shard.send(build_message(request_id), request_id)
+        return await future
+
+    def release(self, key: str):
+        """Drop the engine state a worker holds for a key."""
+        if not self._started:
+            return
+        self.shard_of(key).send(("release", key))
+
+    def set_profile(self, key: str, profile: Dict[str, Any]):
+        """Push a degradation profile for one key to the worker owning it."""
+        if not self._started:
+            return
+        self.shard_of(key).send(("profile", key, profile))
+
+    def stop(self, timeout: float = 2.0):
+        """Stop all worker processes."""
+        with self._lifecycle:
+            self._stopping = True
+        for shard in self.shards:
+            shard.send(None)
+        deadline = time.time() + timeout
+        for shard in self.shards:
+            shard.writer.join(max(0.0, deadline - time.time()))
+            shard.process.join(max(0.0, deadline - time.time()))
+            if shard.process.is_alive():
+                shard.process.terminate()
+            shard.conn.close()
+        self.shards = []
+        self._started = False
+        logger.info("Analytics worker processes stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-shard statistics."""
+        return {
+            "workers": self.num_workers,
+            "inference_in_workers": self.enable_inference,
+            "shards": [
+                {
+                    "shard": shard.shard_id,
+                    "alive": shard.process.is_alive(),
+                    "requests": shard.requests,
+                    "in_flight": len(shard.pending),
+                    "unsent": shard.outbox.qsize(),
+                    "errors": shard.errors,
+                    "restarts": shard.restarts
+                }
+                for shard in self.shards
+            ]
+        }
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: Exception):
+    if not future.done():
+        future.set_exception(exc)